@@ -1,4 +1,5 @@
 from django import forms
+from apps.pacientes.importacion import normalizar_rut, rut_con_puntos
 from .models import ContactosContacto
 
 class ContactoForm(forms.ModelForm):
@@ -67,4 +68,93 @@ class ContactoForm(forms.ModelForm):
         else:
             # Establecer fecha actual como valor por defecto para nuevos contactos
             from datetime import date
-            self.fields['fecha_registro'].initial = date.today()
\ No newline at end of file
+            self.fields['fecha_registro'].initial = date.today()
+
+class ContactoLoteForm(forms.Form):
+    """Fila del ingreso masivo de contactos de un paciente índice"""
+    rut_contacto = forms.CharField(
+        label='RUT', max_length=12,
+        widget=forms.TextInput(attrs={'class': 'form-control form-control-sm', 'placeholder': '12.345.678-9'}),
+    )
+    nombre_contacto = forms.CharField(
+        label='Nombre', max_length=200,
+        widget=forms.TextInput(attrs={'class': 'form-control form-control-sm'}),
+    )
+    parentesco = forms.ChoiceField(
+        label='Parentesco', choices=ContactosContacto.PARENTESCO_OPCIONES,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'}),
+    )
+    tipo_contacto = forms.ChoiceField(
+        label='Tipo', choices=ContactosContacto.TIPO_CONTACTO_OPCIONES,
+        widget=forms.Select(attrs={'class': 'form-select form-select-sm'}),
+    )
+    telefono = forms.CharField(
+        label='Teléfono', max_length=15, required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control form-control-sm'}),
+    )
+
+    def clean_rut_contacto(self):
+        try:
+            return normalizar_rut(self.cleaned_data['rut_contacto'])
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+
+
+class BaseContactoLoteFormSet(forms.BaseFormSet):
+    """Valida el lote completo: RUT repetidos en el lote y ya registrados para el paciente índice"""
+
+    def __init__(self, *args, paciente=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.paciente = paciente
+
+    def clean(self):
+        if any(self.errors):
+            return
+        filas = [form for form in self.forms if form.has_changed() and form.cleaned_data]
+        vistos = set()
+        for form in filas:
+            rut = form.cleaned_data['rut_contacto']
+            if rut in vistos:
+                form.add_error('rut_contacto', 'RUT repetido en el lote')
+            vistos.add(rut)
+
+        # Una sola consulta para todo el lote (el RUT puede estar guardado con o sin puntos)
+        candidatos = set(vistos) | {rut_con_puntos(rut) for rut in vistos}
+        registrados = set()
+        for rut in ContactosContacto.objects.filter(
+            paciente_indice=self.paciente, rut_contacto__in=candidatos
+        ).values_list('rut_contacto', flat=True):
+            try:
+                registrados.add(normalizar_rut(rut))
+            except ValueError:
+                registrados.add(rut)
+        for form in filas:
+            if form.cleaned_data.get('rut_contacto') in registrados:
+                form.add_error('rut_contacto', 'Ya es contacto de este paciente')
+
+
+ContactoLoteFormSet = forms.formset_factory(
+    ContactoLoteForm,
+    formset=BaseContactoLoteFormSet,
+    extra=4,
+    min_num=1,
+    validate_min=True,
+    max_num=200,
+    validate_max=True,
+)
+
+
+class IngresoLoteForm(forms.Form):
+    fecha_registro = forms.DateField(
+        label='Fecha de Registro',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
+    )
+    texto_csv = forms.CharField(
+        label='Pegar desde planilla',
+        required=False,
+        widget=forms.Textarea(attrs={
+            'class': 'form-control font-monospace',
+            'rows': 5,
+            'placeholder': 'rut;nombre;parentesco;tipo;telefono',
+        }),
+    )
@@ -0,0 +1,346 @@
+# grafo.py - Red de contactos entre pacientes y contactos por RUT
+import re
+import threading
+import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+
+from apps.pacientes.importacion import normalizar_rut
+from apps.pacientes.models import PacientesPaciente
+from .models import ContactosContacto
+
+# Segundos entre reconstrucciones completas; entre ellas solo se agregan
+# pacientes y contactos nuevos (las ediciones y eliminaciones esperan a la
+# siguiente reconstrucción)
+INTERVALO_RECONSTRUCCION = 900
+CHUNK_SIZE = 5000
+
+
+def clave_rut(valor):
+    """RUT normalizado; si el dígito verificador no cuadra se usa el texto limpio"""
+    try:
+        return normalizar_rut(valor)
+    except ValueError:
+        return re.sub(r'[.\s]', '', valor or '').upper()
+
+
+class GrafoContactos:
+    """
+    Grafo dirigido paciente índice -> contacto sobre nodos identificados por
+    RUT normalizado: un contacto que también es paciente, o que aparece en
+    varios casos índice, es un solo nodo.
+
+    Los datos se guardan en arreglos compactos indexados por entero: una
+    arista es una posición en _origen/_destino y la adyacencia se arma en
+    formato CSR (desplazamientos + vecinos) solo cuando cambian las aristas.
+    Los conglomerados se mantienen con union-find (unión por tamaño y
+    compresión de caminos), que se actualiza al agregar cada arista. Todas
+    las consultas son lineales en el tamaño del conglomerado.
+    """
+
+    def __init__(self):
+        self._indice = {}
+        self.ruts = []
+        self.nombres = []
+        self.paciente_id = array('q')
+        self._padre = array('q')
+        self._tamano = array('q')
+        self._origen = array('q')
+        self._destino = array('q')
+        self._csr = None
+        self.ultimo_paciente_id = 0
+        self.ultimo_contacto_id = 0
+
+    def __len__(self):
+        return len(self.ruts)
+
+    @property
+    def total_aristas(self):
+        return len(self._origen)
+
+    # Construcción
+
+    def _nodo(self, rut, nombre=''):
+        clave = clave_rut(rut)
+        nodo = self._indice.get(clave)
+        if nodo is None:
+            nodo = len(self.ruts)
+            self._indice[clave] = nodo
+            self.ruts.append(clave)
+            self.nombres.append(nombre)
+            self.paciente_id.append(0)
+            self._padre.append(nodo)
+            self._tamano.append(1)
+        elif nombre and not self.nombres[nodo]:
+            self.nombres[nodo] = nombre
+        return nodo
+
+    def _raiz(self, nodo):
+        padre = self._padre
+        while padre[nodo] != nodo:
+            padre[nodo] = padre[padre[nodo]]
+            nodo = padre[nodo]
+        return nodo
+
+    def _unir(self, a, b):
+        a, b = self._raiz(a), self._raiz(b)
+        if a == b:
+            return
+        if self._tamano[a] < self._tamano[b]:
+            a, b = b, a
+        self._padre[b] = a
+        self._tamano[a] += self._tamano[b]
+
+    def agregar_paciente(self, paciente_id, rut, nombre):
+        nodo = self._nodo(rut)
+        self.paciente_id[nodo] = paciente_id
+        self.nombres[nodo] = nombre
+        return nodo
+
+    def agregar_contacto(self, rut_indice, rut_contacto, nombre_contacto=''):
+        origen = self._nodo(rut_indice)
+        destino = self._nodo(rut_contacto, nombre_contacto)
+        if origen == destino:
+            return
+        self._origen.append(origen)
+        self._destino.append(destino)
+        self._unir(origen, destino)
+
+    def cargar(self):
+        """Agrega los pacientes y contactos con id mayor al último cargado (dos consultas)"""
+        pacientes = PacientesPaciente.objects.filter(id__gt=self.ultimo_paciente_id).order_by('id').values_list(
+            'id', 'rut', 'nombre'
+        )
+        for paciente_id, rut, nombre in pacientes.iterator(chunk_size=CHUNK_SIZE):
+            self.agregar_paciente(paciente_id, rut, nombre)
+            self.ultimo_paciente_id = paciente_id
+
+        contactos = ContactosContacto.objects.filter(id__gt=self.ultimo_contacto_id).order_by('id').values_list(
+            'id', 'paciente_indice__rut', 'rut_contacto', 'nombre_contacto'
+        )
+        for contacto_id, rut_indice, rut_contacto, nombre in contactos.iterator(chunk_size=CHUNK_SIZE):
+            self.agregar_contacto(rut_indice, rut_contacto, nombre)
+            self.ultimo_contacto_id = contacto_id
+
+    # Adyacencia
+
+    def _armar_csr(self, claves, valores):
+        """Desplazamientos y vecinos agrupados por nodo (ordenamiento por conteo, O(N + E))"""
+        desplazamientos = array('q', bytes(8 * (len(self.ruts) + 1)))
+        for clave in claves:
+            desplazamientos[clave + 1] += 1
+        for i in range(len(self.ruts)):
+            desplazamientos[i + 1] += desplazamientos[i]
+        posicion = array('q', desplazamientos)
+        vecinos = array('q', bytes(8 * len(claves)))
+        for clave, valor in zip(claves, valores):
+            vecinos[posicion[clave]] = valor
+            posicion[clave] += 1
+        return desplazamientos, vecinos
+
+    def _adyacencia(self):
+        if self._csr is None or self._csr[0] != (len(self.ruts), len(self._origen)):
+            self._csr = (
+                (len(self.ruts), len(self._origen)),
+                self._armar_csr(self._origen, self._destino),
+                self._armar_csr(self._destino, self._origen),
+            )
+        return self._csr[1], self._csr[2]
+
+    def _vecinos(self, csr, nodo):
+        desplazamientos, vecinos = csr
+        return vecinos[desplazamientos[nodo]:desplazamientos[nodo + 1]]
+
+    # Consultas
+
+    def buscar(self, rut):
+        return self._indice.get(clave_rut(rut))
+
+    def grado(self, nodo):
+        """Cantidad de nodos distintos conectados (en cualquier dirección)"""
+        salientes, entrantes = self._adyacencia()
+        return len(set(self._vecinos(salientes, nodo)) | set(self._vecinos(entrantes, nodo)))
+
+    def conglomerado(self, nodo):
+        """Nodos del conglomerado de `nodo`, en orden de recorrido"""
+        salientes, entrantes = self._adyacencia()
+        visitados = {nodo}
+        cola = deque([nodo])
+        orden = []
+        while cola:
+            actual = cola.popleft()
+            orden.append(actual)
+            for csr in (salientes, entrantes):
+                for vecino in self._vecinos(csr, actual):
+                    if vecino not in visitados:
+                        visitados.add(vecino)
+                        cola.append(vecino)
+        return orden
+
+    def conglomerados(self, min_tamano=2):
+        """Raíz union-find de cada conglomerado con al menos min_tamano nodos"""
+        raices = {}
+        for nodo in range(len(self.ruts)):
+            raiz = self._raiz(nodo)
+            if self._tamano[raiz] >= min_tamano:
+                raices.setdefault(raiz, nodo)
+        return sorted(raices.values(), key=lambda nodo: -self._tamano[self._raiz(nodo)])
+
+    def _propagar(self, generacion, origenes):
+        """BFS por aristas salientes desde `origenes` (generación 0) sin pasar por nodos ya asignados"""
+        salientes, _ = self._adyacencia()
+        generacion.update(dict.fromkeys(origenes, 0))
+        cola = deque(origenes)
+        while cola:
+            actual = cola.popleft()
+            for vecino in self._vecinos(salientes, actual):
+                if vecino not in generacion:
+                    generacion[vecino] = generacion[actual] + 1
+                    cola.append(vecino)
+
+    def _origenes_de_ciclos(self, pendientes):
+        """
+        Un nodo por cada componente fuertemente conexa de `pendientes` a la
+        que no llega ningún otro nodo pendiente. Se recorren en orden inverso
+        de término de un DFS por aristas salientes: el nodo que termina
+        último está en una componente sin aristas entrantes (Kosaraju), y
+        cada nodo no alcanzado desde los anteriores inicia otra.
+        """
+        salientes, _ = self._adyacencia()
+        miembros = set(pendientes)
+        visitados, terminados = set(), []
+        for inicio in pendientes:
+            if inicio in visitados:
+                continue
+            visitados.add(inicio)
+            pila = [(inicio, iter(self._vecinos(salientes, inicio)))]
+            while pila:
+                nodo, vecinos = pila[-1]
+                for vecino in vecinos:
+                    if vecino in miembros and vecino not in visitados:
+                        visitados.add(vecino)
+                        pila.append((vecino, iter(self._vecinos(salientes, vecino))))
+                        break
+                else:
+                    pila.pop()
+                    terminados.append(nodo)
+
+        origenes, alcanzados = [], set()
+        for nodo in reversed(terminados):
+            if nodo in alcanzados:
+                continue
+            origenes.append(nodo)
+            alcanzados.add(nodo)
+            pila = [nodo]
+            while pila:
+                for vecino in self._vecinos(salientes, pila.pop()):
+                    if vecino in miembros and vecino not in alcanzados:
+                        alcanzados.add(vecino)
+                        pila.append(vecino)
+        return origenes
+
+    def generaciones(self, nodos):
+        """
+        Generación de transmisión de cada nodo: 0 para los casos índice que no
+        son contacto de nadie dentro del conglomerado y +1 por cada eslabón
+        índice -> contacto. Los ciclos a los que no llega ningún caso índice
+        (todo el conglomerado, o una rama que solo alimenta a otra) parten
+        en 0 desde uno de sus nodos, así que todo nodo tiene generación.
+        """
+        _, entrantes = self._adyacencia()
+        generacion = {}
+        self._propagar(generacion, [n for n in nodos if not len(self._vecinos(entrantes, n))])
+        pendientes = [n for n in nodos if n not in generacion]
+        if pendientes:
+            self._propagar(generacion, self._origenes_de_ciclos(pendientes))
+        return generacion
+
+    def cadena(self, nodo):
+        """
+        Cadena de transmisión más corta desde un caso índice de origen hasta
+        `nodo`. Si a `nodo` solo se llega desde un ciclo, sin caso índice de
+        origen, la cadena es solo `nodo`.
+        """
+        _, entrantes = self._adyacencia()
+        anterior = {nodo: None}
+        cola = deque([nodo])
+        origen = nodo
+        while cola:
+            actual = cola.popleft()
+            predecesores = self._vecinos(entrantes, actual)
+            if not len(predecesores):
+                origen = actual
+                break
+            for predecesor in predecesores:
+                if predecesor not in anterior:
+                    anterior[predecesor] = actual
+                    cola.append(predecesor)
+        camino = []
+        while origen is not None:
+            camino.append(origen)
+            origen = anterior[origen]
+        return camino
+
+    def _nodo_json(self, nodo, generacion=None):
+        datos = {
+            'rut': self.ruts[nodo],
+            'nombre': self.nombres[nodo],
+            'paciente_id': self.paciente_id[nodo] or None,
+            'grado': self.grado(nodo),
+        }
+        if generacion is not None:
+            datos['generacion'] = generacion.get(nodo)
+        return datos
+
+    def _resumen(self, nodos, generacion):
+        salientes, _ = self._adyacencia()
+        central = max(nodos, key=self.grado)
+        return {
+            'tamano': len(nodos),
+            'pacientes': sum(1 for n in nodos if self.paciente_id[n]),
+            'contactos': sum(1 for n in nodos if not self.paciente_id[n]),
+            'aristas': sum(len(self._vecinos(salientes, n)) for n in nodos),
+            'casos_indice': sum(1 for n in nodos if len(self._vecinos(salientes, n))),
+            'generaciones': max(generacion.values()) + 1,
+            'nodo_central': self._nodo_json(central),
+        }
+
+    def resumen(self, nodo):
+        nodos = self.conglomerado(nodo)
+        return self._resumen(nodos, self.generaciones(nodos))
+
+    def detalle(self, nodo):
+        """Nodos y aristas del conglomerado de `nodo`, con la cadena que llega a él"""
+        nodos = self.conglomerado(nodo)
+        salientes, _ = self._adyacencia()
+        generacion = self.generaciones(nodos)
+        return {
+            'resumen': self._resumen(nodos, generacion),
+            'nodos': [self._nodo_json(n, generacion) for n in nodos],
+            'aristas': [
+                {'origen': self.ruts[n], 'destino': self.ruts[v]}
+                for n in nodos for v in sorted(set(self._vecinos(salientes, n)))
+            ],
+            'cadena': [self.ruts[n] for n in self.cadena(nodo)],
+        }
+
+
+_grafo = None
+_construido = 0.0
+_bloqueo = threading.Lock()
+
+
+@contextmanager
+def grafo_actualizado():
+    """
+    Grafo del proceso al día con la base de datos. Se mantiene bloqueado
+    mientras se usa porque las actualizaciones incrementales lo modifican.
+    """
+    global _grafo, _construido
+    with _bloqueo:
+        if _grafo is None or time.monotonic() - _construido > INTERVALO_RECONSTRUCCION:
+            _grafo = GrafoContactos()
+            _construido = time.monotonic()
+        _grafo.cargar()
+        yield _grafo
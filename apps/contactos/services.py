@@ -0,0 +1,168 @@
+# services.py - Ingreso masivo de contactos de un paciente índice
+import csv
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ContactosContacto
+
+logger = logging.getLogger(__name__)
+
+
+class IngresoContactos:
+    """
+    Registra de una vez los contactos de un paciente índice (brote en el
+    hogar o el trabajo). El lote se valida completo con ContactoLoteFormSet
+    y se inserta con un solo bulk_create; los indicadores del establecimiento
+    y la alerta de estudios pendientes del paciente se actualizan una vez por
+    lote, no por contacto.
+    """
+
+    COLUMNAS = ['rut_contacto', 'nombre_contacto', 'parentesco', 'tipo_contacto', 'telefono']
+    ALIAS_COLUMNAS = {'rut': 'rut_contacto', 'nombre': 'nombre_contacto', 'tipo': 'tipo_contacto'}
+    REGLA_ALERTA = 'contactos_pendientes_lote'
+    DIAS_VENCIMIENTO = 7
+    PENDIENTES_NIVEL_ALTO = 10
+
+    @staticmethod
+    def _codigo(opciones, valor):
+        """Acepta el código o la etiqueta de la opción; si no coincide se deja para que el formset lo informe"""
+        buscado = valor.strip().lower()
+        for codigo, etiqueta in opciones:
+            if codigo and buscado in (codigo.lower(), etiqueta.lower()):
+                return codigo
+        return valor.strip()
+
+    @staticmethod
+    def filas_desde_texto(texto):
+        """
+        Convierte filas pegadas desde una planilla (coma, punto y coma o
+        tabulación) en diccionarios por columna. El encabezado es opcional:
+        sin él se asume el orden de COLUMNAS.
+        """
+        lineas = [linea for linea in texto.splitlines() if linea.strip()]
+        if not lineas:
+            return []
+        try:
+            dialecto = csv.Sniffer().sniff(lineas[0], delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        filas = list(csv.reader(lineas, dialecto))
+
+        columnas = IngresoContactos.COLUMNAS
+        if filas[0] and filas[0][0].strip().lower().startswith('rut'):
+            encabezado = [c.strip().lower().replace(' ', '_') for c in filas.pop(0)]
+            columnas = [IngresoContactos.ALIAS_COLUMNAS.get(c, c) for c in encabezado]
+
+        resultado = []
+        for celdas in filas:
+            fila = dict(zip(columnas, (c.strip() for c in celdas)))
+            fila = {columna: fila.get(columna, '') for columna in IngresoContactos.COLUMNAS}
+            fila['parentesco'] = IngresoContactos._codigo(ContactosContacto.PARENTESCO_OPCIONES, fila['parentesco'])
+            fila['tipo_contacto'] = IngresoContactos._codigo(ContactosContacto.TIPO_CONTACTO_OPCIONES, fila['tipo_contacto'])
+            resultado.append(fila)
+        return resultado
+
+    @staticmethod
+    def datos_formset(filas, prefijo='form'):
+        """Datos POST equivalentes para validar las filas con ContactoLoteFormSet"""
+        datos = {f'{prefijo}-TOTAL_FORMS': str(len(filas)), f'{prefijo}-INITIAL_FORMS': '0'}
+        for i, fila in enumerate(filas):
+            for columna in IngresoContactos.COLUMNAS:
+                datos[f'{prefijo}-{i}-{columna}'] = str(fila.get(columna) or '')
+        return datos
+
+    @staticmethod
+    def registrar(paciente, filas, fecha_registro, usuario=None):
+        """
+        Inserta las filas validadas en una transacción. Retorna (cantidad de
+        contactos creados, alerta de pendientes o None).
+        """
+        contactos = [
+            ContactosContacto(
+                paciente_indice=paciente,
+                rut_contacto=fila['rut_contacto'],
+                nombre_contacto=fila['nombre_contacto'],
+                parentesco=fila['parentesco'],
+                tipo_contacto=fila['tipo_contacto'],
+                telefono=fila.get('telefono') or None,
+                fecha_registro=fecha_registro,
+                estado_estudio='pendiente',
+            )
+            for fila in filas
+        ]
+        from apps.pacientes.linea_tiempo import LineaTiempoPaciente
+
+        with transaction.atomic():
+            ContactosContacto.objects.bulk_create(contactos)
+            # bulk_create no emite post_save
+            transaction.on_commit(lambda: LineaTiempoPaciente.invalidar(paciente.pk))
+            establecimiento = IngresoContactos._actualizar_indicadores(paciente, fecha_registro)
+            alerta = IngresoContactos._alerta_pendientes(paciente, establecimiento, usuario)
+        return len(contactos), alerta
+
+    @staticmethod
+    def _actualizar_indicadores(paciente, fecha_registro):
+        """Recalcula una vez los indicadores del mes del establecimiento del paciente índice"""
+        from apps.indicadores.models import Establecimiento
+        from apps.indicadores.services import CalculadorIndicadores
+
+        establecimiento = Establecimiento.objects.filter(nombre=paciente.establecimiento_salud).first()
+        if establecimiento:
+            CalculadorIndicadores.calcular_indicadores_operacionales(fecha_registro.month, fecha_registro.year, establecimiento)
+            CalculadorIndicadores.calcular_indicadores_prevencion(fecha_registro.month, fecha_registro.year, establecimiento)
+        return establecimiento
+
+    @staticmethod
+    def _alerta_pendientes(paciente, establecimiento, usuario):
+        """
+        Una alerta abierta por paciente índice con el total de estudios
+        pendientes: se crea la primera vez y se actualiza en los lotes siguientes.
+        """
+        from apps.indicadores.models import Alerta
+        from apps.indicadores.reglas import establecimiento_respaldo
+
+        # Igual que el motor de reglas: sin coincidencia solo se usa el establecimiento configurado
+        establecimiento_id = establecimiento.pk if establecimiento else establecimiento_respaldo()
+        if establecimiento_id is None:
+            logger.warning(
+                "Sin alerta de contactos pendientes para %s: el establecimiento '%s' no está registrado",
+                paciente.rut, paciente.establecimiento_salud,
+            )
+            return None
+
+        pendientes = ContactosContacto.objects.filter(paciente_indice=paciente, estado_estudio='pendiente').count()
+        ahora = timezone.now()
+        valores = {
+            'nivel': 'ALTA' if pendientes >= IngresoContactos.PENDIENTES_NIVEL_ALTO else 'MEDIA',
+            'titulo': f'{pendientes} estudios de contacto pendientes - {paciente.nombre}'[:200],
+            'descripcion': (
+                f'El paciente índice {paciente.nombre} ({paciente.rut}) tiene {pendientes} contactos '
+                f'con estudio pendiente'
+            ),
+            'fecha_vencimiento': ahora + timedelta(days=IngresoContactos.DIAS_VENCIMIENTO),
+            'datos_relacionados': {
+                'regla': IngresoContactos.REGLA_ALERTA,
+                'clave': str(paciente.pk),
+                'tipo_objeto': 'paciente',
+                'paciente_id': paciente.pk,
+                'contactos_pendientes': pendientes,
+            },
+        }
+
+        alerta = Alerta.objects.filter(
+            resuelta=False,
+            datos_relacionados__regla=IngresoContactos.REGLA_ALERTA,
+            datos_relacionados__clave=str(paciente.pk),
+        ).first()
+        if alerta:
+            for campo, valor in valores.items():
+                setattr(alerta, campo, valor)
+            alerta.save(update_fields=list(valores))
+        else:
+            alerta = Alerta.objects.create(
+                tipo='SEGUIMIENTO', establecimiento_id=establecimiento_id, usuario_asignado=usuario, **valores
+            )
+        return alerta
@@ -1,3 +1,210 @@
-from django.test import TestCase
+import json
+from datetime import date
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from apps.contactos.forms import ContactoLoteFormSet
+from apps.contactos.grafo import GrafoContactos
+from apps.contactos.models import ContactosContacto
+from apps.contactos.services import IngresoContactos
+from apps.indicadores.models import Alerta, Establecimiento
+from apps.pacientes.models import PacientesPaciente
+
+
+def _grafo(*aristas):
+    grafo = GrafoContactos()
+    for origen, destino in aristas:
+        grafo.agregar_contacto(origen, destino)
+    return grafo
+
+
+class GrafoContactosTest(SimpleTestCase):
+
+    def _ruts(self, grafo, nodos):
+        return [grafo.ruts[n] for n in nodos]
+
+    def _generaciones(self, grafo, rut):
+        nodos = grafo.conglomerado(grafo.buscar(rut))
+        return {grafo.ruts[n]: g for n, g in grafo.generaciones(nodos).items()}
+
+    def test_rut_compartido_es_un_solo_nodo(self):
+        grafo = GrafoContactos()
+        paciente = grafo.agregar_paciente(7, '12.345.678-5', 'Ana')
+        grafo.agregar_contacto('12345678-5', '1.234.567-4', 'Bruno')
+        grafo.agregar_contacto('1234567-4', '11.111.111-1')
+
+        self.assertEqual(len(grafo), 3)
+        self.assertEqual(grafo.buscar('123456785'), paciente)
+        self.assertEqual(grafo.nombres[grafo.buscar('1234567-4')], 'Bruno')
+        self.assertEqual(grafo.paciente_id[paciente], 7)
+        self.assertEqual(len(grafo.conglomerado(paciente)), 3)
+
+    def test_conglomerados_por_tamano(self):
+        grafo = _grafo(('A', 'B'), ('C', 'D'), ('D', 'E'), ('F', 'G'), ('G', 'F'))
+        grafo.agregar_paciente(1, 'H', 'Sin contactos')
+
+        raices = grafo.conglomerados()
+        self.assertEqual([len(grafo.conglomerado(n)) for n in raices], [3, 2, 2])
+        self.assertEqual(len(grafo.conglomerados(min_tamano=1)), 4)
+        self.assertEqual(grafo.conglomerados(min_tamano=4), [])
+
+    def test_adyacencia_se_rearma_al_agregar_aristas(self):
+        grafo = _grafo(('A', 'B'), ('A', 'C'), ('C', 'A'))
+        self.assertEqual(grafo.grado(grafo.buscar('A')), 2)
+        self.assertEqual(grafo.grado(grafo.buscar('C')), 1)
+
+        grafo.agregar_contacto('D', 'C')
+        salientes, entrantes = grafo._adyacencia()
+        c = grafo.buscar('C')
+        self.assertEqual(sorted(self._ruts(grafo, grafo._vecinos(entrantes, c))), ['A', 'D'])
+        self.assertEqual(self._ruts(grafo, grafo._vecinos(salientes, c)), ['A'])
+        self.assertEqual(grafo.grado(c), 2)
+
+    def test_generaciones_desde_los_casos_indice(self):
+        grafo = _grafo(('A', 'B'), ('B', 'C'), ('D', 'C'))
+        self.assertEqual(self._generaciones(grafo, 'A'), {'A': 0, 'B': 1, 'C': 1, 'D': 0})
+
+    def test_generaciones_de_un_conglomerado_que_es_solo_un_ciclo(self):
+        grafo = _grafo(('A', 'B'), ('B', 'C'), ('C', 'A'))
+        self.assertEqual(sorted(self._generaciones(grafo, 'B').values()), [0, 1, 2])
+
+    def test_generaciones_de_un_ciclo_que_solo_alimenta_a_otra_rama(self):
+        # A <-> B -> C <- D: a A y B no llega ningún caso índice
+        grafo = _grafo(('A', 'B'), ('B', 'A'), ('B', 'C'), ('D', 'C'))
+        generaciones = self._generaciones(grafo, 'C')
+
+        self.assertNotIn(None, generaciones.values())
+        self.assertEqual((generaciones['C'], generaciones['D']), (1, 0))
+        self.assertEqual(sorted([generaciones['A'], generaciones['B']]), [0, 1])
+
+    def test_generaciones_parten_del_ciclo_de_mas_arriba(self):
+        # X <-> Y -> A <-> B: el ciclo de origen es X-Y aunque A aparezca antes
+        grafo = _grafo(('A', 'B'), ('B', 'A'), ('Y', 'A'), ('X', 'Y'), ('Y', 'X'))
+        generaciones = self._generaciones(grafo, 'A')
+
+        self.assertEqual(sorted([generaciones['X'], generaciones['Y']]), [0, 1])
+        self.assertEqual(generaciones['A'], generaciones['Y'] + 1)
+        self.assertEqual(generaciones['B'], generaciones['A'] + 1)
+
+    def test_cadena_hasta_el_caso_de_origen(self):
+        grafo = _grafo(('A', 'B'), ('B', 'C'), ('C', 'D'), ('E', 'D'))
+        self.assertEqual(self._ruts(grafo, grafo.cadena(grafo.buscar('C'))), ['A', 'B', 'C'])
+        self.assertEqual(self._ruts(grafo, grafo.cadena(grafo.buscar('D'))), ['E', 'D'])
+        self.assertEqual(self._ruts(grafo, grafo.cadena(grafo.buscar('A'))), ['A'])
+
+    def test_detalle_del_conglomerado(self):
+        grafo = _grafo(('A', 'B'), ('B', 'A'), ('B', 'C'), ('D', 'C'))
+        detalle = grafo.detalle(grafo.buscar('C'))
+
+        self.assertEqual(detalle['resumen']['tamano'], 4)
+        self.assertEqual(detalle['resumen']['aristas'], 4)
+        self.assertEqual(detalle['resumen']['generaciones'], 2)
+        self.assertEqual(detalle['cadena'], ['D', 'C'])
+        self.assertTrue(all(nodo['generacion'] is not None for nodo in detalle['nodos']))
+
+
+def _fila(rut, nombre='Contacto'):
+    return {'rut_contacto': rut, 'nombre_contacto': nombre, 'parentesco': 'hijo_hija',
+            'tipo_contacto': 'intradomiciliario', 'telefono': ''}
+
+
+class IngresoLoteContactosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('enfermera')
+        Establecimiento.objects.create(nombre='CESFAM', codigo='CESFAM')
+        cls.paciente = PacientesPaciente.objects.create(
+            rut='12345678-5', nombre='Paciente Índice', fecha_nacimiento=date(1980, 1, 1), sexo='F',
+            domicilio='Calle 1', comuna='Santiago', telefono='912345678', establecimiento_salud='CESFAM',
+            tipo_tbc='pulmonar', usuario_registro=cls.usuario,
+        )
+        # Contactos ya registrados, uno con puntos y otro sin ellos
+        for rut in ('1.234.567-4', '11111111-1'):
+            ContactosContacto.objects.create(
+                paciente_indice=cls.paciente, rut_contacto=rut, nombre_contacto='Registrado',
+                parentesco='hijo_hija', tipo_contacto='intradomiciliario', fecha_registro=date(2026, 1, 5),
+                estado_estudio='pendiente',
+            )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _formset(self, filas):
+        return ContactoLoteFormSet(IngresoContactos.datos_formset(filas), paciente=self.paciente)
+
+    def _errores_rut(self, formset):
+        return [form.errors.get('rut_contacto') for form in formset.forms]
+
+    def _api(self, cuerpo):
+        return self.client.post(
+            reverse('contactos:api_ingreso_lote', args=[self.paciente.pk]),
+            cuerpo if isinstance(cuerpo, str) else json.dumps(cuerpo), content_type='application/json',
+        )
+
+    def test_rut_repetido_en_el_lote(self):
+        formset = self._formset([_fila('22.222.222-2'), _fila('22222222-2')])
+
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(self._errores_rut(formset), [None, ['RUT repetido en el lote']])
+
+    def test_ya_registrado_con_o_sin_puntos(self):
+        formset = self._formset([_fila('1234567-4'), _fila('11.111.111-1'), _fila('22222222-2')])
+
+        self.assertFalse(formset.is_valid())
+        self.assertEqual(
+            self._errores_rut(formset),
+            [['Ya es contacto de este paciente'], ['Ya es contacto de este paciente'], None],
+        )
+
+    def test_filas_vacias_se_ignoran(self):
+        formset = self._formset([_fila('22222222-2'), {}, {'telefono': ''}])
+        self.assertTrue(formset.is_valid())
+
+        self.assertFalse(self._formset([{}, {}]).is_valid())
+
+    def test_api_crea_el_lote(self):
+        respuesta = self._api({'fecha_registro': '2026-02-01', 'contactos': [_fila('22.222.222-2'), {}]})
+
+        self.assertEqual(respuesta.status_code, 201)
+        datos = respuesta.json()
+        self.assertEqual(datos['creados'], 1)
+        # Los dos registrados antes y el nuevo siguen pendientes de estudio
+        self.assertEqual(datos['pendientes'], 3)
+        self.assertTrue(Alerta.objects.filter(pk=datos['alerta_id']).exists())
+        contacto = ContactosContacto.objects.get(rut_contacto='22222222-2')
+        self.assertEqual((contacto.paciente_indice, contacto.fecha_registro), (self.paciente, date(2026, 2, 1)))
+
+    def test_api_informa_errores_por_fila(self):
+        respuesta = self._api({'contactos': [_fila('22222222-2'), _fila('1.234.567-4'), _fila('22.222.222-2')]})
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()['errores']['filas'], [
+            {'fila': 2, 'campos': {'rut_contacto': ['Ya es contacto de este paciente']}},
+            {'fila': 3, 'campos': {'rut_contacto': ['RUT repetido en el lote']}},
+        ])
+        self.assertFalse(ContactosContacto.objects.filter(rut_contacto='22222222-2').exists())
+
+    def test_api_informa_campos_invalidos_antes_que_los_del_lote(self):
+        # Con errores de campo no se revisan repetidos ni registrados
+        respuesta = self._api({'contactos': [_fila('1.234.567-4'), _fila('12.345.678-9'), {'rut_contacto': '1-9'}]})
+
+        self.assertEqual(respuesta.status_code, 400)
+        filas = respuesta.json()['errores']['filas']
+        self.assertEqual([fila['fila'] for fila in filas], [2, 3])
+        self.assertEqual(filas[0]['campos'], {'rut_contacto': ['Dígito verificador incorrecto']})
+        self.assertEqual(set(filas[1]['campos']), {'nombre_contacto', 'parentesco', 'tipo_contacto'})
+
+    def test_api_rechaza_json_mal_formado(self):
+        for cuerpo, mensaje in (
+            ('no es json', 'Se esperaba un objeto JSON con la lista "contactos"'),
+            ({'contactos': {}}, 'Se esperaba un objeto JSON con la lista "contactos"'),
+            ([], 'Se esperaba un objeto JSON con la lista "contactos"'),
+            ({'contactos': ['x']}, 'Cada elemento de "contactos" debe ser un objeto JSON'),
+        ):
+            with self.subTest(cuerpo=cuerpo):
+                respuesta = self._api(cuerpo)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertEqual(respuesta.json(), {'error': mensaje})
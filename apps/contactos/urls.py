@@ -6,8 +6,11 @@ app_name = 'contactos'
 urlpatterns = [
     path('', views.lista_contactos, name='lista'),
     path('crear/', views.crear_contacto, name='crear'),
+    path('lote/<int:paciente_pk>/', views.ingreso_lote, name='ingreso_lote'),
+    path('api/lote/<int:paciente_pk>/', views.api_ingreso_lote, name='api_ingreso_lote'),
     path('editar/<int:pk>/', views.editar_contacto, name='editar'),
     path('detalle/<int:pk>/', views.detalle_contacto, name='detalle'),
     path('eliminar/<int:pk>/', views.eliminar_contacto, name='eliminar'),
     path('buscar/', views.buscar_contactos, name='buscar'),
+    path('grafo/', views.grafo_contactos, name='grafo'),
 ]
\ No newline at end of file
@@ -1,9 +1,17 @@
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+from apps.pacientes.models import PacientesPaciente
 from .models import ContactosContacto
-from .forms import ContactoForm
+from .forms import ContactoForm, ContactoLoteFormSet, IngresoLoteForm
+from .services import IngresoContactos
+from .grafo import grafo_actualizado
 
 @login_required
 def lista_contactos(request):
@@ -26,6 +34,78 @@ def crear_contacto(request):
         form = ContactoForm()
     return render(request, 'contactos/contacto_form.html', {'form': form, 'contacto': None})
 
+@login_required
+def ingreso_lote(request, paciente_pk):
+    """Registrar varios contactos de un paciente índice (formulario o pegado desde planilla)"""
+    paciente = get_object_or_404(PacientesPaciente, pk=paciente_pk)
+    if request.method == 'POST':
+        form = IngresoLoteForm(request.POST)
+        texto_csv = request.POST.get('texto_csv', '')
+        if 'pegar' in request.POST:
+            # Solo se cargan las filas pegadas en la tabla para revisarlas antes de registrar
+            filas = IngresoContactos.filas_desde_texto(texto_csv)
+            formset = ContactoLoteFormSet(IngresoContactos.datos_formset(filas), paciente=paciente)
+            if filas:
+                formset.is_valid()
+            else:
+                messages.error(request, 'No se encontraron filas en el texto pegado.')
+        else:
+            formset = ContactoLoteFormSet(request.POST, paciente=paciente)
+            if form.is_valid() and formset.is_valid():
+                filas = [f.cleaned_data for f in formset.forms if f.has_changed()]
+                creados, alerta = IngresoContactos.registrar(
+                    paciente, filas, form.cleaned_data['fecha_registro'], request.user
+                )
+                messages.success(request, f'{creados} contactos registrados para {paciente.nombre}.')
+                return redirect('contactos:lista')
+            messages.error(request, 'Por favor corrige los errores del lote.')
+    else:
+        form = IngresoLoteForm(initial={'fecha_registro': timezone.localdate()})
+        formset = ContactoLoteFormSet(paciente=paciente)
+    return render(request, 'contactos/ingreso_lote.html', {'form': form, 'formset': formset, 'paciente': paciente})
+
+@login_required
+@require_POST
+def api_ingreso_lote(request, paciente_pk):
+    """
+    Ingreso masivo en JSON: {"fecha_registro": "AAAA-MM-DD", "contactos": [{...}]}.
+    Responde 201 con el resumen o 400 con los errores de cada fila.
+    """
+    paciente = get_object_or_404(PacientesPaciente, pk=paciente_pk)
+    try:
+        datos = json.loads(request.body)
+        filas = datos['contactos']
+        if not isinstance(filas, list):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Se esperaba un objeto JSON con la lista "contactos"'}, status=400)
+    if not all(isinstance(fila, dict) for fila in filas):
+        return JsonResponse({'error': 'Cada elemento de "contactos" debe ser un objeto JSON'}, status=400)
+
+    form = IngresoLoteForm({'fecha_registro': datos.get('fecha_registro') or timezone.localdate()})
+    formset = ContactoLoteFormSet(IngresoContactos.datos_formset(filas), paciente=paciente)
+    if not (form.is_valid() and formset.is_valid()):
+        return JsonResponse({
+            'errores': {
+                'lote': list(formset.non_form_errors()) + [str(e) for e in form.errors.get('fecha_registro', [])],
+                'filas': [
+                    {'fila': i + 1, 'campos': {campo: list(errores) for campo, errores in f.errors.items()}}
+                    for i, f in enumerate(formset.forms) if f.errors
+                ],
+            }
+        }, status=400)
+
+    creados, alerta = IngresoContactos.registrar(
+        paciente, [f.cleaned_data for f in formset.forms if f.has_changed()], form.cleaned_data['fecha_registro'],
+        request.user
+    )
+    return JsonResponse({
+        'paciente_id': paciente.pk,
+        'creados': creados,
+        'alerta_id': alerta.pk if alerta else None,
+        'pendientes': alerta.datos_relacionados['contactos_pendientes'] if alerta else None,
+    }, status=201)
+
 @login_required
 def editar_contacto(request, pk):
     """Editar contacto existente"""
@@ -90,4 +170,40 @@ def buscar_contactos(request):
         'query': query,
         'estado_filtro': estado_filtro,
         'tipo_filtro': tipo_filtro
-    })
\ No newline at end of file
+    })
+
+@login_required
+def grafo_contactos(request):
+    """
+    Conglomerados de la red de contactos en JSON. Con ?paciente=<id> o
+    ?rut=<rut> retorna el conglomerado de ese nodo (nodos, aristas y cadena
+    de transmisión); sin parámetros, el resumen de los conglomerados más
+    grandes (?min_tamano=3&limite=50).
+    """
+    rut = request.GET.get('rut', '').strip()
+    paciente_id = request.GET.get('paciente')
+    if paciente_id:
+        if not paciente_id.isdigit():
+            return JsonResponse({'error': 'paciente inválido'}, status=400)
+        rut = get_object_or_404(PacientesPaciente.objects.only('rut'), pk=paciente_id).rut
+
+    try:
+        min_tamano = max(2, int(request.GET.get('min_tamano', 3)))
+        limite = min(200, max(1, int(request.GET.get('limite', 50))))
+    except ValueError:
+        return JsonResponse({'error': 'min_tamano y limite deben ser números'}, status=400)
+
+    with grafo_actualizado() as grafo:
+        if rut:
+            nodo = grafo.buscar(rut)
+            if nodo is None:
+                return JsonResponse({'error': 'RUT sin registros en la red de contactos'}, status=404)
+            return JsonResponse(grafo.detalle(nodo))
+
+        conglomerados = grafo.conglomerados(min_tamano)
+        return JsonResponse({
+            'nodos': len(grafo),
+            'aristas': grafo.total_aristas,
+            'total_conglomerados': len(conglomerados),
+            'conglomerados': [grafo.resumen(nodo) for nodo in conglomerados[:limite]],
+        })
@@ -0,0 +1,118 @@
+# estados.py - Estado de los exámenes bacteriológicos y transiciones en lote
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Reglas en orden de prioridad: (estado, campo, valor). Se asigna el primer
+# estado cuyo campo es distinto de `valor` (None = campo con dato). Es la
+# única definición: la usan el modelo, el SQL de las actualizaciones en lote
+# y el generador de datos sintéticos.
+REGLAS_ESTADO = [
+    ('COMPLETADO', 'resultado', 'PENDIENTE'),
+    ('EN_PROCESO', 'fecha_ingreso_laboratorio', None),
+    ('ENVIADO_LABORATORIO', 'fecha_toma_muestra', None),
+]
+ESTADO_INICIAL = 'SOLICITADO'
+# Estados que las transiciones en lote no modifican
+ESTADOS_CERRADOS = ['CANCELADO']
+# Muestras enviadas o recibidas que esperan resultado en el laboratorio
+ESTADOS_EN_LABORATORIO = ['ENVIADO_LABORATORIO', 'EN_PROCESO']
+
+
+def _cumple(valor_regla, valor):
+    return valor is not None if valor_regla is None else valor != valor_regla
+
+
+def estado_para(resultado, fecha_ingreso_laboratorio, fecha_toma_muestra):
+    """Estado que corresponde a los valores dados (versión en Python de expresion_estado)"""
+    valores = {
+        'resultado': resultado,
+        'fecha_ingreso_laboratorio': fecha_ingreso_laboratorio,
+        'fecha_toma_muestra': fecha_toma_muestra,
+    }
+    for estado, campo, valor_regla in REGLAS_ESTADO:
+        if _cumple(valor_regla, valores[campo]):
+            return estado
+    return ESTADO_INICIAL
+
+
+def expresion_estado(**fijos):
+    """
+    Case/When con el estado de cada fila. Los campos de `fijos` se evalúan
+    con el valor dado en lugar de la columna, para calcular el estado en el
+    mismo UPDATE que asigna esos campos (el orden de evaluación de un SET
+    varía entre motores).
+    """
+    condiciones = []
+    for estado, campo, valor_regla in REGLAS_ESTADO:
+        if campo in fijos:
+            if _cumple(valor_regla, fijos[campo]):
+                # La regla se cumple para todas las filas: las siguientes no aplican
+                return Case(*condiciones, default=Value(estado)) if condiciones else Value(estado)
+            continue
+        if valor_regla is None:
+            condicion = Q(**{f'{campo}__isnull': False})
+        else:
+            condicion = ~Q(**{campo: valor_regla})
+        condiciones.append(When(condicion, then=Value(estado)))
+    return Case(*condiciones, default=Value(ESTADO_INICIAL)) if condiciones else Value(ESTADO_INICIAL)
+
+
+class TransicionesExamen:
+    """
+    Transiciones de estado sobre cualquier queryset de exámenes
+    bacteriológicos, cada una en un solo UPDATE: el estado se calcula en SQL
+    con expresion_estado(), con el mismo criterio que
+    ExamenesExamenbacteriologico.actualizar_estado(). update() no emite
+    señales ni aplica auto_now, así que fecha_actualizacion se asigna aquí.
+    """
+
+    @staticmethod
+    def recalcular(queryset):
+        """Corrige estado_examen de las filas cuyo estado no corresponde; retorna cuántas cambiaron"""
+        return queryset.exclude(estado_examen__in=ESTADOS_CERRADOS).exclude(
+            estado_examen=expresion_estado()
+        ).update(
+            estado_examen=expresion_estado(), fecha_actualizacion=timezone.now()
+        )
+
+    @staticmethod
+    def transicionar(queryset, **campos):
+        """Asigna `campos` y el estado resultante a las filas abiertas del queryset"""
+        fijos = {campo: valor for campo, valor in campos.items() if not hasattr(valor, 'resolve_expression')}
+        return queryset.exclude(estado_examen__in=ESTADOS_CERRADOS).update(
+            estado_examen=expresion_estado(**fijos), fecha_actualizacion=timezone.now(), **campos
+        )
+
+    @staticmethod
+    def registrar_ingreso_laboratorio(queryset, fecha=None):
+        """
+        Marca como recibidas en el laboratorio las muestras que aún no tienen
+        fecha de ingreso y se tomaron hasta `fecha`. Una fecha futura es un
+        ValueError.
+        """
+        hoy = timezone.localdate()
+        fecha = fecha or hoy
+        if fecha > hoy:
+            raise ValueError('La fecha de ingreso no puede ser futura')
+        return TransicionesExamen.transicionar(
+            queryset.filter(fecha_ingreso_laboratorio__isnull=True, fecha_toma_muestra__lte=fecha),
+            fecha_ingreso_laboratorio=fecha,
+        )
+
+    @staticmethod
+    def registrar_resultado(queryset, resultado, fecha=None):
+        """Asigna el resultado; la fecha de resultado ya registrada se conserva"""
+        if resultado == 'PENDIENTE':
+            return TransicionesExamen.transicionar(queryset, resultado=resultado)
+        return TransicionesExamen.transicionar(
+            queryset,
+            resultado=resultado,
+            fecha_resultado=Coalesce('fecha_resultado', Value(fecha or timezone.localdate())),
+        )
+
+    @staticmethod
+    def cancelar(queryset):
+        return queryset.exclude(estado_examen__in=ESTADOS_CERRADOS).update(
+            estado_examen='CANCELADO', fecha_actualizacion=timezone.now()
+        )
@@ -5,6 +5,7 @@ from django.utils import timezone
 from django.contrib.auth.models import User  # Importar el modelo User de Django
 from .models import ExamenesExamenbacteriologico, ExamenRadiologico, ExamenPPD
 from apps.pacientes.models import PacientesPaciente
+from apps.laboratorio.models import LaboratorioRedLaboratorios
 
 class ExamenBacteriologicoForm(forms.ModelForm):
     paciente = forms.ModelChoiceField(
@@ -75,14 +76,13 @@ class ExamenBacteriologicoForm(forms.ModelForm):
         label="Sensibilidad"
     )
     
-    # Laboratorio como campo de texto por ahora
-    laboratorio = forms.CharField(
+    # El nombre en texto (laboratorio) se completa desde el laboratorio elegido
+    laboratorio_red = forms.ModelChoiceField(
+        queryset=LaboratorioRedLaboratorios.objects.filter(activo=True).order_by('nombre'),
         required=False,
-        widget=forms.TextInput(attrs={
-            'class': 'form-control',
-            'placeholder': 'Nombre del laboratorio de referencia'
-        }),
-        label="Laboratorio de Referencia"
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        label="Laboratorio de Referencia",
+        empty_label="Seleccione un laboratorio"
     )
     
     # CORRECCIÓN: Usar el modelo User de Django en lugar de UsuariosUsuario
@@ -104,7 +104,7 @@ class ExamenBacteriologicoForm(forms.ModelForm):
             'resistencia_rifampicina', 'resistencia_pirazinamida',
             'resistencia_etambutol', 'resistencia_estreptomicina',
             'resistencia_fluoroquinolonas', 'observaciones_muestra',
-            'observaciones_resultado', 'prioridad', 'laboratorio',
+            'observaciones_resultado', 'prioridad', 'laboratorio_red',
             'numero_muestra_lab', 'usuario_toma_muestra'
         ]
         
@@ -201,7 +201,6 @@ class ExamenBacteriologicoForm(forms.ModelForm):
         self.fields['resultado_cuantitativo'].required = False
         self.fields['resultado_cualitativo'].required = False
         self.fields['sensibilidad'].required = False
-        self.fields['laboratorio'].required = False
         self.fields['numero_muestra_lab'].required = False
         self.fields['usuario_toma_muestra'].required = False
         
@@ -254,6 +253,13 @@ class ExamenBacteriologicoForm(forms.ModelForm):
             raise ValidationError({
                 'otro_tipo_muestra': 'Debe especificar el tipo de muestra cuando selecciona "Otro".'
             })
+
+        # Mantener el nombre en texto; sin laboratorio elegido se conserva el texto histórico
+        laboratorio_red = cleaned_data.get('laboratorio_red')
+        if laboratorio_red:
+            self.instance.laboratorio = laboratorio_red.nombre
+        elif self.instance.laboratorio_red_id:
+            self.instance.laboratorio = None
         return cleaned_data
 
 class ExamenRadiologicoForm(forms.ModelForm):
@@ -0,0 +1,376 @@
+# ingesta.py - Ingreso masivo de resultados desde archivos del LIS
+import csv
+import io
+from collections import namedtuple
+from datetime import datetime
+from itertools import chain, islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.pacientes.linea_tiempo import LineaTiempoPaciente
+from .models import ExamenesExamenbacteriologico
+
+TAMANO_LOTE = 1000
+MAX_ERRORES_EN_MEMORIA = 500
+FORMATOS_FECHA = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y%m%d')
+
+CAMPOS_RESISTENCIA = [
+    'resistencia_isoniazida', 'resistencia_rifampicina', 'resistencia_pirazinamida',
+    'resistencia_etambutol', 'resistencia_estreptomicina', 'resistencia_fluoroquinolonas',
+]
+CAMPOS_RESULTADO = [
+    'resultado', 'fecha_resultado', 'resultado_cuantitativo', 'resultado_cualitativo',
+    'sensibilidad', 'observaciones_resultado',
+] + CAMPOS_RESISTENCIA
+
+# Nombres alternativos de columnas (CSV) y códigos OBX (formato HL7 plano)
+ALIAS = {
+    'numero_muestra': 'numero_muestra_lab',
+    'muestra': 'numero_muestra_lab',
+    'cuantitativo': 'resultado_cuantitativo',
+    'cualitativo': 'resultado_cualitativo',
+    'observaciones': 'observaciones_resultado',
+    'obs': 'observaciones_resultado',
+    'res_h': 'resistencia_isoniazida',
+    'res_r': 'resistencia_rifampicina',
+    'res_z': 'resistencia_pirazinamida',
+    'res_e': 'resistencia_etambutol',
+    'res_s': 'resistencia_estreptomicina',
+    'res_fq': 'resistencia_fluoroquinolonas',
+}
+
+# Convención del LIS para resistencias: R = resistente, S = sensible
+VERDADEROS = {'r', 'resistente', 'si', 'sí', '1', 'true', 'x'}
+FALSOS = {'s', 'sensible', 'no', '0', 'false'}
+
+# Tipo de muestra del examen -> tipo de muestra del tarjetero
+MUESTRA_TARJETERO = {
+    'ESPUTO': 'esputo',
+    'ESPUTO_INDUCIDO': 'esputo',
+    'LAVADO_GASTRICO': 'aspirado',
+    'ASPIRADO': 'lavado',
+}
+
+ErrorResultado = namedtuple('ErrorResultado', ['linea', 'numero_muestra', 'campo', 'mensaje'])
+
+
+def _campo(nombre):
+    nombre = nombre.strip().lower().replace(' ', '_')
+    return ALIAS.get(nombre, nombre)
+
+
+def leer_csv(encabezado, lineas, leidas=1):
+    """
+    (línea, número de muestra, {campo: texto}) por cada fila del CSV.
+    `leidas` es la cantidad de líneas ya consumidas, incluido el encabezado.
+    """
+    try:
+        dialecto = csv.Sniffer().sniff(encabezado, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    columnas = [_campo(c) for c in next(csv.reader([encabezado], dialecto), [])]
+    if 'numero_muestra_lab' not in columnas or 'resultado' not in columnas:
+        raise ValueError('El archivo debe tener las columnas numero_muestra y resultado')
+    lector = csv.reader(lineas, dialecto)
+
+    # El encabezado se valida al llamar; las filas se leen a medida que se piden
+    def filas():
+        for celdas in lector:
+            if not any(c.strip() for c in celdas):
+                continue
+            fila = {c: v for c, v in zip(columnas, celdas) if c in CAMPOS_RESULTADO or c == 'numero_muestra_lab'}
+            yield lector.line_num + leidas, fila.pop('numero_muestra_lab', '').strip(), fila
+    return filas()
+
+
+def leer_hl7(lineas, primera=1):
+    """
+    Formato plano tipo HL7: un segmento OBR por muestra y un OBX por campo.
+
+        MSH|^~\\&|LIS|LABORATORIO|SISTEMA_TBC||20261015
+        OBR|1|M-000123|BACILOSCOPIA|20261015
+        OBX|1|RESULTADO|POSITIVO
+        OBX|2|CUANTITATIVO|++
+        OBX|3|RES_H|R
+
+    La fecha del OBR es la fecha de resultado. `primera` es el número de la
+    primera línea entregada.
+    """
+    actual = None
+    for linea, segmento in enumerate(lineas, start=primera):
+        partes = segmento.rstrip('\r\n').split('|')
+        tipo = partes[0].strip().upper()
+        if tipo == 'OBR':
+            if actual:
+                yield actual
+            fecha = partes[4].strip() if len(partes) > 4 else ''
+            actual = (linea, partes[2].strip() if len(partes) > 2 else '', {'fecha_resultado': fecha} if fecha else {})
+        elif tipo == 'OBX' and actual and len(partes) > 3:
+            actual[2][_campo(partes[2])] = partes[3]
+    if actual:
+        yield actual
+
+
+def _fecha(valor):
+    for formato in FORMATOS_FECHA:
+        try:
+            fecha = datetime.strptime(valor, formato).date()
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError('Fecha inválida')
+    if fecha > timezone.localdate():
+        raise ValueError('Fecha futura')
+    return fecha
+
+
+def _booleano(valor):
+    valor = valor.lower()
+    if valor in VERDADEROS:
+        return True
+    if valor in FALSOS:
+        return False
+    raise ValueError(f'Valor no reconocido: {valor} (use R o S)')
+
+
+def _opcion(choices):
+    opciones = {}
+    for codigo, etiqueta in choices:
+        opciones[codigo.lower()] = codigo
+        opciones[etiqueta.lower()] = codigo
+
+    def validar(valor):
+        if valor.lower() not in opciones:
+            raise ValueError(f'Valor no permitido: {valor}')
+        return opciones[valor.lower()]
+    return validar
+
+
+VALIDADORES = {
+    'resultado': _opcion(ExamenesExamenbacteriologico.RESULTADO_CHOICES),
+    'fecha_resultado': _fecha,
+    'resultado_cuantitativo': lambda valor: valor[:50],
+    'resultado_cualitativo': str,
+    'sensibilidad': _opcion(ExamenesExamenbacteriologico.SENSIBILIDAD_CHOICES),
+    'observaciones_resultado': str,
+    **{campo: _booleano for campo in CAMPOS_RESISTENCIA},
+}
+
+
+class IngestaResultadosLaboratorio:
+    """
+    Aplica resultados de un archivo del LIS (CSV o HL7 plano) a los exámenes
+    bacteriológicos, por lotes de TAMANO_LOTE resultados.
+
+    En cada lote los exámenes se buscan por numero_muestra_lab (indexado)
+    con una consulta IN, los cambios se guardan con bulk_update y los
+    positivos sin registro en el tarjetero se agregan con bulk_create, todo
+    en una transacción. Solo se actualizan los exámenes cuyos valores
+    cambian, así que volver a procesar el mismo archivo no modifica nada.
+
+    Los resultados con errores, números de muestra inexistentes o asociados
+    a más de un examen se omiten y se informan con su línea.
+    """
+
+    def __init__(self, usuario, laboratorio=None, simular=False, reporte=None, evaluar_alertas=True):
+        self.usuario = usuario
+        # Laboratorio que envía el archivo: se usa en el tarjetero si el examen no tiene laboratorio_red
+        self.laboratorio = laboratorio
+        self.simular = simular
+        self.evaluar_alertas = evaluar_alertas
+        self.reporte = csv.writer(reporte) if reporte is not None else None
+        if self.reporte:
+            self.reporte.writerow(ErrorResultado._fields)
+        self.conteos = {
+            'leidos': 0, 'actualizados': 0, 'sin_cambios': 0, 'no_encontrados': 0,
+            'con_errores': 0, 'tarjetero_creados': 0, 'positivos_sin_laboratorio': 0,
+        }
+        self.errores = []
+        self.total_errores = 0
+
+    @staticmethod
+    def _abrir(archivo):
+        """Texto del archivo y el lector según su formato (detectado por la primera línea)"""
+        if isinstance(archivo, io.TextIOBase):
+            texto = archivo
+        else:
+            binario = getattr(archivo, 'file', archivo)
+            texto = io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+        primera, leidas = texto.readline(), 1
+        while primera and not primera.strip():
+            primera, leidas = texto.readline(), leidas + 1
+        segmento = primera.split('|', 1)[0].strip().upper()
+        if segmento == 'MSH':
+            return leer_hl7(texto, leidas + 1)
+        if segmento == 'OBR':
+            return leer_hl7(chain([primera], texto), leidas)
+        return leer_csv(primera, texto, leidas)
+
+    def _registrar_error(self, linea, numero, campo, mensaje):
+        error = ErrorResultado(linea, numero, campo, mensaje)
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_EN_MEMORIA:
+            self.errores.append(error)
+        if self.reporte:
+            self.reporte.writerow(error)
+
+    def _validar(self, linea, numero, fila):
+        if not numero:
+            self._registrar_error(linea, '', 'numero_muestra_lab', 'Campo obligatorio')
+            return None
+        limpios = {}
+        for campo, valor in fila.items():
+            valor = (valor or '').strip()
+            if not valor:
+                continue
+            validador = VALIDADORES.get(campo)
+            if validador is None:
+                self._registrar_error(linea, numero, campo, 'Campo desconocido')
+                return None
+            try:
+                limpios[campo] = validador(valor)
+            except ValueError as e:
+                self._registrar_error(linea, numero, campo, str(e) or 'Valor inválido')
+                return None
+        if 'resultado' not in limpios:
+            self._registrar_error(linea, numero, 'resultado', 'Campo obligatorio')
+            return None
+        return limpios
+
+    def _aplicar(self, examen, datos, hoy):
+        """Copia los valores al examen; retorna True si alguno cambió"""
+        if datos['resultado'] != 'PENDIENTE' and not datos.get('fecha_resultado') and not examen.fecha_resultado:
+            datos['fecha_resultado'] = hoy
+        if datos.get('fecha_resultado') and datos['fecha_resultado'] < examen.fecha_toma_muestra:
+            raise ValueError('La fecha de resultado es anterior a la toma de muestra')
+        cambio = False
+        for campo, valor in datos.items():
+            if getattr(examen, campo) != valor:
+                setattr(examen, campo, valor)
+                cambio = True
+        estado = examen.estado_examen
+        examen.actualizar_estado()
+        return cambio or examen.estado_examen != estado
+
+    def _procesar_lote(self, lote, hoy):
+        # Si un número se repite en el lote, vale el último resultado
+        por_numero = {}
+        for linea, numero, fila in lote:
+            datos = self._validar(linea, numero, fila)
+            if datos is None:
+                self.conteos['con_errores'] += 1
+            else:
+                por_numero[numero] = (linea, datos)
+        if not por_numero:
+            return
+
+        examenes = {}
+        for examen in ExamenesExamenbacteriologico.objects.filter(numero_muestra_lab__in=por_numero):
+            examenes.setdefault(examen.numero_muestra_lab, []).append(examen)
+
+        cambiados, positivos = [], []
+        for numero, (linea, datos) in por_numero.items():
+            encontrados = examenes.get(numero, [])
+            if not encontrados:
+                self.conteos['no_encontrados'] += 1
+                self._registrar_error(linea, numero, 'numero_muestra_lab', 'No existe un examen con ese número de muestra')
+                continue
+            if len(encontrados) > 1:
+                self.conteos['con_errores'] += 1
+                self._registrar_error(linea, numero, 'numero_muestra_lab', 'Número de muestra asociado a varios exámenes')
+                continue
+            examen = encontrados[0]
+            try:
+                cambio = self._aplicar(examen, datos, hoy)
+            except ValueError as e:
+                self.conteos['con_errores'] += 1
+                self._registrar_error(linea, numero, 'fecha_resultado', str(e))
+                continue
+            if cambio:
+                cambiados.append(examen)
+            else:
+                self.conteos['sin_cambios'] += 1
+            if examen.resultado == 'POSITIVO':
+                positivos.append(examen)
+
+        self.conteos['actualizados'] += len(cambiados)
+        if self.simular:
+            return
+        ahora = timezone.now()
+        with transaction.atomic():
+            if cambiados:
+                # bulk_update no aplica auto_now
+                for examen in cambiados:
+                    examen.fecha_actualizacion = ahora
+                ExamenesExamenbacteriologico.objects.bulk_update(
+                    cambiados, CAMPOS_RESULTADO + ['estado_examen', 'fecha_actualizacion'], batch_size=TAMANO_LOTE
+                )
+            if positivos:
+                self._registrar_tarjetero(positivos, hoy)
+            # bulk_update y bulk_create no emiten señales
+            pacientes = [examen.paciente_id for examen in cambiados + positivos]
+            if pacientes:
+                transaction.on_commit(lambda: LineaTiempoPaciente.invalidar_varios(pacientes))
+
+    def _laboratorio_de(self, examen):
+        return examen.laboratorio_red_id or (self.laboratorio.pk if self.laboratorio else None)
+
+    def _registrar_tarjetero(self, positivos, hoy):
+        """Un registro por examen positivo que aún no está en el tarjetero (una consulta y un bulk_create)"""
+        from apps.laboratorio.models import LaboratorioTarjetero
+
+        registrados = set(
+            LaboratorioTarjetero.objects.filter(examen__in=positivos).values_list('examen_id', flat=True)
+        )
+        nuevos = []
+        for examen in positivos:
+            if examen.pk in registrados:
+                continue
+            laboratorio_id = self._laboratorio_de(examen)
+            if laboratorio_id is None:
+                self.conteos['positivos_sin_laboratorio'] += 1
+                continue
+            detalle = f' ({examen.resultado_cuantitativo})' if examen.resultado_cuantitativo else ''
+            nuevos.append(LaboratorioTarjetero(
+                paciente_id=examen.paciente_id,
+                examen=examen,
+                fecha_deteccion=examen.fecha_resultado or hoy,
+                tipo_muestra=MUESTRA_TARJETERO.get(examen.tipo_muestra, 'otros'),
+                resultado=f'{examen.get_tipo_examen_display()} positivo{detalle}'[:100],
+                laboratorio_referencia_id=laboratorio_id,
+                fecha_notificacion=hoy,
+                usuario_notificador=self.usuario,
+            ))
+        LaboratorioTarjetero.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE)
+        self.conteos['tarjetero_creados'] += len(nuevos)
+
+    def procesar(self, archivo, progreso=None):
+        """
+        Procesa el archivo completo y retorna los conteos. `progreso(conteos)`
+        se llama al terminar cada lote.
+        """
+        resultados = self._abrir(archivo)
+        hoy = timezone.localdate()
+        while True:
+            lote = list(islice(resultados, TAMANO_LOTE))
+            if not lote:
+                break
+            self.conteos['leidos'] += len(lote)
+            self._procesar_lote(lote, hoy)
+            if progreso:
+                progreso(self.conteos)
+
+        if self.evaluar_alertas and not self.simular and self.conteos['actualizados']:
+            self._evaluar_alertas()
+        return self.conteos
+
+    @staticmethod
+    def _evaluar_alertas():
+        """bulk_update no emite señales: se evalúan las reglas de resultados de inmediato"""
+        from apps.indicadores.reglas import (
+            MotorReglas, ReglaExamenPositivoSinTarjetero, ReglaResistenciaMDR, ReglaResistenciaXDR,
+        )
+
+        MotorReglas([ReglaExamenPositivoSinTarjetero(), ReglaResistenciaMDR(), ReglaResistenciaXDR()]).evaluar()
@@ -0,0 +1,76 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.examenes.ingesta import IngestaResultadosLaboratorio
+from apps.laboratorio.models import LaboratorioRedLaboratorios
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica resultados exportados por el LIS (CSV o HL7 plano) a los exámenes por número de '
+        'muestra, con bulk_update y registro automático de positivos en el tarjetero'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con encabezado o archivo HL7 plano (segmentos OBR/OBX)')
+        parser.add_argument('--usuario', required=True, help='Username que queda como notificador en el tarjetero')
+        parser.add_argument('--laboratorio', type=int,
+                            help='Id del laboratorio que envía el archivo (para el tarjetero si el examen no indica uno)')
+        parser.add_argument('--reporte', help='CSV donde escribir los resultados omitidos')
+        parser.add_argument('--simular', action='store_true', help='Validar sin guardar')
+        parser.add_argument('--sin-alertas', action='store_true', help='No evaluar las reglas de alertas de resultados')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuario {options['usuario']} no existe")
+        laboratorio = None
+        if options['laboratorio']:
+            laboratorio = LaboratorioRedLaboratorios.objects.filter(pk=options['laboratorio']).first()
+            if laboratorio is None:
+                raise CommandError(f"Laboratorio {options['laboratorio']} no existe")
+
+        reporte = open(options['reporte'], 'w', newline='', encoding='utf-8') if options['reporte'] else None
+        ingesta = IngestaResultadosLaboratorio(
+            usuario,
+            laboratorio=laboratorio,
+            simular=options['simular'],
+            reporte=reporte,
+            evaluar_alertas=not options['sin_alertas'],
+        )
+
+        def progreso(conteos):
+            self.stdout.write(
+                f"  {conteos['leidos']} resultados leídos, {conteos['actualizados']} actualizados, "
+                f"{conteos['sin_cambios']} sin cambios, {conteos['con_errores'] + conteos['no_encontrados']} omitidos"
+            )
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                conteos = ingesta.procesar(archivo, progreso=progreso)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if reporte:
+                reporte.close()
+
+        resultado = 'válidos (simulación, no se guardaron)' if options['simular'] else 'actualizados'
+        self.stdout.write(self.style.SUCCESS(
+            f"{conteos['actualizados']} de {conteos['leidos']} exámenes {resultado} en "
+            f"{time.perf_counter() - inicio:.1f} s; {conteos['tarjetero_creados']} positivos agregados al tarjetero"
+        ))
+        if conteos['positivos_sin_laboratorio']:
+            self.stdout.write(self.style.WARNING(
+                f"{conteos['positivos_sin_laboratorio']} positivos sin laboratorio conocido no se agregaron al "
+                f"tarjetero (use --laboratorio)"
+            ))
+        if ingesta.total_errores:
+            destino = f" (detalle en {options['reporte']})" if options['reporte'] else ''
+            self.stdout.write(self.style.WARNING(f'{ingesta.total_errores} resultados omitidos{destino}'))
+            if not options['reporte']:
+                for error in ingesta.errores[:20]:
+                    self.stdout.write(f'  línea {error.linea} [{error.campo}] {error.numero_muestra}: {error.mensaje}')
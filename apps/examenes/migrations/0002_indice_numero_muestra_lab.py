@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examenes', '0001_initial'),
+        ('pacientes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examenesexamenbacteriologico',
+            index=models.Index(fields=['numero_muestra_lab'], name='examenes_ex_numero__52d1f2_idx'),
+        ),
+    ]
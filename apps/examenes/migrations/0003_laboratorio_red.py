@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:13
+
+import difflib
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Copia de apps.laboratorio.coincidencias al momento de la migración, para
+# que los cambios posteriores al criterio no alteren lo que hace.
+PALABRAS_COMUNES = {'laboratorio', 'lab', 'de', 'del', 'la', 'el'}
+UMBRAL_SIMILITUD = 0.85
+
+
+def normalizar_nombre(texto):
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode().lower()
+    palabras = re.findall(r'[a-z0-9]+', texto)
+    return ' '.join(p for p in palabras if p not in PALABRAS_COMUNES)
+
+
+def _distintivos(clave):
+    return {p for p in clave.split() if any(c.isdigit() for c in p) or re.fullmatch(r'[ivx]+', p)}
+
+
+def asociar_nombres(nombres, laboratorios, umbral=UMBRAL_SIMILITUD):
+    candidatos = {}
+    for pk, nombre in laboratorios:
+        candidatos.setdefault(normalizar_nombre(nombre), set()).add(pk)
+    candidatos = {clave: ids.pop() for clave, ids in candidatos.items() if len(ids) == 1 and clave}
+
+    asociados = {}
+    for nombre in nombres:
+        clave = normalizar_nombre(nombre)
+        if not clave:
+            continue
+        if clave in candidatos:
+            asociados[nombre] = candidatos[clave]
+            continue
+        distintivos = _distintivos(clave)
+        parecidos = [
+            p for p in difflib.get_close_matches(clave, candidatos, n=3, cutoff=umbral)
+            if _distintivos(p) == distintivos
+        ][:2]
+        if len(parecidos) == 1 or (
+            len(parecidos) == 2
+            and difflib.SequenceMatcher(None, clave, parecidos[0]).ratio()
+            > difflib.SequenceMatcher(None, clave, parecidos[1]).ratio()
+        ):
+            asociados[nombre] = candidatos[parecidos[0]]
+    return asociados
+
+
+def asociar_laboratorios(apps, schema_editor):
+    """Asigna laboratorio_red desde el texto libre: un UPDATE por laboratorio con los textos que le corresponden"""
+    Examen = apps.get_model('examenes', 'ExamenesExamenbacteriologico')
+    Laboratorio = apps.get_model('laboratorio', 'LaboratorioRedLaboratorios')
+    nombres = Examen.objects.exclude(laboratorio__isnull=True).exclude(laboratorio='').values_list(
+        'laboratorio', flat=True
+    ).order_by().distinct()
+    asociados = asociar_nombres(list(nombres), Laboratorio.objects.values_list('pk', 'nombre'))
+    por_laboratorio = {}
+    for nombre, laboratorio_id in asociados.items():
+        por_laboratorio.setdefault(laboratorio_id, []).append(nombre)
+    for laboratorio_id, textos in por_laboratorio.items():
+        Examen.objects.filter(laboratorio__in=textos).update(laboratorio_red_id=laboratorio_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('examenes', '0002_indice_numero_muestra_lab'),
+        ('laboratorio', '0001_initial'),
+        ('pacientes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examenesexamenbacteriologico',
+            name='laboratorio_red',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='examenes', to='laboratorio.laboratorioredlaboratorios', verbose_name='Laboratorio de la Red'),
+        ),
+        migrations.AddIndex(
+            model_name='examenesexamenbacteriologico',
+            index=models.Index(fields=['laboratorio_red', 'estado_examen', 'prioridad', 'fecha_toma_muestra'], name='examenes_ex_laborat_00b340_idx'),
+        ),
+        migrations.RunPython(asociar_laboratorios, migrations.RunPython.noop),
+    ]
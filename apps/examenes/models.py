@@ -5,6 +5,7 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from .estados import estado_para
 
 class ExamenesExamenbacteriologico(models.Model):
     TIPO_EXAMEN_CHOICES = [
@@ -178,6 +179,14 @@ class ExamenesExamenbacteriologico(models.Model):
         null=True,
         verbose_name='Laboratorio de Referencia'
     )
+    laboratorio_red = models.ForeignKey(
+        'laboratorio.LaboratorioRedLaboratorios',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='examenes',
+        verbose_name='Laboratorio de la Red'
+    )
     numero_muestra_lab = models.CharField(
         max_length=100,
         blank=True,
@@ -211,6 +220,9 @@ class ExamenesExamenbacteriologico(models.Model):
             models.Index(fields=['paciente', 'fecha_toma_muestra']),
             models.Index(fields=['tipo_examen', 'resultado']),
             models.Index(fields=['estado_examen']),
+            models.Index(fields=['numero_muestra_lab']),
+            # Colas de trabajo por laboratorio (ColaTrabajoLaboratorio)
+            models.Index(fields=['laboratorio_red', 'estado_examen', 'prioridad', 'fecha_toma_muestra']),
         ]
 
     def __str__(self):
@@ -247,17 +259,8 @@ class ExamenesExamenbacteriologico(models.Model):
         super().save(*args, **kwargs)
 
     def actualizar_estado(self):
-        """Actualizar estado del examen automáticamente"""
-        hoy = timezone.now().date()
-        
-        if self.resultado != 'PENDIENTE':
-            self.estado_examen = 'COMPLETADO'
-        elif self.fecha_ingreso_laboratorio:
-            self.estado_examen = 'EN_PROCESO'
-        elif self.fecha_toma_muestra:
-            self.estado_examen = 'ENVIADO_LABORATORIO'
-        else:
-            self.estado_examen = 'SOLICITADO'
+        """Actualizar estado del examen automáticamente (mismas reglas que TransicionesExamen en SQL)"""
+        self.estado_examen = estado_para(self.resultado, self.fecha_ingreso_laboratorio, self.fecha_toma_muestra)
 
     @property
     def tiempo_procesamiento(self):
@@ -1,3 +1,233 @@
-from django.test import TestCase
+import io
+from datetime import date, timedelta
+from itertools import product
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.examenes.estados import TransicionesExamen, estado_para, expresion_estado
+from apps.examenes.ingesta import IngestaResultadosLaboratorio, leer_csv, leer_hl7
+from apps.examenes.models import ExamenesExamenbacteriologico
+from apps.laboratorio.models import LaboratorioRedLaboratorios, LaboratorioTarjetero
+from apps.pacientes.models import PacientesPaciente
+
+
+def _crear_paciente(usuario):
+    return PacientesPaciente.objects.create(
+        rut='12345678-5', nombre='Paciente de Prueba', fecha_nacimiento=date(1980, 1, 1), sexo='F',
+        domicilio='Calle 2', comuna='Santiago', telefono='912345678', establecimiento_salud='CESFAM',
+        tipo_tbc='pulmonar', usuario_registro=usuario,
+    )
+
+
+def _leer_csv(texto):
+    lineas = io.StringIO(texto)
+    return list(leer_csv(lineas.readline(), lineas))
+
+
+class LecturaArchivosLISTest(SimpleTestCase):
+
+    def test_leer_csv_normaliza_columnas_y_numera_lineas(self):
+        filas = _leer_csv(
+            'Numero Muestra,Resultado,Cuantitativo,res_h,columna_ajena\n'
+            'M-1,POSITIVO,++,R,x\n'
+            '\n'
+            'M-2,NEGATIVO,,S,y\n'
+        )
+        self.assertEqual(filas, [
+            (2, 'M-1', {'resultado': 'POSITIVO', 'resultado_cuantitativo': '++', 'resistencia_isoniazida': 'R'}),
+            (4, 'M-2', {'resultado': 'NEGATIVO', 'resultado_cuantitativo': '', 'resistencia_isoniazida': 'S'}),
+        ])
+
+    def test_leer_csv_detecta_punto_y_coma(self):
+        filas = _leer_csv('muestra;resultado\nM-1;NEGATIVO\n')
+        self.assertEqual(filas, [(2, 'M-1', {'resultado': 'NEGATIVO'})])
+
+    def test_leer_csv_exige_numero_y_resultado(self):
+        with self.assertRaises(ValueError):
+            _leer_csv('muestra,observaciones\nM-1,x\n')
+
+    def test_leer_hl7_agrupa_obx_por_obr(self):
+        lineas = [
+            'OBR|1|M-1|BACILOSCOPIA|20261015\n',
+            'OBX|1|RESULTADO|POSITIVO\n',
+            'OBX|2|CUANTITATIVO|++\n',
+            'OBR|2|M-2|CULTIVO\n',
+            'OBX|1|RESULTADO|NEGATIVO\n',
+            'OBX|2|incompleto\n',
+        ]
+        self.assertEqual(list(leer_hl7(lineas, primera=2)), [
+            (2, 'M-1', {'fecha_resultado': '20261015', 'resultado': 'POSITIVO', 'resultado_cuantitativo': '++'}),
+            (5, 'M-2', {'resultado': 'NEGATIVO'}),
+        ])
+
+    def test_leer_hl7_ignora_obx_antes_del_primer_obr(self):
+        self.assertEqual(list(leer_hl7(['OBX|1|RESULTADO|POSITIVO\n'])), [])
+
+
+class IngestaResultadosLaboratorioTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('laboratorista')
+        cls.laboratorio = LaboratorioRedLaboratorios.objects.create(
+            nombre='Laboratorio de Prueba', tipo='II', direccion='Calle 1', comuna='Santiago',
+            responsable='Responsable', telefono='221234567', email='lab@example.com',
+        )
+        paciente = _crear_paciente(cls.usuario)
+        cls.hoy = timezone.localdate()
+        cls.examen = ExamenesExamenbacteriologico.objects.create(
+            paciente=paciente, tipo_examen='BACILOSCOPIA', tipo_muestra='ESPUTO',
+            fecha_solicitud=cls.hoy - timedelta(days=5), fecha_toma_muestra=cls.hoy - timedelta(days=4),
+            fecha_ingreso_laboratorio=cls.hoy - timedelta(days=3), laboratorio_red=cls.laboratorio,
+            numero_muestra_lab='M-1', usuario_registro=cls.usuario,
+        )
+
+    def _procesar(self, texto):
+        ingesta = IngestaResultadosLaboratorio(self.usuario, evaluar_alertas=False)
+        return ingesta, ingesta.procesar(io.StringIO(texto))
+
+    def _csv_positivo(self):
+        return f'numero_muestra,resultado,fecha_resultado,cuantitativo\nM-1,POSITIVO,{self.hoy:%Y-%m-%d},++\n'
+
+    def test_aplica_resultado_y_registra_tarjetero(self):
+        _, conteos = self._procesar(self._csv_positivo())
+
+        self.assertEqual(conteos['actualizados'], 1)
+        self.assertEqual(conteos['tarjetero_creados'], 1)
+        self.examen.refresh_from_db()
+        self.assertEqual(self.examen.resultado, 'POSITIVO')
+        self.assertEqual(self.examen.fecha_resultado, self.hoy)
+        self.assertEqual(self.examen.estado_examen, 'COMPLETADO')
+        self.assertTrue(LaboratorioTarjetero.objects.filter(examen=self.examen).exists())
+
+    def test_reingesta_del_mismo_archivo_no_modifica_nada(self):
+        self._procesar(self._csv_positivo())
+        self.examen.refresh_from_db()
+        fecha_actualizacion = self.examen.fecha_actualizacion
+
+        _, conteos = self._procesar(self._csv_positivo())
+
+        self.assertEqual(conteos['actualizados'], 0)
+        self.assertEqual(conteos['sin_cambios'], 1)
+        self.assertEqual(conteos['tarjetero_creados'], 0)
+        self.examen.refresh_from_db()
+        self.assertEqual(self.examen.fecha_actualizacion, fecha_actualizacion)
+        self.assertEqual(LaboratorioTarjetero.objects.filter(examen=self.examen).count(), 1)
+
+    def test_hl7_con_encabezado(self):
+        _, conteos = self._procesar(
+            f'MSH|^~\\&|LIS|LABORATORIO|SISTEMA_TBC||{self.hoy:%Y%m%d}\n'
+            f'OBR|1|M-1|BACILOSCOPIA|{self.hoy:%Y%m%d}\n'
+            'OBX|1|RESULTADO|NEGATIVO\n'
+        )
+        self.assertEqual(conteos['actualizados'], 1)
+        self.examen.refresh_from_db()
+        self.assertEqual(self.examen.resultado, 'NEGATIVO')
+
+    def test_informa_campo_desconocido_y_numero_inexistente(self):
+        ingesta, conteos = self._procesar(
+            'OBR|1|M-1|BACILOSCOPIA\n'
+            'OBX|1|RESULTADO|NEGATIVO\n'
+            'OBX|2|DESCONOCIDO|1\n'
+            'OBR|2|M-404|BACILOSCOPIA\n'
+            'OBX|1|RESULTADO|NEGATIVO\n'
+        )
+        self.assertEqual(conteos['con_errores'], 1)
+        self.assertEqual(conteos['no_encontrados'], 1)
+        self.assertEqual(
+            [(e.linea, e.numero_muestra, e.campo, e.mensaje) for e in ingesta.errores],
+            [
+                (1, 'M-1', 'desconocido', 'Campo desconocido'),
+                (4, 'M-404', 'numero_muestra_lab', 'No existe un examen con ese número de muestra'),
+            ],
+        )
+
+    def test_rechaza_fecha_de_resultado_futura(self):
+        ingesta, conteos = self._procesar(
+            f'numero_muestra,resultado,fecha_resultado\nM-1,NEGATIVO,{self.hoy + timedelta(days=1):%Y-%m-%d}\n'
+        )
+        self.assertEqual(conteos['actualizados'], 0)
+        self.assertEqual(ingesta.errores[0].mensaje, 'Fecha futura')
+
+    def test_simular_no_guarda(self):
+        ingesta = IngestaResultadosLaboratorio(self.usuario, simular=True, evaluar_alertas=False)
+        conteos = ingesta.procesar(io.StringIO(self._csv_positivo()))
+
+        self.assertEqual(conteos['actualizados'], 1)
+        self.examen.refresh_from_db()
+        self.assertEqual(self.examen.resultado, 'PENDIENTE')
+
+
+class EstadoExamenTest(TestCase):
+    """expresion_estado() (SQL) y estado_para() (Python) deben asignar siempre el mismo estado"""
+
+    RESULTADOS = [codigo for codigo, _ in ExamenesExamenbacteriologico.RESULTADO_CHOICES]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('tecnologo')
+        cls.paciente = _crear_paciente(cls.usuario)
+        cls.hoy = timezone.localdate()
+        cls.toma = cls.hoy - timedelta(days=3)
+        # bulk_create no llama a save(), así que estado_examen queda con su valor por defecto
+        ExamenesExamenbacteriologico.objects.bulk_create([
+            ExamenesExamenbacteriologico(
+                paciente=cls.paciente, tipo_examen='BACILOSCOPIA', tipo_muestra='ESPUTO',
+                fecha_toma_muestra=cls.toma, fecha_ingreso_laboratorio=ingreso, resultado=resultado,
+                fecha_resultado=None if resultado == 'PENDIENTE' else cls.hoy,
+                numero_muestra_lab=f'E-{n}', usuario_registro=cls.usuario,
+            )
+            for n, (resultado, ingreso) in enumerate(product(cls.RESULTADOS, [None, cls.hoy - timedelta(days=2)]))
+        ])
+
+    def _comparar(self, **fijos):
+        filas = ExamenesExamenbacteriologico.objects.annotate(estado=expresion_estado(**fijos)).values(
+            'resultado', 'fecha_ingreso_laboratorio', 'fecha_toma_muestra', 'estado'
+        )
+        for fila in filas:
+            valores = {campo: fijos.get(campo, fila[campo])
+                       for campo in ('resultado', 'fecha_ingreso_laboratorio', 'fecha_toma_muestra')}
+            with self.subTest(fijos=fijos, **valores):
+                self.assertEqual(fila['estado'], estado_para(**valores))
+
+    def test_columnas(self):
+        self._comparar()
+
+    def test_toda_combinacion_de_campos_fijos(self):
+        sin_fijar = object()
+        fechas = [sin_fijar, None, self.hoy - timedelta(days=1)]
+        for resultado, ingreso, toma in product([sin_fijar] + self.RESULTADOS, fechas, fechas):
+            fijos = {
+                campo: valor
+                for campo, valor in (
+                    ('resultado', resultado), ('fecha_ingreso_laboratorio', ingreso), ('fecha_toma_muestra', toma)
+                )
+                if valor is not sin_fijar
+            }
+            self._comparar(**fijos)
+
+    def test_transiciones_dejan_el_estado_de_estado_para(self):
+        examenes = ExamenesExamenbacteriologico.objects.all()
+        TransicionesExamen.recalcular(examenes)
+        for examen in examenes:
+            with self.subTest(numero=examen.numero_muestra_lab):
+                self.assertEqual(
+                    examen.estado_examen,
+                    estado_para(examen.resultado, examen.fecha_ingreso_laboratorio, examen.fecha_toma_muestra),
+                )
+
+    def test_ingreso_laboratorio_rechaza_fecha_futura(self):
+        with self.assertRaises(ValueError):
+            TransicionesExamen.registrar_ingreso_laboratorio(
+                ExamenesExamenbacteriologico.objects.all(), self.hoy + timedelta(days=1)
+            )
+
+    def test_ingreso_laboratorio_omite_muestras_tomadas_despues(self):
+        pendientes = ExamenesExamenbacteriologico.objects.filter(fecha_ingreso_laboratorio__isnull=True)
+        cantidad = pendientes.count()
+
+        self.assertEqual(TransicionesExamen.registrar_ingreso_laboratorio(pendientes, self.toma - timedelta(days=1)), 0)
+        self.assertEqual(TransicionesExamen.registrar_ingreso_laboratorio(pendientes, self.toma), cantidad)
+        self.assertFalse(ExamenesExamenbacteriologico.objects.filter(fecha_ingreso_laboratorio__isnull=True).exists())
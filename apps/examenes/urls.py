@@ -7,6 +7,8 @@ app_name = 'examenes'
 urlpatterns = [
     path('', views.lista_examenes, name='lista_examenes'),
     path('crear/', views.crear_examen, name='crear_examen'),
+    path('api/resultados-lis/', views.api_resultados_lis, name='api_resultados_lis'),
+    path('api/recepcion/', views.api_recepcion_muestras, name='api_recepcion_muestras'),
     path('<int:examen_id>/', views.detalle_examen, name='detalle_examen'),
     path('<int:examen_id>/editar/', views.editar_examen, name='editar_examen'),
     path('<int:examen_id>/eliminar/', views.eliminar_examen, name='eliminar_examen'),
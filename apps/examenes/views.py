@@ -1,10 +1,19 @@
 # apps/examenes/views.py
+import io
+import json
+from datetime import date
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
 from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from apps.laboratorio.models import LaboratorioRedLaboratorios
 from .models import ExamenesExamenbacteriologico
+from .estados import TransicionesExamen
+from .ingesta import IngestaResultadosLaboratorio, MAX_ERRORES_EN_MEMORIA
 from .forms import ExamenBacteriologicoForm
 
 @login_required
@@ -20,9 +29,9 @@ def lista_examenes(request):
     if query:
         examenes = examenes.filter(
             Q(paciente__nombre__icontains=query) |
-            Q(paciente__apellido__icontains=query) |
-            Q(paciente__run__icontains=query) |
-            Q(observaciones__icontains=query)
+            Q(paciente__rut__icontains=query) |
+            Q(numero_muestra_lab__icontains=query) |
+            Q(observaciones_muestra__icontains=query)
         )
     
     if tipo_examen:
@@ -128,4 +137,74 @@ def examenes_por_paciente(request, paciente_id):
         'paciente': paciente,
         'examenes': examenes,
     }
-    return render(request, 'examenes/examenes_por_paciente.html', context)
\ No newline at end of file
+    return render(request, 'examenes/examenes_por_paciente.html', context)
+
+
+@login_required
+@require_POST
+def api_resultados_lis(request):
+    """
+    Recibe un archivo de resultados del LIS (CSV o HL7 plano), como campo
+    "archivo" de un formulario multipart o como cuerpo de la solicitud.
+    Parámetros opcionales: ?laboratorio=<id> y ?simular=1. Responde con los
+    conteos y los resultados omitidos.
+    """
+    laboratorio = None
+    if request.GET.get('laboratorio'):
+        if not request.GET['laboratorio'].isdigit():
+            return JsonResponse({'error': 'El parámetro laboratorio debe ser un id numérico'}, status=400)
+        laboratorio = LaboratorioRedLaboratorios.objects.filter(pk=request.GET['laboratorio']).first()
+        if laboratorio is None:
+            return JsonResponse({'error': 'Laboratorio no existe'}, status=400)
+
+    archivo = request.FILES.get('archivo') or io.BytesIO(request.body)
+    ingesta = IngestaResultadosLaboratorio(
+        request.user, laboratorio=laboratorio, simular=request.GET.get('simular') == '1'
+    )
+    try:
+        conteos = ingesta.procesar(archivo)
+    except (UnicodeDecodeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'conteos': conteos,
+        'total_errores': ingesta.total_errores,
+        'errores': [error._asdict() for error in ingesta.errores[:MAX_ERRORES_EN_MEMORIA]],
+    })
+
+
+MAX_MUESTRAS_RECEPCION = 5000
+
+
+@login_required
+@require_POST
+def api_recepcion_muestras(request):
+    """
+    Marca muestras como recibidas en el laboratorio en un solo UPDATE:
+    {"numeros_muestra": ["M-1", ...], "fecha": "AAAA-MM-DD"} (fecha opcional, hoy por defecto).
+    Las muestras ya ingresadas, canceladas o tomadas después de la fecha no
+    se modifican; una fecha futura se rechaza.
+    """
+    try:
+        datos = json.loads(request.body)
+        numeros = datos['numeros_muestra']
+        if not isinstance(numeros, list) or not all(isinstance(n, str) for n in numeros):
+            raise ValueError
+        fecha = date.fromisoformat(datos['fecha']) if datos.get('fecha') else None
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse(
+            {'error': 'Se esperaba {"numeros_muestra": [...], "fecha": "AAAA-MM-DD"}'}, status=400
+        )
+    if len(numeros) > MAX_MUESTRAS_RECEPCION:
+        return JsonResponse({'error': f'Máximo {MAX_MUESTRAS_RECEPCION} muestras por solicitud'}, status=400)
+
+    examenes = ExamenesExamenbacteriologico.objects.filter(numero_muestra_lab__in=set(numeros))
+    existentes = set(examenes.values_list('numero_muestra_lab', flat=True))
+    try:
+        actualizados = TransicionesExamen.registrar_ingreso_laboratorio(examenes, fecha)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'actualizados': actualizados,
+        'no_encontrados': sorted(set(numeros) - existentes),
+    })
@@ -5,7 +5,8 @@ from .models import (
     IndicadoresOperacionales,
     IndicadoresPrevencion,
     Alerta,
-    ReportePersonalizado
+    ReportePersonalizado,
+    ConsolidadoIndicador,
 )
 
 @admin.register(Establecimiento)
@@ -77,4 +78,10 @@ class AlertaAdmin(admin.ModelAdmin):
 class ReportePersonalizadoAdmin(admin.ModelAdmin):
     list_display = ['nombre', 'usuario_creador', 'compartido', 'fecha_creacion']
     list_filter = ['compartido', 'fecha_creacion']
-    search_fields = ['nombre', 'descripcion']
\ No newline at end of file
+    search_fields = ['nombre', 'descripcion']
+@admin.register(ConsolidadoIndicador)
+class ConsolidadoIndicadorAdmin(admin.ModelAdmin):
+    list_display = ['familia', 'periodo', 'nivel', 'nombre', 'establecimientos', 'fecha_actualizacion']
+    list_filter = ['familia', 'nivel', 'periodo']
+    search_fields = ['nombre', 'clave']
+    readonly_fields = ['fecha_actualizacion']
@@ -0,0 +1,177 @@
+# brotes.py - Detección de aumentos de casos por comuna y semana
+import logging
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from apps.pacientes.models import PacientesPaciente
+from .eventos import canal_alertas
+from .models import Alerta, Establecimiento
+from .reglas import establecimiento_respaldo
+
+logger = logging.getLogger(__name__)
+
+REGLA = 'brote_comuna'
+
+
+def cola_poisson(observados, esperados):
+    """P(X >= observados) para X ~ Poisson(esperados)"""
+    if observados <= 0:
+        return 1.0
+    termino = math.exp(-esperados)
+    acumulada = termino
+    for k in range(1, observados):
+        termino *= esperados / k
+        acumulada += termino
+    return max(0.0, 1.0 - acumulada)
+
+
+class DetectorBrotes:
+    """
+    Agrupa los casos por (comuna, semana de diagnóstico) con una consulta y
+    compara cada semana con una línea base EWMA de las semanas anteriores de
+    la misma comuna. Una semana es señal si sus casos son improbables bajo
+    Poisson(línea base) y alcanzan un mínimo absoluto; cada señal genera una
+    alerta EPIDEMIOLOGICA, sin duplicar las ya emitidas.
+
+    Por defecto solo se evalúan las últimas `semanas` (ejecución periódica)
+    usando HISTORIA_SEMANAS de historia para la línea base; con `completo`
+    se recorre toda la historia en una pasada.
+
+    La serie de cada comuna se completa con ceros desde el inicio de la
+    ventana (o la primera semana de la historia con `completo`), no desde su
+    primer caso, y la EWMA parte del promedio de las primeras `semanas_base`
+    semanas. Así ambos modos llegan a la misma línea base en las semanas
+    evaluadas: con alfa=0.3 el valor inicial pesa 0.7**44 tras 52 semanas.
+    """
+
+    HISTORIA_SEMANAS = 52
+
+    def __init__(self, alfa=0.3, p_umbral=0.01, minimo_casos=3, semanas_base=8, piso_esperado=0.5):
+        self.alfa = alfa
+        self.p_umbral = p_umbral
+        self.minimo_casos = minimo_casos
+        self.semanas_base = semanas_base
+        self.piso_esperado = piso_esperado
+
+    @staticmethod
+    def _normalizar_comuna(comuna):
+        return ' '.join((comuna or '').split()).title()
+
+    def _casos_por_semana(self, desde):
+        """{comuna: {semana: casos}} y el establecimiento con más casos de cada (comuna, semana)"""
+        filas = PacientesPaciente.objects.filter(fecha_diagnostico__isnull=False)
+        if desde:
+            filas = filas.filter(fecha_diagnostico__gte=desde)
+        filas = filas.annotate(semana=TruncWeek('fecha_diagnostico')).values(
+            'comuna', 'semana', 'establecimiento_salud'
+        ).annotate(casos=Count('id'))
+
+        series = defaultdict(Counter)
+        establecimientos = defaultdict(Counter)
+        for fila in filas:
+            comuna = self._normalizar_comuna(fila['comuna'])
+            if not comuna:
+                continue
+            semana = fila['semana']
+            semana = semana.date() if hasattr(semana, 'date') else semana
+            series[comuna][semana] += fila['casos']
+            establecimientos[(comuna, semana)][fila['establecimiento_salud']] += fila['casos']
+        return series, establecimientos
+
+    def _senales(self, serie, inicio, evaluar_desde):
+        """
+        Recorre la serie semanal (con ceros) desde `inicio` una vez y retorna
+        (semana, casos, esperados, p) de las semanas desde `evaluar_desde`
+        """
+        ultima = max(max(serie), timezone.localdate() - timedelta(days=timezone.localdate().weekday()))
+        # Línea base inicial: promedio de las primeras semanas_base semanas, que no se evalúan
+        esperados = sum(serie.get(inicio + timedelta(weeks=i), 0) for i in range(self.semanas_base)) / self.semanas_base
+        semana = inicio + timedelta(weeks=self.semanas_base)
+        senales = []
+        while semana <= ultima:
+            casos = serie.get(semana, 0)
+            if semana >= evaluar_desde:
+                base = max(esperados, self.piso_esperado)
+                p = cola_poisson(casos, base)
+                if casos >= self.minimo_casos and p < self.p_umbral:
+                    senales.append((semana, casos, esperados, p))
+            # La semana se incorpora a la línea base después de evaluarla
+            esperados = self.alfa * casos + (1 - self.alfa) * esperados
+            semana += timedelta(days=7)
+        return senales
+
+    def detectar(self, semanas=2, completo=False):
+        """Evalúa las semanas pedidas, crea las alertas nuevas y retorna un resumen"""
+        hoy = timezone.localdate()
+        inicio_semana = hoy - timedelta(days=hoy.weekday())
+        if completo:
+            desde, evaluar_desde = None, None
+        else:
+            evaluar_desde = inicio_semana - timedelta(weeks=semanas - 1)
+            desde = evaluar_desde - timedelta(weeks=self.HISTORIA_SEMANAS)
+
+        series, casos_establecimiento = self._casos_por_semana(desde)
+        # Todas las comunas parten en la misma semana, tengan o no casos en ella
+        inicio = desde or min((min(serie) for serie in series.values()), default=None)
+        senales = []
+        for comuna, serie in series.items():
+            senales.extend((comuna, *senal) for senal in self._senales(serie, inicio, evaluar_desde or inicio))
+
+        creadas = self._crear_alertas(senales, casos_establecimiento) if senales else 0
+        return {'comunas': len(series), 'senales': len(senales), 'creadas': creadas}
+
+    def _crear_alertas(self, senales, casos_establecimiento):
+        existentes = {
+            str(clave) for clave in Alerta.objects.filter(datos_relacionados__regla=REGLA)
+            .values_list('datos_relacionados__clave', flat=True)
+        }
+        ids_establecimiento = dict(Establecimiento.objects.values_list('nombre', 'id'))
+        if not ids_establecimiento:
+            return 0
+        por_defecto = establecimiento_respaldo()
+
+        ahora = timezone.now()
+        nuevas = []
+        for comuna, semana, casos, esperados, p in senales:
+            clave = f'{comuna}|{semana.isoformat()}'
+            if clave in existentes:
+                continue
+            nombre_establecimiento = casos_establecimiento[(comuna, semana)].most_common(1)[0][0]
+            establecimiento_id = ids_establecimiento.get(nombre_establecimiento, por_defecto)
+            if establecimiento_id is None:
+                logger.warning(
+                    "Sin alerta de brote para %s (semana %s): el establecimiento '%s' no está registrado",
+                    comuna, semana, nombre_establecimiento,
+                )
+                continue
+            nuevas.append(Alerta(
+                tipo='EPIDEMIOLOGICA',
+                nivel='CRITICA' if p < self.p_umbral / 10 else 'ALTA',
+                titulo=f'Aumento de casos en {comuna} - semana del {semana:%d-%m-%Y}'[:200],
+                descripcion=(
+                    f'{casos} casos diagnosticados en {comuna} la semana del {semana:%d-%m-%Y}; '
+                    f'se esperaban {esperados:.1f} según las semanas anteriores (p = {p:.4f})'
+                ),
+                establecimiento_id=establecimiento_id,
+                fecha_vencimiento=ahora + timedelta(days=7),
+                datos_relacionados={
+                    'regla': REGLA,
+                    'clave': clave,
+                    'tipo_objeto': 'comuna',
+                    'comuna': comuna,
+                    'semana': semana.isoformat(),
+                    'casos': casos,
+                    'esperados': round(esperados, 2),
+                    'p_valor': round(p, 6),
+                },
+            ))
+
+        if nuevas:
+            Alerta.objects.bulk_create(nuevas, batch_size=500)
+            canal_alertas.publicar_creadas(REGLA, [a.datos_relacionados['clave'] for a in nuevas])
+        return len(nuevas)
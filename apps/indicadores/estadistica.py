@@ -0,0 +1,11 @@
+# estadistica.py - Cálculos estadísticos en Python puro, sin dependencias de Django
+# (los importan también los benchmarks que corren fuera del proyecto)
+import math
+
+
+def percentil(valores, p):
+    """Percentil `p` (0 a 100) por rango más cercano; 0 si no hay valores"""
+    valores = sorted(valores)
+    if not valores:
+        return 0
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
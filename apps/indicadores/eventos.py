@@ -0,0 +1,136 @@
+# eventos.py - Publicación en memoria de eventos de alertas
+import asyncio
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+
+def serializar_alerta(alerta, evento):
+    """Representación mínima de una alerta para enviarla al navegador"""
+    return {
+        'evento': evento,
+        'id': alerta.pk,
+        'tipo': alerta.tipo,
+        'tipo_display': alerta.get_tipo_display(),
+        'nivel': alerta.nivel,
+        'nivel_display': alerta.get_nivel_display(),
+        'titulo': alerta.titulo,
+        'descripcion': alerta.descripcion,
+        'establecimiento_id': alerta.establecimiento_id,
+        'usuario_asignado_id': alerta.usuario_asignado_id,
+        'fecha_creacion': alerta.fecha_creacion.isoformat() if alerta.fecha_creacion else None,
+        'fecha_vencimiento': alerta.fecha_vencimiento.isoformat() if alerta.fecha_vencimiento else None,
+    }
+
+
+def alertas_visibles(alertas, usuario_id, establecimiento_id=None, ver_todas=False):
+    """Mismo criterio que Suscripcion.acepta(), aplicado a un queryset de alertas"""
+    if establecimiento_id:
+        alertas = alertas.filter(establecimiento_id=establecimiento_id)
+    if ver_todas:
+        return alertas
+    return alertas.filter(Q(usuario_asignado__isnull=True) | Q(usuario_asignado_id=usuario_id))
+
+
+class Suscripcion:
+    """Cola de eventos de un navegador conectado, con su filtro por usuario y establecimiento"""
+    MAX_PENDIENTES = 100
+
+    def __init__(self, usuario_id, establecimiento_id=None, ver_todas=False):
+        self.usuario_id = usuario_id
+        self.establecimiento_id = establecimiento_id
+        self.ver_todas = ver_todas
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=self.MAX_PENDIENTES)
+
+    def acepta(self, evento):
+        if self.establecimiento_id and evento['establecimiento_id'] != self.establecimiento_id:
+            return False
+        if self.ver_todas:
+            return True
+        return evento['usuario_asignado_id'] in (None, self.usuario_id)
+
+    def _encolar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Un cliente lento no debe acumular memoria; recargará al reconectar
+            logger.warning("Suscripción de alertas saturada para el usuario %s", self.usuario_id)
+
+    def entregar(self, evento):
+        # publicar() puede llamarse desde el hilo de una vista síncrona
+        self.loop.call_soon_threadsafe(self._encolar, evento)
+
+
+class CanalAlertas:
+    """
+    Pub/sub en memoria del proceso para alertas nuevas y resueltas.
+
+    Solo reparte eventos entre las conexiones atendidas por el mismo proceso
+    ASGI; los cambios hechos desde otros procesos se ven al recargar.
+    """
+
+    def __init__(self):
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+
+    def suscribir(self, usuario_id, establecimiento_id=None, ver_todas=False):
+        suscripcion = Suscripcion(usuario_id, establecimiento_id, ver_todas)
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    @property
+    def total_suscripciones(self):
+        return len(self._suscripciones)
+
+    def publicar(self, evento):
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            if not suscripcion.acepta(evento):
+                continue
+            try:
+                suscripcion.entregar(evento)
+            except RuntimeError:
+                # El loop de la conexión ya se cerró
+                self.cancelar(suscripcion)
+
+    def publicar_alerta(self, alerta, evento):
+        if self._suscripciones:
+            self.publicar(serializar_alerta(alerta, evento))
+
+    def publicar_creadas(self, regla, claves):
+        """
+        Avisa las alertas de `regla` creadas con bulk_create, que no emite
+        post_save. Se releen por su clave de deduplicación al confirmarse la
+        transacción, porque no todos los motores devuelven el id en
+        bulk_create. Sin suscripciones (comandos y procesos que no son el
+        servidor ASGI) no se hace nada: esas alertas llegan al navegador por
+        NovedadesAlertasView.
+        """
+        if not self._suscripciones or not claves:
+            return
+        claves = [str(clave) for clave in claves]
+
+        def publicar():
+            from .models import Alerta
+
+            alertas = Alerta.objects.filter(
+                datos_relacionados__regla=regla, datos_relacionados__clave__in=claves
+            )
+            for alerta in alertas:
+                self.publicar_alerta(alerta, 'nueva')
+
+        transaction.on_commit(publicar)
+
+
+canal_alertas = CanalAlertas()
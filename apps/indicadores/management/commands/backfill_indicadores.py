@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.indicadores.models import Establecimiento
+from apps.indicadores.services import BackfillIndicadores
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula el historial de indicadores (cohorte por trimestre, operacionales y prevención por mes) '
+        'desde los datos de origen, con una pasada por tabla y upserts por lotes'
+    )
+
+    def add_arguments(self, parser):
+        año_actual = timezone.localdate().year
+        parser.add_argument('--desde', type=int, default=año_actual, help='Primer año (por defecto el actual)')
+        parser.add_argument('--hasta', type=int, default=año_actual, help='Último año (por defecto el actual)')
+        parser.add_argument('--establecimiento', action='append', type=int, help='Id a recalcular (repetible)')
+        parser.add_argument('--sin-consolidar', action='store_true', help='No recalcular los consolidados por región')
+
+    def handle(self, *args, **options):
+        establecimientos = None
+        if options['establecimiento']:
+            establecimientos = list(Establecimiento.objects.filter(pk__in=options['establecimiento']))
+            if len(establecimientos) != len(set(options['establecimiento'])):
+                raise CommandError('Algún establecimiento indicado no existe')
+
+        inicio = time.perf_counter()
+        try:
+            filas = BackfillIndicadores.ejecutar(
+                options['desde'],
+                options['hasta'],
+                establecimientos=establecimientos,
+                consolidar=not options['sin_consolidar'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for familia, cantidad in filas.items():
+            self.stdout.write(f'  {familia}: {cantidad} filas')
+        self.stdout.write(self.style.SUCCESS(
+            f"Historial {options['desde']}-{options['hasta']} recalculado en {time.perf_counter() - inicio:.1f} s"
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.indicadores.brotes import DetectorBrotes
+
+
+class Command(BaseCommand):
+    help = (
+        "Detecta aumentos de casos por comuna y semana frente a su línea base "
+        "y genera alertas epidemiológicas. Pensado para ejecutarse a diario o "
+        "semanalmente desde cron; las alertas ya emitidas no se duplican."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--semanas',
+            type=int,
+            default=2,
+            help='Semanas recientes a evaluar, incluida la actual (por defecto 2).',
+        )
+        parser.add_argument(
+            '--completo',
+            action='store_true',
+            help='Evalúa toda la historia de diagnósticos en una pasada.',
+        )
+        parser.add_argument('--alfa', type=float, default=0.3, help='Peso EWMA de la semana más reciente.')
+        parser.add_argument('--p', type=float, default=0.01, dest='p_umbral', help='Umbral de probabilidad Poisson.')
+        parser.add_argument('--minimo', type=int, default=3, help='Casos mínimos en la semana para alertar.')
+
+    def handle(self, *args, **options):
+        if options['semanas'] < 1:
+            raise CommandError('--semanas debe ser al menos 1')
+        if not 0 < options['alfa'] <= 1:
+            raise CommandError('--alfa debe estar entre 0 y 1')
+
+        detector = DetectorBrotes(
+            alfa=options['alfa'], p_umbral=options['p_umbral'], minimo_casos=options['minimo']
+        )
+        resumen = detector.detectar(semanas=options['semanas'], completo=options['completo'])
+        self.stdout.write(f"Comunas evaluadas: {resumen['comunas']}")
+        self.stdout.write(f"Semanas sobre la línea base: {resumen['senales']}")
+        self.stdout.write(self.style.SUCCESS(f"{resumen['creadas']} alertas epidemiológicas nuevas"))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.indicadores.reglas import REGLAS, MotorReglas
+
+
+class Command(BaseCommand):
+    help = "Evalúa en lote las reglas de alertas y muestra tiempos y consultas por regla"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--regla',
+            action='append',
+            dest='reglas',
+            help='Código de la regla a evaluar (se puede repetir). Por defecto se evalúan todas.',
+        )
+        parser.add_argument(
+            '--estricto',
+            action='store_true',
+            help='Termina con error si alguna regla excede su presupuesto de consultas de lectura.',
+        )
+
+    def handle(self, *args, **options):
+        reglas = REGLAS
+        if options['reglas']:
+            disponibles = {regla.codigo: regla for regla in REGLAS}
+            desconocidas = [codigo for codigo in options['reglas'] if codigo not in disponibles]
+            if desconocidas:
+                raise CommandError(
+                    f"Reglas desconocidas: {', '.join(desconocidas)}. "
+                    f"Disponibles: {', '.join(disponibles)}"
+                )
+            reglas = [disponibles[codigo] for codigo in options['reglas']]
+
+        metricas = MotorReglas(reglas).evaluar()
+
+        self.stdout.write(
+            f"{'Regla':<28} {'Candidatos':>10} {'Creadas':>8} {'Consultas':>10} {'Escrituras':>10} {'Segundos':>9}"
+        )
+        excedidas = []
+        for m in metricas:
+            linea = (f"{m['regla']:<28} {m['candidatos']:>10} {m['creadas']:>8} "
+                     f"{m['consultas']:>6}/{m['max_consultas']:<3} {m['escrituras']:>10} {m['segundos']:>9.4f}")
+            if m['consultas'] > m['max_consultas']:
+                excedidas.append(m['regla'])
+                self.stdout.write(self.style.WARNING(linea))
+            else:
+                self.stdout.write(linea)
+
+        total = sum(m['creadas'] for m in metricas)
+        self.stdout.write(self.style.SUCCESS(f"{total} alertas nuevas generadas"))
+        omitidas = sum(m['sin_establecimiento'] for m in metricas)
+        if omitidas:
+            self.stdout.write(self.style.WARNING(
+                f"{omitidas} alertas omitidas por no tener establecimiento coincidente "
+                f"(ALERTAS_ESTABLECIMIENTO_POR_DEFECTO)"
+            ))
+
+        if excedidas and options['estricto']:
+            raise CommandError(f"Reglas sobre presupuesto de consultas: {', '.join(excedidas)}")
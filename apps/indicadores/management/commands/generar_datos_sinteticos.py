@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.indicadores.sinteticos import GeneradorDatosSinteticos, PASSWORD_USUARIOS, PREFIJO_USUARIO
+
+
+class Command(BaseCommand):
+    help = 'Genera datos sintéticos reproducibles a escala de producción (pacientes, contactos, tratamientos, exámenes, QP)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=100000)
+        parser.add_argument('--establecimientos', type=int, default=20)
+        parser.add_argument('--semilla', type=int, default=1, help='Misma semilla sobre una base vacía, mismos datos')
+        parser.add_argument('--dias-dosis', type=int, default=14, help='Días de dosis registradas por esquema')
+        parser.add_argument('--lote', type=int, default=5000, help='Pacientes por transacción')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        def progreso(generados, total):
+            segundos = time.perf_counter() - inicio
+            self.stdout.write(f'  {generados}/{total} pacientes ({segundos:.1f} s)')
+
+        conteos = GeneradorDatosSinteticos(
+            pacientes=options['pacientes'],
+            establecimientos=options['establecimientos'],
+            semilla=options['semilla'],
+            dias_dosis=options['dias_dosis'],
+            lote=options['lote'],
+        ).generar(progreso=progreso)
+
+        self.stdout.write('')
+        for modelo, cantidad in sorted(conteos.items()):
+            self.stdout.write(f'{modelo:45} {cantidad:>10}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{sum(conteos.values())} filas en {time.perf_counter() - inicio:.1f} s. '
+            f'Usuarios {PREFIJO_USUARIO}<rol> con contraseña {PASSWORD_USUARIOS}'
+        ))
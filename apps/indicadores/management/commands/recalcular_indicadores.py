@@ -0,0 +1,66 @@
+import os
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.indicadores.recalculo import MODOS, RecalculoIndicadores, generar_particiones
+
+
+def _mes(valor):
+    try:
+        año, mes = valor.split('-')[:2]
+        return date(int(año), int(mes), 1)
+    except ValueError:
+        raise CommandError(f'Mes inválido: {valor} (use AAAA-MM)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula indicadores de cohorte, operacionales y prevención por establecimiento y trimestre '
+        'en paralelo, y consolida por región al terminar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primer mes AAAA-MM (por defecto enero del año actual)')
+        parser.add_argument('--hasta', help='Último mes AAAA-MM (por defecto el mes actual)')
+        parser.add_argument('--establecimiento', action='append', type=int, help='Id a recalcular (repetible)')
+        parser.add_argument('--trabajadores', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--modo', choices=MODOS, default='procesos')
+        parser.add_argument('--sin-consolidar', action='store_true', help='No recalcular los consolidados por región')
+
+    def handle(self, *args, **options):
+        hoy = timezone.localdate()
+        desde = _mes(options['desde']) if options['desde'] else date(hoy.year, 1, 1)
+        hasta = _mes(options['hasta']) if options['hasta'] else hoy
+        if desde > hasta:
+            raise CommandError('--desde es posterior a --hasta')
+
+        particiones = generar_particiones(desde, hasta, options['establecimiento'])
+        recalculo = RecalculoIndicadores(
+            trabajadores=options['trabajadores'],
+            modo=options['modo'],
+            consolidar=not options['sin_consolidar'],
+        )
+        if recalculo.trabajadores == 1:
+            self.stdout.write(f'{len(particiones)} particiones en serie')
+        else:
+            self.stdout.write(f"{len(particiones)} particiones con {recalculo.trabajadores} trabajadores ({options['modo']})")
+
+        inicio = time.perf_counter()
+
+        def progreso(completadas, total, resultado):
+            p = resultado['particion']
+            estado = 'ERROR ' + resultado['error'] if resultado['error'] else f"{resultado['segundos']:.2f} s"
+            self.stdout.write(f'  [{completadas}/{total}] establecimiento {p.establecimiento_id} {p.año}-{p.trimestre} {estado}')
+
+        resultados = recalculo.ejecutar(particiones, progreso=progreso)
+
+        fallidas = [r for r in resultados if r['error']]
+        total = time.perf_counter() - inicio
+        trabajo = sum(r['segundos'] for r in resultados)
+        self.stdout.write(f'{len(resultados) - len(fallidas)} particiones en {total:.1f} s ({trabajo:.1f} s de trabajo)')
+        if fallidas:
+            raise CommandError(f'{len(fallidas)} particiones fallaron; el resto quedó guardado')
+        self.stdout.write(self.style.SUCCESS('Recálculo terminado'))
@@ -0,0 +1,77 @@
+import glob
+import json
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.indicadores.estadistica import percentil
+
+
+class Command(BaseCommand):
+    help = 'Resume el log del perfilador: vistas más lentas y con más consultas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivo', help='Log a analizar (por defecto PERFILADOR_LOG y sus respaldos)')
+        parser.add_argument('--top', type=int, default=10, help='Cantidad de vistas a mostrar')
+        parser.add_argument('--orden', choices=['duracion', 'consultas'], default='duracion')
+
+    def _leer(self, ruta_base):
+        rutas = sorted(glob.glob(f'{ruta_base}*'))
+        if not rutas:
+            raise CommandError(f'No existe el log del perfilador: {ruta_base}')
+        for ruta in rutas:
+            with open(ruta, encoding='utf-8') as archivo:
+                for linea in archivo:
+                    try:
+                        yield json.loads(linea)
+                    except ValueError:
+                        continue
+
+    def handle(self, *args, **options):
+        ruta = options['archivo'] or str(getattr(settings, 'PERFILADOR_LOG', ''))
+        vistas = defaultdict(lambda: {
+            'duraciones': [], 'consultas': [], 'sql_ms': [], 'plantillas_ms': [],
+            'duplicadas': 0, 'memoria': [], 'repetidas': Counter(),
+        })
+
+        for registro in self._leer(ruta):
+            vista = vistas[registro.get('vista') or registro.get('ruta')]
+            vista['duraciones'].append(registro['duracion_ms'])
+            vista['consultas'].append(registro['consultas'])
+            vista['sql_ms'].append(registro['sql_ms'])
+            vista['plantillas_ms'].append(registro.get('plantillas_ms', 0))
+            vista['duplicadas'] = max(vista['duplicadas'], registro.get('duplicadas', 0))
+            if registro.get('memoria_pico_kb') is not None:
+                vista['memoria'].append(registro['memoria_pico_kb'])
+            for repetida in registro.get('repetidas', []):
+                vista['repetidas'][repetida['sql']] = max(vista['repetidas'][repetida['sql']], repetida['veces'])
+
+        if not vistas:
+            self.stdout.write('El log no tiene peticiones registradas.')
+            return
+
+        clave = (lambda item: percentil(item[1]['duraciones'], 95)) if options['orden'] == 'duracion' \
+            else (lambda item: max(item[1]['consultas']))
+        ranking = sorted(vistas.items(), key=clave, reverse=True)[:options['top']]
+
+        self.stdout.write(
+            f"{'Vista':40} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'SQL ms':>8} "
+            f"{'plant ms':>8} {'cons':>6} {'máx':>5} {'dup':>5} {'mem KB':>8}"
+        )
+        for nombre, datos in ranking:
+            n = len(datos['duraciones'])
+            memoria = max(datos['memoria']) if datos['memoria'] else 0
+            self.stdout.write(
+                f"{str(nombre)[:40]:40} {n:>5} "
+                f"{percentil(datos['duraciones'], 50):>8.1f} {percentil(datos['duraciones'], 95):>8.1f} "
+                f"{sum(datos['sql_ms']) / n:>8.1f} {sum(datos['plantillas_ms']) / n:>8.1f} "
+                f"{sum(datos['consultas']) / n:>6.1f} {max(datos['consultas']):>5} "
+                f"{datos['duplicadas']:>5} {memoria:>8.0f}"
+            )
+
+        self.stdout.write('\nConsultas repetidas (posibles N+1):')
+        for nombre, datos in ranking:
+            for sql, veces in datos['repetidas'].most_common(2):
+                if veces >= 5:
+                    self.stdout.write(f'  {nombre}: {veces}x {sql[:150]}')
@@ -0,0 +1,205 @@
+import gc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from apps.indicadores.models import Alerta
+from apps.indicadores.views import CLAVE_INDICADORES_CALCULADOS, CLAVE_REGLAS_EVALUADAS
+from apps.indicadores.sinteticos import GeneradorDatosSinteticos, ROLES
+from apps.pacientes.models import PacientesPaciente
+from apps.contactos.models import ContactosContacto
+from apps.tratamientos.models import Tratamiento, EsquemaMedicamento
+from apps.examenes.models import ExamenesExamenbacteriologico
+from apps.prevencion.models import PrevencionQuimioprofilaxis
+from apps.laboratorio.models import (
+    LaboratorioRedLaboratorios,
+    LaboratorioControlCalidad,
+    LaboratorioTarjetero,
+    LaboratorioIndicadores,
+)
+from apps.usuarios.models import UsuariosUsuario
+
+# Vistas que no se recorren: cierran la sesión o no terminan (streaming)
+EXCLUIDAS = {'usuarios:logout', 'indicadores:stream_alertas'}
+
+# Modelo del objeto que identifica cada parámetro de URL, por namespace
+OBJETOS_URL = {
+    'usuarios': {'pk': UsuariosUsuario},
+    'pacientes': {'pk': PacientesPaciente},
+    'contactos': {'pk': ContactosContacto, 'paciente_pk': PacientesPaciente},
+    'examenes': {'examen_id': ExamenesExamenbacteriologico, 'paciente_id': PacientesPaciente},
+    'tratamientos': {'pk': Tratamiento, 'tratamiento_pk': Tratamiento, 'esquema_pk': EsquemaMedicamento},
+    'prevencion': {'pk': PrevencionQuimioprofilaxis},
+    'indicadores': {'alerta_id': Alerta},
+}
+
+# Excepciones por prefijo de nombre de vista
+OBJETOS_POR_VISTA = {
+    'tratamientos:eliminar_esquema': {'pk': EsquemaMedicamento},
+    'laboratorio:laboratorio_': {'pk': LaboratorioRedLaboratorios},
+    'laboratorio:control_calidad_': {'pk': LaboratorioControlCalidad},
+    'laboratorio:tarjetero_': {'pk': LaboratorioTarjetero},
+    'laboratorio:indicadores_': {'pk': LaboratorioIndicadores},
+}
+
+# Máximo de consultas por vista (con datos pequeños); el resto usa el valor por defecto
+PRESUPUESTO_POR_DEFECTO = 25
+PRESUPUESTOS = {
+    'indicadores:alertas_lista': 45,
+    'indicadores:dashboard': 40,
+    'indicadores:actualizar_indicadores': 10,
+    'laboratorio:dashboard': 30,
+    'laboratorio:reportes': 30,
+}
+
+# Problemas ya conocidos: se informan sin hacer fallar la verificación.
+# Al corregir uno, eliminarlo de aquí para que quede protegido.
+PENDIENTES = {
+    'laboratorio:tarjetero_crear': 'la etiqueta de cada examen del select consulta su paciente',
+    'laboratorio:tarjetero_editar': 'la etiqueta de cada examen del select consulta su paciente',
+    'prevencion:vacunacion_lista': 'plantilla prevencion/vacunacion_lista.html inexistente',
+    'prevencion:seguimiento_crear': 'ContactosContacto no tiene atributo nombre',
+    'usuarios:eliminar': 'plantilla usuarios/confirm_delete.html inexistente',
+}
+
+
+def recorrer_urls(patrones=None, namespace=None):
+    """Retorna (nombre, patrón) de cada URL con nombre del proyecto, sin el admin"""
+    if patrones is None:
+        patrones = get_resolver().url_patterns
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            if patron.namespace == 'admin':
+                continue
+            yield from recorrer_urls(patron.url_patterns, patron.namespace or namespace)
+        elif isinstance(patron, URLPattern) and patron.name:
+            yield (f'{namespace}:{patron.name}' if namespace else patron.name), patron
+
+
+def comparar(pequeno, grande, tolerancia):
+    """
+    Compara las mediciones de _medir() de los dos conjuntos. Retorna las
+    filas del informe (rol, vista, status, consultas, consultas con datos
+    grandes, máximo, marca) y las fallas que no están en PENDIENTES.
+    """
+    filas, fallas = [], []
+    for (rol, nombre), (status, consultas) in sorted(pequeno.items()):
+        status_grande, consultas_grande = grande.get((rol, nombre), (status, consultas))
+        maximo = PRESUPUESTOS.get(nombre, PRESUPUESTO_POR_DEFECTO)
+        marcas = []
+        if status >= 500 or status_grande >= 500:
+            marcas.append('ERROR')
+        if consultas > maximo:
+            marcas.append('PRESUPUESTO')
+        if consultas_grande > consultas + tolerancia:
+            marcas.append('CRECE')
+        marca = ','.join(marcas)
+        if marcas and nombre in PENDIENTES:
+            marca += f' (conocido: {PENDIENTES[nombre]})'
+        elif marcas:
+            fallas.append(f'{rol} {nombre}: {marca} ({consultas} -> {consultas_grande}, máx {maximo}, status {status}/{status_grande})')
+        filas.append((rol, nombre, status, consultas, consultas_grande, maximo, marca))
+    return filas, fallas
+
+
+class Command(BaseCommand):
+    help = (
+        'Recorre todas las URL con nombre como cada rol sobre datos sintéticos de dos tamaños '
+        'y falla si una vista supera su presupuesto de consultas o si las consultas crecen con los datos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pacientes', type=int, default=8, help='Pacientes del conjunto pequeño')
+        parser.add_argument('--factor', type=int, default=4, help='Multiplicador del conjunto grande')
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--rol', action='append', choices=ROLES, help='Roles a recorrer (por defecto todos)')
+        parser.add_argument('--vista', action='append', help='Limitar a vistas cuyo nombre comience así')
+        parser.add_argument('--tolerancia', type=int, default=2,
+                            help='Consultas extra admitidas en el conjunto grande (ramas que dependen de los datos)')
+        parser.add_argument('--usar-base-actual', action='store_true',
+                            help='No crear base de pruebas; los datos se revierten al terminar')
+
+    def _objeto(self, nombre, parametro):
+        modelos = dict(OBJETOS_URL.get(nombre.split(':')[0], {}))
+        for prefijo, excepciones in OBJETOS_POR_VISTA.items():
+            if nombre.startswith(prefijo):
+                modelos.update(excepciones)
+        modelo = modelos.get(parametro)
+        if modelo is None:
+            return None
+        return modelo.objects.order_by('pk').values_list('pk', flat=True).first()
+
+    def _urls(self, filtros):
+        urls = []
+        for nombre, patron in recorrer_urls():
+            if nombre in EXCLUIDAS or (filtros and not any(nombre.startswith(f) for f in filtros)):
+                continue
+            parametros = list(getattr(patron.pattern, 'converters', {}))
+            if not parametros and '(?P<' in str(patron.pattern):
+                continue  # patrones regex genéricos (archivos estáticos)
+            kwargs = {p: self._objeto(nombre, p) for p in parametros}
+            if any(v is None for v in kwargs.values()):
+                self.stderr.write(f'  Sin objeto para {nombre} {list(kwargs)}; se omite')
+                continue
+            urls.append((nombre, reverse(nombre, kwargs=kwargs)))
+        return urls
+
+    def _medir(self, pacientes, establecimientos, semilla, roles, filtros):
+        """Siembra datos dentro de una transacción que se revierte y mide cada vista por rol"""
+        resultados = {}
+        with transaction.atomic():
+            GeneradorDatosSinteticos(pacientes=pacientes, establecimientos=establecimientos, semilla=semilla).generar()
+            usuarios = GeneradorDatosSinteticos().usuarios_por_rol()
+            urls = self._urls(filtros)
+            for rol in roles:
+                cliente = Client(raise_request_exception=False)
+                cliente.force_login(usuarios[rol])
+                for nombre, url in urls:
+                    cache.clear()
+                    # El motor de reglas tiene su propio presupuesto (evaluar_alertas --estricto)
+                    # y sus consultas dependen de qué reglas encuentran candidatos; el recálculo
+                    # de indicadores es periódico y se mide en benchmarks.suite
+                    cache.set(CLAVE_REGLAS_EVALUADAS, True)
+                    cache.set(CLAVE_INDICADORES_CALCULADOS, True)
+                    # queries_log tiene largo máximo; lleno, CaptureQueriesContext contaría cero
+                    connection.queries_log.clear()
+                    with CaptureQueriesContext(connection) as contexto:
+                        # Cabecera AJAX para que los endpoints JSON respondan como desde el navegador
+                        respuesta = cliente.get(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+                    resultados[(rol, nombre)] = (respuesta.status_code, len(contexto.captured_queries))
+            transaction.set_rollback(True)
+        return resultados
+
+    def handle(self, *args, **options):
+        roles = options['rol'] or ROLES
+        pacientes = options['pacientes']
+        factor = max(2, options['factor'])
+
+        setup_test_environment()
+        nombre_original = None
+        if not options['usar_base_actual']:
+            nombre_original = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            pequeno = self._medir(pacientes, 2, options['semilla'], roles, options['vista'])
+            grande = self._medir(pacientes * factor, 2 * factor, options['semilla'], roles, options['vista'])
+        finally:
+            gc.collect()  # cierra cursores de respuestas descartadas antes de borrar la base
+            if nombre_original is not None:
+                connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        filas, fallas = comparar(pequeno, grande, options['tolerancia'])
+        self.stdout.write(f"{'Rol':11} {'Vista':45} {'status':>6} {'consultas':>9} {'x' + str(factor):>6} {'máx':>5}")
+        for rol, nombre, status, consultas, consultas_grande, maximo, marca in filas:
+            self.stdout.write(
+                f'{rol:11} {nombre[:45]:45} {status:>6} {consultas:>9} {consultas_grande:>6} {maximo:>5} {marca}'
+            )
+
+        if fallas:
+            raise CommandError('Vistas fuera de presupuesto:\n' + '\n'.join(fallas))
+        self.stdout.write(self.style.SUCCESS(f'{len(pequeno)} combinaciones de rol y vista dentro de presupuesto'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indicadores', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alerta',
+            index=models.Index(fields=['resuelta', 'fecha_resolucion'], name='indicadores_resuelt_5d0877_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indicadores', '0002_alerta_indice_resolucion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsolidadoIndicador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('familia', models.CharField(choices=[('cohorte', 'Cohorte'), ('operacionales', 'Operacionales'), ('prevencion', 'Prevención')], max_length=20)),
+                ('nivel', models.CharField(choices=[('nacional', 'Nacional'), ('region', 'Región'), ('establecimiento', 'Establecimiento')], max_length=20)),
+                ('clave', models.CharField(max_length=100)),
+                ('padre', models.CharField(blank=True, max_length=100)),
+                ('nombre', models.CharField(max_length=200)),
+                ('periodo', models.DateField()),
+                ('establecimientos', models.IntegerField(default=0)),
+                ('totales', models.JSONField(default=dict)),
+                ('tasas', models.JSONField(default=dict)),
+                ('fecha_actualizacion', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Consolidado de Indicadores',
+                'verbose_name_plural': 'Consolidados de Indicadores',
+                'indexes': [models.Index(fields=['familia', 'periodo', 'nivel', 'padre'], name='indicadores_familia_2e09b0_idx')],
+                'unique_together': {('familia', 'nivel', 'clave', 'periodo')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:48
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def eliminar_duplicados(apps, schema_editor):
+    """Deja la fila más reciente de cada (establecimiento, periodo) antes de crear la restricción"""
+    IndicadoresPrevencion = apps.get_model('indicadores', 'IndicadoresPrevencion')
+    duplicados = (
+        IndicadoresPrevencion.objects.values('establecimiento', 'periodo')
+        .annotate(filas=Count('id'), ultimo=Max('id'))
+        .filter(filas__gt=1)
+    )
+    for grupo in duplicados:
+        IndicadoresPrevencion.objects.filter(
+            establecimiento=grupo['establecimiento'], periodo=grupo['periodo'], id__lt=grupo['ultimo']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indicadores', '0003_consolidadoindicador'),
+    ]
+
+    operations = [
+        migrations.RunPython(eliminar_duplicados, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='indicadoresprevencion',
+            unique_together={('establecimiento', 'periodo')},
+        ),
+    ]
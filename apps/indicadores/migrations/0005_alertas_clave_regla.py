@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# (tipo de alerta, tipo_objeto) de GeneradorAlertas.verificar_alertas_* -> regla del motor
+REGLAS_ANTERIORES = {
+    ('VENCIMIENTO', 'tratamiento'): ('vencimiento_tratamiento', 'tratamiento_id'),
+    ('SEGUIMIENTO', 'contacto'): ('contacto_pendiente', 'contacto_id'),
+}
+
+
+def asignar_regla_y_clave(apps, schema_editor):
+    """
+    Las alertas creadas antes del motor de reglas no tienen 'regla' ni
+    'clave' en datos_relacionados; sin ellas la primera evaluación las
+    duplicaría. Se derivan del id del tratamiento o contacto que guardaban.
+    """
+    Alerta = apps.get_model('indicadores', 'Alerta')
+    actualizadas = []
+    alertas = Alerta.objects.filter(tipo__in=['VENCIMIENTO', 'SEGUIMIENTO']).only('tipo', 'datos_relacionados')
+    for alerta in alertas.iterator(chunk_size=1000):
+        datos = alerta.datos_relacionados
+        if not isinstance(datos, dict) or 'regla' in datos:
+            continue
+        regla = REGLAS_ANTERIORES.get((alerta.tipo, datos.get('tipo_objeto')))
+        if regla is None or datos.get(regla[1]) is None:
+            continue
+        datos['regla'], datos['clave'] = regla[0], str(datos[regla[1]])
+        actualizadas.append(alerta)
+    Alerta.objects.bulk_update(actualizadas, ['datos_relacionados'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indicadores', '0004_indicadoresprevencion_unico'),
+    ]
+
+    operations = [
+        migrations.RunPython(asignar_regla_y_clave, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth.models import User
 from apps.pacientes.models import PacientesPaciente
 from apps.tratamientos.models import Tratamiento
@@ -6,6 +9,70 @@ from apps.contactos.models import ContactosContacto
 from apps.prevencion.models import PrevencionQuimioprofilaxis
 from datetime import datetime
 
+class TasasQuerySet(models.QuerySet):
+    """QuerySet de modelos con TASAS: las calcula en SQL para ordenar y filtrar"""
+
+    def con_tasas(self):
+        """
+        Anota cada tasa de model.TASAS como _<nombre>. Las propiedades del
+        modelo retornan el valor anotado si está presente, así las plantillas
+        y exportaciones no repiten la aritmética por fila.
+        """
+        anotaciones = {
+            f'_{nombre}': expresion_porcentaje(sumar_campos(numerador), sumar_campos(denominador))
+            for nombre, (numerador, denominador) in self.model.TASAS.items()
+        }
+        return self.annotate(**anotaciones)
+
+
+def expresion_porcentaje(numerador, denominador):
+    """round(numerador / denominador * 100, 2) en SQL, 0 si el denominador no es positivo"""
+    return Case(
+        When(GreaterThan(denominador, 0), then=Round(Cast(numerador, FloatField()) * 100 / denominador, 2)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def sumar_campos(campos):
+    expresion = F(campos[0])
+    for campo in campos[1:]:
+        expresion = expresion + F(campo)
+    return expresion
+
+
+class TasasMixin:
+    """
+    Tasas porcentuales definidas en TASAS = {nombre: (campos_numerador, campos_denominador)}.
+    Es la misma definición que usa TasasQuerySet.con_tasas() en SQL.
+    """
+    TASAS = {}
+
+    def _tasa(self, nombre):
+        anotado = self.__dict__.get(f'_{nombre}')
+        if anotado is not None:
+            return anotado
+        numerador, denominador = self.TASAS[nombre]
+        return porcentaje(
+            sum(getattr(self, campo) for campo in numerador),
+            sum(getattr(self, campo) for campo in denominador),
+        )
+
+    @classmethod
+    def tasas_desde_totales(cls, totales):
+        """Tasas a partir de un diccionario {campo: total}, p. ej. los de una región"""
+        return {
+            nombre: porcentaje(sum(totales[c] for c in numerador), sum(totales[c] for c in denominador))
+            for nombre, (numerador, denominador) in cls.TASAS.items()
+        }
+
+
+def porcentaje(numerador, denominador):
+    if denominador > 0:
+        return round((numerador / denominador) * 100, 2)
+    return 0
+
+
 class Establecimiento(models.Model):
     """Modelo de establecimiento para el módulo indicadores"""
     nombre = models.CharField(max_length=200)
@@ -20,7 +87,7 @@ class Establecimiento(models.Model):
     def __str__(self):
         return self.nombre
 
-class IndicadoresCohorte(models.Model):
+class IndicadoresCohorte(TasasMixin, models.Model):
     """Indicadores de cohorte trimestrales PROCET"""
     ESTADOS_COHORTE = [
         ('Q1', 'Primer Trimestre'),
@@ -44,6 +111,15 @@ class IndicadoresCohorte(models.Model):
     fracasos = models.IntegerField(default=0)
     trasladados = models.IntegerField(default=0)
 
+    TOTAL_CASOS = ['casos_nuevos', 'casos_retratamiento']
+    TASAS = {
+        'exito_tratamiento_porcentaje': (['curados'], TOTAL_CASOS),
+        'tasa_abandono': (['abandonos'], TOTAL_CASOS),
+        'tasa_fallecimiento': (['fallecidos'], TOTAL_CASOS),
+    }
+
+    objects = TasasQuerySet.as_manager()
+
     # Cálculos automáticos
     @property
     def total_casos(self):
@@ -51,21 +127,15 @@ class IndicadoresCohorte(models.Model):
 
     @property
     def exito_tratamiento_porcentaje(self):
-        if self.total_casos > 0:
-            return round((self.curados / self.total_casos) * 100, 2)
-        return 0
+        return self._tasa('exito_tratamiento_porcentaje')
 
     @property
     def tasa_abandono(self):
-        if self.total_casos > 0:
-            return round((self.abandonos / self.total_casos) * 100, 2)
-        return 0
+        return self._tasa('tasa_abandono')
 
     @property
     def tasa_fallecimiento(self):
-        if self.total_casos > 0:
-            return round((self.fallecidos / self.total_casos) * 100, 2)
-        return 0
+        return self._tasa('tasa_fallecimiento')
 
     class Meta:
         unique_together = ['año', 'trimestre', 'establecimiento']
@@ -75,7 +145,7 @@ class IndicadoresCohorte(models.Model):
     def __str__(self):
         return f"{self.año}-{self.trimestre} - {self.establecimiento}"
 
-class IndicadoresOperacionales(models.Model):
+class IndicadoresOperacionales(TasasMixin, models.Model):
     """Indicadores operacionales mensuales"""
     establecimiento = models.ForeignKey(Establecimiento, on_delete=models.CASCADE)
     periodo = models.DateField()  # Primer día del mes
@@ -96,23 +166,25 @@ class IndicadoresOperacionales(models.Model):
     # Tiempos
     tiempo_promedio_diagnostico = models.IntegerField(default=0)  # en horas
 
+    TASAS = {
+        'indice_pesquisa': (['baciloscopias_realizadas'], ['sintomaticos_respiratorios']),
+        'cobertura_estudio_contactos': (['contactos_estudiados'], ['contactos_identificados']),
+        'adherencia_taes': (['pacientes_adherentes'], ['pacientes_taes']),
+    }
+
+    objects = TasasQuerySet.as_manager()
+
     @property
     def indice_pesquisa(self):
-        if self.sintomaticos_respiratorios > 0:
-            return round((self.baciloscopias_realizadas / self.sintomaticos_respiratorios) * 100, 2)
-        return 0
+        return self._tasa('indice_pesquisa')
 
     @property
     def cobertura_estudio_contactos(self):
-        if self.contactos_identificados > 0:
-            return round((self.contactos_estudiados / self.contactos_identificados) * 100, 2)
-        return 0
+        return self._tasa('cobertura_estudio_contactos')
 
     @property
     def adherencia_taes(self):
-        if self.pacientes_taes > 0:
-            return round((self.pacientes_adherentes / self.pacientes_taes) * 100, 2)
-        return 0
+        return self._tasa('adherencia_taes')
 
     class Meta:
         unique_together = ['establecimiento', 'periodo']
@@ -122,7 +194,7 @@ class IndicadoresOperacionales(models.Model):
     def __str__(self):
         return f"Operacionales {self.periodo} - {self.establecimiento}"
 
-class IndicadoresPrevencion(models.Model):
+class IndicadoresPrevencion(TasasMixin, models.Model):
     """Indicadores de actividades preventivas"""
     establecimiento = models.ForeignKey(Establecimiento, on_delete=models.CASCADE)
     periodo = models.DateField()
@@ -139,31 +211,75 @@ class IndicadoresPrevencion(models.Model):
     # Tiempos
     tiempo_promedio_inicio_qp = models.IntegerField(default=0)  # en días
 
+    TASAS = {
+        'cobertura_quimioprofilaxis': (['contactos_iniciados_qp'], ['contactos_elegibles_qp']),
+        'adherencia_quimioprofilaxis': (['contactos_completados_qp'], ['contactos_iniciados_qp']),
+        'cobertura_vacunacion_bcg': (['recien_nacidos_vacunados'], ['recien_nacidos']),
+    }
+
+    objects = TasasQuerySet.as_manager()
+
     @property
     def cobertura_quimioprofilaxis(self):
-        if self.contactos_elegibles_qp > 0:
-            return round((self.contactos_iniciados_qp / self.contactos_elegibles_qp) * 100, 2)
-        return 0
+        return self._tasa('cobertura_quimioprofilaxis')
 
     @property
     def adherencia_quimioprofilaxis(self):
-        if self.contactos_iniciados_qp > 0:
-            return round((self.contactos_completados_qp / self.contactos_iniciados_qp) * 100, 2)
-        return 0
+        return self._tasa('adherencia_quimioprofilaxis')
 
     @property
     def cobertura_vacunacion_bcg(self):
-        if self.recien_nacidos > 0:
-            return round((self.recien_nacidos_vacunados / self.recien_nacidos) * 100, 2)
-        return 0
+        return self._tasa('cobertura_vacunacion_bcg')
 
     class Meta:
+        unique_together = ['establecimiento', 'periodo']
         verbose_name = "Indicador de Prevención"
         verbose_name_plural = "Indicadores de Prevención"
 
     def __str__(self):
         return f"Prevención {self.periodo} - {self.establecimiento}"
 
+class ConsolidadoIndicador(models.Model):
+    """
+    Totales de indicadores consolidados por establecimiento, región y nivel
+    nacional. Se recalculan en cada actualización de indicadores
+    (ConsolidadorIndicadores) y sirven el drill-down sin recorrer los
+    establecimientos.
+    """
+    FAMILIAS = [
+        ('cohorte', 'Cohorte'),
+        ('operacionales', 'Operacionales'),
+        ('prevencion', 'Prevención'),
+    ]
+    NIVELES = [
+        ('nacional', 'Nacional'),
+        ('region', 'Región'),
+        ('establecimiento', 'Establecimiento'),
+    ]
+
+    familia = models.CharField(max_length=20, choices=FAMILIAS)
+    nivel = models.CharField(max_length=20, choices=NIVELES)
+    clave = models.CharField(max_length=100)  # id del establecimiento, nombre de la región o 'nacional'
+    padre = models.CharField(max_length=100, blank=True)  # clave del nivel superior
+    nombre = models.CharField(max_length=200)
+    periodo = models.DateField()  # primer día del mes o del trimestre (cohorte)
+
+    establecimientos = models.IntegerField(default=0)
+    totales = models.JSONField(default=dict)
+    tasas = models.JSONField(default=dict)
+    fecha_actualizacion = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['familia', 'nivel', 'clave', 'periodo']
+        indexes = [
+            models.Index(fields=['familia', 'periodo', 'nivel', 'padre']),
+        ]
+        verbose_name = "Consolidado de Indicadores"
+        verbose_name_plural = "Consolidados de Indicadores"
+
+    def __str__(self):
+        return f"{self.get_familia_display()} {self.periodo:%Y-%m} - {self.nombre}"
+
 class Alerta(models.Model):
     """Sistema de alertas y notificaciones"""
 
@@ -198,6 +314,9 @@ class Alerta(models.Model):
 
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['resuelta', 'fecha_resolucion']),
+        ]
         verbose_name = "Alerta"
         verbose_name_plural = "Alertas"
 
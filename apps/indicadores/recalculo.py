@@ -0,0 +1,141 @@
+# recalculo.py - Recálculo de indicadores particionado por establecimiento y trimestre
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import date
+
+from django.db import connection, connections, transaction
+
+MODOS = ('hilos', 'procesos')
+
+# Unidad de trabajo: la cohorte de un trimestre y los indicadores mensuales
+# de los meses pedidos de ese trimestre, para un establecimiento
+Particion = namedtuple('Particion', ['establecimiento_id', 'año', 'trimestre', 'meses'])
+
+
+def inicio_trimestre(particion):
+    return date(particion.año, (int(particion.trimestre[1]) - 1) * 3 + 1, 1)
+
+
+def generar_particiones(desde, hasta, establecimiento_ids=None):
+    """Particiones de cada establecimiento (todos por defecto) para los meses entre desde y hasta"""
+    from .models import Establecimiento
+
+    if establecimiento_ids is None:
+        establecimiento_ids = list(Establecimiento.objects.order_by('pk').values_list('pk', flat=True))
+
+    trimestres = {}
+    año, mes = desde.year, desde.month
+    while (año, mes) <= (hasta.year, hasta.month):
+        trimestres.setdefault((año, (mes - 1) // 3 + 1), []).append(mes)
+        año, mes = (año + 1, 1) if mes == 12 else (año, mes + 1)
+
+    # Los trimestres recientes primero: son los que se consultan
+    return [
+        Particion(establecimiento_id, año, f'Q{trimestre}', tuple(meses))
+        for (año, trimestre), meses in sorted(trimestres.items(), reverse=True)
+        for establecimiento_id in establecimiento_ids
+    ]
+
+
+def calcular_particion(particion):
+    """
+    Calcula una partición en su propia transacción. Nunca lanza excepciones:
+    el error se retorna para que una partición fallida no detenga al resto.
+    """
+    from .models import Establecimiento
+    from .services import CalculadorIndicadores
+
+    inicio = time.perf_counter()
+    try:
+        establecimiento = Establecimiento.objects.get(pk=particion.establecimiento_id)
+        with transaction.atomic():
+            CalculadorIndicadores.calcular_indicadores_cohorte(particion.año, particion.trimestre, establecimiento)
+            for mes in particion.meses:
+                CalculadorIndicadores.calcular_indicadores_operacionales(mes, particion.año, establecimiento)
+                CalculadorIndicadores.calcular_indicadores_prevencion(mes, particion.año, establecimiento)
+        error = None
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return {'particion': particion, 'error': error, 'segundos': time.perf_counter() - inicio}
+
+
+def _calcular_en_hilo(particion):
+    try:
+        return calcular_particion(particion)
+    finally:
+        # Las conexiones de Django son por hilo: se cierran las de este trabajador
+        connections.close_all()
+
+
+def _inicializar_proceso():
+    """Prepara Django en cada proceso trabajador (necesario con 'spawn' o 'forkserver')"""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistemaTBC_demo.settings')
+        django.setup()
+
+
+class RecalculoIndicadores:
+    """
+    Ejecuta particiones de recálculo en serie o en un pool de hilos o de
+    procesos; cada trabajador usa su propia conexión a la base de datos.
+    Al final consolida por región y nivel nacional una sola vez.
+
+    Con trabajadores=1 se calcula en el hilo que llama (sin pool), como lo
+    usa calcular_todos_indicadores() desde las vistas. El modo 'procesos'
+    cierra las conexiones del proceso actual antes de crear el pool: no
+    usarlo dentro de una transacción abierta. SQLite admite un solo escritor
+    a la vez, así que con ese motor siempre se calcula en serie.
+    """
+
+    def __init__(self, trabajadores=1, modo='hilos', consolidar=True):
+        if modo not in MODOS:
+            raise ValueError(f'Modo desconocido: {modo}')
+        self.trabajadores = 1 if connection.vendor == 'sqlite' else max(1, trabajadores)
+        self.modo = modo
+        self.consolidar = consolidar
+
+    def _pool(self):
+        if self.modo == 'procesos':
+            # Los procesos hijos no deben heredar sockets abiertos del padre
+            connections.close_all()
+            return ProcessPoolExecutor(max_workers=self.trabajadores, initializer=_inicializar_proceso), calcular_particion
+        return ThreadPoolExecutor(max_workers=self.trabajadores), _calcular_en_hilo
+
+    def ejecutar(self, particiones, progreso=None):
+        """
+        Calcula las particiones y retorna un resultado por cada una
+        ({'particion', 'error', 'segundos'}). `progreso(completadas, total,
+        resultado)` se llama al terminar cada partición.
+        """
+        from .services import ConsolidadorIndicadores
+
+        resultados = []
+
+        def registrar(resultado):
+            resultados.append(resultado)
+            if progreso:
+                progreso(len(resultados), len(particiones), resultado)
+
+        if self.trabajadores == 1 or len(particiones) <= 1:
+            for particion in particiones:
+                registrar(calcular_particion(particion))
+        else:
+            pool, tarea = self._pool()
+            with pool:
+                futuros = {pool.submit(tarea, particion): particion for particion in particiones}
+                for futuro in as_completed(futuros):
+                    try:
+                        resultado = futuro.result()
+                    except Exception as e:
+                        # El trabajador murió (p. ej. proceso terminado): se informa como falla
+                        resultado = {'particion': futuros[futuro], 'error': f'{type(e).__name__}: {e}', 'segundos': 0}
+                    registrar(resultado)
+
+        if self.consolidar and any(r['error'] is None for r in resultados):
+            ConsolidadorIndicadores.consolidar(desde=min(inicio_trimestre(p) for p in particiones))
+        return resultados
@@ -0,0 +1,424 @@
+# reglas.py - Motor declarativo de reglas de alertas
+import abc
+import logging
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Exists, Max, OuterRef, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.contactos.models import ContactosContacto
+from apps.examenes.models import ExamenesExamenbacteriologico
+from apps.laboratorio.models import LaboratorioTarjetero
+from apps.prevencion.models import PrevencionQuimioprofilaxis, PrevencionSeguimiento
+from apps.tratamientos.models import Tratamiento
+from .eventos import canal_alertas
+from .models import Alerta, Establecimiento
+
+logger = logging.getLogger(__name__)
+
+
+def establecimiento_respaldo():
+    """
+    Id del establecimiento configurado en ALERTAS_ESTABLECIMIENTO_POR_DEFECTO
+    (por código) para las alertas sin establecimiento coincidente, o None.
+    """
+    codigo = getattr(settings, 'ALERTAS_ESTABLECIMIENTO_POR_DEFECTO', '')
+    if not codigo:
+        return None
+    pk = Establecimiento.objects.filter(codigo=codigo).values_list('pk', flat=True).first()
+    if pk is None:
+        logger.warning("ALERTAS_ESTABLECIMIENTO_POR_DEFECTO=%s no corresponde a ningún establecimiento", codigo)
+    return pk
+
+
+class ReglaAlerta(abc.ABC):
+    """
+    Regla declarativa de alerta.
+
+    Cada regla describe un queryset de candidatos que se resuelve en una sola
+    consulta (``values()``) y una plantilla para la alerta. El motor se encarga
+    de evitar duplicados y de insertar las alertas nuevas en bloque.
+    """
+    codigo = None
+    tipo = 'SEGUIMIENTO'
+    nivel = 'MEDIA'
+    titulo = ''
+    descripcion = ''
+    tipo_objeto = ''
+    campos = ()
+    campo_establecimiento = None
+    campo_usuario = None
+    dias_vencimiento = 3
+    max_consultas = 3
+
+    @abc.abstractmethod
+    def candidatos(self, hoy):
+        """Queryset de los objetos que deben tener una alerta abierta a la fecha `hoy`"""
+
+    def clave(self, fila):
+        """Identifica el objeto que originó la alerta, para no duplicarla"""
+        return str(fila['id'])
+
+    def fecha_vencimiento(self, fila, ahora):
+        return ahora + timedelta(days=self.dias_vencimiento)
+
+    def datos_relacionados(self, fila):
+        return {}
+
+    def construir_alerta(self, fila, establecimiento_id, ahora):
+        datos = {
+            'regla': self.codigo,
+            'clave': self.clave(fila),
+            'tipo_objeto': self.tipo_objeto,
+            f'{self.tipo_objeto}_id': fila['id'],
+        }
+        datos.update(self.datos_relacionados(fila))
+        return Alerta(
+            tipo=self.tipo,
+            nivel=self.nivel,
+            titulo=self.titulo.format(**fila)[:200],
+            descripcion=self.descripcion.format(**fila),
+            establecimiento_id=establecimiento_id,
+            usuario_asignado_id=fila.get(self.campo_usuario) if self.campo_usuario else None,
+            fecha_vencimiento=self.fecha_vencimiento(fila, ahora),
+            datos_relacionados=datos,
+        )
+
+
+class ReglaVencimientoTratamiento(ReglaAlerta):
+    codigo = 'vencimiento_tratamiento'
+    tipo = 'VENCIMIENTO'
+    nivel = 'MEDIA'
+    titulo = "Vencimiento próximo de tratamiento - {paciente__nombre}"
+    descripcion = "El tratamiento de {paciente__nombre} vence el {fecha_termino_estimada}"
+    tipo_objeto = 'tratamiento'
+    campos = ('paciente_id', 'paciente__nombre', 'paciente__establecimiento_salud',
+              'fecha_termino_estimada', 'usuario_registro_id')
+    campo_establecimiento = 'paciente__establecimiento_salud'
+    campo_usuario = 'usuario_registro_id'
+
+    def candidatos(self, hoy):
+        return Tratamiento.objects.filter(
+            Q(resultado_final__isnull=True) | Q(resultado_final='En Tratamiento'),
+            fecha_termino_estimada__lte=hoy + timedelta(days=7),
+            fecha_termino_estimada__gt=hoy,
+        )
+
+    def fecha_vencimiento(self, fila, ahora):
+        return timezone.make_aware(datetime.combine(fila['fecha_termino_estimada'], datetime.min.time()))
+
+    def datos_relacionados(self, fila):
+        return {'paciente_id': fila['paciente_id']}
+
+
+class ReglaContactoPendiente(ReglaAlerta):
+    codigo = 'contacto_pendiente'
+    tipo = 'SEGUIMIENTO'
+    nivel = 'BAJA'
+    titulo = "Estudio de contacto pendiente - {nombre_contacto}"
+    descripcion = "El estudio de contacto de {nombre_contacto} está pendiente por más de 7 días"
+    tipo_objeto = 'contacto'
+    campos = ('nombre_contacto', 'paciente_indice_id', 'paciente_indice__establecimiento_salud')
+    campo_establecimiento = 'paciente_indice__establecimiento_salud'
+
+    def candidatos(self, hoy):
+        return ContactosContacto.objects.filter(
+            estado_estudio='pendiente',
+            fecha_registro__lte=hoy - timedelta(days=7),
+        )
+
+    def datos_relacionados(self, fila):
+        return {'paciente_id': fila['paciente_indice_id']}
+
+
+class ReglaExamenPositivoSinTarjetero(ReglaAlerta):
+    codigo = 'positivo_sin_tarjetero'
+    tipo = 'RESULTADO'
+    nivel = 'ALTA'
+    titulo = "Resultado positivo sin notificar en tarjetero - {paciente__nombre}"
+    descripcion = ("El examen {tipo_examen} de {paciente__nombre} resultó positivo "
+                   "({fecha_resultado}) y no está registrado en el tarjetero de positivos")
+    tipo_objeto = 'examen'
+    campos = ('paciente_id', 'paciente__nombre', 'paciente__establecimiento_salud',
+              'tipo_examen', 'fecha_resultado', 'usuario_registro_id')
+    campo_establecimiento = 'paciente__establecimiento_salud'
+    campo_usuario = 'usuario_registro_id'
+    dias_vencimiento = 2
+
+    def candidatos(self, hoy):
+        return ExamenesExamenbacteriologico.objects.filter(resultado='POSITIVO').filter(
+            ~Exists(LaboratorioTarjetero.objects.filter(examen=OuterRef('pk')))
+        )
+
+    def datos_relacionados(self, fila):
+        return {'paciente_id': fila['paciente_id']}
+
+
+class ReglaResistenciaMDR(ReglaAlerta):
+    codigo = 'resistencia_mdr'
+    tipo = 'RESULTADO'
+    nivel = 'ALTA'
+    titulo = "Resistencia MDR detectada - {paciente__nombre}"
+    descripcion = ("El examen {tipo_examen} de {paciente__nombre} muestra resistencia "
+                   "a Isoniazida y Rifampicina (MDR)")
+    tipo_objeto = 'examen'
+    campos = ('paciente_id', 'paciente__nombre', 'paciente__establecimiento_salud',
+              'tipo_examen', 'usuario_registro_id')
+    campo_establecimiento = 'paciente__establecimiento_salud'
+    campo_usuario = 'usuario_registro_id'
+    dias_vencimiento = 2
+
+    # Equivalente en SQL de ExamenesExamenbacteriologico.es_mdr / es_xdr
+    filtro_mdr = Q(resistencia_isoniazida=True, resistencia_rifampicina=True)
+    filtro_xdr = filtro_mdr & Q(resistencia_fluoroquinolonas=True, resistencia_estreptomicina=True)
+
+    def candidatos(self, hoy):
+        return ExamenesExamenbacteriologico.objects.filter(self.filtro_mdr).exclude(self.filtro_xdr)
+
+    def datos_relacionados(self, fila):
+        return {'paciente_id': fila['paciente_id']}
+
+
+class ReglaResistenciaXDR(ReglaResistenciaMDR):
+    codigo = 'resistencia_xdr'
+    nivel = 'CRITICA'
+    titulo = "Resistencia XDR detectada - {paciente__nombre}"
+    descripcion = ("El examen {tipo_examen} de {paciente__nombre} muestra resistencia extensa "
+                   "(MDR con resistencia a fluoroquinolonas y estreptomicina)")
+    dias_vencimiento = 1
+
+    def candidatos(self, hoy):
+        return ExamenesExamenbacteriologico.objects.filter(self.filtro_xdr)
+
+
+class ReglaDosisOmitidas(ReglaAlerta):
+    codigo = 'dosis_omitidas'
+    tipo = 'SEGUIMIENTO'
+    nivel = 'ALTA'
+    titulo = "Dosis omitidas en tratamiento - {paciente__nombre}"
+    descripcion = ("{paciente__nombre} registra {dias_omitidos} días con dosis no administradas "
+                   "en los últimos {ventana} días (última: {ultima_omision})")
+    tipo_objeto = 'tratamiento'
+    campos = ('paciente_id', 'paciente__nombre', 'paciente__establecimiento_salud',
+              'usuario_registro_id', 'dias_omitidos', 'ultima_omision')
+    campo_establecimiento = 'paciente__establecimiento_salud'
+    campo_usuario = 'usuario_registro_id'
+    dias_vencimiento = 1
+
+    ventana_dias = 7
+    umbral_dias = 3
+
+    def candidatos(self, hoy):
+        omitidas = Q(
+            esquemas_medicamento__dosis_administradas__administrada=False,
+            esquemas_medicamento__dosis_administradas__fecha_dosis__gte=hoy - timedelta(days=self.ventana_dias),
+            esquemas_medicamento__dosis_administradas__fecha_dosis__lt=hoy,
+        )
+        return Tratamiento.objects.filter(
+            Q(resultado_final__isnull=True) | Q(resultado_final='En Tratamiento')
+        ).annotate(
+            dias_omitidos=Count(
+                'esquemas_medicamento__dosis_administradas__fecha_dosis',
+                filter=omitidas,
+                distinct=True,
+            ),
+            ultima_omision=Max('esquemas_medicamento__dosis_administradas__fecha_dosis', filter=omitidas),
+        ).filter(dias_omitidos__gte=self.umbral_dias)
+
+    def clave(self, fila):
+        # Una nueva racha de omisiones genera una alerta nueva
+        return f"{fila['id']}:{fila['ultima_omision']}"
+
+    def construir_alerta(self, fila, establecimiento_id, ahora):
+        fila = dict(fila, ventana=self.ventana_dias)
+        return super().construir_alerta(fila, establecimiento_id, ahora)
+
+    def datos_relacionados(self, fila):
+        return {'paciente_id': fila['paciente_id'], 'dias_omitidos': fila['dias_omitidos']}
+
+
+class ReglaControlQuimioprofilaxisVencido(ReglaAlerta):
+    codigo = 'control_qp_vencido'
+    tipo = 'SEGUIMIENTO'
+    nivel = 'MEDIA'
+    titulo = "Control de quimioprofilaxis vencido - {nombre}"
+    descripcion = "El control de quimioprofilaxis de {nombre} estaba programado para el {proximo_control}"
+    tipo_objeto = 'seguimiento'
+    campos = ('quimioprofilaxis_id', 'nombre', 'establecimiento_salud', 'proximo_control', 'usuario_registro_id')
+    campo_establecimiento = 'establecimiento_salud'
+    campo_usuario = 'usuario_registro_id'
+
+    def candidatos(self, hoy):
+        controles_posteriores = PrevencionSeguimiento.objects.filter(
+            quimioprofilaxis=OuterRef('quimioprofilaxis'),
+            fecha_seguimiento__gte=OuterRef('proximo_control'),
+        )
+        return PrevencionSeguimiento.objects.filter(
+            quimioprofilaxis__isnull=False,
+            quimioprofilaxis__estado__in=['pendiente', 'en_curso'],
+            proximo_control__lt=hoy,
+        ).filter(~Exists(controles_posteriores)).annotate(
+            nombre=Coalesce('quimioprofilaxis__paciente__nombre', 'quimioprofilaxis__contacto__nombre_contacto'),
+            establecimiento_salud=Coalesce(
+                'quimioprofilaxis__paciente__establecimiento_salud',
+                'quimioprofilaxis__contacto__paciente_indice__establecimiento_salud',
+            ),
+        )
+
+    def datos_relacionados(self, fila):
+        return {'quimioprofilaxis_id': fila['quimioprofilaxis_id']}
+
+
+class ReglaQuimioprofilaxisSinSeguimiento(ReglaAlerta):
+    codigo = 'qp_sin_seguimiento'
+    tipo = 'SEGUIMIENTO'
+    nivel = 'MEDIA'
+    titulo = "Quimioprofilaxis sin seguimiento - {nombre}"
+    descripcion = ("La quimioprofilaxis de {nombre} inició el {fecha_inicio} "
+                   "y no tiene seguimientos registrados")
+    tipo_objeto = 'quimioprofilaxis'
+    campos = ('nombre', 'establecimiento_salud', 'fecha_inicio', 'usuario_registro_id')
+    campo_establecimiento = 'establecimiento_salud'
+    campo_usuario = 'usuario_registro_id'
+
+    dias_sin_seguimiento = 30
+
+    def candidatos(self, hoy):
+        return PrevencionQuimioprofilaxis.objects.filter(
+            estado__in=['pendiente', 'en_curso'],
+            fecha_inicio__lte=hoy - timedelta(days=self.dias_sin_seguimiento),
+        ).filter(
+            ~Exists(PrevencionSeguimiento.objects.filter(quimioprofilaxis=OuterRef('pk')))
+        ).annotate(
+            nombre=Coalesce('paciente__nombre', 'contacto__nombre_contacto'),
+            establecimiento_salud=Coalesce(
+                'paciente__establecimiento_salud',
+                'contacto__paciente_indice__establecimiento_salud',
+            ),
+        )
+
+
+REGLAS = [
+    ReglaVencimientoTratamiento(),
+    ReglaContactoPendiente(),
+    ReglaExamenPositivoSinTarjetero(),
+    ReglaResistenciaMDR(),
+    ReglaResistenciaXDR(),
+    ReglaDosisOmitidas(),
+    ReglaControlQuimioprofilaxisVencido(),
+    ReglaQuimioprofilaxisSinSeguimiento(),
+]
+
+
+class _ContadorConsultas:
+    """execute_wrapper que cuenta las consultas emitidas por una regla"""
+    CONTROL_TRANSACCION = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.lstrip().upper().startswith(self.CONTROL_TRANSACCION):
+            self.total += 1
+        return execute(sql, params, many, context)
+
+
+class MotorReglas:
+    """
+    Evalúa un conjunto de reglas en lote.
+
+    Por cada regla se ejecuta: una consulta de candidatos, una de claves ya
+    alertadas y un ``bulk_create`` con las alertas nuevas. Se registran el
+    tiempo y el número de consultas de cada regla: el presupuesto
+    (max_consultas) se aplica a las lecturas, que son las que dependen de la
+    regla; los lotes del ``bulk_create`` crecen con las alertas nuevas y se
+    informan aparte como escrituras.
+    """
+
+    def __init__(self, reglas=None):
+        self.reglas = reglas if reglas is not None else REGLAS
+
+    def _mapa_establecimientos(self):
+        return dict(Establecimiento.objects.values_list('nombre', 'id')), establecimiento_respaldo()
+
+    def evaluar(self):
+        ahora = timezone.now()
+        hoy = ahora.date()
+        establecimientos, por_defecto = self._mapa_establecimientos()
+        if not establecimientos:
+            logger.warning("No hay establecimientos registrados; no se generan alertas")
+            return []
+
+        metricas = []
+        for regla in self.reglas:
+            lecturas, escrituras = _ContadorConsultas(), _ContadorConsultas()
+            inicio = time.perf_counter()
+            with connection.execute_wrapper(lecturas):
+                nuevas, candidatos, sin_establecimiento = self._evaluar_regla(
+                    regla, hoy, ahora, establecimientos, por_defecto
+                )
+            with connection.execute_wrapper(escrituras):
+                self._guardar(regla, nuevas)
+            resultado = {
+                'regla': regla.codigo,
+                'candidatos': candidatos,
+                'creadas': len(nuevas),
+                'sin_establecimiento': sin_establecimiento,
+                'consultas': lecturas.total,
+                'escrituras': escrituras.total,
+                'max_consultas': regla.max_consultas,
+                'segundos': round(time.perf_counter() - inicio, 4),
+            }
+            if lecturas.total > regla.max_consultas:
+                logger.warning(
+                    "La regla %s excedió su presupuesto de consultas (%s > %s)",
+                    regla.codigo, lecturas.total, regla.max_consultas,
+                )
+            if sin_establecimiento:
+                logger.warning(
+                    "La regla %s omitió %s alertas sin establecimiento coincidente "
+                    "(configure ALERTAS_ESTABLECIMIENTO_POR_DEFECTO para asignarlas)",
+                    regla.codigo, sin_establecimiento,
+                )
+            metricas.append(resultado)
+        return metricas
+
+    def _evaluar_regla(self, regla, hoy, ahora, establecimientos, por_defecto):
+        """
+        Alertas nuevas de la regla (sin guardar), cantidad de candidatos y
+        cantidad de candidatos omitidos por no tener establecimiento: sin
+        coincidencia por nombre se usa el establecimiento configurado o se
+        omite la fila, que vuelve a evaluarse en la siguiente ejecución.
+        """
+        filas = list(regla.candidatos(hoy).values('id', *regla.campos))
+        if not filas:
+            return [], 0, 0
+
+        # Algunos motores decodifican la clave JSON como número; se normaliza a texto
+        existentes = {
+            str(clave) for clave in Alerta.objects.filter(datos_relacionados__regla=regla.codigo)
+            .values_list('datos_relacionados__clave', flat=True)
+        }
+
+        nuevas = []
+        sin_establecimiento = 0
+        for fila in filas:
+            if regla.clave(fila) in existentes:
+                continue
+            nombre_establecimiento = fila.get(regla.campo_establecimiento) if regla.campo_establecimiento else None
+            establecimiento_id = establecimientos.get(nombre_establecimiento, por_defecto)
+            if establecimiento_id is None:
+                sin_establecimiento += 1
+                continue
+            nuevas.append(regla.construir_alerta(fila, establecimiento_id, ahora))
+        return nuevas, len(filas), sin_establecimiento
+
+    def _guardar(self, regla, nuevas):
+        if not nuevas:
+            return
+        Alerta.objects.bulk_create(nuevas, batch_size=500)
+        canal_alertas.publicar_creadas(regla.codigo, [a.datos_relacionados['clave'] for a in nuevas])
@@ -1,16 +1,33 @@
 # services.py - Servicios para cálculo de indicadores
-from django.db.models import Count, Q, Avg
-from datetime import datetime, timedelta
+from collections import Counter, defaultdict
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q, Avg, F, Case, When, Value, Window, DurationField, ExpressionWrapper, FloatField, IntegerField
+from django.db.models.functions import Cast, Ceil, RowNumber, TruncMonth, TruncQuarter, TruncYear
+from django.db.models import Sum
+from django.utils import timezone
+from datetime import date, datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from apps.pacientes.models import PacientesPaciente
 from apps.tratamientos.models import Tratamiento
 from apps.contactos.models import ContactosContacto
 from apps.prevencion.models import PrevencionQuimioprofilaxis
-from .models import IndicadoresCohorte, IndicadoresOperacionales, IndicadoresPrevencion, Alerta, Establecimiento
+from .models import (
+    IndicadoresCohorte, IndicadoresOperacionales, IndicadoresPrevencion, Alerta, Establecimiento,
+    ConsolidadoIndicador, expresion_porcentaje, sumar_campos,
+)
+from .tiempos_respuesta import AnaliticaTiemposRespuesta
 
 class CalculadorIndicadores:
     """Servicio para cálculo automático de indicadores PROCET con datos reales"""
 
+    # Proporciones simuladas mientras no existan los datos de origen
+    PROPORCION_BACILOSCOPIAS = 0.8  # 80% de los sintomáticos
+    POSITIVIDAD = 0.1  # 10% de positividad
+    ADHERENCIA_TAES = 0.85  # 85% de adherencia
+    RECIEN_NACIDOS = 50  # Número simulado
+    COBERTURA_BCG = 0.95  # 95% de cobertura
+
     @staticmethod
     def calcular_indicadores_cohorte(año, trimestre, establecimiento):
         """Calcula indicadores de cohorte para un trimestre específico con datos reales"""
@@ -23,8 +40,10 @@ class CalculadorIndicadores:
         }[trimestre]
         trimestre_fin = trimestre_inicio + relativedelta(months=3)
 
-        # Filtrar pacientes del trimestre con datos reales
+        # Filtrar pacientes del trimestre del establecimiento (PacientesPaciente
+        # guarda el establecimiento como texto: se compara con su nombre)
         pacientes_trimestre = PacientesPaciente.objects.filter(
+            establecimiento_salud=establecimiento.nombre,
             fecha_diagnostico__gte=trimestre_inicio,
             fecha_diagnostico__lt=trimestre_fin
         )
@@ -33,8 +52,6 @@ class CalculadorIndicadores:
             Q(estado='activo') | Q(estado='egresado')
         ).count()
         
-        casos_retratamiento = 0  # Se calcula basado en tratamientos previos
-
         # Calcular resultados de tratamiento con datos reales
         curados = pacientes_trimestre.filter(estado='egresado').count()
         abandonos = pacientes_trimestre.filter(estado='abandono').count()
@@ -42,11 +59,10 @@ class CalculadorIndicadores:
         fracasos = 0  # Se calcularía basado en tratamientos fallidos
         trasladados = 0  # Se calcularía basado en transferencias
 
-        # Calcular retratamientos (pacientes con más de un tratamiento)
-        for paciente in pacientes_trimestre:
-            tratamientos_count = Tratamiento.objects.filter(paciente=paciente).count()
-            if tratamientos_count > 1:
-                casos_retratamiento += 1
+        # Calcular retratamientos (pacientes con más de un tratamiento) en una sola consulta
+        casos_retratamiento = pacientes_trimestre.annotate(
+            num_tratamientos=Count('tratamientos')
+        ).filter(num_tratamientos__gt=1).count()
 
         # Crear o actualizar indicador
         indicador, created = IndicadoresCohorte.objects.update_or_create(
@@ -73,21 +89,24 @@ class CalculadorIndicadores:
 
         # Cálculo de pesquisa con datos reales
         sintomaticos = PacientesPaciente.objects.filter(
+            establecimiento_salud=establecimiento.nombre,
             fecha_diagnostico__year=año,
             fecha_diagnostico__month=mes
         ).count()
 
         # Cálculo de baciloscopias (simulado - en un sistema real vendría del módulo de exámenes)
-        baciloscopias_realizadas = sintomaticos * 0.8  # 80% de los sintomáticos
-        casos_tb_encontrados = sintomaticos * 0.1  # 10% de positividad
+        baciloscopias_realizadas = sintomaticos * CalculadorIndicadores.PROPORCION_BACILOSCOPIAS
+        casos_tb_encontrados = sintomaticos * CalculadorIndicadores.POSITIVIDAD
 
         # Cálculo de contactos con datos reales
         contactos_identificados = ContactosContacto.objects.filter(
+            paciente_indice__establecimiento_salud=establecimiento.nombre,
             fecha_registro__year=año,
             fecha_registro__month=mes
         ).count()
 
         contactos_estudiados = ContactosContacto.objects.filter(
+            paciente_indice__establecimiento_salud=establecimiento.nombre,
             fecha_registro__year=año,
             fecha_registro__month=mes,
             estado_estudio__in=['completado', 'en_progreso']
@@ -95,12 +114,18 @@ class CalculadorIndicadores:
 
         # Cálculo de TAES con datos reales
         pacientes_taes = Tratamiento.objects.filter(
+            paciente__establecimiento_salud=establecimiento.nombre,
             fecha_inicio__year=año,
             fecha_inicio__month=mes
         ).count()
 
         # Calcular adherentes (simulado)
-        pacientes_adherentes = int(pacientes_taes * 0.85)  # 85% de adherencia
+        pacientes_adherentes = int(pacientes_taes * CalculadorIndicadores.ADHERENCIA_TAES)
+
+        # Tiempo de diagnóstico con datos reales (exámenes solicitados en el mes)
+        tiempo_diagnostico = AnaliticaTiemposRespuesta.horas_diagnostico(
+            periodo.date(), periodo.date() + relativedelta(months=1), establecimiento
+        ).get((establecimiento.nombre, periodo.date()), 0)
 
         # Crear indicador operacional
         indicador, created = IndicadoresOperacionales.objects.update_or_create(
@@ -113,7 +138,8 @@ class CalculadorIndicadores:
                 'contactos_identificados': contactos_identificados,
                 'contactos_estudiados': contactos_estudiados,
                 'pacientes_taes': pacientes_taes,
-                'pacientes_adherentes': pacientes_adherentes
+                'pacientes_adherentes': pacientes_adherentes,
+                'tiempo_promedio_diagnostico': tiempo_diagnostico,
             }
         )
 
@@ -126,11 +152,14 @@ class CalculadorIndicadores:
 
         # Cálculo de quimioprofilaxis con datos reales
         quimioprofilaxis_total = PrevencionQuimioprofilaxis.objects.filter(
+            Q(paciente__establecimiento_salud=establecimiento.nombre) |
+            Q(contacto__paciente_indice__establecimiento_salud=establecimiento.nombre),
             fecha_inicio__year=año,
             fecha_inicio__month=mes
         )
 
         contactos_elegibles_qp = ContactosContacto.objects.filter(
+            paciente_indice__establecimiento_salud=establecimiento.nombre,
             fecha_registro__year=año,
             fecha_registro__month=mes
         ).count()
@@ -141,8 +170,8 @@ class CalculadorIndicadores:
         ).count()
 
         # Cálculo de vacunación BCG (simulado)
-        recien_nacidos = 50  # Número simulado
-        recien_nacidos_vacunados = int(recien_nacidos * 0.95)  # 95% de cobertura
+        recien_nacidos = CalculadorIndicadores.RECIEN_NACIDOS
+        recien_nacidos_vacunados = int(recien_nacidos * CalculadorIndicadores.COBERTURA_BCG)
 
         # Crear indicador de prevención
         indicador, created = IndicadoresPrevencion.objects.update_or_create(
@@ -161,86 +190,656 @@ class CalculadorIndicadores:
 
     @staticmethod
     def calcular_todos_indicadores():
-        """Calcula todos los indicadores para el año actual"""
-        from django.utils import timezone
-        hoy = timezone.now()
-        año_actual = hoy.year
-        mes_actual = hoy.month
-        
-        # Obtener todos los establecimientos
-        establecimientos = Establecimiento.objects.all()
-        
-        for establecimiento in establecimientos:
-            # Calcular indicadores para el trimestre actual
-            trimestre_actual = 'Q' + str((mes_actual - 1) // 3 + 1)
-            CalculadorIndicadores.calcular_indicadores_cohorte(
-                año_actual, trimestre_actual, establecimiento
-            )
-            
-            # Calcular indicadores operacionales del mes actual
-            CalculadorIndicadores.calcular_indicadores_operacionales(
-                mes_actual, año_actual, establecimiento
-            )
-            
-            # Calcular indicadores de prevención del mes actual
-            CalculadorIndicadores.calcular_indicadores_prevencion(
-                mes_actual, año_actual, establecimiento
-            )
+        """
+        Calcula los indicadores del periodo actual (cohorte del trimestre,
+        operacionales y prevención del mes) de todos los establecimientos.
+        Una falla en un establecimiento no impide calcular los demás.
+        """
+        from .recalculo import RecalculoIndicadores, generar_particiones
+
+        hoy = timezone.localdate()
+        resultados = RecalculoIndicadores().ejecutar(generar_particiones(hoy, hoy))
+
+        fallidas = [r for r in resultados if r['error']]
+        if fallidas:
+            raise RuntimeError('; '.join(
+                f"establecimiento {r['particion'].establecimiento_id}: {r['error']}" for r in fallidas
+            ))
+
+class BackfillIndicadores:
+    """
+    Recalcula el historial de indicadores desde los datos de origen. A
+    diferencia de CalculadorIndicadores (varias consultas por establecimiento
+    y periodo) lee cada tabla de origen una sola vez en el rango, acumula los
+    conteos por establecimiento y periodo en memoria y guarda cada familia con
+    un upsert por lotes. Las métricas son las mismas del calculador.
+    """
+
+    BATCH_SIZE = 1000
+    CHUNK_SIZE = 5000
+    CAMPOS_COHORTE = [
+        'casos_nuevos', 'casos_retratamiento', 'curados', 'abandonos', 'fallecidos', 'fracasos', 'trasladados',
+    ]
+    CAMPOS_OPERACIONALES = [
+        'sintomaticos_respiratorios', 'baciloscopias_realizadas', 'casos_tb_encontrados',
+        'contactos_identificados', 'contactos_estudiados', 'pacientes_taes', 'pacientes_adherentes',
+        'tiempo_promedio_diagnostico',
+    ]
+    CAMPOS_PREVENCION = [
+        'contactos_elegibles_qp', 'contactos_iniciados_qp', 'contactos_completados_qp',
+        'recien_nacidos', 'recien_nacidos_vacunados',
+    ]
+
+    @staticmethod
+    def _trimestre(fecha):
+        return fecha.year, f'Q{(fecha.month - 1) // 3 + 1}'
+
+    @staticmethod
+    def _contar(desde, hasta):
+        """
+        Una pasada por tabla de origen. Retorna dos diccionarios de Counter:
+        por (nombre del establecimiento, año, trimestre) y por (nombre, mes).
+        """
+        fin = hasta + relativedelta(months=1)
+        # La cohorte del último trimestre abarca el trimestre completo, como en el calculador
+        fin_trimestre = date(hasta.year, (hasta.month - 1) // 3 * 3 + 1, 1) + relativedelta(months=3)
+        cohorte = defaultdict(Counter)
+        mensual = defaultdict(Counter)
+        chunk = BackfillIndicadores.CHUNK_SIZE
+
+        pacientes = PacientesPaciente.objects.filter(
+            fecha_diagnostico__gte=desde, fecha_diagnostico__lt=fin_trimestre
+        ).annotate(num_tratamientos=Count('tratamientos')).values_list(
+            'establecimiento_salud', 'fecha_diagnostico', 'estado', 'num_tratamientos'
+        )
+        for nombre, fecha, estado, num_tratamientos in pacientes.iterator(chunk_size=chunk):
+            conteo = cohorte[(nombre, *BackfillIndicadores._trimestre(fecha))]
+            conteo['casos_nuevos'] += estado in ('activo', 'egresado')
+            conteo['curados'] += estado == 'egresado'
+            conteo['abandonos'] += estado == 'abandono'
+            conteo['fallecidos'] += estado == 'fallecido'
+            conteo['casos_retratamiento'] += num_tratamientos > 1
+            if fecha < fin:
+                mensual[(nombre, fecha.replace(day=1))]['sintomaticos_respiratorios'] += 1
+
+        contactos = ContactosContacto.objects.filter(
+            fecha_registro__gte=desde, fecha_registro__lt=fin
+        ).values_list('paciente_indice__establecimiento_salud', 'fecha_registro', 'estado_estudio')
+        for nombre, fecha, estado_estudio in contactos.iterator(chunk_size=chunk):
+            conteo = mensual[(nombre, fecha.replace(day=1))]
+            conteo['contactos_identificados'] += 1
+            conteo['contactos_estudiados'] += estado_estudio in ('completado', 'en_progreso')
+
+        tratamientos = Tratamiento.objects.filter(
+            fecha_inicio__gte=desde, fecha_inicio__lt=fin
+        ).values_list('paciente__establecimiento_salud', 'fecha_inicio')
+        for nombre, fecha in tratamientos.iterator(chunk_size=chunk):
+            mensual[(nombre, fecha.replace(day=1))]['pacientes_taes'] += 1
+
+        # Una quimioprofilaxis cuenta para el establecimiento del paciente y
+        # para el del caso índice del contacto (una vez si coinciden)
+        quimioprofilaxis = PrevencionQuimioprofilaxis.objects.filter(
+            fecha_inicio__gte=desde, fecha_inicio__lt=fin
+        ).values_list(
+            'paciente__establecimiento_salud', 'contacto__paciente_indice__establecimiento_salud',
+            'fecha_inicio', 'estado',
+        )
+        for nombre_paciente, nombre_contacto, fecha, estado in quimioprofilaxis.iterator(chunk_size=chunk):
+            for nombre in {nombre_paciente, nombre_contacto} - {None}:
+                conteo = mensual[(nombre, fecha.replace(day=1))]
+                conteo['contactos_iniciados_qp'] += 1
+                conteo['contactos_completados_qp'] += estado == 'completado'
+
+        return cohorte, mensual
+
+    @staticmethod
+    def ejecutar(año_desde, año_hasta, establecimientos=None, consolidar=True):
+        """
+        Recalcula cada trimestre y mes entre enero de año_desde y diciembre de
+        año_hasta (sin pasar del mes actual) para los establecimientos dados
+        (todos por defecto). Retorna las filas guardadas por familia.
+        """
+        calculador = CalculadorIndicadores
+        desde = date(año_desde, 1, 1)
+        hasta = min(date(año_hasta, 12, 1), timezone.localdate().replace(day=1))
+        if desde > hasta:
+            raise ValueError('El rango de años no contiene meses a calcular')
+
+        meses = []
+        mes = desde
+        while mes <= hasta:
+            meses.append(mes)
+            mes += relativedelta(months=1)
+        trimestres = sorted({BackfillIndicadores._trimestre(mes) for mes in meses})
+
+        cohorte, mensual = BackfillIndicadores._contar(desde, hasta)
+        horas_diagnostico = AnaliticaTiemposRespuesta.horas_diagnostico(desde, hasta + relativedelta(months=1))
+        vacio = Counter()
+
+        filas_cohorte, filas_operacionales, filas_prevencion = [], [], []
+        for establecimiento in establecimientos if establecimientos is not None else Establecimiento.objects.all():
+            for año, trimestre in trimestres:
+                conteo = cohorte.get((establecimiento.nombre, año, trimestre), vacio)
+                filas_cohorte.append(IndicadoresCohorte(
+                    año=año, trimestre=trimestre, establecimiento=establecimiento,
+                    **{campo: conteo[campo] for campo in BackfillIndicadores.CAMPOS_COHORTE},
+                ))
+            for mes in meses:
+                conteo = mensual.get((establecimiento.nombre, mes), vacio)
+                sintomaticos = conteo['sintomaticos_respiratorios']
+                filas_operacionales.append(IndicadoresOperacionales(
+                    establecimiento=establecimiento, periodo=mes,
+                    sintomaticos_respiratorios=sintomaticos,
+                    baciloscopias_realizadas=int(sintomaticos * calculador.PROPORCION_BACILOSCOPIAS),
+                    casos_tb_encontrados=int(sintomaticos * calculador.POSITIVIDAD),
+                    contactos_identificados=conteo['contactos_identificados'],
+                    contactos_estudiados=conteo['contactos_estudiados'],
+                    pacientes_taes=conteo['pacientes_taes'],
+                    pacientes_adherentes=int(conteo['pacientes_taes'] * calculador.ADHERENCIA_TAES),
+                    tiempo_promedio_diagnostico=horas_diagnostico.get((establecimiento.nombre, mes), 0),
+                ))
+                filas_prevencion.append(IndicadoresPrevencion(
+                    establecimiento=establecimiento, periodo=mes,
+                    contactos_elegibles_qp=conteo['contactos_identificados'],
+                    contactos_iniciados_qp=conteo['contactos_iniciados_qp'],
+                    contactos_completados_qp=conteo['contactos_completados_qp'],
+                    recien_nacidos=calculador.RECIEN_NACIDOS,
+                    recien_nacidos_vacunados=int(calculador.RECIEN_NACIDOS * calculador.COBERTURA_BCG),
+                ))
+
+        guardar = [
+            (IndicadoresCohorte, filas_cohorte, ['año', 'trimestre', 'establecimiento'], BackfillIndicadores.CAMPOS_COHORTE),
+            (IndicadoresOperacionales, filas_operacionales, ['establecimiento', 'periodo'], BackfillIndicadores.CAMPOS_OPERACIONALES),
+            (IndicadoresPrevencion, filas_prevencion, ['establecimiento', 'periodo'], BackfillIndicadores.CAMPOS_PREVENCION),
+        ]
+        with transaction.atomic():
+            for modelo, filas, unicos, campos in guardar:
+                modelo.objects.bulk_create(
+                    filas,
+                    batch_size=BackfillIndicadores.BATCH_SIZE,
+                    update_conflicts=True,
+                    unique_fields=unicos,
+                    update_fields=campos,
+                )
+
+        if consolidar:
+            ConsolidadorIndicadores.consolidar(desde=desde)
+        return {
+            'cohorte': len(filas_cohorte),
+            'operacionales': len(filas_operacionales),
+            'prevencion': len(filas_prevencion),
+        }
+
 
 class GeneradorAlertas:
     """Servicio para generación automática de alertas con datos reales"""
-    
+
+    @staticmethod
+    def evaluar_reglas(reglas=None):
+        """Evalúa en lote las reglas de alertas y retorna las métricas por regla"""
+        from .reglas import MotorReglas
+        return MotorReglas(reglas).evaluar()
+
     @staticmethod
     def verificar_alertas_vencimientos():
         """Verifica y genera alertas por vencimientos con datos reales"""
-        from django.utils import timezone
-        hoy = timezone.now().date()
-
-        # Alertas de vencimiento de tratamientos
-        tratamientos_proximos = Tratamiento.objects.filter(
-            fecha_termino_estimada__lte=hoy + timedelta(days=7),
-            fecha_termino_estimada__gt=hoy,
-            resultado_final__in=[None, 'En Tratamiento']
+        from .reglas import ReglaVencimientoTratamiento
+        return GeneradorAlertas.evaluar_reglas([ReglaVencimientoTratamiento()])
+
+    @staticmethod
+    def verificar_alertas_estudio_contactos():
+        """Verifica contactos con estudio pendiente"""
+        from .reglas import ReglaContactoPendiente
+        return GeneradorAlertas.evaluar_reglas([ReglaContactoPendiente()])
+
+
+class AnaliticaAlertas:
+    """Métricas de tiempo de resolución (SLA) de alertas calculadas en la base de datos"""
+
+    DIMENSIONES = {
+        'por_nivel': 'nivel',
+        'por_tipo': 'tipo',
+        'por_establecimiento': 'establecimiento__nombre',
+    }
+    PERCENTILES = (50, 90)
+    CACHE_TIMEOUT = 300
+
+    @staticmethod
+    def _horas(duracion):
+        if duracion is None:
+            return 0
+        return round(duracion.total_seconds() / 3600, 1)
+
+    @staticmethod
+    def _resueltas(desde):
+        duracion = ExpressionWrapper(
+            F('fecha_resolucion') - F('fecha_creacion'),
+            output_field=DurationField()
         )
+        return Alerta.objects.filter(
+            resuelta=True,
+            fecha_resolucion__isnull=False,
+            fecha_resolucion__gte=desde,
+        ).annotate(duracion=duracion)
+
+    @staticmethod
+    def _percentiles(queryset, campo=None):
+        """
+        Obtiene p50/p90 por grupo en una sola consulta: ROW_NUMBER() y COUNT()
+        sobre ventanas particionadas por el grupo marcan la fila de cada percentil.
+        """
+        particion = [F(campo)] if campo else None
+        total = Cast(F('n'), FloatField())
+        marcas = [
+            When(rn=Ceil(total * (p / 100)), then=Value(p))
+            for p in AnaliticaAlertas.PERCENTILES
+        ]
+        filas = queryset.annotate(
+            rn=Window(RowNumber(), partition_by=particion, order_by=F('duracion').asc()),
+            n=Window(Count('id'), partition_by=particion),
+        ).annotate(
+            percentil=Case(*marcas, default=None, output_field=IntegerField())
+        ).filter(percentil__isnull=False)
+
+        campos = ['percentil', 'duracion'] + ([campo] if campo else [])
+        resultado = {}
+        for fila in filas.values(*campos):
+            grupo = resultado.setdefault(fila[campo] if campo else None, {})
+            grupo[fila['percentil']] = AnaliticaAlertas._horas(fila['duracion'])
+
+        # Con pocos casos varios percentiles caen en la misma fila
+        for grupo in resultado.values():
+            ultimo = 0
+            for p in AnaliticaAlertas.PERCENTILES:
+                ultimo = grupo.setdefault(p, ultimo)
+        return resultado
+
+    @staticmethod
+    def calcular(dias=30):
+        """Calcula promedio, p50 y p90 del tiempo de resolución, global y por nivel, tipo y establecimiento"""
+        desde = timezone.now() - timedelta(days=dias)
+        resueltas = AnaliticaAlertas._resueltas(desde)
+
+        resumen = resueltas.aggregate(total=Count('id'), promedio=Avg('duracion'))
+        percentiles = AnaliticaAlertas._percentiles(resueltas).get(None, {})
+        promedio_horas = AnaliticaAlertas._horas(resumen['promedio'])
+        datos = {
+            'dias': dias,
+            'total': resumen['total'],
+            'promedio_horas': promedio_horas,
+            'promedio_dias': round(promedio_horas / 24, 1),
+            'p50_horas': percentiles.get(50, 0),
+            'p90_horas': percentiles.get(90, 0),
+        }
 
-        for tratamiento in tratamientos_proximos:
-            Alerta.objects.get_or_create(
-                tipo='VENCIMIENTO',
-                nivel='MEDIA',
-                titulo=f"Vencimiento próximo de tratamiento - {tratamiento.paciente.nombre}",
-                descripcion=f"El tratamiento de {tratamiento.paciente.nombre} vence el {tratamiento.fecha_termino_estimada}",
-                establecimiento=Establecimiento.objects.first(),  # Ajustar según tu lógica
-                usuario_asignado=tratamiento.usuario_registro,
-                fecha_vencimiento=tratamiento.fecha_termino_estimada,
-                defaults={
-                    'datos_relacionados': {
-                        'paciente_id': tratamiento.paciente.id,
-                        'tratamiento_id': tratamiento.id,
-                        'tipo_objeto': 'tratamiento'
-                    }
+        for nombre, campo in AnaliticaAlertas.DIMENSIONES.items():
+            grupos = resueltas.values(campo).annotate(
+                total=Count('id'), promedio=Avg('duracion')
+            ).order_by(campo)
+            percentiles = AnaliticaAlertas._percentiles(resueltas, campo)
+            datos[nombre] = [
+                {
+                    'clave': grupo[campo],
+                    'total': grupo['total'],
+                    'promedio_horas': AnaliticaAlertas._horas(grupo['promedio']),
+                    'p50_horas': percentiles.get(grupo[campo], {}).get(50, 0),
+                    'p90_horas': percentiles.get(grupo[campo], {}).get(90, 0),
                 }
+                for grupo in grupos
+            ]
+        return datos
+
+    @staticmethod
+    def obtener(dias=30):
+        """Versión en caché de calcular() para los dashboards"""
+        return cache.get_or_set(
+            f'indicadores:sla_alertas:{dias}',
+            lambda: AnaliticaAlertas.calcular(dias),
+            AnaliticaAlertas.CACHE_TIMEOUT,
+        )
+
+
+class SeriesIndicadores:
+    """
+    Series de tiempo de indicadores para gráficos, agregadas en SQL por
+    periodo (mes, trimestre o año) sobre los establecimientos pedidos.
+
+    Las tasas se recalculan desde las sumas del periodo (no se promedian
+    tasas) y cada una incluye su media móvil. La respuesta tiene siempre la
+    misma forma y `data` se entrega tal cual a Chart.js.
+    """
+
+    GRANULARIDADES = ['mes', 'trimestre', 'año']
+    FAMILIAS = {
+        'cohorte': {
+            'modelo': IndicadoresCohorte,
+            'granularidades': ['trimestre', 'año'],
+            'totales': ['casos_nuevos', 'casos_retratamiento', 'curados', 'abandonos', 'fallecidos'],
+        },
+        'operacionales': {
+            'modelo': IndicadoresOperacionales,
+            'granularidades': GRANULARIDADES,
+            'totales': ['sintomaticos_respiratorios', 'baciloscopias_realizadas', 'casos_tb_encontrados',
+                        'contactos_identificados', 'contactos_estudiados', 'pacientes_taes'],
+        },
+        'prevencion': {
+            'modelo': IndicadoresPrevencion,
+            'granularidades': GRANULARIDADES,
+            'totales': ['contactos_elegibles_qp', 'contactos_iniciados_qp', 'contactos_completados_qp',
+                        'recien_nacidos', 'recien_nacidos_vacunados'],
+        },
+    }
+    ETIQUETAS = {
+        'exito_tratamiento_porcentaje': 'Éxito Tratamiento (%)',
+        'tasa_abandono': 'Abandono (%)',
+        'tasa_fallecimiento': 'Fallecimiento (%)',
+        'indice_pesquisa': 'Índice Pesquisa (%)',
+        'cobertura_estudio_contactos': 'Cobertura Contactos (%)',
+        'adherencia_taes': 'Adherencia TAES (%)',
+        'cobertura_quimioprofilaxis': 'Cobertura QP (%)',
+        'adherencia_quimioprofilaxis': 'Adherencia QP (%)',
+        'cobertura_vacunacion_bcg': 'Cobertura BCG (%)',
+    }
+    TRUNCAR = {'mes': TruncMonth, 'trimestre': TruncQuarter, 'año': TruncYear}
+    # Sobre este número de puntos se sube de granularidad (mes -> trimestre -> año)
+    MAX_PUNTOS = 60
+    CACHE_TIMEOUT = 300
+
+    @staticmethod
+    def _periodo(fecha, granularidad):
+        if granularidad == 'mes':
+            return (fecha.year, fecha.month)
+        if granularidad == 'trimestre':
+            return (fecha.year, (fecha.month - 1) // 3 + 1)
+        return (fecha.year,)
+
+    @staticmethod
+    def _periodos(desde, hasta, granularidad):
+        """Todos los periodos del rango, para que los huecos queden como null en el gráfico"""
+        if granularidad == 'año':
+            return [(año,) for año in range(desde.year, hasta.year + 1)]
+        meses = 1 if granularidad == 'mes' else 3
+        inicio, fin = SeriesIndicadores._periodo(desde, granularidad), SeriesIndicadores._periodo(hasta, granularidad)
+        por_año = 12 // meses
+        return [
+            (indice // por_año, indice % por_año + 1)
+            for indice in range(inicio[0] * por_año + inicio[1] - 1, fin[0] * por_año + fin[1])
+        ]
+
+    @staticmethod
+    def _etiqueta(periodo, granularidad):
+        if granularidad == 'mes':
+            return f'{periodo[0]}-{periodo[1]:02d}'
+        if granularidad == 'trimestre':
+            return f'{periodo[0]}-Q{periodo[1]}'
+        return str(periodo[0])
+
+    @staticmethod
+    def _agrupar(familia, granularidad, desde, hasta, establecimientos):
+        """Una consulta agregada: (periodo, {campo o tasa: valor}) por periodo con datos"""
+        config = SeriesIndicadores.FAMILIAS[familia]
+        modelo = config['modelo']
+        queryset = modelo.objects.all()
+        if establecimientos:
+            queryset = queryset.filter(establecimiento_id__in=establecimientos)
+
+        if familia == 'cohorte':
+            # La cohorte guarda año y trimestre ('Q1'..'Q4'): se filtra por un índice de trimestre
+            numero = Case(
+                *[When(trimestre=f'Q{q}', then=Value(q)) for q in range(1, 5)],
+                output_field=IntegerField(),
+            )
+            queryset = queryset.annotate(numero_trimestre=numero, indice=F('año') * 4 + numero).filter(
+                indice__gte=desde.year * 4 + (desde.month - 1) // 3 + 1,
+                indice__lte=hasta.year * 4 + (hasta.month - 1) // 3 + 1,
             )
+            claves = ['año'] if granularidad == 'año' else ['año', 'numero_trimestre']
+        else:
+            queryset = queryset.filter(periodo__gte=desde.replace(day=1), periodo__lte=hasta).annotate(
+                grupo=SeriesIndicadores.TRUNCAR[granularidad]('periodo')
+            )
+            claves = ['grupo']
+
+        # Alias distintos de los campos: F() dentro de las tasas debe referirse a la columna
+        agregados = {f'suma_{campo}': Sum(campo) for campo in config['totales']}
+        for nombre, (numerador, denominador) in modelo.TASAS.items():
+            agregados[nombre] = expresion_porcentaje(Sum(sumar_campos(numerador)), Sum(sumar_campos(denominador)))
+
+        resultado = {}
+        for fila in queryset.values(*claves).annotate(**agregados).order_by(*claves):
+            if familia != 'cohorte':
+                periodo = SeriesIndicadores._periodo(fila['grupo'], granularidad)
+            elif granularidad == 'año':
+                periodo = (fila['año'],)
+            else:
+                periodo = (fila['año'], fila['numero_trimestre'])
+            resultado[periodo] = fila
+        return resultado
 
     @staticmethod
-    def verificar_alertas_estudio_contactos():
-        """Verifica contactos con estudio pendiente"""
-        contactos_pendientes = ContactosContacto.objects.filter(
-            estado_estudio='pendiente',
-            fecha_registro__lte=timezone.now().date() - timedelta(days=7)
+    def _media_movil(valores, ventana):
+        medias = []
+        for i in range(len(valores)):
+            presentes = [v for v in valores[max(0, i - ventana + 1):i + 1] if v is not None]
+            medias.append(round(sum(presentes) / len(presentes), 2) if presentes else None)
+        return medias
+
+    @staticmethod
+    def calcular(familia, granularidad, desde, hasta, establecimientos=None, ventana=3):
+        """
+        Retorna {'familia', 'granularidad', 'desde', 'hasta', 'establecimientos',
+        'ventana', 'data': {'labels', 'datasets'}, 'totales'}.
+
+        Si el rango tiene más de MAX_PUNTOS periodos se usa la siguiente
+        granularidad disponible; la respuesta indica la que se usó.
+        """
+        config = SeriesIndicadores.FAMILIAS[familia]
+        if granularidad not in config['granularidades']:
+            granularidad = config['granularidades'][0]
+        while (len(SeriesIndicadores._periodos(desde, hasta, granularidad)) > SeriesIndicadores.MAX_PUNTOS
+               and granularidad != 'año'):
+            granularidad = SeriesIndicadores.GRANULARIDADES[SeriesIndicadores.GRANULARIDADES.index(granularidad) + 1]
+
+        periodos = SeriesIndicadores._periodos(desde, hasta, granularidad)
+        filas = SeriesIndicadores._agrupar(familia, granularidad, desde, hasta, establecimientos)
+
+        datasets = []
+        for nombre in config['modelo'].TASAS:
+            valores = [filas[p][nombre] if p in filas else None for p in periodos]
+            etiqueta = SeriesIndicadores.ETIQUETAS.get(nombre, nombre)
+            datasets.append({'clave': nombre, 'label': etiqueta, 'data': valores})
+            datasets.append({
+                'clave': f'{nombre}_media_movil',
+                'label': f'{etiqueta} - media móvil {ventana}',
+                'data': SeriesIndicadores._media_movil(valores, ventana),
+            })
+
+        return {
+            'familia': familia,
+            'granularidad': granularidad,
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'establecimientos': sorted(establecimientos or []),
+            'ventana': ventana,
+            'data': {
+                'labels': [SeriesIndicadores._etiqueta(p, granularidad) for p in periodos],
+                'datasets': datasets,
+            },
+            'totales': {
+                campo: [filas[p][f'suma_{campo}'] if p in filas else None for p in periodos]
+                for campo in config['totales']
+            },
+        }
+
+    @staticmethod
+    def obtener(familia, granularidad, desde, hasta, establecimientos=None, ventana=3):
+        """Versión en caché de calcular() por combinación de parámetros"""
+        clave = 'indicadores:series:{}:{}:{}:{}:{}:{}'.format(
+            familia, granularidad, desde.isoformat(), hasta.isoformat(),
+            ','.join(str(e) for e in sorted(establecimientos or [])) or 'todos', ventana,
+        )
+        return cache.get_or_set(
+            clave,
+            lambda: SeriesIndicadores.calcular(familia, granularidad, desde, hasta, establecimientos, ventana),
+            SeriesIndicadores.CACHE_TIMEOUT,
         )
 
-        for contacto in contactos_pendientes:
-            Alerta.objects.get_or_create(
-                tipo='SEGUIMIENTO',
-                nivel='BAJA',
-                titulo=f"Estudio de contacto pendiente - {contacto.nombre_contacto}",
-                descripcion=f"El estudio de contacto de {contacto.nombre_contacto} está pendiente por más de 7 días",
-                establecimiento=Establecimiento.objects.first(),
-                fecha_vencimiento=timezone.now() + timedelta(days=3),
-                defaults={
-                    'datos_relacionados': {
-                        'contacto_id': contacto.id,
-                        'tipo_objeto': 'contacto'
-                    }
-                }
-            )
\ No newline at end of file
+
+class ConsolidadorIndicadores:
+    """
+    Consolida los indicadores por establecimiento -> región -> nacional en
+    filas ConsolidadoIndicador. Una consulta agrupada por familia lee los
+    totales por establecimiento y periodo; la región y el nivel nacional se
+    suman en memoria y se guardan con un solo upsert, así el drill-down se
+    sirve de esas filas sin recalcular los establecimientos.
+    """
+
+    SIN_REGION = 'Sin región'
+    NIVEL_HIJO = {'nacional': 'region', 'region': 'establecimiento'}
+    NIVEL_PADRE = {'region': 'nacional', 'establecimiento': 'region'}
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def _campos(familia):
+        """Campos sumables de la familia: los totales de las series y los de sus tasas"""
+        config = SeriesIndicadores.FAMILIAS[familia]
+        campos = list(config['totales'])
+        for numerador, denominador in config['modelo'].TASAS.values():
+            campos.extend(c for c in numerador + denominador if c not in campos)
+        return campos
+
+    @staticmethod
+    def _por_establecimiento(familia, campos, desde):
+        """Filas (establecimiento, periodo, totales) en una consulta agrupada"""
+        modelo = SeriesIndicadores.FAMILIAS[familia]['modelo']
+        queryset = modelo.objects.all()
+        if familia == 'cohorte':
+            numero = Case(
+                *[When(trimestre=f'Q{q}', then=Value(q)) for q in range(1, 5)],
+                output_field=IntegerField(),
+            )
+            queryset = queryset.annotate(numero_trimestre=numero)
+            if desde:
+                queryset = queryset.annotate(indice=F('año') * 4 + numero).filter(
+                    indice__gte=desde.year * 4 + (desde.month - 1) // 3 + 1
+                )
+            claves = ['año', 'numero_trimestre']
+        else:
+            if desde:
+                queryset = queryset.filter(periodo__gte=desde)
+            claves = ['periodo']
+
+        filas = queryset.values(
+            *claves, 'establecimiento_id', 'establecimiento__nombre', 'establecimiento__region'
+        ).annotate(**{f'suma_{campo}': Sum(campo) for campo in campos})
+        for fila in filas:
+            if familia == 'cohorte':
+                periodo = date(fila['año'], (fila['numero_trimestre'] - 1) * 3 + 1, 1)
+            else:
+                periodo = fila['periodo']
+            yield fila, periodo, {campo: fila[f'suma_{campo}'] or 0 for campo in campos}
+
+    @staticmethod
+    def consolidar(familias=None, desde=None):
+        """
+        Recalcula los consolidados de las familias pedidas (todas por defecto)
+        desde un periodo (todos por defecto). Retorna filas guardadas por familia.
+        """
+        familias = familias or list(SeriesIndicadores.FAMILIAS)
+        ahora = timezone.now()
+        filas = []
+        conteos = {}
+        for familia in familias:
+            modelo = SeriesIndicadores.FAMILIAS[familia]['modelo']
+            campos = ConsolidadorIndicadores._campos(familia)
+            nodos = {}
+            for fila, periodo, totales in ConsolidadorIndicadores._por_establecimiento(familia, campos, desde):
+                region = fila['establecimiento__region'] or ConsolidadorIndicadores.SIN_REGION
+                niveles = [
+                    ('establecimiento', str(fila['establecimiento_id']), region, fila['establecimiento__nombre']),
+                    ('region', region, 'nacional', region),
+                    ('nacional', 'nacional', '', 'Nacional'),
+                ]
+                for nivel, clave, padre, nombre in niveles:
+                    nodo = nodos.setdefault((nivel, clave, periodo), {
+                        'padre': padre, 'nombre': nombre, 'establecimientos': 0, 'totales': dict.fromkeys(campos, 0),
+                    })
+                    nodo['establecimientos'] += 1
+                    for campo in campos:
+                        nodo['totales'][campo] += totales[campo]
+
+            for (nivel, clave, periodo), nodo in nodos.items():
+                filas.append(ConsolidadoIndicador(
+                    familia=familia, nivel=nivel, clave=clave, padre=nodo['padre'], nombre=nodo['nombre'],
+                    periodo=periodo, establecimientos=nodo['establecimientos'], totales=nodo['totales'],
+                    tasas=modelo.tasas_desde_totales(nodo['totales']), fecha_actualizacion=ahora,
+                ))
+            conteos[familia] = len(nodos)
+
+        with transaction.atomic():
+            ConsolidadoIndicador.objects.bulk_create(
+                filas,
+                batch_size=ConsolidadorIndicadores.BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['familia', 'nivel', 'clave', 'periodo'],
+                update_fields=['padre', 'nombre', 'establecimientos', 'totales', 'tasas', 'fecha_actualizacion'],
+            )
+            # Nodos que ya no existen en el rango (establecimiento eliminado o cambiado de región)
+            obsoletos = ConsolidadoIndicador.objects.filter(familia__in=familias, fecha_actualizacion__lt=ahora)
+            if desde:
+                obsoletos = obsoletos.filter(periodo__gte=desde)
+            obsoletos.delete()
+        return conteos
+
+    @staticmethod
+    def _serializar(consolidado):
+        return {
+            'nivel': consolidado.nivel,
+            'clave': consolidado.clave,
+            'nombre': consolidado.nombre,
+            'establecimientos': consolidado.establecimientos,
+            'totales': consolidado.totales,
+            'tasas': consolidado.tasas,
+        }
+
+    @staticmethod
+    def drill_down(familia, periodo=None, nivel='nacional', clave='nacional'):
+        """
+        Nodo pedido y sus hijos del nivel inferior para un periodo (por
+        defecto el último consolidado). Retorna None si no hay datos.
+        """
+        consolidados = ConsolidadoIndicador.objects.filter(familia=familia)
+        periodos = list(
+            consolidados.filter(nivel='nacional').order_by('-periodo').values_list('periodo', flat=True)
+        )
+        if periodo is None and periodos:
+            periodo = periodos[0]
+        if periodo is None:
+            return None
+
+        nivel_hijo = ConsolidadorIndicadores.NIVEL_HIJO.get(nivel)
+        condicion = Q(nivel=nivel, clave=clave)
+        if nivel_hijo:
+            condicion |= Q(nivel=nivel_hijo, padre=clave)
+        nodo, hijos = None, []
+        for consolidado in consolidados.filter(condicion, periodo=periodo).order_by('nombre'):
+            if consolidado.nivel == nivel and consolidado.clave == clave:
+                nodo = consolidado
+            else:
+                hijos.append(ConsolidadorIndicadores._serializar(consolidado))
+        if nodo is None:
+            return None
+
+        return {
+            'familia': familia,
+            'periodo': periodo.isoformat(),
+            'periodos': [p.isoformat() for p in periodos],
+            'padre': (
+                {'nivel': ConsolidadorIndicadores.NIVEL_PADRE[nivel], 'clave': nodo.padre}
+                if nivel in ConsolidadorIndicadores.NIVEL_PADRE else None
+            ),
+            'nodo': ConsolidadorIndicadores._serializar(nodo),
+            'nivel_hijos': nivel_hijo,
+            'hijos': hijos,
+            'actualizado': nodo.fecha_actualizacion.isoformat(),
+        }
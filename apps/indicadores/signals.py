@@ -1,9 +1,12 @@
 # signals.py - Señales para integración automática
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from apps.pacientes.models import PacientesPaciente
 from apps.tratamientos.models import Tratamiento
 from apps.contactos.models import ContactosContacto
+from .eventos import canal_alertas
+from .models import Alerta
 from .services import CalculadorIndicadores
 from django.utils import timezone
 
@@ -36,4 +39,15 @@ def actualizar_indicadores_tratamiento(sender, instance, **kwargs):
         if establecimiento:
             CalculadorIndicadores.calcular_indicadores_cohorte(
                 año, trimestre, establecimiento
-            )
\ No newline at end of file
+            )
+
+@receiver(post_save, sender=Alerta)
+def publicar_alerta(sender, instance, created, **kwargs):
+    """Notifica a los navegadores conectados las alertas nuevas y resueltas"""
+    if created:
+        evento = 'nueva'
+    elif instance.resuelta:
+        evento = 'resuelta'
+    else:
+        return
+    transaction.on_commit(lambda: canal_alertas.publicar_alerta(instance, evento))
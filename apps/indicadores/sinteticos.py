@@ -0,0 +1,549 @@
+# sinteticos.py - Generación de datos sintéticos para pruebas de rendimiento
+import random
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from django.contrib.auth.models import User, Permission
+from django.db import transaction
+from django.db.models import Max
+from django.db.models import signals
+from django.utils import timezone
+
+from .models import (
+    Establecimiento,
+    IndicadoresCohorte,
+    IndicadoresOperacionales,
+    IndicadoresPrevencion,
+    Alerta,
+)
+from .services import ConsolidadorIndicadores
+from apps.laboratorio.services import CalculadorIndicadoresLaboratorio
+from apps.pacientes.models import PacientesPaciente
+from apps.pacientes.importacion import digito_verificador
+from apps.contactos.models import ContactosContacto
+from apps.tratamientos.models import Tratamiento, EsquemaMedicamento, DosisAdministrada
+from apps.examenes.models import ExamenesExamenbacteriologico, ExamenRadiologico, ExamenPPD
+from apps.examenes.estados import estado_para
+from apps.prevencion.models import (
+    PrevencionQuimioprofilaxis,
+    PrevencionVacunacionBCG,
+    PrevencionSeguimiento,
+)
+from apps.laboratorio.models import (
+    LaboratorioRedLaboratorios,
+    LaboratorioControlCalidad,
+    LaboratorioTarjetero,
+    LaboratorioIndicadores,
+)
+from apps.usuarios.models import UsuariosUsuario
+
+ROLES = ['admin', 'medico', 'enfermera', 'tecnologo', 'paramedico']
+
+COMUNAS = ['Santiago', 'Pudahuel', 'Maipú', 'La Florida', 'Puente Alto', 'Recoleta', 'Independencia', 'Estación Central']
+NOMBRES = ['Juan', 'María', 'Pedro', 'Ana', 'Luis', 'Carmen', 'José', 'Rosa', 'Carlos', 'Camila']
+APELLIDOS = ['González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda']
+
+# Mismos permisos que asigna create_groups_users.py a cada grupo
+PERMISOS_POR_ROL = {
+    'admin': (['add', 'change', 'delete', 'view'], ['usuarios', 'pacientes', 'tratamientos', 'examenes', 'contactos',
+                                                     'prevencion', 'laboratorio', 'indicadores', 'auth']),
+    'medico': (['add', 'change', 'view'], ['pacientes', 'tratamientos', 'examenes', 'contactos']),
+    'enfermera': (['view', 'change'], ['pacientes', 'tratamientos', 'examenes', 'contactos', 'prevencion']),
+    'tecnologo': (['view', 'change'], ['examenes', 'laboratorio', 'pacientes']),
+    'paramedico': (['view', 'add'], ['pacientes', 'contactos', 'prevencion']),
+}
+
+# Distribuciones aproximadas del programa TBC: (valor, peso)
+DISTRIBUCION_EDAD = [((0, 14), 4), ((15, 24), 12), ((25, 44), 36), ((45, 64), 30), ((65, 90), 18)]
+DISTRIBUCION_SEXO = [('M', 63), ('F', 37)]
+DISTRIBUCION_ESTADO = [('activo', 55), ('egresado', 30), ('abandono', 8), ('fallecido', 5), ('suspendido', 2)]
+DISTRIBUCION_TIPO_TBC = [('pulmonar', 80), ('extrapulmonar', 17), ('mixta', 3)]
+DISTRIBUCION_POBLACION = [('', 62), ('migrante', 14), ('privada_libertad', 5), ('sin_techo', 4), ('vih', 5),
+                          ('diabetes', 7), ('alcoholismo', 3)]
+DISTRIBUCION_CONTACTOS = [(0, 12), (1, 14), (2, 20), (3, 20), (4, 14), (5, 9), (6, 6), (8, 5)]
+DISTRIBUCION_RESULTADO = [('NEGATIVO', 62), ('POSITIVO', 22), ('PENDIENTE', 10), ('CONTAMINADO', 4), ('INDETERMINADO', 2)]
+
+PREFIJO_USUARIO = 'sintetico.'
+PASSWORD_USUARIOS = 'Sintetico.1234'
+
+
+@contextmanager
+def senales_suspendidas():
+    """
+    Desactiva temporalmente las señales de guardado y borrado (perfil de
+    usuario, recálculo de indicadores, publicación de alertas) mientras se
+    cargan datos masivos.
+    """
+    señales = [signals.pre_save, signals.post_save, signals.pre_delete, signals.post_delete, signals.m2m_changed]
+    respaldo = [(señal, señal.receivers) for señal in señales]
+    try:
+        for señal in señales:
+            señal.receivers = []
+            señal.sender_receivers_cache.clear()
+        yield
+    finally:
+        for señal, receptores in respaldo:
+            señal.receivers = receptores
+            señal.sender_receivers_cache.clear()
+
+
+class GeneradorDatosSinteticos:
+    """
+    Crea un conjunto de datos sintético y reproducible (misma semilla, mismos
+    datos) con todas las entidades clínicas del sistema, usando bulk_create.
+
+    Los RUT parten desde el mayor RUT sintético existente, por lo que se puede
+    llamar varias veces sobre la misma base para hacerla crecer. Los pacientes
+    se generan por lotes, cada uno con sus entidades dependientes y en su
+    propia transacción, para acotar la memoria con cientos de miles de filas.
+    """
+    RUT_BASE_PACIENTES = 30000000
+    RUT_BASE_CONTACTOS = 60000000
+    RUT_BASE_USUARIOS = 90000000
+
+    def __init__(self, pacientes=100, establecimientos=3, semilla=1, dias_dosis=14, lote=5000, batch_size=1000):
+        self.total_pacientes = pacientes
+        self.total_establecimientos = establecimientos
+        self.dias_dosis = dias_dosis
+        self.lote = max(1, lote)
+        self.batch_size = batch_size
+        self.rng = random.Random(semilla)
+        self.hoy = date.today()
+        self.conteos = {}
+
+    # Utilidades
+
+    def _fecha_pasada(self, max_dias, min_dias=0):
+        return self.hoy - timedelta(days=self.rng.randint(min_dias, max_dias))
+
+    def _elegir(self, distribucion):
+        valores, pesos = zip(*distribucion)
+        return self.rng.choices(valores, weights=pesos)[0]
+
+    def _nombre(self):
+        return f"{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)} {self.rng.choice(APELLIDOS)}"
+
+    def _insertar(self, modelo, objetos):
+        """
+        bulk_create que garantiza pk en los objetos: MySQL no los retorna, así
+        que se leen los ids asignados a continuación del máximo previo.
+        """
+        if not objetos:
+            return objetos
+        ultimo = modelo.objects.aggregate(m=Max('pk'))['m'] or 0
+        creados = modelo.objects.bulk_create(objetos, batch_size=self.batch_size)
+        if creados[0].pk is None:
+            ids = modelo.objects.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)
+            for objeto, pk in zip(creados, ids):
+                objeto.pk = pk
+        self.conteos[modelo._meta.label] = self.conteos.get(modelo._meta.label, 0) + len(creados)
+        return creados
+
+    # Entidades base
+
+    def usuarios_por_rol(self):
+        """Un usuario por rol (se reutilizan si ya existen)"""
+        usuarios = {}
+        for n, rol in enumerate(ROLES):
+            numero = self.RUT_BASE_USUARIOS + n
+            username = f'{PREFIJO_USUARIO}{rol}'
+            usuario = User.objects.filter(username=username).first()
+            if usuario is None:
+                usuario = User.objects.create_user(
+                    username=username,
+                    password=PASSWORD_USUARIOS,
+                    first_name='Usuario',
+                    last_name=rol.capitalize(),
+                )
+            acciones, aplicaciones = PERMISOS_POR_ROL[rol]
+            usuario.user_permissions.set(Permission.objects.filter(
+                content_type__app_label__in=aplicaciones,
+                codename__regex=r'^(%s)_' % '|'.join(acciones),
+            ))
+            UsuariosUsuario.objects.update_or_create(
+                user=usuario,
+                defaults={'rol': rol, 'rut': f'{numero}-{digito_verificador(numero)}', 'establecimiento': 'Sintético'},
+            )
+            usuarios[rol] = usuario
+        return usuarios
+
+    def _establecimientos(self):
+        existentes = Establecimiento.objects.filter(codigo__startswith='SIN-').count()
+        nuevos = [
+            Establecimiento(
+                nombre=f'CESFAM Sintético {n}',
+                codigo=f'SIN-{n:04d}',
+                region='Metropolitana',
+            )
+            for n in range(existentes + 1, self.total_establecimientos + 1)
+        ]
+        self._insertar(Establecimiento, nuevos)
+        return list(Establecimiento.objects.filter(codigo__startswith='SIN-').order_by('codigo'))
+
+    def _laboratorios(self):
+        laboratorios = list(LaboratorioRedLaboratorios.objects.filter(nombre__startswith='Laboratorio Sintético'))
+        if laboratorios:
+            return laboratorios
+        return self._insertar(LaboratorioRedLaboratorios, [
+            LaboratorioRedLaboratorios(
+                nombre=f'Laboratorio Sintético {tipo}',
+                tipo=tipo,
+                direccion='Dirección sintética',
+                comuna=self.rng.choice(COMUNAS),
+                responsable=self._nombre(),
+                telefono='221234567',
+                email=f'lab{tipo.lower()}@sintetico.cl',
+            )
+            for tipo in ('I', 'II', 'III')
+        ])
+
+    # Entidades clínicas
+
+    @staticmethod
+    def _siguiente_rut(queryset, campo, base, limite):
+        """
+        Posición (desde `base`) del siguiente RUT sintético libre: el mayor ya
+        usado más uno. Contar las filas no sirve si se eliminó alguna.
+        """
+        # Solo RUT de 8 dígitos sin puntos: '9123456-7' > '30000000' como texto
+        ultimo = queryset.filter(**{
+            f'{campo}__gte': str(base), f'{campo}__lt': str(limite), f'{campo}__regex': r'^[0-9]{8}-[0-9K]$',
+        }).aggregate(m=Max(campo))['m']
+        return int(ultimo.split('-')[0]) - base + 1 if ultimo else 0
+
+    def _pacientes(self, cantidad, establecimientos, usuario):
+        ultimo = self._siguiente_rut(
+            PacientesPaciente.objects.all(), 'rut', self.RUT_BASE_PACIENTES, self.RUT_BASE_CONTACTOS
+        )
+        # Pocos establecimientos grandes concentran la mayoría de los casos
+        pesos = [1 / (posicion + 1) for posicion in range(len(establecimientos))]
+        pacientes = []
+        for n in range(ultimo, ultimo + cantidad):
+            numero = self.RUT_BASE_PACIENTES + n
+            diagnostico = self._fecha_pasada(720, 5)
+            edad_minima, edad_maxima = self._elegir(DISTRIBUCION_EDAD)
+            pacientes.append(PacientesPaciente(
+                rut=f'{numero}-{digito_verificador(numero)}',
+                nombre=self._nombre(),
+                fecha_nacimiento=self._fecha_pasada(edad_maxima * 365, edad_minima * 365),
+                sexo=self._elegir(DISTRIBUCION_SEXO),
+                domicilio=f'Calle {self.rng.randint(1, 999)}',
+                comuna=self.rng.choice(COMUNAS),
+                telefono=f'9{self.rng.randint(10000000, 99999999)}',
+                establecimiento_salud=self.rng.choices(establecimientos, weights=pesos)[0].nombre,
+                fecha_diagnostico=diagnostico,
+                tipo_tbc=self._elegir(DISTRIBUCION_TIPO_TBC),
+                baciloscopia_inicial=self.rng.choice(['Positiva', 'Negativa']),
+                poblacion_prioritaria=self._elegir(DISTRIBUCION_POBLACION),
+                estado=self._elegir(DISTRIBUCION_ESTADO),
+                usuario_registro=usuario,
+            ))
+        return self._insertar(PacientesPaciente, pacientes)
+
+    def _contactos(self, pacientes):
+        ultimo = self._siguiente_rut(
+            ContactosContacto.objects.all(), 'rut_contacto', self.RUT_BASE_CONTACTOS, self.RUT_BASE_USUARIOS
+        )
+        contactos = []
+        for paciente in pacientes:
+            for _ in range(self._elegir(DISTRIBUCION_CONTACTOS)):
+                numero = self.RUT_BASE_CONTACTOS + ultimo + len(contactos)
+                contactos.append(ContactosContacto(
+                    rut_contacto=f'{numero}-{digito_verificador(numero)}',
+                    nombre_contacto=self._nombre(),
+                    parentesco=self.rng.choice(['esposo_esposa', 'hijo_hija', 'padre_madre', 'hermano_hermana']),
+                    tipo_contacto=self.rng.choice(['intradomiciliario'] * 3 + ['extradomiciliario', 'laboral']),
+                    fecha_registro=self._fecha_pasada(180),
+                    estado_estudio=self.rng.choice(['pendiente', 'en_progreso', 'completado', 'completado']),
+                    paciente_indice=paciente,
+                ))
+        return self._insertar(ContactosContacto, contactos)
+
+    def _tratamientos(self, pacientes, usuario):
+        tratamientos = []
+        for paciente in pacientes:
+            if self.rng.random() > 0.8:
+                continue
+            inicio = paciente.fecha_diagnostico + timedelta(days=self.rng.randint(0, 20))
+            terminado = paciente.estado in ('egresado', 'abandono', 'fallecido')
+            resultado = {
+                'egresado': self.rng.choice(['Curación', 'Tratamiento Completo']),
+                'abandono': 'Abandono',
+                'fallecido': 'Fallecimiento',
+            }.get(paciente.estado, 'En Tratamiento')
+            tratamientos.append(Tratamiento(
+                paciente=paciente,
+                esquema=self.rng.choice(['HRZE'] * 8 + ['HRE', 'Personalizado']),
+                fecha_inicio=inicio,
+                fecha_termino_estimada=inicio + timedelta(days=180),
+                fecha_termino_real=min(self.hoy, inicio + timedelta(days=180)) if terminado else None,
+                peso_kg=self.rng.randint(45, 95),
+                resultado_final=resultado,
+                usuario_registro=usuario,
+            ))
+        return self._insertar(Tratamiento, tratamientos)
+
+    def _esquemas_y_dosis(self, tratamientos, usuario):
+        esquemas = []
+        for tratamiento in tratamientos:
+            for medicamento in self.rng.sample(['Isoniazida (H)', 'Rifampicina (R)', 'Pirazinamida (Z)', 'Etambutol (E)'], 2):
+                esquemas.append(EsquemaMedicamento(
+                    tratamiento=tratamiento,
+                    medicamento=medicamento,
+                    dosis_mg=self.rng.choice([300, 450, 600]),
+                    frecuencia='Diaria',
+                    fase='Fase Intensiva',
+                    duracion_semanas=8,
+                    fecha_inicio=tratamiento.fecha_inicio,
+                    fecha_termino=tratamiento.fecha_inicio + timedelta(weeks=8),
+                ))
+        esquemas = self._insertar(EsquemaMedicamento, esquemas)
+
+        dosis = []
+        for esquema in esquemas:
+            adherencia = self.rng.choice([0.95, 0.9, 0.8, 0.6])
+            for dias in range(1, self.dias_dosis + 1):
+                fecha = self.hoy - timedelta(days=dias)
+                if fecha < esquema.fecha_inicio:
+                    break
+                dosis.append(DosisAdministrada(
+                    esquema_medicamento=esquema,
+                    fecha_dosis=fecha,
+                    administrada=self.rng.random() < adherencia,
+                    usuario_administracion=usuario,
+                ))
+        self._insertar(DosisAdministrada, dosis)
+        return esquemas
+
+    def _examenes(self, pacientes, laboratorios, usuario):
+        examenes = []
+        for paciente in pacientes:
+            for _ in range(self.rng.randint(1, 3)):
+                solicitud = self._fecha_pasada(365)
+                toma = solicitud + timedelta(days=self.rng.randint(0, 2))
+                ingreso = toma + timedelta(days=1) if self.rng.random() < 0.9 else None
+                resultado = self._elegir(DISTRIBUCION_RESULTADO)
+                if ingreso is None:
+                    resultado = 'PENDIENTE'
+                fecha_resultado = ingreso + timedelta(days=self.rng.randint(1, 30)) if resultado != 'PENDIENTE' else None
+                if fecha_resultado and fecha_resultado > self.hoy:
+                    fecha_resultado = self.hoy
+                resistente = resultado == 'POSITIVO' and self.rng.random() < 0.05
+                laboratorio = self.rng.choice(laboratorios)
+                examenes.append(ExamenesExamenbacteriologico(
+                    paciente=paciente,
+                    tipo_examen=self.rng.choice(['BACILOSCOPIA'] * 3 + ['CULTIVO', 'GENEXPERT']),
+                    tipo_muestra='ESPUTO',
+                    fecha_solicitud=solicitud,
+                    fecha_toma_muestra=toma,
+                    fecha_ingreso_laboratorio=ingreso,
+                    fecha_resultado=fecha_resultado,
+                    resultado=resultado,
+                    sensibilidad='MDR' if resistente else None,
+                    resistencia_isoniazida=resistente,
+                    resistencia_rifampicina=resistente,
+                    estado_examen=estado_para(resultado, ingreso, toma),
+                    prioridad=self.rng.choice(['NORMAL'] * 8 + ['URGENTE']),
+                    laboratorio=laboratorio.nombre,
+                    laboratorio_red=laboratorio,
+                    numero_muestra_lab=f'SIN-{paciente.pk}-{len(examenes)}',
+                    usuario_registro=usuario,
+                ))
+        examenes = self._insertar(ExamenesExamenbacteriologico, examenes)
+
+        radiologicos = [
+            ExamenRadiologico(
+                paciente=paciente,
+                tipo_radiografia='TORAX_PA',
+                fecha_examen=paciente.fecha_diagnostico,
+                hallazgos=self.rng.choice(['NORMAL', 'COMPATIBLE_TBC', 'SUGERENTE_TBC']),
+                descripcion_hallazgos='Informe sintético',
+                establecimiento_realizacion=paciente.establecimiento_salud,
+                usuario_registro=usuario,
+            )
+            for paciente in pacientes if self.rng.random() < 0.5
+        ]
+        self._insertar(ExamenRadiologico, radiologicos)
+
+        ppd = []
+        for paciente in pacientes:
+            if self.rng.random() < 0.2:
+                aplicacion = self._fecha_pasada(365, 3)
+                milimetros = self.rng.randint(0, 20)
+                ppd.append(ExamenPPD(
+                    paciente=paciente,
+                    fecha_aplicacion=aplicacion,
+                    fecha_lectura=aplicacion + timedelta(days=3),
+                    milimetro_induration=milimetros,
+                    resultado='POSITIVO' if milimetros >= 10 else 'NEGATIVO',
+                    usuario_aplicacion=usuario,
+                    usuario_lectura=usuario,
+                ))
+        self._insertar(ExamenPPD, ppd)
+        return examenes
+
+    def _tarjetero(self, examenes, laboratorios, usuario):
+        tarjetas = [
+            LaboratorioTarjetero(
+                paciente_id=examen.paciente_id,
+                examen=examen,
+                fecha_deteccion=examen.fecha_resultado,
+                tipo_muestra='esputo',
+                resultado='Positivo',
+                laboratorio_referencia=self.rng.choice(laboratorios),
+                fecha_notificacion=examen.fecha_resultado,
+                usuario_notificador=usuario,
+            )
+            for examen in examenes
+            if examen.resultado == 'POSITIVO' and self.rng.random() < 0.8
+        ]
+        return self._insertar(LaboratorioTarjetero, tarjetas)
+
+    def _prevencion(self, pacientes, contactos, usuario):
+        quimioprofilaxis = []
+        for contacto in contactos:
+            if self.rng.random() > 0.3:
+                continue
+            inicio = contacto.fecha_registro + timedelta(days=self.rng.randint(1, 30))
+            quimioprofilaxis.append(PrevencionQuimioprofilaxis(
+                tipo_paciente='contacto',
+                contacto=contacto,
+                medicamento='isoniacida',
+                dosis='300 mg',
+                fecha_inicio=inicio,
+                fecha_termino_prevista=inicio + timedelta(days=180),
+                esquema='6H',
+                adherencia_porcentaje=self.rng.randint(40, 100),
+                estado=self.rng.choice(['en_curso', 'en_curso', 'completado', 'abandonado']),
+                usuario_registro=usuario,
+            ))
+        quimioprofilaxis = self._insertar(PrevencionQuimioprofilaxis, quimioprofilaxis)
+
+        vacunas = [
+            PrevencionVacunacionBCG(
+                paciente=paciente,
+                fecha_vacunacion=paciente.fecha_nacimiento,
+                lote=f'L{self.rng.randint(1000, 9999)}',
+                establecimiento=paciente.establecimiento_salud,
+                usuario_registro=usuario,
+            )
+            for paciente in pacientes if self.rng.random() < 0.1
+        ]
+        self._insertar(PrevencionVacunacionBCG, vacunas)
+
+        seguimientos = [
+            PrevencionSeguimiento(
+                tipo_seguimiento='quimioprofilaxis',
+                quimioprofilaxis=qp,
+                fecha_seguimiento=qp.fecha_inicio + timedelta(days=30),
+                resultado='Control sin observaciones',
+                proximo_control=qp.fecha_inicio + timedelta(days=60),
+                usuario_registro=usuario,
+            )
+            for qp in quimioprofilaxis if self.rng.random() < 0.6
+        ]
+        self._insertar(PrevencionSeguimiento, seguimientos)
+
+    # Agregados por establecimiento y laboratorio
+
+    def _indicadores(self, establecimientos, laboratorios, usuario):
+        existentes = set(IndicadoresOperacionales.objects.values_list('establecimiento_id', flat=True))
+        nuevos = [e for e in establecimientos if e.pk not in existentes]
+        meses = [self.hoy.replace(day=1) - relativedelta(months=n) for n in range(6)]
+        cohorte, operacionales, prevencion = [], [], []
+        for establecimiento in nuevos:
+            for n in range(4):
+                trimestre = ((self.hoy.month - 1) // 3 - n) % 4 + 1
+                año = self.hoy.year - (1 if (self.hoy.month - 1) // 3 - n < 0 else 0)
+                casos = self.rng.randint(5, 40)
+                cohorte.append(IndicadoresCohorte(
+                    año=año, trimestre=f'Q{trimestre}', establecimiento=establecimiento,
+                    casos_nuevos=casos, curados=int(casos * 0.8), abandonos=self.rng.randint(0, 3),
+                    fallecidos=self.rng.randint(0, 2),
+                ))
+            for mes in meses:
+                operacionales.append(IndicadoresOperacionales(
+                    establecimiento=establecimiento, periodo=mes,
+                    sintomaticos_respiratorios=self.rng.randint(50, 200),
+                    baciloscopias_realizadas=self.rng.randint(40, 180),
+                    casos_tb_encontrados=self.rng.randint(0, 10),
+                    contactos_identificados=self.rng.randint(10, 60),
+                    contactos_estudiados=self.rng.randint(5, 50),
+                    pacientes_taes=self.rng.randint(5, 30),
+                    pacientes_adherentes=self.rng.randint(3, 25),
+                    tiempo_promedio_diagnostico=self.rng.randint(3, 20),
+                ))
+                prevencion.append(IndicadoresPrevencion(
+                    establecimiento=establecimiento, periodo=mes,
+                    contactos_elegibles_qp=self.rng.randint(5, 40),
+                    contactos_iniciados_qp=self.rng.randint(3, 30),
+                    contactos_completados_qp=self.rng.randint(1, 20),
+                    recien_nacidos=self.rng.randint(20, 80),
+                    recien_nacidos_vacunados=self.rng.randint(18, 80),
+                ))
+        self._insertar(IndicadoresCohorte, cohorte)
+        self._insertar(IndicadoresOperacionales, operacionales)
+        self._insertar(IndicadoresPrevencion, prevencion)
+
+        ahora_alertas = [
+            Alerta(
+                tipo=self.rng.choice(['VENCIMIENTO', 'RESULTADO', 'SEGUIMIENTO']),
+                nivel=self.rng.choice(['BAJA', 'MEDIA', 'ALTA', 'CRITICA']),
+                titulo='Alerta sintética',
+                descripcion='Generada para pruebas de rendimiento',
+                establecimiento=establecimiento,
+                usuario_asignado=usuario,
+                fecha_vencimiento=timezone.now() + timedelta(days=3),
+                datos_relacionados={},
+            )
+            for establecimiento in nuevos for _ in range(3)
+        ]
+        self._insertar(Alerta, ahora_alertas)
+
+        # Los indicadores de laboratorio se calculan desde los exámenes al final de generar()
+        controles = []
+        for laboratorio in laboratorios:
+            for mes in meses:
+                controles.append(LaboratorioControlCalidad(
+                    laboratorio=laboratorio, fecha_control=mes, tipo_control='interno',
+                    resultado=self.rng.choice(['satisfactorio', 'satisfactorio', 'insatisfactorio']),
+                    observaciones='Control sintético', usuario_responsable=usuario,
+                ))
+        self._insertar(LaboratorioControlCalidad, controles)
+
+    def _generar_lote(self, cantidad, establecimientos, laboratorios, usuarios):
+        usuario = usuarios['enfermera']
+        pacientes = self._pacientes(cantidad, establecimientos, usuario)
+        contactos = self._contactos(pacientes)
+        tratamientos = self._tratamientos(pacientes, usuario)
+        self._esquemas_y_dosis(tratamientos, usuario)
+        examenes = self._examenes(pacientes, laboratorios, usuarios['tecnologo'])
+        self._tarjetero(examenes, laboratorios, usuarios['tecnologo'])
+        self._prevencion(pacientes, contactos, usuario)
+
+    def generar(self, progreso=None):
+        """
+        Genera el conjunto completo y retorna la cantidad de filas creadas por
+        modelo. `progreso(generados, total)` se llama al terminar cada lote.
+        """
+        with senales_suspendidas():
+            with transaction.atomic():
+                usuarios = self.usuarios_por_rol()
+                establecimientos = self._establecimientos()
+                laboratorios = self._laboratorios()
+                self._indicadores(establecimientos, laboratorios, usuarios['admin'])
+                # Los indicadores se insertan sin pasar por el calculador: consolidar aquí
+                ConsolidadorIndicadores.consolidar()
+
+            generados = 0
+            while generados < self.total_pacientes:
+                cantidad = min(self.lote, self.total_pacientes - generados)
+                with transaction.atomic():
+                    self._generar_lote(cantidad, establecimientos, laboratorios, usuarios)
+                generados += cantidad
+                if progreso:
+                    progreso(generados, self.total_pacientes)
+            resumen = CalculadorIndicadoresLaboratorio.actualizar(completo=True)
+            self.conteos[LaboratorioIndicadores._meta.label] = resumen['filas']
+        return self.conteos
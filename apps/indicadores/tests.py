@@ -1,3 +1,258 @@
-from django.test import TestCase
+import importlib
+import io
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.indicadores.estadistica import percentil
+from apps.indicadores.management.commands.verificar_consultas import Command as VerificarConsultas, comparar
+from apps.contactos.models import ContactosContacto
+from apps.indicadores.models import (
+    Alerta, Establecimiento, IndicadoresCohorte, IndicadoresOperacionales, IndicadoresPrevencion,
+)
+from apps.indicadores.reglas import MotorReglas, ReglaAlerta, ReglaContactoPendiente, ReglaVencimientoTratamiento
+from apps.indicadores.sinteticos import ROLES, GeneradorDatosSinteticos
+from apps.indicadores.views import NovedadesAlertasView
+from apps.pacientes.models import PacientesPaciente
+from apps.tratamientos.models import Tratamiento
+from apps.usuarios.models import UsuariosUsuario
+
+
+def _fecha_fija(hoy):
+    """Reemplazo de datetime.date cuyo today() retorna `hoy`"""
+    class FechaFija(date):
+        @classmethod
+        def today(cls):
+            return hoy
+    return FechaFija
+
+
+class PercentilTest(SimpleTestCase):
+
+    def test_rango_mas_cercano(self):
+        valores = list(range(100, 0, -1))
+        for p, esperado in ((0, 1), (1, 1), (50, 50), (95, 95), (99, 99), (100, 100)):
+            with self.subTest(p=p):
+                self.assertEqual(percentil(valores, p), esperado)
+        self.assertEqual(percentil([7, 3], 50), 3)
+        self.assertEqual(percentil([7, 3], 51), 7)
+
+    def test_sin_valores(self):
+        self.assertEqual(percentil([], 95), 0)
+
+
+class PresupuestoConsultasTest(TestCase):
+    """Mismo recorrido que `manage.py verificar_consultas`, para que una regresión haga fallar la CI"""
+
+    PACIENTES = 8
+    FACTOR = 4
+    TOLERANCIA = 2
+
+    def test_vistas_dentro_de_presupuesto(self):
+        comando = VerificarConsultas(stdout=io.StringIO(), stderr=io.StringIO())
+        pequeno = comando._medir(self.PACIENTES, 2, 1, ROLES, None)
+        grande = comando._medir(self.PACIENTES * self.FACTOR, 2 * self.FACTOR, 1, ROLES, None)
+
+        self.assertTrue(pequeno)
+        filas, fallas = comparar(pequeno, grande, self.TOLERANCIA)
+        self.assertEqual(fallas, [], 'Vistas fuera de presupuesto:\n' + '\n'.join(fallas))
+
+
+class GeneradorDatosSinteticosTest(TestCase):
+
+    def test_indicadores_de_seis_meses_distintos_en_marzo_a_mayo(self):
+        # Restar 30 días por mes repetía meses entre marzo y mayo y el bulk_create fallaba
+        for hoy in (date(2026, 3, 31), date(2026, 4, 1), date(2026, 5, 15)):
+            with self.subTest(hoy=hoy), mock.patch('apps.indicadores.sinteticos.date', _fecha_fija(hoy)):
+                for modelo in (IndicadoresCohorte, IndicadoresOperacionales, IndicadoresPrevencion):
+                    modelo.objects.all().delete()
+                GeneradorDatosSinteticos(pacientes=2, establecimientos=1, semilla=1).generar()
+
+                periodos = IndicadoresOperacionales.objects.values('establecimiento').annotate(
+                    meses=Count('periodo', distinct=True), filas=Count('id')
+                )
+                for fila in periodos:
+                    self.assertEqual((fila['meses'], fila['filas']), (6, 6))
+                self.assertEqual(
+                    max(IndicadoresOperacionales.objects.values_list('periodo', flat=True)), hoy.replace(day=1)
+                )
+
+
+class MotorReglasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('tens')
+        cls.establecimiento = Establecimiento.objects.create(nombre='CESFAM Norte', codigo='CN')
+        cls.respaldo = Establecimiento.objects.create(nombre='Hospital Base', codigo='HB')
+        cls.hoy = timezone.localdate()
+        cls.paciente = cls._paciente('12345678-5', 'CESFAM Norte')
+        cls.tratamiento = cls._tratamiento(cls.paciente, cls.hoy + timedelta(days=5))
+        # Fuera de la ventana de 7 días
+        cls._tratamiento(cls.paciente, cls.hoy + timedelta(days=30))
+        cls.contacto = cls._contacto(cls.paciente, cls.hoy - timedelta(days=10))
+        # Registrado hace menos de 7 días
+        cls._contacto(cls.paciente, cls.hoy - timedelta(days=2))
+
+    @classmethod
+    def _paciente(cls, rut, establecimiento_salud):
+        return PacientesPaciente.objects.create(
+            rut=rut, nombre=f'Paciente {rut}', fecha_nacimiento=date(1980, 1, 1), sexo='F', domicilio='Calle 1',
+            comuna='Santiago', telefono='912345678', establecimiento_salud=establecimiento_salud,
+            tipo_tbc='pulmonar', usuario_registro=cls.usuario,
+        )
+
+    @classmethod
+    def _tratamiento(cls, paciente, termino):
+        return Tratamiento.objects.create(
+            paciente=paciente, esquema='HRZE', fecha_inicio=termino - timedelta(days=180),
+            fecha_termino_estimada=termino, peso_kg=60, usuario_registro=cls.usuario,
+        )
+
+    @classmethod
+    def _contacto(cls, paciente, fecha_registro):
+        return ContactosContacto.objects.create(
+            paciente_indice=paciente, rut_contacto='11111111-1', nombre_contacto='Contacto', parentesco='hijo_hija',
+            tipo_contacto='intradomiciliario', fecha_registro=fecha_registro, estado_estudio='pendiente',
+        )
+
+    def _evaluar(self):
+        metricas = MotorReglas([ReglaVencimientoTratamiento(), ReglaContactoPendiente()]).evaluar()
+        return {m['regla']: m for m in metricas}
+
+    def test_la_regla_base_es_abstracta(self):
+        with self.assertRaises(TypeError):
+            ReglaAlerta()
+
+    def test_candidatos_por_regla(self):
+        self.assertEqual(
+            list(ReglaVencimientoTratamiento().candidatos(self.hoy).values_list('pk', flat=True)), [self.tratamiento.pk]
+        )
+        self.assertEqual(
+            list(ReglaContactoPendiente().candidatos(self.hoy).values_list('pk', flat=True)), [self.contacto.pk]
+        )
+
+    def test_crea_alertas_con_regla_clave_y_establecimiento(self):
+        metricas = self._evaluar()
+
+        self.assertEqual(metricas['vencimiento_tratamiento']['creadas'], 1)
+        self.assertEqual(metricas['contacto_pendiente']['creadas'], 1)
+        alerta = Alerta.objects.get(datos_relacionados__regla='vencimiento_tratamiento')
+        self.assertEqual(alerta.datos_relacionados['clave'], str(self.tratamiento.pk))
+        self.assertEqual(alerta.establecimiento, self.establecimiento)
+        self.assertEqual(alerta.usuario_asignado, self.usuario)
+
+    def test_no_duplica_alertas_en_evaluaciones_sucesivas(self):
+        self._evaluar()
+        metricas = self._evaluar()
+
+        self.assertEqual(metricas['vencimiento_tratamiento']['creadas'], 0)
+        self.assertEqual(metricas['contacto_pendiente']['creadas'], 0)
+        self.assertEqual(Alerta.objects.count(), 2)
+
+    def test_no_duplica_alertas_del_generador_anterior(self):
+        # Forma de datos_relacionados de GeneradorAlertas.verificar_alertas_* antes del motor
+        Alerta.objects.create(
+            tipo='VENCIMIENTO', nivel='MEDIA', titulo='t', descripcion='d', establecimiento=self.establecimiento,
+            fecha_vencimiento=timezone.now(),
+            datos_relacionados={'paciente_id': self.paciente.pk, 'tratamiento_id': self.tratamiento.pk,
+                                'tipo_objeto': 'tratamiento'},
+        )
+        Alerta.objects.create(
+            tipo='SEGUIMIENTO', nivel='BAJA', titulo='t', descripcion='d', establecimiento=self.establecimiento,
+            fecha_vencimiento=timezone.now(),
+            datos_relacionados={'contacto_id': self.contacto.pk, 'tipo_objeto': 'contacto'},
+        )
+        migracion = importlib.import_module('apps.indicadores.migrations.0005_alertas_clave_regla')
+        migracion.asignar_regla_y_clave(django_apps, None)
+
+        metricas = self._evaluar()
+
+        self.assertEqual(metricas['vencimiento_tratamiento']['creadas'], 0)
+        self.assertEqual(metricas['contacto_pendiente']['creadas'], 0)
+
+    def test_omite_filas_sin_establecimiento_coincidente(self):
+        otro = self._paciente('1234567-4', 'Posta Rural')
+        self._tratamiento(otro, self.hoy + timedelta(days=3))
+
+        with self.assertLogs('apps.indicadores.reglas', 'WARNING'):
+            metricas = self._evaluar()
+
+        self.assertEqual(metricas['vencimiento_tratamiento']['creadas'], 1)
+        self.assertEqual(metricas['vencimiento_tratamiento']['sin_establecimiento'], 1)
+        self.assertFalse(Alerta.objects.filter(datos_relacionados__paciente_id=otro.pk).exists())
+
+    @override_settings(ALERTAS_ESTABLECIMIENTO_POR_DEFECTO='HB')
+    def test_usa_el_establecimiento_configurado_sin_coincidencia(self):
+        otro = self._paciente('1234567-4', 'Posta Rural')
+        self._tratamiento(otro, self.hoy + timedelta(days=3))
+
+        metricas = self._evaluar()
+
+        self.assertEqual(metricas['vencimiento_tratamiento']['creadas'], 2)
+        self.assertEqual(metricas['vencimiento_tratamiento']['sin_establecimiento'], 0)
+        alerta = Alerta.objects.get(datos_relacionados__paciente_id=otro.pk)
+        self.assertEqual(alerta.establecimiento, self.respaldo)
+
+
+class NovedadesAlertasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('enfermera')
+        UsuariosUsuario.objects.update_or_create(
+            user=cls.usuario, defaults={'rut': '12345678-5', 'rol': 'enfermera', 'establecimiento': 'CESFAM'}
+        )
+        otro = User.objects.create_user('otro')
+        cls.establecimiento = Establecimiento.objects.create(nombre='CESFAM Norte', codigo='CN')
+        cls.desde = timezone.now() - timedelta(minutes=1)
+        cls.alertas = [
+            Alerta.objects.create(
+                tipo='SEGUIMIENTO', nivel='BAJA', titulo=f'Alerta {n}', descripcion='d',
+                establecimiento=cls.establecimiento, fecha_vencimiento=timezone.now(),
+            )
+            for n in range(5)
+        ]
+        # Asignada a otro usuario: la enfermera no debe verla
+        Alerta.objects.create(
+            tipo='SEGUIMIENTO', nivel='BAJA', titulo='Ajena', descripcion='d', establecimiento=cls.establecimiento,
+            fecha_vencimiento=timezone.now(), usuario_asignado=otro,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _consultar(self, desde):
+        return self.client.get(reverse('indicadores:novedades_alertas'), {'desde': desde.isoformat()}).json()
+
+    @mock.patch.object(NovedadesAlertasView, 'MAX_EVENTOS', 2)
+    def test_pagina_con_el_cursor_sin_perder_eventos(self):
+        recibidas, desde, paginas = [], self.desde, 0
+        while True:
+            respuesta = self._consultar(desde)
+            paginas += 1
+            recibidas += [evento['id'] for evento in respuesta['eventos']]
+            desde = timezone.datetime.fromisoformat(respuesta['desde'])
+            if not respuesta['hay_mas']:
+                break
+
+        self.assertEqual(paginas, 3)
+        self.assertEqual(recibidas, [alerta.pk for alerta in self.alertas])
+        self.assertEqual(self._consultar(desde)['eventos'], [])
+
+    def test_alerta_resuelta_se_informa_al_resolverse(self):
+        alerta = self.alertas[0]
+        alerta.resuelta = True
+        alerta.fecha_resolucion = timezone.now()
+        alerta.save()
+
+        respuesta = self._consultar(self.alertas[-1].fecha_creacion)
+
+        self.assertEqual([(e['id'], e['evento']) for e in respuesta['eventos']], [(alerta.pk, 'resuelta')])
+        self.assertFalse(respuesta['hay_mas'])
@@ -0,0 +1,172 @@
+# tiempos_respuesta.py - Tiempos de respuesta (TAT) de los exámenes bacteriológicos
+import bisect
+import math
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db.models import Avg, DurationField, ExpressionWrapper, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from dateutil.relativedelta import relativedelta
+
+from apps.examenes.models import ExamenesExamenbacteriologico
+
+# (clave, fecha inicial, fecha final, nombre) de cada tramo del circuito del examen
+TRAMOS = [
+    ('toma', 'fecha_solicitud', 'fecha_toma_muestra', 'Solicitud → toma de muestra'),
+    ('ingreso', 'fecha_toma_muestra', 'fecha_ingreso_laboratorio', 'Toma → ingreso al laboratorio'),
+    ('resultado', 'fecha_ingreso_laboratorio', 'fecha_resultado', 'Ingreso → resultado'),
+    ('total', 'fecha_solicitud', 'fecha_resultado', 'Solicitud → resultado'),
+]
+# Límite superior (excluido) de cada intervalo del histograma, en días; el último queda abierto
+LIMITES_DIAS = (1, 2, 3, 5, 7, 10, 14, 21, 30, 45, 60)
+
+
+def _etiquetas():
+    etiquetas, inicio = [], 0
+    for limite in LIMITES_DIAS:
+        etiquetas.append(str(inicio) if limite - inicio == 1 else f'{inicio}-{limite - 1}')
+        inicio = limite
+    return etiquetas + [f'{inicio}+']
+
+
+ETIQUETAS = _etiquetas()
+
+
+class AnaliticaTiemposRespuesta:
+    """
+    Distribución de los tiempos de cada tramo (TRAMOS) de los exámenes
+    solicitados en un mes, global y por tipo de examen, laboratorio y tipo y
+    laboratorio: cantidad, promedio, p50/p90/p99 e histograma de intervalos
+    fijos (LIMITES_DIAS).
+
+    Las fechas son días completos, así que cada grupo acumula la frecuencia
+    de cada duración (Counter) en una sola pasada por las filas de una
+    consulta; los percentiles (rango más cercano, como AnaliticaAlertas) y el
+    histograma salen exactos de esas frecuencias sin ordenar las filas. El
+    resultado se guarda en caché por mes: los meses cerrados por más tiempo.
+    """
+
+    PERCENTILES = (50, 90, 99)
+    CHUNK_SIZE = 5000
+    CACHE_TIMEOUT = 300
+    CACHE_TIMEOUT_CERRADO = 60 * 60 * 24
+    SIN_LABORATORIO = 'Sin laboratorio'
+
+    @staticmethod
+    def _clave(periodo):
+        return f'indicadores:tiempos_respuesta:{periodo:%Y-%m}'
+
+    @staticmethod
+    def _estadisticas(frecuencias):
+        """Cantidad, promedio, percentiles e histograma desde {días: cantidad}"""
+        n = sum(frecuencias.values())
+        datos = {'n': n, 'promedio_dias': 0, 'histograma': [0] * len(ETIQUETAS)}
+        datos.update({f'p{p}': 0 for p in AnaliticaTiemposRespuesta.PERCENTILES})
+        if not n:
+            return datos
+        datos['promedio_dias'] = round(sum(dias * cantidad for dias, cantidad in frecuencias.items()) / n, 1)
+        rangos = [(p, math.ceil(n * p / 100)) for p in AnaliticaTiemposRespuesta.PERCENTILES]
+        acumulado = 0
+        for dias in sorted(frecuencias):
+            cantidad = frecuencias[dias]
+            datos['histograma'][bisect.bisect_right(LIMITES_DIAS, dias)] += cantidad
+            acumulado += cantidad
+            while rangos and rangos[0][1] <= acumulado:
+                datos[f'p{rangos.pop(0)[0]}'] = dias
+        return datos
+
+    @staticmethod
+    def calcular(periodo):
+        """Analítica de los exámenes solicitados en el mes de `periodo` (una consulta)"""
+        desde = periodo.replace(day=1)
+        hasta = desde + relativedelta(months=1)
+        campos = sorted({campo for _, inicio, fin, _ in TRAMOS for campo in (inicio, fin)})
+        filas = ExamenesExamenbacteriologico.objects.filter(
+            fecha_solicitud__gte=desde, fecha_solicitud__lt=hasta
+        ).exclude(estado_examen='CANCELADO').values_list(
+            'tipo_examen', 'laboratorio_red_id', 'laboratorio_red__nombre', *campos
+        ).order_by()
+
+        # grupo -> tramo -> {días: cantidad}
+        frecuencias = defaultdict(lambda: defaultdict(Counter))
+        laboratorios = {None: AnaliticaTiemposRespuesta.SIN_LABORATORIO}
+        inconsistentes = Counter()
+        total = 0
+        for tipo, laboratorio_id, nombre_laboratorio, *fechas in filas.iterator(chunk_size=AnaliticaTiemposRespuesta.CHUNK_SIZE):
+            total += 1
+            fechas = dict(zip(campos, fechas))
+            if laboratorio_id is not None:
+                laboratorios[laboratorio_id] = nombre_laboratorio
+            grupos = [None, ('tipo', tipo), ('laboratorio', laboratorio_id), ('tipo_laboratorio', tipo, laboratorio_id)]
+            for clave, inicio, fin, _ in TRAMOS:
+                if fechas[inicio] is None or fechas[fin] is None:
+                    continue
+                dias = (fechas[fin] - fechas[inicio]).days
+                if dias < 0:
+                    inconsistentes[clave] += 1
+                    continue
+                for grupo in grupos:
+                    frecuencias[grupo][clave][dias] += 1
+
+        def tramos(grupo):
+            return {clave: AnaliticaTiemposRespuesta._estadisticas(frecuencias[grupo][clave]) for clave, *_ in TRAMOS}
+
+        tipos = dict(ExamenesExamenbacteriologico.TIPO_EXAMEN_CHOICES)
+        grupos = sorted((g for g in frecuencias if g is not None), key=lambda g: tuple(str(v) for v in g))
+        return {
+            'periodo': f'{desde:%Y-%m}',
+            'examenes': total,
+            'tramos': [{'clave': clave, 'nombre': nombre} for clave, _, _, nombre in TRAMOS],
+            'percentiles': list(AnaliticaTiemposRespuesta.PERCENTILES),
+            'intervalos': ETIQUETAS,
+            'inconsistentes': dict(inconsistentes),
+            'global': tramos(None),
+            'por_tipo': [
+                {'tipo_examen': g[1], 'nombre': tipos.get(g[1], g[1]), 'tramos': tramos(g)}
+                for g in grupos if g[0] == 'tipo'
+            ],
+            'por_laboratorio': [
+                {'laboratorio_id': g[1], 'nombre': laboratorios[g[1]], 'tramos': tramos(g)}
+                for g in grupos if g[0] == 'laboratorio'
+            ],
+            'por_tipo_laboratorio': [
+                {'tipo_examen': g[1], 'laboratorio_id': g[2], 'nombre': f'{tipos.get(g[1], g[1])} - {laboratorios[g[2]]}',
+                 'tramos': tramos(g)}
+                for g in grupos if g[0] == 'tipo_laboratorio'
+            ],
+        }
+
+    @staticmethod
+    def obtener(periodo=None):
+        """Versión en caché de calcular() para los dashboards (mes actual por defecto)"""
+        hoy = timezone.localdate()
+        periodo = (periodo or hoy).replace(day=1)
+        cerrado = periodo < hoy.replace(day=1)
+        return cache.get_or_set(
+            AnaliticaTiemposRespuesta._clave(periodo),
+            lambda: AnaliticaTiemposRespuesta.calcular(periodo),
+            AnaliticaTiemposRespuesta.CACHE_TIMEOUT_CERRADO if cerrado else AnaliticaTiemposRespuesta.CACHE_TIMEOUT,
+        )
+
+    @staticmethod
+    def horas_diagnostico(desde, hasta, establecimiento=None):
+        """
+        Promedio en horas de solicitud -> resultado por (nombre del
+        establecimiento del paciente, mes de solicitud) en una consulta
+        agrupada; alimenta IndicadoresOperacionales.tiempo_promedio_diagnostico.
+        """
+        examenes = ExamenesExamenbacteriologico.objects.filter(
+            fecha_solicitud__gte=desde, fecha_solicitud__lt=hasta, fecha_resultado__isnull=False,
+            fecha_resultado__gte=F('fecha_solicitud'),
+        ).exclude(resultado='PENDIENTE').exclude(estado_examen='CANCELADO')
+        if establecimiento is not None:
+            examenes = examenes.filter(paciente__establecimiento_salud=establecimiento.nombre)
+        filas = examenes.values('paciente__establecimiento_salud', mes=TruncMonth('fecha_solicitud')).annotate(
+            promedio=Avg(ExpressionWrapper(F('fecha_resultado') - F('fecha_solicitud'), output_field=DurationField())),
+        ).order_by()
+        return {
+            (fila['paciente__establecimiento_salud'], fila['mes']): round(fila['promedio'].total_seconds() / 3600)
+            for fila in filas
+            if fila['promedio'] is not None
+        }
@@ -5,6 +5,9 @@ app_name = 'indicadores'
 
 urlpatterns = [
     path('dashboard/', views.DashboardPrincipalView.as_view(), name='dashboard'),
+    path('series/', views.SeriesIndicadoresView.as_view(), name='series_indicadores'),
+    path('consolidado/', views.ConsolidadoIndicadoresView.as_view(), name='consolidado_indicadores'),
+    path('tiempos-respuesta/', views.TiemposRespuestaView.as_view(), name='tiempos_respuesta'),
     path('cohorte/', views.IndicadoresCohorteView.as_view(), name='indicadores_cohorte'),
     path('operacionales/', views.IndicadoresOperacionalesView.as_view(), name='indicadores_operacionales'),
     path('prevencion/', views.IndicadoresPrevencionView.as_view(), name='indicadores_prevencion'),
@@ -15,5 +18,7 @@ urlpatterns = [
     path('actualizar-indicadores/', views.ActualizarIndicadoresView.as_view(), name='actualizar_indicadores'),
     path('alertas/<int:alerta_id>/resolver/', views.ResolverAlertaView.as_view(), name='resolver_alerta'),
     path('alertas/crear/', views.CrearAlertaView.as_view(), name='crear_alerta'),
+    path('alertas/stream/', views.StreamAlertasView.as_view(), name='stream_alertas'),
+    path('alertas/novedades/', views.NovedadesAlertasView.as_view(), name='novedades_alertas'),
     path('alertas/<int:alerta_id>/eliminar/', views.EliminarAlertaView.as_view(), name='eliminar_alerta'),
 ]
\ No newline at end of file
@@ -1,10 +1,15 @@
 from django.views.generic import TemplateView, ListView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.db.models import Count, Avg, Sum, Q
+from django.core.cache import cache
+from django.db.models import Count, Avg, Sum, Q, F
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
-from django.shortcuts import get_object_or_404
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse, Http404
+from django.shortcuts import get_object_or_404, aget_object_or_404
+from django.utils.dateparse import parse_date, parse_datetime
 from datetime import timedelta, datetime
+from asgiref.sync import sync_to_async
+import asyncio
 import json
 import csv
 
@@ -14,21 +19,89 @@ from .models import (
     IndicadoresPrevencion,
     Alerta,
     Establecimiento,
-    ReportePersonalizado
+    ReportePersonalizado,
+    ConsolidadoIndicador,
+)
+from .eventos import alertas_visibles, canal_alertas, serializar_alerta
+from .tiempos_respuesta import AnaliticaTiemposRespuesta
+from .services import (
+    CalculadorIndicadores, GeneradorAlertas, AnaliticaAlertas, SeriesIndicadores, ConsolidadorIndicadores
 )
-from .services import CalculadorIndicadores, GeneradorAlertas
 from apps.pacientes.models import PacientesPaciente
 from apps.tratamientos.models import Tratamiento
 from apps.contactos.models import ContactosContacto
 
+# Segundos entre evaluaciones de reglas disparadas al abrir la lista de alertas
+INTERVALO_EVALUACION_REGLAS = 300
+CLAVE_REGLAS_EVALUADAS = 'indicadores:reglas_evaluadas'
+
+# Segundos entre recálculos de indicadores disparados al abrir el dashboard o la cohorte
+INTERVALO_CALCULO_INDICADORES = 300
+CLAVE_INDICADORES_CALCULADOS = 'indicadores:indicadores_calculados'
+
+# Etiquetas de las tasas de TasasMixin para los filtros de las listas
+ETIQUETAS_TASAS = {
+    'exito_tratamiento_porcentaje': 'Éxito de tratamiento',
+    'tasa_abandono': 'Abandono',
+    'tasa_fallecimiento': 'Fallecimiento',
+    'indice_pesquisa': 'Índice de pesquisa',
+    'cobertura_estudio_contactos': 'Cobertura de contactos',
+    'adherencia_taes': 'Adherencia TAES',
+    'cobertura_quimioprofilaxis': 'Cobertura QP',
+    'adherencia_quimioprofilaxis': 'Adherencia QP',
+    'cobertura_vacunacion_bcg': 'Cobertura BCG',
+}
+
+
+class OrdenTasasMixin:
+    """
+    Orden y filtro por tasa en la base de datos para listas de modelos con
+    TasasQuerySet. Parámetros GET: orden=[-]<campo o tasa>, tasa=<nombre>,
+    tasa_desde y tasa_hasta (porcentajes).
+    """
+    orden_por_defecto = ['-periodo']
+    campos_orden = ['periodo', 'establecimiento__nombre']
+
+    def ordenar_y_filtrar(self, queryset):
+        queryset = queryset.select_related('establecimiento').con_tasas()
+        tasas = self.model.TASAS
+
+        tasa = self.request.GET.get('tasa')
+        if tasa in tasas:
+            for parametro, lookup in (('tasa_desde', 'gte'), ('tasa_hasta', 'lte')):
+                try:
+                    valor = float(self.request.GET.get(parametro, ''))
+                except ValueError:
+                    continue
+                queryset = queryset.filter(**{f'_{tasa}__{lookup}': valor})
+
+        orden = self.request.GET.get('orden', '')
+        campo = orden.lstrip('-')
+        signo = '-' if orden.startswith('-') else ''
+        if campo in tasas:
+            return queryset.order_by(f'{signo}_{campo}', *self.orden_por_defecto)
+        if campo in self.campos_orden:
+            return queryset.order_by(f'{signo}{campo}', *self.orden_por_defecto)
+        return queryset.order_by(*self.orden_por_defecto)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['tasas_disponibles'] = [(nombre, ETIQUETAS_TASAS.get(nombre, nombre)) for nombre in self.model.TASAS]
+        context['filtro_tasas'] = {
+            clave: self.request.GET.get(clave, '') for clave in ('orden', 'tasa', 'tasa_desde', 'tasa_hasta')
+        }
+        return context
+
 # Mixins de permisos para el módulo de indicadores
 class PermisoIndicadoresMixin(UserPassesTestMixin):
+    roles_permitidos = ['medico', 'enfermera', 'tecnologo', 'admin']
+
     def test_func(self):
         user = self.request.user
         if user.is_superuser:
             return True
         if hasattr(user, 'usuariosusuario'):
-            return user.usuariosusuario.rol in ['medico', 'enfermera', 'tecnologo', 'admin']
+            return user.usuariosusuario.rol in self.roles_permitidos
         return False
 
     def handle_no_permission(self):
@@ -103,7 +176,7 @@ class PermisoAdministradorMixin(UserPassesTestMixin):
         if user.is_superuser:
             return True
         if hasattr(user, 'usuariosusuario'):
-            return user.usuariosusuario.rol == 'admin' or getattr(user.usuariosusuario, 'es_administrador', False)
+            return user.usuariosusuario.es_administrador()
         return False
 
     def handle_no_permission(self):
@@ -120,9 +193,10 @@ class DashboardPrincipalView(PermisoIndicadoresMixin, LoginRequiredMixin, Templa
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Calcular indicadores actuales si no existen
+        # Recalcular indicadores actuales como máximo una vez por intervalo
         try:
-            CalculadorIndicadores.calcular_todos_indicadores()
+            if cache.add(CLAVE_INDICADORES_CALCULADOS, True, INTERVALO_CALCULO_INDICADORES):
+                CalculadorIndicadores.calcular_todos_indicadores()
         except Exception as e:
             print(f"Error calculando indicadores: {e}")
         
@@ -147,52 +221,18 @@ class DashboardPrincipalView(PermisoIndicadoresMixin, LoginRequiredMixin, Templa
                 region="Región Principal"
             )
 
-        # Obtener datos para gráficos
-        indicadores = IndicadoresCohorte.objects.filter(
-            establecimiento=establecimiento
-        ).order_by('año', 'trimestre')[:8]
-
-        trimestres = []
-        tasas_exito = []
-        tasas_abandono = []
-
-        for ind in indicadores:
-            trimestres.append(f"{ind.año}-{ind.get_trimestre_display()}")
-            tasas_exito.append(float(ind.exito_tratamiento_porcentaje))
-            tasas_abandono.append(float(ind.tasa_abandono))
-
-        # Si no hay datos, crear algunos de ejemplo basados en datos reales
-        if not trimestres:
-            # Usar datos reales para crear indicadores de ejemplo
-            hoy = timezone.now()
-            año_actual = hoy.year
-            trimestre_actual = 'Q' + str((hoy.month - 1) // 3 + 1)
-            
-            # Calcular métricas reales para el ejemplo
-            pacientes_total = PacientesPaciente.objects.count()
-            pacientes_egresados = PacientesPaciente.objects.filter(estado='egresado').count()
-            pacientes_abandono = PacientesPaciente.objects.filter(estado='abandono').count()
-            
-            exito_ejemplo = round((pacientes_egresados / pacientes_total * 100), 1) if pacientes_total > 0 else 85.0
-            abandono_ejemplo = round((pacientes_abandono / pacientes_total * 100), 1) if pacientes_total > 0 else 3.5
-            
-            trimestres = [f'{año_actual}-Q1', f'{año_actual}-Q2', f'{año_actual}-Q3', f'{año_actual}-Q4']
-            tasas_exito = [exito_ejemplo - 2, exito_ejemplo - 1, exito_ejemplo, exito_ejemplo + 1]
-            tasas_abandono = [abandono_ejemplo + 1, abandono_ejemplo, abandono_ejemplo - 0.5, abandono_ejemplo]
-
-        # Calcular éxito y abandono actual
-        ultimo_trimestre = IndicadoresCohorte.objects.filter(
-            establecimiento=establecimiento
-        ).order_by('-año', '-trimestre').first()
-        
-        exito_actual = ultimo_trimestre.exito_tratamiento_porcentaje if ultimo_trimestre else tasas_exito[-1] if tasas_exito else 85.2
-        abandono_actual = ultimo_trimestre.tasa_abandono if ultimo_trimestre else tasas_abandono[-1] if tasas_abandono else 3.8
+        # Serie trimestral de los últimos dos años; el gráfico la pide de nuevo a
+        # SeriesIndicadoresView al cambiar de granularidad
+        hasta = timezone.localdate()
+        serie = SeriesIndicadores.obtener('cohorte', 'trimestre', hasta.replace(year=hasta.year - 2, month=1, day=1), hasta)
+        datasets = {d['clave']: d['data'] for d in serie['data']['datasets']}
+
+        # Último trimestre con datos; None si aún no hay indicadores calculados
+        exito_actual = next((v for v in reversed(datasets['exito_tratamiento_porcentaje']) if v is not None), None)
+        abandono_actual = next((v for v in reversed(datasets['tasa_abandono']) if v is not None), None)
 
         context.update({
-            'trimestres': json.dumps(trimestres),
-            'tasas_exito': json.dumps(tasas_exito),
-            'tasas_abandono': json.dumps(tasas_abandono),
-            'indicadores_cohorte': indicadores,
+            'serie_cohorte': serie,
             'total_pacientes': total_pacientes,
             'pacientes_activos': pacientes_activos,
             'tratamientos_activos': tratamientos_activos,
@@ -208,17 +248,20 @@ class DashboardPrincipalView(PermisoIndicadoresMixin, LoginRequiredMixin, Templa
 
         return context
 
-class IndicadoresCohorteView(PermisoCohorteMixin, LoginRequiredMixin, ListView):
+class IndicadoresCohorteView(PermisoCohorteMixin, LoginRequiredMixin, OrdenTasasMixin, ListView):
     """Vista para listar indicadores de cohorte"""
     model = IndicadoresCohorte
     template_name = 'indicadores/indicadores_cohorte.html'
     context_object_name = 'indicadores'
     paginate_by = 10
+    orden_por_defecto = ['-año', '-trimestre', 'establecimiento__nombre']
+    campos_orden = ['año', 'trimestre', 'establecimiento__nombre']
 
     def get_queryset(self):
-        # Calcular indicadores actuales antes de mostrar
+        # Recalcular indicadores actuales como máximo una vez por intervalo
         try:
-            CalculadorIndicadores.calcular_todos_indicadores()
+            if cache.add(CLAVE_INDICADORES_CALCULADOS, True, INTERVALO_CALCULO_INDICADORES):
+                CalculadorIndicadores.calcular_todos_indicadores()
         except Exception as e:
             print(f"Error calculando indicadores: {e}")
         
@@ -234,7 +277,7 @@ class IndicadoresCohorteView(PermisoCohorteMixin, LoginRequiredMixin, ListView):
         if trimestre and trimestre != 'all':
             queryset = queryset.filter(trimestre=trimestre)
             
-        return queryset.order_by('-año', '-trimestre')
+        return self.ordenar_y_filtrar(queryset)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -243,7 +286,7 @@ class IndicadoresCohorteView(PermisoCohorteMixin, LoginRequiredMixin, ListView):
         context['años'] = años
         return context
 
-class IndicadoresOperacionalesView(PermisoOperacionalesMixin, LoginRequiredMixin, ListView):
+class IndicadoresOperacionalesView(PermisoOperacionalesMixin, LoginRequiredMixin, OrdenTasasMixin, ListView):
     """Vista para indicadores operacionales"""
     model = IndicadoresOperacionales
     template_name = 'indicadores/indicadores_operacionales.html'
@@ -263,7 +306,7 @@ class IndicadoresOperacionalesView(PermisoOperacionalesMixin, LoginRequiredMixin
         if mes and mes != 'all':
             queryset = queryset.filter(periodo__month=int(mes))
             
-        return queryset.order_by('-periodo')
+        return self.ordenar_y_filtrar(queryset)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -272,7 +315,7 @@ class IndicadoresOperacionalesView(PermisoOperacionalesMixin, LoginRequiredMixin
         context['años'] = [date.year for date in años]
         return context
 
-class IndicadoresPrevencionView(PermisoPrevencionMixin, LoginRequiredMixin, ListView):
+class IndicadoresPrevencionView(PermisoPrevencionMixin, LoginRequiredMixin, OrdenTasasMixin, ListView):
     """Vista para indicadores de prevención"""
     model = IndicadoresPrevencion
     template_name = 'indicadores/indicadores_prevencion.html'
@@ -292,7 +335,7 @@ class IndicadoresPrevencionView(PermisoPrevencionMixin, LoginRequiredMixin, List
         if mes and mes != 'all':
             queryset = queryset.filter(periodo__month=int(mes))
             
-        return queryset.order_by('-periodo')
+        return self.ordenar_y_filtrar(queryset)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -343,50 +386,46 @@ class AlertasView(PermisoIndicadoresMixin, LoginRequiredMixin, ListView):
         if establecimiento_id and establecimiento_id != 'all':
             queryset = queryset.filter(establecimiento_id=establecimiento_id)
             
-        return queryset.order_by('-fecha_creacion')
+        return queryset.select_related('establecimiento', 'usuario_asignado').order_by('-fecha_creacion')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Generar alertas antes de mostrar
+        # Generar alertas como máximo una vez por intervalo; las novedades
+        # llegan al navegador por StreamAlertasView sin recargar la página
         try:
-            GeneradorAlertas.verificar_alertas_vencimientos()
-            GeneradorAlertas.verificar_alertas_estudio_contactos()
+            if cache.add(CLAVE_REGLAS_EVALUADAS, True, INTERVALO_EVALUACION_REGLAS):
+                GeneradorAlertas.evaluar_reglas()
         except Exception as e:
             print(f"Error generando alertas: {e}")
 
-        # Estadísticas para el dashboard de alertas
-        alertas = Alerta.objects.all()
-
-        context.update({
-            'alertas_criticas': alertas.filter(nivel='CRITICA', resuelta=False).count(),
-            'alertas_altas': alertas.filter(nivel='ALTA', resuelta=False).count(),
-            'alertas_pendientes': alertas.filter(resuelta=False).count(),
-            'alertas_resueltas_7d': alertas.filter(
+        # Estadísticas para el dashboard de alertas en una sola consulta
+        pendientes = Q(resuelta=False)
+        estadisticas = Alerta.objects.aggregate(
+            alertas_criticas=Count('id', filter=pendientes & Q(nivel='CRITICA')),
+            alertas_altas=Count('id', filter=pendientes & Q(nivel='ALTA')),
+            alertas_pendientes=Count('id', filter=pendientes),
+            alertas_resueltas_7d=Count('id', filter=Q(
                 resuelta=True,
                 fecha_resolucion__gte=timezone.now() - timedelta(days=7)
-            ).count(),
+            )),
+        )
+        sla = AnaliticaAlertas.obtener()
+
+        context.update(estadisticas)
+        context.update({
             'establecimientos': Establecimiento.objects.all(),
             'usuarios': self.request.user.__class__.objects.filter(is_active=True),
-            'tiempo_promedio_resolucion': self._calcular_tiempo_promedio_resolucion()
+            'tiempo_promedio_resolucion': sla['promedio_dias'],
+            'sla_alertas': sla,
+            'sla_grupos': [
+                ('Por nivel', sla['por_nivel']),
+                ('Por tipo', sla['por_tipo']),
+                ('Por establecimiento', sla['por_establecimiento']),
+            ],
         })
         return context
 
-    def _calcular_tiempo_promedio_resolucion(self):
-        """Calcula el tiempo promedio de resolución de alertas"""
-        alertas_resueltas = Alerta.objects.filter(
-            resuelta=True,
-            fecha_resolucion__isnull=False
-        )
-        if alertas_resueltas.exists():
-            total_dias = 0
-            for alerta in alertas_resueltas:
-                if alerta.fecha_resolucion and alerta.fecha_creacion:
-                    dias = (alerta.fecha_resolucion.date() - alerta.fecha_creacion.date()).days
-                    total_dias += dias
-            return round(total_dias / alertas_resueltas.count(), 1)
-        return 0
-
 class ReportesView(PermisoReportesMixin, LoginRequiredMixin, TemplateView):
     """Vista para reportes gerenciales"""
     template_name = 'indicadores/reportes_gerenciales.html'
@@ -426,21 +465,18 @@ class GenerarReporteCohorteView(PermisoReportesMixin, LoginRequiredMixin, View):
         queryset = IndicadoresCohorte.objects.filter(año=año)
         if trimestre != 'all':
             queryset = queryset.filter(trimestre=trimestre)
-            
-        for indicador in queryset:
-            writer.writerow([
-                indicador.año,
-                indicador.get_trimestre_display(),
-                indicador.establecimiento.nombre,
-                indicador.casos_nuevos,
-                indicador.casos_retratamiento,
-                indicador.total_casos,
-                indicador.curados,
-                indicador.abandonos,
-                indicador.fallecidos,
-                indicador.exito_tratamiento_porcentaje,
-                indicador.tasa_abandono
-            ])
+
+        # Tasas y nombre del establecimiento resueltos en la misma consulta
+        trimestres = dict(IndicadoresCohorte.ESTADOS_COHORTE)
+        filas = queryset.con_tasas().annotate(
+            _total_casos=F('casos_nuevos') + F('casos_retratamiento'),
+        ).order_by('trimestre', 'establecimiento__nombre').values_list(
+            'año', 'trimestre', 'establecimiento__nombre', 'casos_nuevos', 'casos_retratamiento',
+            '_total_casos', 'curados', 'abandonos', 'fallecidos',
+            '_exito_tratamiento_porcentaje', '_tasa_abandono',
+        )
+        for fila in filas:
+            writer.writerow([fila[0], trimestres.get(fila[1], fila[1]), *fila[2:]])
         
         return response
 
@@ -464,65 +500,80 @@ class GenerarReporteOperacionalView(PermisoReportesMixin, LoginRequiredMixin, Vi
         queryset = IndicadoresOperacionales.objects.filter(periodo__year=año)
         if mes != 'all':
             queryset = queryset.filter(periodo__month=mes)
-            
-        for indicador in queryset:
-            writer.writerow([
-                indicador.periodo.strftime("%Y-%m"),
-                indicador.establecimiento.nombre,
-                indicador.sintomaticos_respiratorios,
-                indicador.baciloscopias_realizadas,
-                indicador.casos_tb_encontrados,
-                indicador.contactos_identificados,
-                indicador.contactos_estudiados,
-                indicador.pacientes_taes,
-                indicador.pacientes_adherentes,
-                indicador.indice_pesquisa,
-                indicador.cobertura_estudio_contactos,
-                indicador.adherencia_taes
-            ])
+
+        filas = queryset.con_tasas().order_by('periodo', 'establecimiento__nombre').values_list(
+            'periodo', 'establecimiento__nombre', 'sintomaticos_respiratorios', 'baciloscopias_realizadas',
+            'casos_tb_encontrados', 'contactos_identificados', 'contactos_estudiados',
+            'pacientes_taes', 'pacientes_adherentes',
+            '_indice_pesquisa', '_cobertura_estudio_contactos', '_adherencia_taes',
+        )
+        for periodo, *resto in filas:
+            writer.writerow([periodo.strftime("%Y-%m"), *resto])
         
         return response
 
-class ActualizarIndicadoresView(PermisoAdministradorMixin, LoginRequiredMixin, View):
+class AccesoAsincronoMixin:
+    """
+    Control de acceso para vistas con manejadores async.
+
+    LoginRequiredMixin y UserPassesTestMixin leen request.user de forma
+    síncrona, lo que no está permitido dentro del event loop; aquí se usa
+    request.auser() y se responde JSON, ya que estas vistas son AJAX.
+    """
+    roles_permitidos = None  # None: cualquier usuario autenticado
+    mensaje_sin_permiso = "No tiene permisos para esta acción"
+
+    async def dispatch(self, request, *args, **kwargs):
+        from apps.usuarios.models import UsuariosUsuario
+
+        self.usuario = await request.auser()
+        if not self.usuario.is_authenticated:
+            return JsonResponse({'error': 'Debe iniciar sesión'}, status=401)
+
+        self.rol = await UsuariosUsuario.objects.filter(
+            user_id=self.usuario.pk
+        ).values_list('rol', flat=True).afirst()
+        self.es_administrador = self.usuario.is_superuser or self.rol == 'admin'
+
+        if self.roles_permitidos is not None and not (self.usuario.is_superuser or self.rol in self.roles_permitidos):
+            return JsonResponse({'error': self.mensaje_sin_permiso}, status=403)
+        return await super().dispatch(request, *args, **kwargs)
+
+class ActualizarIndicadoresView(AccesoAsincronoMixin, View):
     """Vista para actualizar indicadores manualmente"""
+    roles_permitidos = ['admin']
+    mensaje_sin_permiso = "No tiene permisos de administrador para esta acción."
     
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         try:
-            CalculadorIndicadores.calcular_todos_indicadores()
+            # El cálculo es síncrono y pesado: se ejecuta fuera del event loop
+            await sync_to_async(CalculadorIndicadores.calcular_todos_indicadores)()
             return JsonResponse({'success': 'Indicadores actualizados correctamente'})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
-class ResolverAlertaView(LoginRequiredMixin, View):
+class ResolverAlertaView(AccesoAsincronoMixin, View):
     """Vista para resolver alertas"""
     
-    def post(self, request, alerta_id):
-        try:
-            alerta = get_object_or_404(Alerta, id=alerta_id)
-            # Verificar que el usuario tenga permisos para resolver esta alerta
-            if (request.user == alerta.usuario_asignado or 
-                request.user.is_superuser or 
-                getattr(request.user.usuariosusuario, 'es_administrador', False)):
-                
-                alerta.resuelta = True
-                alerta.fecha_resolucion = timezone.now()
-                alerta.save()
-                return JsonResponse({'success': True})
-            else:
-                return JsonResponse({'error': 'No tiene permisos para resolver esta alerta'}, status=403)
-                
-        except Alerta.DoesNotExist:
-            return JsonResponse({'error': 'Alerta no encontrada'}, status=404)
-
-class CrearAlertaView(LoginRequiredMixin, View):
+    async def post(self, request, alerta_id):
+        alerta = await aget_object_or_404(Alerta, id=alerta_id)
+        # Verificar que el usuario tenga permisos para resolver esta alerta
+        if alerta.usuario_asignado_id == self.usuario.pk or self.es_administrador:
+            alerta.resuelta = True
+            alerta.fecha_resolucion = timezone.now()
+            await alerta.asave()
+            return JsonResponse({'success': True})
+        return JsonResponse({'error': 'No tiene permisos para resolver esta alerta'}, status=403)
+
+class CrearAlertaView(AccesoAsincronoMixin, View):
     """Vista para crear alertas manualmente"""
     
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
+        # Solo administradores y superusuarios pueden crear alertas manualmente
+        if not self.es_administrador:
+            return JsonResponse({'error': 'No tiene permisos para crear alertas'}, status=403)
+
         try:
-            # Solo administradores y superusuarios pueden crear alertas manualmente
-            if not (request.user.is_superuser or getattr(request.user.usuariosusuario, 'es_administrador', False)):
-                return JsonResponse({'error': 'No tiene permisos para crear alertas'}, status=403)
-                
             titulo = request.POST.get('titulo')
             descripcion = request.POST.get('descripcion')
             tipo = request.POST.get('tipo')
@@ -535,12 +586,12 @@ class CrearAlertaView(LoginRequiredMixin, View):
             if not all([titulo, descripcion, tipo, nivel, establecimiento_id, fecha_vencimiento]):
                 return JsonResponse({'error': 'Faltan campos obligatorios'}, status=400)
             
-            establecimiento = get_object_or_404(Establecimiento, id=establecimiento_id)
+            establecimiento = await aget_object_or_404(Establecimiento, id=establecimiento_id)
             usuario_asignado = None
             if usuario_asignado_id:
-                usuario_asignado = get_object_or_404(request.user.__class__, id=usuario_asignado_id)
+                usuario_asignado = await aget_object_or_404(self.usuario.__class__, id=usuario_asignado_id)
             
-            alerta = Alerta.objects.create(
+            alerta = await Alerta.objects.acreate(
                 titulo=titulo,
                 descripcion=descripcion,
                 tipo=tipo,
@@ -552,6 +603,8 @@ class CrearAlertaView(LoginRequiredMixin, View):
             
             return JsonResponse({'success': True, 'alerta_id': alerta.id})
             
+        except Http404:
+            raise
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -564,4 +617,171 @@ class EliminarAlertaView(PermisoAdministradorMixin, LoginRequiredMixin, View):
             alerta.delete()
             return JsonResponse({'success': True})
         except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+            return JsonResponse({'error': str(e)}, status=500)
+# Notificación de alertas en tiempo real
+def _parsear_establecimiento(valor):
+    try:
+        return int(valor) if valor else None
+    except (TypeError, ValueError):
+        return None
+
+class StreamAlertasView(AccesoAsincronoMixin, View):
+    """
+    Envía alertas nuevas y resueltas al navegador mediante Server-Sent Events.
+
+    Es una vista asíncrona: cada conexión abierta solo ocupa una corrutina si
+    el proyecto se sirve por ASGI (sistemaTBC_demo/asgi.py). Bajo WSGI los
+    clientes deben usar NovedadesAlertasView. PermisoIndicadoresMixin lee
+    request.user de forma síncrona, así que aquí se aplican sus mismos roles
+    con AccesoAsincronoMixin.
+    """
+    INTERVALO_PING = 15
+    roles_permitidos = PermisoIndicadoresMixin.roles_permitidos
+    mensaje_sin_permiso = "No tiene permisos para ver alertas"
+
+    async def get(self, request, *args, **kwargs):
+        from django.core.handlers.asgi import ASGIRequest
+
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'error': 'El streaming de alertas requiere un servidor ASGI'}, status=501)
+
+        suscripcion = canal_alertas.suscribir(
+            usuario_id=self.usuario.pk,
+            establecimiento_id=_parsear_establecimiento(request.GET.get('establecimiento')),
+            ver_todas=self.es_administrador,
+        )
+
+        async def eventos():
+            try:
+                yield 'retry: 5000\n\n'
+                while True:
+                    try:
+                        evento = await asyncio.wait_for(suscripcion.cola.get(), timeout=self.INTERVALO_PING)
+                    except asyncio.TimeoutError:
+                        yield ': ping\n\n'
+                        continue
+                    yield f"event: {evento['evento']}\ndata: {json.dumps(evento)}\n\n"
+            finally:
+                canal_alertas.cancelar(suscripcion)
+
+        response = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class NovedadesAlertasView(PermisoIndicadoresMixin, LoginRequiredMixin, View):
+    """
+    Alternativa por consulta periódica al stream: alertas creadas o resueltas desde una fecha.
+
+    Entrega a lo más MAX_EVENTOS por consulta, en orden cronológico. `desde`
+    en la respuesta es el cursor para la siguiente consulta y `hay_mas`
+    indica que quedaron eventos sin enviar.
+    """
+    MAX_EVENTOS = 100
+
+    def get(self, request, *args, **kwargs):
+        desde = parse_datetime(request.GET.get('desde', '') or '') or timezone.now() - timedelta(minutes=5)
+
+        user = request.user
+        rol = getattr(getattr(user, 'usuariosusuario', None), 'rol', None)
+        alertas = alertas_visibles(
+            Alerta.objects.all(), user.pk,
+            establecimiento_id=_parsear_establecimiento(request.GET.get('establecimiento')),
+            ver_todas=user.is_superuser or rol == 'admin',
+        )
+        # Una alerta resuelta se informa al resolverse; si no, al crearse
+        alertas = alertas.annotate(
+            momento=Coalesce('fecha_resolucion', 'fecha_creacion')
+        ).filter(momento__gt=desde).order_by('momento', 'pk')
+
+        pagina = list(alertas[:self.MAX_EVENTOS + 1])
+        hay_mas = len(pagina) > self.MAX_EVENTOS
+        if hay_mas:
+            # El cursor es estricto: no cortar entre alertas del mismo instante
+            siguiente = pagina.pop().momento
+            pagina = [alerta for alerta in pagina if alerta.momento < siguiente] or pagina
+
+        eventos = [serializar_alerta(alerta, 'resuelta' if alerta.resuelta else 'nueva') for alerta in pagina]
+        cursor = pagina[-1].momento if pagina else desde
+        return JsonResponse({'desde': cursor.isoformat(), 'hay_mas': hay_mas, 'eventos': eventos})
+
+
+class SeriesIndicadoresView(PermisoIndicadoresMixin, LoginRequiredMixin, View):
+    """
+    Series de tiempo de indicadores en JSON para Chart.js.
+
+    Parámetros GET: familia (cohorte, operacionales, prevencion),
+    granularidad (mes, trimestre, año), desde y hasta (AAAA-MM-DD; por
+    defecto los últimos dos años), establecimiento (repetible; por defecto
+    todos) y ventana de la media móvil (1 a 12).
+    """
+
+    def get(self, request, *args, **kwargs):
+        familia = request.GET.get('familia', 'cohorte')
+        granularidad = request.GET.get('granularidad', 'trimestre')
+        if familia not in SeriesIndicadores.FAMILIAS:
+            return JsonResponse({'error': f'Familia desconocida: {familia}'}, status=400)
+        if granularidad not in SeriesIndicadores.GRANULARIDADES:
+            return JsonResponse({'error': f'Granularidad desconocida: {granularidad}'}, status=400)
+
+        try:
+            hasta = parse_date(request.GET.get('hasta', '')) or timezone.localdate()
+            desde = parse_date(request.GET.get('desde', '')) or hasta.replace(year=hasta.year - 2, month=1, day=1)
+            ventana = int(request.GET.get('ventana', 3))
+            establecimientos = [int(e) for e in request.GET.getlist('establecimiento') if e and e != 'all']
+        except ValueError:
+            return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+        if desde > hasta or not 1 <= ventana <= 12:
+            return JsonResponse({'error': 'Rango de fechas o ventana inválidos'}, status=400)
+
+        return JsonResponse(SeriesIndicadores.obtener(
+            familia, granularidad, desde, hasta, establecimientos, ventana
+        ))
+
+
+class TiemposRespuestaView(PermisoIndicadoresMixin, LoginRequiredMixin, View):
+    """
+    Tiempos de respuesta de los exámenes bacteriológicos en JSON: p50/p90/p99
+    e histograma por tramo, global, por tipo de examen y por laboratorio.
+
+    Parámetro GET: periodo (AAAA-MM, mes de solicitud; por defecto el actual).
+    """
+
+    def get(self, request, *args, **kwargs):
+        periodo = request.GET.get('periodo')
+        if periodo:
+            try:
+                periodo = datetime.strptime(periodo, '%Y-%m').date()
+            except ValueError:
+                return JsonResponse({'error': 'Periodo inválido (AAAA-MM)'}, status=400)
+            if periodo > timezone.localdate():
+                return JsonResponse({'error': 'El periodo no puede ser futuro'}, status=400)
+        return JsonResponse(AnaliticaTiemposRespuesta.obtener(periodo or None))
+
+
+class ConsolidadoIndicadoresView(PermisoIndicadoresMixin, LoginRequiredMixin, View):
+    """
+    Drill-down nacional -> región -> establecimiento desde los consolidados.
+
+    Parámetros GET: familia (cohorte, operacionales, prevencion), nivel
+    (nacional, region, establecimiento), clave (nombre de la región o id del
+    establecimiento) y periodo (AAAA-MM-DD; por defecto el último).
+    """
+
+    def get(self, request, *args, **kwargs):
+        familia = request.GET.get('familia', 'cohorte')
+        nivel = request.GET.get('nivel', 'nacional')
+        clave = request.GET.get('clave', 'nacional')
+        if familia not in SeriesIndicadores.FAMILIAS:
+            return JsonResponse({'error': f'Familia desconocida: {familia}'}, status=400)
+        if nivel not in dict(ConsolidadoIndicador.NIVELES):
+            return JsonResponse({'error': f'Nivel desconocido: {nivel}'}, status=400)
+        try:
+            periodo = parse_date(request.GET.get('periodo', ''))
+        except ValueError:
+            return JsonResponse({'error': 'Periodo inválido'}, status=400)
+
+        datos = ConsolidadorIndicadores.drill_down(familia, periodo, nivel, clave)
+        if datos is None:
+            return JsonResponse({'error': 'Sin consolidados para esos parámetros'}, status=404)
+        return JsonResponse(datos)
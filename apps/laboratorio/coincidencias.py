@@ -0,0 +1,56 @@
+# coincidencias.py - Asociación de nombres de laboratorio escritos a mano con la red
+import difflib
+import re
+import unicodedata
+
+# Palabras que no distinguen un laboratorio de otro
+PALABRAS_COMUNES = {'laboratorio', 'lab', 'de', 'del', 'la', 'el'}
+UMBRAL_SIMILITUD = 0.85
+
+
+def normalizar_nombre(texto):
+    """Minúsculas, sin tildes, signos ni palabras comunes: 'Lab. del Hospital Sótero' -> 'hospital sotero'"""
+    texto = unicodedata.normalize('NFKD', texto or '').encode('ascii', 'ignore').decode().lower()
+    palabras = re.findall(r'[a-z0-9]+', texto)
+    return ' '.join(p for p in palabras if p not in PALABRAS_COMUNES)
+
+
+def _distintivos(clave):
+    """Números y números romanos del nombre: 'sintetico ii' y 'sintetico iii' no son el mismo laboratorio"""
+    return {p for p in clave.split() if any(c.isdigit() for c in p) or re.fullmatch(r'[ivx]+', p)}
+
+
+def asociar_nombres(nombres, laboratorios, umbral=UMBRAL_SIMILITUD):
+    """
+    Retorna {nombre: laboratorio_id} para los textos de `nombres` que
+    corresponden a un laboratorio de `laboratorios` (pares (id, nombre)).
+    Primero se busca el nombre normalizado exacto y luego el más parecido
+    con difflib entre los que tienen los mismos números; los textos sin un
+    candidato sobre `umbral` quedan fuera, igual que los que empatan con dos
+    laboratorios distintos.
+    """
+    candidatos = {}
+    for pk, nombre in laboratorios:
+        candidatos.setdefault(normalizar_nombre(nombre), set()).add(pk)
+    candidatos = {clave: ids.pop() for clave, ids in candidatos.items() if len(ids) == 1 and clave}
+
+    asociados = {}
+    for nombre in nombres:
+        clave = normalizar_nombre(nombre)
+        if not clave:
+            continue
+        if clave in candidatos:
+            asociados[nombre] = candidatos[clave]
+            continue
+        distintivos = _distintivos(clave)
+        parecidos = [
+            p for p in difflib.get_close_matches(clave, candidatos, n=3, cutoff=umbral)
+            if _distintivos(p) == distintivos
+        ][:2]
+        if len(parecidos) == 1 or (
+            len(parecidos) == 2
+            and difflib.SequenceMatcher(None, clave, parecidos[0]).ratio()
+            > difflib.SequenceMatcher(None, clave, parecidos[1]).ratio()
+        ):
+            asociados[nombre] = candidatos[parecidos[0]]
+    return asociados
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from apps.laboratorio.services import CalculadorIndicadoresLaboratorio
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula los indicadores de laboratorio por laboratorio y mes desde los exámenes "
+        "bacteriológicos. Por defecto solo los meses con exámenes modificados desde la última ejecución; "
+        "programe --completo una vez al día para reflejar exámenes eliminados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Recalcula todos los meses.')
+
+    def handle(self, *args, **options):
+        resumen = CalculadorIndicadoresLaboratorio.actualizar(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['filas']} filas de indicadores guardadas ({resumen['meses']} meses)"
+        ))
+        if resumen['sin_laboratorio']:
+            self.stdout.write(self.style.WARNING(
+                'Exámenes con laboratorio que no está en la red (no se contabilizan): '
+                + ', '.join(resumen['sin_laboratorio'])
+            ))
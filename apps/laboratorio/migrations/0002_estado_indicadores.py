@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laboratorio', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaboratorioEstadoIndicadores',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_ejecucion', models.DateTimeField()),
+                ('ultimo_completo', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Estado Indicadores Laboratorio',
+                'db_table': 'laboratorio_estado_indicadores',
+            },
+        ),
+    ]
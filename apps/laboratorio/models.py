@@ -96,4 +96,20 @@ class LaboratorioIndicadores(models.Model):
         unique_together = ['laboratorio', 'periodo']
 
     def __str__(self):
-        return f"Indicadores {self.laboratorio.nombre} - {self.periodo}"
\ No newline at end of file
+        return f"Indicadores {self.laboratorio.nombre} - {self.periodo}"
+
+class LaboratorioEstadoIndicadores(models.Model):
+    """
+    Fila única con la marca de la última ejecución de
+    CalculadorIndicadoresLaboratorio.actualizar(), para que el cálculo
+    incremental no dependa del caché del proceso.
+    """
+    ultima_ejecucion = models.DateTimeField()
+    ultimo_completo = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'laboratorio_estado_indicadores'
+        verbose_name_plural = 'Estado Indicadores Laboratorio'
+
+    def __str__(self):
+        return f"Indicadores laboratorio calculados el {self.ultima_ejecucion:%Y-%m-%d %H:%M}"
@@ -0,0 +1,303 @@
+# services.py - Indicadores y colas de trabajo de laboratorio calculados desde los exámenes
+import heapq
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import islice
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.examenes.estados import ESTADOS_EN_LABORATORIO
+from apps.examenes.models import ExamenesExamenbacteriologico
+from .coincidencias import asociar_nombres
+from .models import LaboratorioEstadoIndicadores, LaboratorioIndicadores, LaboratorioRedLaboratorios
+
+CAMPOS = [
+    'muestras_recibidas', 'muestras_procesadas', 'positivos',
+    'contaminacion_porcentaje', 'tiempo_respuesta_promedio',
+]
+
+
+def _periodo(fecha):
+    return f'{fecha.year:04d}-{fecha.month:02d}'
+
+
+def _inicio_mes(periodo):
+    """'2024-03' -> date(2024, 3, 1)"""
+    anio, mes = periodo.split('-')
+    return date(int(anio), int(mes), 1)
+
+
+def _mes_siguiente(fecha):
+    return date(fecha.year + fecha.month // 12, fecha.month % 12 + 1, 1)
+
+
+def _orden_cola(examen):
+    # Mismo orden que order_by('fecha_toma_muestra', 'id'): los NULL primero
+    return examen.fecha_toma_muestra or date.min, examen.id
+
+
+class CalculadorIndicadoresLaboratorio:
+    """
+    Deriva LaboratorioIndicadores por laboratorio (laboratorio_red) y mes
+    desde los exámenes bacteriológicos:
+
+    - muestras_recibidas: exámenes con fecha_ingreso_laboratorio en el mes
+    - muestras_procesadas: exámenes con resultado y fecha_resultado en el mes
+    - positivos / contaminacion_porcentaje: de los procesados en el mes
+    - tiempo_respuesta_promedio: promedio en días de fecha_resultado -
+      fecha_ingreso_laboratorio, calculado en la base de datos
+
+    Se leen dos consultas agrupadas (por mes de ingreso y por mes de
+    resultado) y se guarda con un upsert. Las filas de los meses calculados
+    se sobrescriben, incluidas las ingresadas a mano.
+
+    actualizar() es incremental: recalcula los meses de ingreso y resultado
+    de los exámenes modificados desde la ejecución anterior
+    (fecha_actualizacion, que también asignan las transiciones en lote y la
+    ingesta del LIS) y los meses ya guardados de sus laboratorios, que
+    cubren los meses que un examen dejó al cambiar de fecha o volver a
+    PENDIENTE. Cada mes se recalcula para todos los laboratorios, así que un
+    cambio de laboratorio_red que no mueve fechas también queda cubierto.
+    La ejecución anterior se registra en LaboratorioEstadoIndicadores, de
+    modo que cada corrida del comando retoma desde la previa. Sin ejecución
+    anterior registrada, o con completo=True, recalcula todo.
+
+    Limitación: el valor anterior de un examen no se guarda, así que los
+    exámenes eliminados, o los que cambian de laboratorio y de fecha a la
+    vez (o quedan sin laboratorio), solo se corrigen en el recálculo
+    completo; conviene programar `calcular_indicadores_laboratorio
+    --completo` una vez al día.
+    Antes de calcular se asocian a la red los exámenes que solo traen el
+    nombre del laboratorio en texto.
+    """
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def asociar_examenes():
+        """
+        Asigna laboratorio_red a los exámenes que solo tienen el nombre en
+        texto (mismo criterio que la migración que creó la FK). Retorna
+        cuántos exámenes se asociaron.
+        """
+        pendientes = ExamenesExamenbacteriologico.objects.filter(laboratorio_red__isnull=True).exclude(
+            laboratorio__isnull=True
+        ).exclude(laboratorio='')
+        nombres = list(pendientes.values_list('laboratorio', flat=True).order_by().distinct())
+        if not nombres:
+            return 0
+        asociados = asociar_nombres(nombres, LaboratorioRedLaboratorios.objects.values_list('pk', 'nombre'))
+        por_laboratorio = defaultdict(list)
+        for nombre, laboratorio_id in asociados.items():
+            por_laboratorio[laboratorio_id].append(nombre)
+        ahora = timezone.now()
+        return sum(
+            pendientes.filter(laboratorio__in=textos).update(laboratorio_red_id=laboratorio_id, fecha_actualizacion=ahora)
+            for laboratorio_id, textos in por_laboratorio.items()
+        )
+
+    @staticmethod
+    def _meses_modificados(desde):
+        """
+        Meses (inicio) de ingreso o resultado de los exámenes modificados
+        desde `desde`, más los meses ya guardados de sus laboratorios
+        """
+        filas = ExamenesExamenbacteriologico.objects.filter(fecha_actualizacion__gte=desde).annotate(
+            mes_ingreso=TruncMonth('fecha_ingreso_laboratorio'),
+            mes_resultado=TruncMonth('fecha_resultado'),
+        ).values_list('laboratorio_red', 'mes_ingreso', 'mes_resultado').order_by().distinct()
+        meses = set()
+        laboratorios = set()
+        for laboratorio_id, mes_ingreso, mes_resultado in filas:
+            meses.update(m for m in (mes_ingreso, mes_resultado) if m)
+            if laboratorio_id is not None:
+                laboratorios.add(laboratorio_id)
+        if laboratorios:
+            # Un examen que cambió de fecha o volvió a PENDIENTE deja de aparecer en su mes anterior
+            guardados = LaboratorioIndicadores.objects.filter(laboratorio_id__in=laboratorios).values_list(
+                'periodo', flat=True
+            ).order_by().distinct()
+            meses.update(_inicio_mes(periodo) for periodo in guardados)
+        return meses
+
+    @staticmethod
+    def _filtro_meses(campo, meses):
+        """Filtro de `campo` que cubre exactamente los meses pedidos (con dato si meses es None)"""
+        if meses is None:
+            return Q(**{f'{campo}__isnull': False})
+        filtro = Q(pk__in=[])
+        for mes in meses:
+            filtro |= Q(**{f'{campo}__gte': mes, f'{campo}__lt': _mes_siguiente(mes)})
+        return filtro
+
+    @staticmethod
+    def calcular(meses=None):
+        """
+        Retorna {(laboratorio_id, periodo): {campo: valor}} de los meses pedidos
+        (todos si meses es None) y los nombres de laboratorio de los exámenes
+        sin laboratorio_red, que no se contabilizan.
+        """
+        examenes = ExamenesExamenbacteriologico.objects.filter(laboratorio_red__isnull=False)
+        valores = defaultdict(lambda: dict.fromkeys(CAMPOS, 0))
+
+        filtro_meses = CalculadorIndicadoresLaboratorio._filtro_meses
+        recibidas = examenes.filter(filtro_meses('fecha_ingreso_laboratorio', meses)).values(
+            'laboratorio_red', mes=TruncMonth('fecha_ingreso_laboratorio')
+        ).annotate(total=Count('id'))
+
+        procesadas = examenes.filter(filtro_meses('fecha_resultado', meses)).exclude(resultado='PENDIENTE').values(
+            'laboratorio_red', mes=TruncMonth('fecha_resultado')
+        ).annotate(
+            total=Count('id'),
+            positivos=Count('id', filter=Q(resultado='POSITIVO')),
+            contaminados=Count('id', filter=Q(resultado='CONTAMINADO')),
+            respuesta=Avg(
+                ExpressionWrapper(F('fecha_resultado') - F('fecha_ingreso_laboratorio'), output_field=DurationField()),
+                filter=Q(fecha_ingreso_laboratorio__isnull=False),
+            ),
+        )
+
+        for fila in recibidas:
+            valores[fila['laboratorio_red'], _periodo(fila['mes'])]['muestras_recibidas'] = fila['total']
+        for fila in procesadas:
+            v = valores[fila['laboratorio_red'], _periodo(fila['mes'])]
+            v['muestras_procesadas'] = fila['total']
+            v['positivos'] = fila['positivos']
+            v['contaminacion_porcentaje'] = fila['contaminados'] * 100 / fila['total']
+            if fila['respuesta'] is not None:
+                v['tiempo_respuesta_promedio'] = fila['respuesta'].total_seconds() / 86400
+
+        sin_laboratorio = ExamenesExamenbacteriologico.objects.filter(laboratorio_red__isnull=True).exclude(
+            laboratorio__isnull=True
+        ).exclude(laboratorio='').values_list('laboratorio', flat=True).order_by().distinct()
+        return valores, set(sin_laboratorio)
+
+    @staticmethod
+    def guardar(valores, meses=None):
+        """
+        Upsert de los valores calculados. Las filas existentes de los meses
+        recalculados que ya no tienen exámenes quedan en cero.
+        """
+        existentes = LaboratorioIndicadores.objects.all()
+        if meses is not None:
+            existentes = existentes.filter(periodo__in=[_periodo(m) for m in meses])
+        for laboratorio_id, periodo in existentes.values_list('laboratorio_id', 'periodo'):
+            valores.setdefault((laboratorio_id, periodo), dict.fromkeys(CAMPOS, 0))
+
+        filas = [
+            LaboratorioIndicadores(
+                laboratorio_id=laboratorio_id,
+                periodo=periodo,
+                muestras_recibidas=v['muestras_recibidas'],
+                muestras_procesadas=v['muestras_procesadas'],
+                positivos=v['positivos'],
+                contaminacion_porcentaje=Decimal(str(round(v['contaminacion_porcentaje'], 2))),
+                tiempo_respuesta_promedio=Decimal(str(round(min(v['tiempo_respuesta_promedio'], 999.99), 2))),
+            )
+            for (laboratorio_id, periodo), v in valores.items()
+        ]
+        with transaction.atomic():
+            LaboratorioIndicadores.objects.bulk_create(
+                filas,
+                batch_size=CalculadorIndicadoresLaboratorio.BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['laboratorio', 'periodo'],
+                update_fields=CAMPOS,
+            )
+        return len(filas)
+
+    @staticmethod
+    def _registrar_ejecucion(inicio, completo):
+        defaults = {'ultima_ejecucion': inicio}
+        if completo:
+            defaults['ultimo_completo'] = inicio
+        # Una sola consulta en el caso habitual: la fila ya existe
+        if not LaboratorioEstadoIndicadores.objects.filter(pk=1).update(**defaults):
+            LaboratorioEstadoIndicadores.objects.create(pk=1, **defaults)
+
+    @staticmethod
+    def actualizar(completo=False):
+        """Recalcula los meses con cambios (o todo) y retorna un resumen"""
+        inicio = timezone.now()
+        CalculadorIndicadoresLaboratorio.asociar_examenes()
+        ultima = None
+        if not completo:
+            ultima = LaboratorioEstadoIndicadores.objects.filter(pk=1).values_list(
+                'ultima_ejecucion', flat=True
+            ).first()
+        meses = None
+        if ultima is not None:
+            # Margen para cambios guardados mientras corría la ejecución anterior
+            meses = CalculadorIndicadoresLaboratorio._meses_modificados(ultima - timedelta(minutes=1))
+            if not meses:
+                CalculadorIndicadoresLaboratorio._registrar_ejecucion(inicio, completo=False)
+                return {'meses': 0, 'filas': 0, 'sin_laboratorio': []}
+
+        valores, sin_laboratorio = CalculadorIndicadoresLaboratorio.calcular(meses)
+        filas = CalculadorIndicadoresLaboratorio.guardar(valores, meses)
+        CalculadorIndicadoresLaboratorio._registrar_ejecucion(inicio, completo=meses is None)
+        return {
+            'meses': len(meses) if meses is not None else len({periodo for _, periodo in valores}),
+            'filas': filas,
+            'sin_laboratorio': sorted(sin_laboratorio),
+        }
+
+
+class ColaTrabajoLaboratorio:
+    """
+    Muestras pendientes (ESTADOS_EN_LABORATORIO) de cada laboratorio de la
+    red, por prioridad y luego por antigüedad de la toma de muestra.
+
+    Todas las consultas se resuelven con el índice (laboratorio_red,
+    estado_examen, prioridad, fecha_toma_muestra): el resumen agrupa por sus
+    tres primeras columnas y la cola lee un tramo del índice ya ordenado por
+    cada estado y prioridad, con LIMIT. Los tramos de una misma prioridad se
+    combinan con heapq.merge y se dejan de leer al completar el límite.
+    """
+
+    # La prioridad es texto: el orden de atención no es el alfabético
+    PRIORIDADES = ['EMERGENCIA', 'URGENTE', 'NORMAL']
+    LIMITE = 100
+
+    @staticmethod
+    def resumen():
+        """{laboratorio_id: {'total', 'mas_antigua', <prioridad>: cantidad}} en una consulta"""
+        filas = ExamenesExamenbacteriologico.objects.filter(
+            laboratorio_red__isnull=False, estado_examen__in=ESTADOS_EN_LABORATORIO
+        ).values('laboratorio_red', 'prioridad').annotate(
+            total=Count('id'), mas_antigua=Min('fecha_toma_muestra')
+        ).order_by()
+        resumen = {}
+        for fila in filas:
+            r = resumen.setdefault(
+                fila['laboratorio_red'],
+                {**dict.fromkeys(ColaTrabajoLaboratorio.PRIORIDADES, 0), 'total': 0, 'mas_antigua': None},
+            )
+            r[fila['prioridad']] = fila['total']
+            r['total'] += fila['total']
+            if fila['mas_antigua'] and (r['mas_antigua'] is None or fila['mas_antigua'] < r['mas_antigua']):
+                r['mas_antigua'] = fila['mas_antigua']
+        return resumen
+
+    @staticmethod
+    def cola(laboratorio_id, limite=None):
+        """Las primeras `limite` muestras que el laboratorio debe procesar, en orden de atención"""
+        limite = limite or ColaTrabajoLaboratorio.LIMITE
+        base = ExamenesExamenbacteriologico.objects.filter(laboratorio_red_id=laboratorio_id).select_related(
+            'paciente'
+        ).order_by('fecha_toma_muestra', 'id')
+        muestras = []
+        for prioridad in ColaTrabajoLaboratorio.PRIORIDADES:
+            faltan = limite - len(muestras)
+            if faltan <= 0:
+                break
+            tramos = [
+                list(base.filter(estado_examen=estado, prioridad=prioridad)[:faltan])
+                for estado in ESTADOS_EN_LABORATORIO
+            ]
+            muestras.extend(islice(heapq.merge(*tramos, key=_orden_cola), faltan))
+        return muestras
@@ -1,3 +1,111 @@
-from django.test import TestCase
+from datetime import date, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from apps.examenes.models import ExamenesExamenbacteriologico
+from apps.pacientes.models import PacientesPaciente
+from .coincidencias import asociar_nombres, normalizar_nombre
+from .models import LaboratorioEstadoIndicadores, LaboratorioIndicadores, LaboratorioRedLaboratorios
+from .services import CalculadorIndicadoresLaboratorio
+
+
+class AsociarNombresTest(SimpleTestCase):
+
+    LABORATORIOS = [
+        (1, 'Laboratorio Sintético II'), (2, 'Laboratorio Sintético III'),
+        (3, 'CESFAM 1'), (4, 'Cesfam 2'),
+        (5, 'Laboratorio Hospital Sótero del Río'),
+    ]
+
+    def test_normalizar_nombre(self):
+        self.assertEqual(normalizar_nombre('Lab. del Hospital Sótero'), 'hospital sotero')
+        self.assertEqual(normalizar_nombre(None), '')
+
+    def test_nombre_exacto_y_parecido(self):
+        self.assertEqual(
+            asociar_nombres(['Lab. del Hospital Sotero del Rio', 'Hospital Sotero dl Rio'], self.LABORATORIOS),
+            {'Lab. del Hospital Sotero del Rio': 5, 'Hospital Sotero dl Rio': 5},
+        )
+
+    def test_numeros_romanos_y_arabigos_deben_coincidir(self):
+        asociados = asociar_nombres(
+            ['lab sintetico ii', 'Lab Sintetco III', 'Lab Sintetico IV', 'Sintetico', 'Cesfm 2', 'cesfam 3'],
+            self.LABORATORIOS,
+        )
+        self.assertEqual(asociados, {'lab sintetico ii': 1, 'Lab Sintetco III': 2, 'Cesfm 2': 4})
+
+    def test_empates_quedan_sin_asociar(self):
+        laboratorios = [
+            (1, 'Lab Central'), (2, 'Laboratorio Central'),
+            (3, 'Hospital Regional Nortea'), (4, 'Hospital Regional Norteb'),
+        ]
+        # Dos laboratorios con el mismo nombre normalizado, y dos igual de parecidos
+        self.assertEqual(asociar_nombres(['Central', 'Hospital Regional Nortec'], laboratorios), {})
+        self.assertEqual(asociar_nombres(['Hospital Regional Nortea'], laboratorios), {'Hospital Regional Nortea': 3})
+
+    def test_sin_candidato_sobre_el_umbral(self):
+        self.assertEqual(asociar_nombres(['Clínica Alemana', '', 'Laboratorio'], self.LABORATORIOS), {})
+
+
+class CalculadorIndicadoresLaboratorioTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        usuario = User.objects.create_user('laboratorista')
+        cls.laboratorio = LaboratorioRedLaboratorios.objects.create(
+            nombre='Laboratorio de Prueba', tipo='II', direccion='Calle 1', comuna='Santiago',
+            responsable='Responsable', telefono='221234567', email='lab@example.com',
+        )
+        paciente = PacientesPaciente.objects.create(
+            rut='12345678-5', nombre='Paciente de Prueba', fecha_nacimiento=date(1980, 1, 1), sexo='F',
+            domicilio='Calle 2', comuna='Santiago', telefono='912345678', establecimiento_salud='CESFAM',
+            tipo_tbc='pulmonar', usuario_registro=usuario,
+        )
+        hoy = timezone.localdate()
+        # Un examen por cada uno de los últimos seis meses
+        cls.examenes = [
+            ExamenesExamenbacteriologico.objects.create(
+                paciente=paciente, tipo_examen='BACILOSCOPIA', tipo_muestra='ESPUTO',
+                fecha_toma_muestra=fecha, fecha_ingreso_laboratorio=fecha, laboratorio_red=cls.laboratorio,
+                numero_muestra_lab=f'M-{n}', usuario_registro=usuario,
+            )
+            for n, fecha in enumerate(date(hoy.year, hoy.month, 1) - timedelta(days=31 * n) for n in range(6))
+        ]
+        # Fuera del margen de un minuto que actualizar() resta a la marca anterior
+        ExamenesExamenbacteriologico.objects.update(fecha_actualizacion=timezone.now() - timedelta(hours=1))
+
+    def test_primera_ejecucion_recalcula_todo_y_registra_la_marca(self):
+        resumen = CalculadorIndicadoresLaboratorio.actualizar()
+
+        self.assertEqual(resumen['meses'], 6)
+        self.assertEqual(LaboratorioIndicadores.objects.filter(laboratorio=self.laboratorio).count(), 6)
+        estado = LaboratorioEstadoIndicadores.objects.get()
+        self.assertEqual(estado.ultima_ejecucion, estado.ultimo_completo)
+
+    def test_la_marca_sobrevive_a_otro_proceso(self):
+        CalculadorIndicadoresLaboratorio.actualizar()
+        # Otro proceso (una nueva corrida del comando) no comparte el caché local
+        cache.clear()
+
+        self.assertEqual(CalculadorIndicadoresLaboratorio.actualizar()['meses'], 0)
+
+    def test_recalcula_los_meses_de_los_examenes_modificados(self):
+        CalculadorIndicadoresLaboratorio.actualizar()
+        examen = self.examenes[0]
+        examen.resultado = 'POSITIVO'
+        examen.fecha_resultado = examen.fecha_ingreso_laboratorio
+        examen.save()
+
+        self.assertEqual(CalculadorIndicadoresLaboratorio.actualizar()['meses'], 6)
+        indicador = LaboratorioIndicadores.objects.get(
+            laboratorio=self.laboratorio, periodo=examen.fecha_resultado.strftime('%Y-%m')
+        )
+        self.assertEqual((indicador.muestras_procesadas, indicador.positivos), (1, 1))
+
+    def test_completo_ignora_la_marca(self):
+        CalculadorIndicadoresLaboratorio.actualizar()
+
+        self.assertEqual(CalculadorIndicadoresLaboratorio.actualizar(completo=True)['meses'], 6)
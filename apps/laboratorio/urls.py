@@ -10,6 +10,7 @@ urlpatterns = [
     path('laboratorios/<int:pk>/editar/', views.LaboratorioUpdateView.as_view(), name='laboratorio_editar'),
     path('laboratorios/<int:pk>/eliminar/', views.LaboratorioDeleteView.as_view(), name='laboratorio_eliminar'),
     path('laboratorios/<int:pk>/', views.LaboratorioDetailView.as_view(), name='laboratorio_detalle'),
+    path('laboratorios/<int:pk>/cola/', views.LaboratorioColaView.as_view(), name='laboratorio_cola'),
 
     # Control de Calidad
     path('control-calidad/', views.ControlCalidadListView.as_view(), name='control_calidad_lista'),
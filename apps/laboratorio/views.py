@@ -1,13 +1,19 @@
 from django.views.generic import ListView, CreateView, UpdateView, DetailView, TemplateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.urls import reverse_lazy
-from django.db.models import Count, Avg, Q
+from django.core.cache import cache
+from django.db.models import Count, Avg, Q, Sum
 from django.utils import timezone
 from django.contrib import messages
 from django.shortcuts import get_object_or_404
 
 from .models import LaboratorioRedLaboratorios, LaboratorioControlCalidad, LaboratorioTarjetero, LaboratorioIndicadores
 from .forms import LaboratorioForm, ControlCalidadForm, TarjeteroForm, IndicadoresForm
+from .services import CalculadorIndicadoresLaboratorio, ColaTrabajoLaboratorio
+from apps.indicadores.tiempos_respuesta import AnaliticaTiemposRespuesta
+
+INTERVALO_CALCULO_INDICADORES_LABORATORIO = 300
+CLAVE_INDICADORES_LABORATORIO_CALCULADOS = 'laboratorio:indicadores_calculados'
 
 # Laboratorio Views
 class LaboratorioListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
@@ -56,6 +62,18 @@ class LaboratorioDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailV
     template_name = 'laboratorio/laboratorio_detalle.html'
     permission_required = 'laboratorio.view_laboratorioredlaboratorios'
 
+class LaboratorioColaView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
+    """Cola de trabajo del laboratorio: muestras pendientes por prioridad y antigüedad"""
+    model = LaboratorioRedLaboratorios
+    template_name = 'laboratorio/laboratorio_cola.html'
+    permission_required = 'laboratorio.view_laboratorioredlaboratorios'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['muestras'] = ColaTrabajoLaboratorio.cola(self.object.pk)
+        context['limite'] = ColaTrabajoLaboratorio.LIMITE
+        return context
+
 # Control Calidad Views
 class ControlCalidadListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
     model = LaboratorioControlCalidad
@@ -193,6 +211,10 @@ class IndicadoresListView(LoginRequiredMixin, PermissionRequiredMixin, ListView)
     context_object_name = 'indicadores'
 
     def get_queryset(self):
+        # Los meses con exámenes modificados se recalculan como máximo una vez por intervalo
+        if cache.add(CLAVE_INDICADORES_LABORATORIO_CALCULADOS, True, INTERVALO_CALCULO_INDICADORES_LABORATORIO):
+            CalculadorIndicadoresLaboratorio.actualizar()
+
         queryset = super().get_queryset()
         periodo = self.request.GET.get('periodo')
         laboratorio_id = self.request.GET.get('laboratorio')
@@ -206,26 +228,19 @@ class IndicadoresListView(LoginRequiredMixin, PermissionRequiredMixin, ListView)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        indicadores = context['indicadores']
-        
-        # Cálculos para el resumen
-        if indicadores:
-            context['total_muestras_recibidas'] = sum(i.muestras_recibidas for i in indicadores)
-            context['total_muestras_procesadas'] = sum(i.muestras_procesadas for i in indicadores)
-            context['total_positivos'] = sum(i.positivos for i in indicadores)
-            context['promedio_contaminacion'] = sum(i.contaminacion_porcentaje for i in indicadores) / len(indicadores)
-            context['promedio_tiempo_respuesta'] = sum(i.tiempo_respuesta_promedio for i in indicadores) / len(indicadores)
-            context['tasa_positividad'] = (context['total_positivos'] / context['total_muestras_procesadas'] * 100) if context['total_muestras_procesadas'] > 0 else 0
-        else:
-            context.update({
-                'total_muestras_recibidas': 0,
-                'total_muestras_procesadas': 0,
-                'total_positivos': 0,
-                'promedio_contaminacion': 0,
-                'promedio_tiempo_respuesta': 0,
-                'tasa_positividad': 0
-            })
-        
+
+        # Resumen calculado en la base de datos sobre las filas filtradas
+        resumen = self.object_list.aggregate(
+            total_muestras_recibidas=Sum('muestras_recibidas', default=0),
+            total_muestras_procesadas=Sum('muestras_procesadas', default=0),
+            total_positivos=Sum('positivos', default=0),
+            promedio_contaminacion=Avg('contaminacion_porcentaje', default=0),
+            promedio_tiempo_respuesta=Avg('tiempo_respuesta_promedio', default=0),
+        )
+        procesadas = resumen['total_muestras_procesadas']
+        resumen['tasa_positividad'] = resumen['total_positivos'] / procesadas * 100 if procesadas > 0 else 0
+        context.update(resumen)
+
         context['laboratorios'] = LaboratorioRedLaboratorios.objects.filter(activo=True)
         return context
 
@@ -263,7 +278,7 @@ class IndicadoresDeleteView(LoginRequiredMixin, PermissionRequiredMixin, DeleteV
 
 # Dashboard y Reportes
 class DashboardLaboratorioView(LoginRequiredMixin, PermissionRequiredMixin, TemplateView):
-    template_name = 'laboratorio/dashboard.html'
+    template_name = 'laboratorio/laboratorio_dashboard.html'
     permission_required = 'laboratorio.view_laboratorioredlaboratorios'
 
     def get_context_data(self, **kwargs):
@@ -299,7 +314,21 @@ class DashboardLaboratorioView(LoginRequiredMixin, PermissionRequiredMixin, Temp
         ).order_by('-fecha_deteccion')[:5]
 
         # Laboratorios para filtros
-        context['laboratorios'] = LaboratorioRedLaboratorios.objects.filter(activo=True)
+        context['laboratorios'] = LaboratorioRedLaboratorios.objects.filter(activo=True).order_by('nombre')
+
+        # Colas de trabajo: muestras pendientes por laboratorio y prioridad
+        resumen = ColaTrabajoLaboratorio.resumen()
+        context['colas'] = [
+            {'laboratorio': laboratorio, **resumen[laboratorio.pk]}
+            for laboratorio in context['laboratorios']
+            if laboratorio.pk in resumen
+        ]
+
+        # Tiempos de respuesta del mes (en caché por periodo)
+        tiempos = AnaliticaTiemposRespuesta.obtener()
+        context['tiempos_respuesta'] = [
+            {**tramo, **tiempos['global'][tramo['clave']]} for tramo in tiempos['tramos']
+        ]
 
         return context
 
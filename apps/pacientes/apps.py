@@ -3,4 +3,8 @@ from django.apps import AppConfig
 class PacientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.pacientes'
-    verbose_name = 'Gestión de Pacientes'
\ No newline at end of file
+    verbose_name = 'Gestión de Pacientes'
+
+    def ready(self):
+        # Invalidación de la línea de tiempo del paciente
+        from . import signals  # noqa: F401
@@ -107,4 +107,15 @@ class PacienteForm(forms.ModelForm):
             if self.instance.fecha_nacimiento:
                 self.fields['fecha_nacimiento'].widget.attrs['value'] = self.instance.fecha_nacimiento.strftime('%Y-%m-%d')
             if self.instance.fecha_diagnostico:
-                self.fields['fecha_diagnostico'].widget.attrs['value'] = self.instance.fecha_diagnostico.strftime('%Y-%m-%d')
\ No newline at end of file
+                self.fields['fecha_diagnostico'].widget.attrs['value'] = self.instance.fecha_diagnostico.strftime('%Y-%m-%d')
+
+class ImportarPacientesForm(forms.Form):
+    archivo = forms.FileField(
+        label='Archivo CSV',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
+    simular = forms.BooleanField(
+        label='Solo validar (no guardar)',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
@@ -0,0 +1,290 @@
+# importacion.py - Importación masiva de pacientes desde CSV
+import csv
+import io
+import re
+from collections import namedtuple
+from datetime import date, datetime
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import PacientesPaciente
+
+TAMANO_LOTE = 1000
+MAX_ERRORES_EN_MEMORIA = 500
+FORMATOS_FECHA = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+RE_RUT = re.compile(r'^(\d{1,8})-?([\dK])$')
+
+COLUMNAS_OBLIGATORIAS = [
+    'rut', 'nombre', 'fecha_nacimiento', 'sexo', 'domicilio', 'comuna',
+    'telefono', 'establecimiento_salud', 'tipo_tbc',
+]
+COLUMNAS_OPCIONALES = [
+    'fecha_diagnostico', 'baciloscopia_inicial', 'cultivo_inicial', 'poblacion_prioritaria', 'estado',
+]
+
+ErrorFila = namedtuple('ErrorFila', ['fila', 'rut', 'columna', 'mensaje'])
+
+
+def digito_verificador(numero):
+    """Dígito verificador de un RUT chileno (módulo 11)"""
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+
+def normalizar_rut(valor):
+    """Retorna el RUT como 12345678-K (sin puntos) o lanza ValueError si es inválido"""
+    limpio = re.sub(r'[.\s]', '', valor or '').upper()
+    coincidencia = RE_RUT.match(limpio)
+    if not coincidencia:
+        raise ValueError('RUT con formato inválido')
+    numero, dv = coincidencia.groups()
+    numero = numero.lstrip('0') or '0'
+    if digito_verificador(numero) != dv:
+        raise ValueError('Dígito verificador incorrecto')
+    return f'{numero}-{dv}'
+
+
+def rut_con_puntos(rut):
+    numero, dv = rut.split('-')
+    return f'{int(numero):,}'.replace(',', '.') + f'-{dv}'
+
+
+# Validadores por columna: reciben el texto de la celda y retornan el valor
+# limpio o lanzan ValueError con el mensaje para el reporte
+
+def _texto(max_length=None, obligatorio=True):
+    def validar(valor):
+        valor = valor.strip()
+        if not valor:
+            if obligatorio:
+                raise ValueError('Campo obligatorio')
+            return None
+        if max_length and len(valor) > max_length:
+            raise ValueError(f'Máximo {max_length} caracteres')
+        return valor
+    return validar
+
+
+def _fecha(obligatorio=True):
+    def validar(valor):
+        valor = valor.strip()
+        if not valor:
+            if obligatorio:
+                raise ValueError('Campo obligatorio')
+            return None
+        for formato in FORMATOS_FECHA:
+            try:
+                fecha = datetime.strptime(valor, formato).date()
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError('Fecha inválida (use AAAA-MM-DD o DD-MM-AAAA)')
+        if fecha > timezone.localdate():
+            raise ValueError('Fecha futura')
+        if fecha < date(1900, 1, 1):
+            raise ValueError('Fecha anterior a 1900')
+        return fecha
+    return validar
+
+
+def _opcion(choices, obligatorio=True, defecto=None):
+    # Se acepta el código o la etiqueta, sin distinguir mayúsculas
+    opciones = {}
+    for codigo, etiqueta in choices:
+        if codigo:
+            opciones[codigo.lower()] = codigo
+            opciones[etiqueta.lower()] = codigo
+
+    def validar(valor):
+        valor = valor.strip().lower()
+        if not valor:
+            if obligatorio:
+                raise ValueError('Campo obligatorio')
+            return defecto
+        if valor not in opciones:
+            raise ValueError(f'Valor no permitido: {valor}')
+        return opciones[valor]
+    return validar
+
+
+VALIDADORES = {
+    'rut': normalizar_rut,
+    'nombre': _texto(200),
+    'fecha_nacimiento': _fecha(),
+    'sexo': _opcion(PacientesPaciente.SEXO_CHOICES),
+    'domicilio': _texto(),
+    'comuna': _texto(100),
+    'telefono': _texto(15),
+    'establecimiento_salud': _texto(100),
+    'tipo_tbc': _opcion(PacientesPaciente.TIPO_TBC_CHOICES),
+    'fecha_diagnostico': _fecha(obligatorio=False),
+    'baciloscopia_inicial': _texto(50, obligatorio=False),
+    'cultivo_inicial': _texto(50, obligatorio=False),
+    'poblacion_prioritaria': _opcion(PacientesPaciente.POBLACION_PRIORITARIA_CHOICES, obligatorio=False, defecto=''),
+    'estado': _opcion(PacientesPaciente.ESTADO_CHOICES, obligatorio=False, defecto='activo'),
+}
+
+
+class ImportadorPacientes:
+    """
+    Importa pacientes desde un CSV por lotes de TAMANO_LOTE filas, sin cargar
+    el archivo completo en memoria. En cada lote se valida columna por
+    columna, se buscan los RUT ya registrados con una sola consulta IN y se
+    insertan las filas válidas con bulk_create en una transacción.
+
+    Las filas con errores, con RUT ya registrado o con un RUT que ya apareció
+    en el archivo (en cualquier lote) se omiten y se informan con su número
+    de línea. Si se entrega `reporte` (archivo de texto), cada error se
+    escribe ahí como CSV al momento de encontrarlo; en memoria solo se
+    guardan los primeros MAX_ERRORES_EN_MEMORIA para mostrarlos.
+    """
+
+    def __init__(self, usuario, simular=False, reporte=None, recalcular_indicadores=True):
+        self.usuario = usuario
+        self.simular = simular
+        self.recalcular_indicadores = recalcular_indicadores
+        self.reporte = csv.writer(reporte) if reporte is not None else None
+        if self.reporte:
+            self.reporte.writerow(ErrorFila._fields)
+        self.conteos = {'leidas': 0, 'creadas': 0, 'duplicadas': 0, 'con_errores': 0}
+        self.errores = []
+        self.total_errores = 0
+        self._establecimientos = set()
+        self._primer_diagnostico = None
+        # RUT aceptados de todos los lotes, para detectar repeticiones entre lotes
+        self._ruts_vistos = set()
+
+    @staticmethod
+    def _abrir(archivo):
+        """Acepta un archivo de texto o binario (p. ej. UploadedFile) y detecta el separador"""
+        if isinstance(archivo, io.TextIOBase):
+            texto = archivo
+        else:
+            binario = getattr(archivo, 'file', archivo)
+            texto = io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+        muestra = texto.readline()
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        encabezado = next(csv.reader([muestra], dialecto), [])
+        columnas = [c.strip().lower().replace(' ', '_') for c in encabezado]
+        faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in columnas]
+        if faltantes:
+            raise ValueError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+        return columnas, csv.reader(texto, dialecto)
+
+    def _registrar_error(self, fila, rut, columna, mensaje):
+        error = ErrorFila(fila, rut, columna, mensaje)
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_EN_MEMORIA:
+            self.errores.append(error)
+        if self.reporte:
+            self.reporte.writerow(error)
+
+    def _validar_lote(self, columnas, lote):
+        """Valida columna por columna; retorna [(fila, datos)] de las filas sin errores"""
+        posiciones = {columna: i for i, columna in enumerate(columnas) if columna in VALIDADORES}
+
+        def columna_del_lote(columna):
+            posicion = posiciones.get(columna)
+            if posicion is None:
+                return [''] * len(lote)
+            return [celdas[posicion] if posicion < len(celdas) else '' for _, celdas in lote]
+
+        ruts = columna_del_lote('rut')
+        limpios = [{} for _ in lote]
+        con_error = [False] * len(lote)
+        for columna, validador in VALIDADORES.items():
+            for i, valor in enumerate(columna_del_lote(columna)):
+                try:
+                    limpios[i][columna] = validador(valor)
+                except ValueError as e:
+                    con_error[i] = True
+                    self._registrar_error(lote[i][0], ruts[i], columna, str(e))
+
+        validos = []
+        for (fila, _), datos, error in zip(lote, limpios, con_error):
+            if error:
+                self.conteos['con_errores'] += 1
+            else:
+                validos.append((fila, datos))
+        return validos
+
+    def _descartar_duplicados(self, validos):
+        """Una consulta IN por lote contra el índice único de rut (con y sin puntos)"""
+        candidatos = set()
+        for _, datos in validos:
+            candidatos.update((datos['rut'], rut_con_puntos(datos['rut'])))
+        registrados = {
+            normalizar_rut(rut)
+            for rut in PacientesPaciente.objects.filter(rut__in=candidatos).values_list('rut', flat=True)
+        }
+
+        nuevos = []
+        for fila, datos in validos:
+            # Antes que los registrados: sin simular, el RUT de un lote anterior ya está en la base
+            if datos['rut'] in self._ruts_vistos:
+                mensaje = 'RUT repetido en el archivo'
+            elif datos['rut'] in registrados:
+                mensaje = 'RUT ya registrado'
+            else:
+                self._ruts_vistos.add(datos['rut'])
+                nuevos.append(datos)
+                continue
+            self.conteos['duplicadas'] += 1
+            self._registrar_error(fila, datos['rut'], 'rut', mensaje)
+        return nuevos
+
+    def _guardar(self, nuevos):
+        pacientes = [PacientesPaciente(usuario_registro=self.usuario, **datos) for datos in nuevos]
+        if not self.simular:
+            with transaction.atomic():
+                PacientesPaciente.objects.bulk_create(pacientes, batch_size=TAMANO_LOTE)
+        self.conteos['creadas'] += len(pacientes)
+        for paciente in pacientes:
+            if paciente.fecha_diagnostico:
+                self._establecimientos.add(paciente.establecimiento_salud)
+                if self._primer_diagnostico is None or paciente.fecha_diagnostico < self._primer_diagnostico:
+                    self._primer_diagnostico = paciente.fecha_diagnostico
+
+    def importar(self, archivo, progreso=None):
+        """
+        Procesa el archivo completo y retorna los conteos. `progreso(conteos)`
+        se llama al terminar cada lote.
+        """
+        columnas, lector = self._abrir(archivo)
+        # line_num no cuenta el encabezado, que se leyó antes de crear el lector
+        filas = ((lector.line_num + 1, celdas) for celdas in lector if any(c.strip() for c in celdas))
+        while True:
+            lote = list(islice(filas, TAMANO_LOTE))
+            if not lote:
+                break
+            self.conteos['leidas'] += len(lote)
+            validos = self._validar_lote(columnas, lote)
+            if validos:
+                self._guardar(self._descartar_duplicados(validos))
+            if progreso:
+                progreso(self.conteos)
+
+        if self.recalcular_indicadores and not self.simular and self._primer_diagnostico:
+            self._actualizar_indicadores()
+        return self.conteos
+
+    def _actualizar_indicadores(self):
+        """bulk_create no emite post_save: se recalcula el historial de los establecimientos afectados"""
+        from apps.indicadores.models import Establecimiento
+        from apps.indicadores.services import BackfillIndicadores
+
+        establecimientos = list(Establecimiento.objects.filter(nombre__in=self._establecimientos))
+        if establecimientos:
+            BackfillIndicadores.ejecutar(
+                self._primer_diagnostico.year, timezone.localdate().year, establecimientos=establecimientos
+            )
@@ -0,0 +1,217 @@
+# linea_tiempo.py - Línea de tiempo clínica unificada de un paciente
+import heapq
+from operator import itemgetter
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.contactos.models import ContactosContacto
+from apps.examenes.models import ExamenesExamenbacteriologico, ExamenPPD, ExamenRadiologico
+from apps.laboratorio.models import LaboratorioTarjetero
+from apps.prevencion.models import PrevencionQuimioprofilaxis, PrevencionVacunacionBCG
+from apps.tratamientos.models import DosisAdministrada, EsquemaMedicamento, Tratamiento
+from .models import PacientesPaciente
+
+
+def _evento(fecha, tipo, titulo, detalle='', url=None):
+    return {'fecha': fecha, 'tipo': tipo, 'titulo': titulo, 'detalle': detalle, 'url': url}
+
+
+class LineaTiempoPaciente:
+    """
+    Reúne exámenes, radiografías, PPD, tratamientos, dosis, contactos,
+    quimioprofilaxis, vacunas BCG y registros del tarjetero de un paciente.
+
+    Cada relación se carga con un Prefetch ya ordenado por fecha descendente,
+    así la cantidad de consultas es fija (una por relación) sin importar
+    cuántos eventos tenga el paciente. Las listas ordenadas se combinan con
+    heapq.merge (k-way merge) sin volver a ordenar todo. El resultado se
+    guarda en caché por paciente y las páginas se sirven desde ahí.
+
+    La caché se invalida con señales al guardar o eliminar cualquier fuente
+    (signals.py) y desde las cargas en lote, que no emiten señales (lotes de
+    contactos e ingesta del LIS). Las transiciones de estado en lote
+    (TransicionesExamen) solo se ven al vencer CACHE_TIMEOUT.
+    """
+
+    CACHE_TIMEOUT = 300
+    POR_PAGINA = 50
+    MAX_POR_PAGINA = 200
+
+    @staticmethod
+    def _clave(paciente_id):
+        return f'pacientes:linea_tiempo:{paciente_id}'
+
+    @staticmethod
+    def _paciente(paciente_id):
+        dosis = DosisAdministrada.objects.order_by('-fecha_dosis', '-id')
+        esquemas = EsquemaMedicamento.objects.prefetch_related(Prefetch('dosis_administradas', queryset=dosis))
+        tratamientos = Tratamiento.objects.order_by('-fecha_inicio').prefetch_related(
+            Prefetch('esquemas_medicamento', queryset=esquemas)
+        )
+        return PacientesPaciente.objects.prefetch_related(
+            Prefetch('examenes_bacteriologicos',
+                     queryset=ExamenesExamenbacteriologico.objects.order_by('-fecha_toma_muestra', '-id')),
+            Prefetch('examenes_radiologicos', queryset=ExamenRadiologico.objects.order_by('-fecha_examen', '-id')),
+            Prefetch('examenes_ppd', queryset=ExamenPPD.objects.order_by('-fecha_aplicacion', '-id')),
+            Prefetch('tratamientos', queryset=tratamientos),
+            Prefetch('contactoscontacto_set', queryset=ContactosContacto.objects.order_by('-fecha_registro', '-id')),
+            Prefetch('prevencionquimioprofilaxis_set',
+                     queryset=PrevencionQuimioprofilaxis.objects.order_by('-fecha_inicio', '-id')),
+            Prefetch('prevencionvacunacionbcg_set',
+                     queryset=PrevencionVacunacionBCG.objects.order_by('-fecha_vacunacion', '-id')),
+            Prefetch('laboratoriotarjetero_set',
+                     queryset=LaboratorioTarjetero.objects.order_by('-fecha_deteccion', '-id')),
+        ).get(pk=paciente_id)
+
+    # Cada fuente retorna sus eventos en orden de fecha descendente
+
+    @staticmethod
+    def _examenes(paciente):
+        return [
+            _evento(
+                e.fecha_toma_muestra, 'examen_bacteriologico', f'{e.get_tipo_examen_display()} ({e.get_tipo_muestra_display()})',
+                f'Resultado: {e.get_resultado_display()} - {e.get_estado_examen_display()}',
+                reverse('examenes:detalle_examen', args=[e.pk]),
+            )
+            for e in paciente.examenes_bacteriologicos.all()
+        ]
+
+    @staticmethod
+    def _radiologicos(paciente):
+        return [
+            _evento(r.fecha_examen, 'examen_radiologico', r.get_tipo_radiografia_display(), r.get_hallazgos_display())
+            for r in paciente.examenes_radiologicos.all()
+        ]
+
+    @staticmethod
+    def _ppd(paciente):
+        return [
+            _evento(p.fecha_aplicacion, 'ppd', 'PPD aplicado',
+                    f'{p.milimetro_induration} mm - {p.get_resultado_display()} (lectura {p.fecha_lectura:%d-%m-%Y})')
+            for p in paciente.examenes_ppd.all()
+        ]
+
+    @staticmethod
+    def _tratamientos(paciente):
+        eventos = []
+        for t in paciente.tratamientos.all():
+            url = reverse('tratamientos:detalle', args=[t.pk])
+            eventos.append(_evento(t.fecha_inicio, 'tratamiento', f'Inicio de tratamiento {t.esquema}', '', url))
+            if t.fecha_termino_real:
+                eventos.append(_evento(t.fecha_termino_real, 'tratamiento', 'Término de tratamiento',
+                                       t.resultado_final or '', url))
+        # El término puede ser posterior al inicio de un tratamiento más reciente
+        eventos.sort(key=itemgetter('fecha'), reverse=True)
+        return eventos
+
+    @staticmethod
+    def _dosis(paciente):
+        """Una lista ordenada por esquema; se combinan entre sí con el mismo merge"""
+        return [
+            [
+                _evento(d.fecha_dosis, 'dosis', f'{esquema.medicamento} {esquema.dosis_mg} mg',
+                        'Administrada' if d.administrada else 'No administrada')
+                for d in esquema.dosis_administradas.all()
+            ]
+            for tratamiento in paciente.tratamientos.all()
+            for esquema in tratamiento.esquemas_medicamento.all()
+        ]
+
+    @staticmethod
+    def _contactos(paciente):
+        return [
+            _evento(c.fecha_registro, 'contacto', f'Contacto registrado: {c.nombre_contacto}',
+                    f'{c.get_parentesco_display()} - {c.get_estado_estudio_display()}',
+                    reverse('contactos:detalle', args=[c.pk]))
+            for c in paciente.contactoscontacto_set.all()
+        ]
+
+    @staticmethod
+    def _quimioprofilaxis(paciente):
+        return [
+            _evento(q.fecha_inicio, 'quimioprofilaxis', f'Quimioprofilaxis {q.get_medicamento_display()}',
+                    q.get_estado_display(), reverse('prevencion:quimioprofilaxis_detalle', args=[q.pk]))
+            for q in paciente.prevencionquimioprofilaxis_set.all()
+        ]
+
+    @staticmethod
+    def _vacunas(paciente):
+        return [
+            _evento(v.fecha_vacunacion, 'vacuna_bcg', 'Vacunación BCG', f'Lote {v.lote} - reacción {v.get_reaccion_display()}')
+            for v in paciente.prevencionvacunacionbcg_set.all()
+        ]
+
+    @staticmethod
+    def _tarjetero(paciente):
+        return [
+            _evento(t.fecha_deteccion, 'tarjetero', 'Registro en tarjetero de positivos', t.resultado,
+                    reverse('laboratorio:tarjetero_detalle', args=[t.pk]))
+            for t in paciente.laboratoriotarjetero_set.all()
+        ]
+
+    @staticmethod
+    def calcular(paciente_id):
+        """Lista completa de eventos del paciente, del más reciente al más antiguo"""
+        paciente = LineaTiempoPaciente._paciente(paciente_id)
+        propios = [
+            _evento(f, 'paciente', titulo)
+            for f, titulo in sorted(
+                [(timezone.localdate(paciente.fecha_registro), 'Registro del paciente')]
+                + ([(paciente.fecha_diagnostico, 'Diagnóstico')] if paciente.fecha_diagnostico else []),
+                reverse=True,
+            )
+        ]
+        fuentes = [
+            propios,
+            LineaTiempoPaciente._examenes(paciente),
+            LineaTiempoPaciente._radiologicos(paciente),
+            LineaTiempoPaciente._ppd(paciente),
+            LineaTiempoPaciente._tratamientos(paciente),
+            LineaTiempoPaciente._contactos(paciente),
+            LineaTiempoPaciente._quimioprofilaxis(paciente),
+            LineaTiempoPaciente._vacunas(paciente),
+            LineaTiempoPaciente._tarjetero(paciente),
+            *LineaTiempoPaciente._dosis(paciente),
+        ]
+        eventos = list(heapq.merge(*fuentes, key=itemgetter('fecha'), reverse=True))
+        for evento in eventos:
+            evento['fecha'] = evento['fecha'].isoformat()
+        return eventos
+
+    @staticmethod
+    def obtener(paciente_id):
+        return cache.get_or_set(
+            LineaTiempoPaciente._clave(paciente_id),
+            lambda: LineaTiempoPaciente.calcular(paciente_id),
+            LineaTiempoPaciente.CACHE_TIMEOUT,
+        )
+
+    @staticmethod
+    def invalidar(paciente_id):
+        cache.delete(LineaTiempoPaciente._clave(paciente_id))
+
+    @staticmethod
+    def invalidar_varios(paciente_ids):
+        cache.delete_many([LineaTiempoPaciente._clave(paciente_id) for paciente_id in set(paciente_ids)])
+
+    @staticmethod
+    def pagina(paciente_id, numero=1, por_pagina=None, tipos=None):
+        """Una página de eventos en formato JSON; `tipos` filtra por tipo de evento"""
+        por_pagina = min(max(1, por_pagina or LineaTiempoPaciente.POR_PAGINA), LineaTiempoPaciente.MAX_POR_PAGINA)
+        eventos = LineaTiempoPaciente.obtener(paciente_id)
+        if tipos:
+            eventos = [e for e in eventos if e['tipo'] in tipos]
+        total = len(eventos)
+        paginas = max(1, -(-total // por_pagina))
+        numero = min(max(1, numero), paginas)
+        inicio = (numero - 1) * por_pagina
+        return {
+            'paciente_id': paciente_id,
+            'pagina': numero,
+            'paginas': paginas,
+            'total': total,
+            'eventos': eventos[inicio:inicio + por_pagina],
+        }
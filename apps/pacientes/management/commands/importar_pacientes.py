@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.pacientes.importacion import ImportadorPacientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa pacientes desde un CSV por lotes (validación, duplicados por RUT y bulk_create), '
+        'con reporte de errores por fila'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con encabezado (separador coma, punto y coma o tabulación)')
+        parser.add_argument('--usuario', required=True, help='Username que queda como usuario de registro')
+        parser.add_argument('--reporte', help='CSV donde escribir los errores por fila')
+        parser.add_argument('--simular', action='store_true', help='Validar sin guardar')
+        parser.add_argument('--sin-indicadores', action='store_true',
+                            help='No recalcular los indicadores de los establecimientos afectados')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuario {options['usuario']} no existe")
+
+        reporte = open(options['reporte'], 'w', newline='', encoding='utf-8') if options['reporte'] else None
+        importador = ImportadorPacientes(
+            usuario,
+            simular=options['simular'],
+            reporte=reporte,
+            recalcular_indicadores=not options['sin_indicadores'],
+        )
+
+        def progreso(conteos):
+            self.stdout.write(
+                f"  {conteos['leidas']} filas leídas, {conteos['creadas']} nuevas, "
+                f"{conteos['duplicadas']} duplicadas, {conteos['con_errores']} con errores"
+            )
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                conteos = importador.importar(archivo, progreso=progreso)
+        except (OSError, UnicodeDecodeError, ValueError) as e:
+            raise CommandError(str(e))
+        finally:
+            if reporte:
+                reporte.close()
+
+        resultado = 'válidos (simulación, no se guardaron)' if options['simular'] else 'importados'
+        self.stdout.write(self.style.SUCCESS(
+            f"{conteos['creadas']} de {conteos['leidas']} pacientes {resultado} en {time.perf_counter() - inicio:.1f} s"
+        ))
+        if importador.total_errores:
+            destino = f" (detalle en {options['reporte']})" if options['reporte'] else ''
+            self.stdout.write(self.style.WARNING(f'{importador.total_errores} filas omitidas{destino}'))
+            if not options['reporte']:
+                for error in importador.errores[:20]:
+                    self.stdout.write(f'  línea {error.fila} [{error.columna}] {error.rut}: {error.mensaje}')
@@ -0,0 +1,43 @@
+# signals.py - Invalidación de la línea de tiempo cuando cambian sus fuentes
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from apps.contactos.models import ContactosContacto
+from apps.examenes.models import ExamenesExamenbacteriologico, ExamenPPD, ExamenRadiologico
+from apps.laboratorio.models import LaboratorioTarjetero
+from apps.prevencion.models import PrevencionQuimioprofilaxis, PrevencionVacunacionBCG
+from apps.tratamientos.models import DosisAdministrada, EsquemaMedicamento, Tratamiento
+from .linea_tiempo import LineaTiempoPaciente
+from .models import PacientesPaciente
+
+# Modelo -> función que retorna el id del paciente de la instancia
+FUENTES = {
+    PacientesPaciente: lambda instancia: instancia.pk,
+    ExamenesExamenbacteriologico: lambda instancia: instancia.paciente_id,
+    ExamenRadiologico: lambda instancia: instancia.paciente_id,
+    ExamenPPD: lambda instancia: instancia.paciente_id,
+    Tratamiento: lambda instancia: instancia.paciente_id,
+    EsquemaMedicamento: lambda instancia: Tratamiento.objects.filter(
+        pk=instancia.tratamiento_id
+    ).values_list('paciente_id', flat=True).first(),
+    DosisAdministrada: lambda instancia: EsquemaMedicamento.objects.filter(
+        pk=instancia.esquema_medicamento_id
+    ).values_list('tratamiento__paciente_id', flat=True).first(),
+    ContactosContacto: lambda instancia: instancia.paciente_indice_id,
+    PrevencionQuimioprofilaxis: lambda instancia: instancia.paciente_id,
+    PrevencionVacunacionBCG: lambda instancia: instancia.paciente_id,
+    LaboratorioTarjetero: lambda instancia: instancia.paciente_id,
+}
+
+
+def invalidar_linea_tiempo(sender, instance, **kwargs):
+    """Descarta la línea de tiempo en caché del paciente al confirmarse el cambio"""
+    paciente_id = FUENTES[sender](instance)
+    # En un borrado en cascada el tratamiento o esquema padre puede ya no existir
+    if paciente_id is not None:
+        transaction.on_commit(lambda: LineaTiempoPaciente.invalidar(paciente_id))
+
+
+for modelo in FUENTES:
+    post_save.connect(invalidar_linea_tiempo, sender=modelo, dispatch_uid=f'linea_tiempo_{modelo._meta.label}_save')
+    post_delete.connect(invalidar_linea_tiempo, sender=modelo, dispatch_uid=f'linea_tiempo_{modelo._meta.label}_delete')
@@ -1,3 +1,133 @@
-from django.test import TestCase
+import io
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from apps.pacientes.importacion import (
+    ErrorFila, ImportadorPacientes, digito_verificador, normalizar_rut, rut_con_puntos,
+)
+from apps.pacientes.models import PacientesPaciente
+
+
+class RutTest(SimpleTestCase):
+
+    def test_digito_verificador(self):
+        self.assertEqual(digito_verificador(12345678), '5')
+        self.assertEqual(digito_verificador(1000005), 'K')
+        self.assertEqual(digito_verificador(1000013), '0')
+
+    def test_normalizar_rut_acepta_formatos_habituales(self):
+        for valor in ('12345678-5', '12.345.678-5', ' 12.345.678-5 ', '123456785', '12 345 678-5'):
+            with self.subTest(valor=valor):
+                self.assertEqual(normalizar_rut(valor), '12345678-5')
+
+    def test_normalizar_rut_digito_k_en_mayuscula(self):
+        self.assertEqual(normalizar_rut('1.000.005-k'), '1000005-K')
+
+    def test_normalizar_rut_quita_ceros_a_la_izquierda(self):
+        self.assertEqual(normalizar_rut('01234567-4'), '1234567-4')
+
+    def test_normalizar_rut_rechaza_formato_invalido(self):
+        for valor in ('', None, 'abc', '12345678-X', '123456789-0', '12.345.678-'):
+            with self.subTest(valor=valor):
+                with self.assertRaisesMessage(ValueError, 'RUT con formato inválido'):
+                    normalizar_rut(valor)
+
+    def test_normalizar_rut_rechaza_digito_incorrecto(self):
+        with self.assertRaisesMessage(ValueError, 'Dígito verificador incorrecto'):
+            normalizar_rut('12.345.678-9')
+
+    def test_rut_con_puntos(self):
+        self.assertEqual(rut_con_puntos('12345678-5'), '12.345.678-5')
+        self.assertEqual(rut_con_puntos('1234567-4'), '1.234.567-4')
+        self.assertEqual(rut_con_puntos('1000005-K'), '1.000.005-K')
+
+    def test_rut_con_puntos_y_normalizar_son_inversas(self):
+        for rut in ('12345678-5', '1234567-4', '1000005-K'):
+            with self.subTest(rut=rut):
+                self.assertEqual(normalizar_rut(rut_con_puntos(rut)), rut)
+
+
+class AutocompletarPacientesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('enfermera')
+        for rut, nombre in (('12.345.678-5', 'Ana Pérez'), ('1234567-4', 'Bruno Soto')):
+            PacientesPaciente.objects.create(
+                rut=rut, nombre=nombre, fecha_nacimiento=date(1980, 1, 1), sexo='F', domicilio='Calle 1',
+                comuna='Santiago', telefono='912345678', establecimiento_salud='CESFAM', tipo_tbc='pulmonar',
+                usuario_registro=cls.usuario,
+            )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _nombres(self, q):
+        respuesta = self.client.get(reverse('pacientes:autocompletar'), {'q': q})
+        return [p['nombre'] for p in respuesta.json()['resultados']]
+
+    def test_rut_completo_en_cualquier_formato(self):
+        for q, nombre in (
+            ('12345678-5', 'Ana Pérez'), ('12.345.678-5', 'Ana Pérez'), ('123456785', 'Ana Pérez'),
+            ('1234567-4', 'Bruno Soto'), ('1.234.567-4', 'Bruno Soto'),
+        ):
+            with self.subTest(q=q):
+                self.assertEqual(self._nombres(q), [nombre])
+
+    def test_rut_parcial_y_nombre(self):
+        self.assertEqual(self._nombres('12.345'), ['Ana Pérez', 'Bruno Soto'])
+        self.assertEqual(self._nombres('345.678'), ['Ana Pérez'])
+        self.assertEqual(self._nombres('soto'), ['Bruno Soto'])
+
+    def test_consulta_corta_no_busca(self):
+        self.assertEqual(self._nombres('1'), [])
+
+
+class ImportadorPacientesTest(TestCase):
+
+    ENCABEZADO = 'rut,nombre,fecha_nacimiento,sexo,domicilio,comuna,telefono,establecimiento_salud,tipo_tbc\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('enfermera')
+        PacientesPaciente.objects.create(
+            rut='1.234.567-4', nombre='Registrado', fecha_nacimiento=date(1980, 1, 1), sexo='F',
+            domicilio='Calle 1', comuna='Santiago', telefono='912345678', establecimiento_salud='CESFAM',
+            tipo_tbc='pulmonar', usuario_registro=cls.usuario,
+        )
+
+    def _fila(self, rut, nombre):
+        return f'{rut},{nombre},1980-01-01,M,Calle 2,Santiago,912345678,CESFAM,pulmonar\n'
+
+    def _archivo(self):
+        return io.StringIO(
+            self.ENCABEZADO
+            + self._fila('12345678-5', 'Ana')          # línea 2
+            + '\n'                                     # línea 3, vacía
+            + self._fila('abc', 'Sin RUT')             # línea 4
+            + self._fila('1234567-4', 'Ya existe')     # línea 5, registrado con puntos
+            + self._fila('11111111-1', 'Bruno')        # línea 6
+            + self._fila('12.345.678-5', 'Ana otra vez')  # línea 7, en otro lote
+        )
+
+    @mock.patch('apps.pacientes.importacion.TAMANO_LOTE', 2)
+    def test_importar_y_simular_informan_lo_mismo(self):
+        for simular in (True, False):
+            with self.subTest(simular=simular):
+                importador = ImportadorPacientes(self.usuario, simular=simular, recalcular_indicadores=False)
+                conteos = importador.importar(self._archivo())
+
+                self.assertEqual(conteos, {'leidas': 5, 'creadas': 2, 'duplicadas': 2, 'con_errores': 1})
+                self.assertEqual(importador.errores, [
+                    ErrorFila(4, 'abc', 'rut', 'RUT con formato inválido'),
+                    ErrorFila(5, '1234567-4', 'rut', 'RUT ya registrado'),
+                    ErrorFila(7, '12345678-5', 'rut', 'RUT repetido en el archivo'),
+                ])
+                self.assertEqual(
+                    PacientesPaciente.objects.filter(rut__in=['12345678-5', '11111111-1']).count(),
+                    0 if simular else 2,
+                )
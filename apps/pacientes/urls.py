@@ -6,8 +6,11 @@ app_name = 'pacientes'
 urlpatterns = [
     path('', views.lista_pacientes, name='lista'),
     path('crear/', views.crear_paciente, name='crear'),
+    path('importar/', views.importar_pacientes, name='importar'),
     path('editar/<int:pk>/', views.editar_paciente, name='editar'),  
     path('detalle/<int:pk>/', views.detalle_paciente, name='detalle'),  
+    path('detalle/<int:pk>/linea-tiempo/', views.linea_tiempo_paciente, name='linea_tiempo'),
     path('eliminar/<int:pk>/', views.eliminar_paciente, name='eliminar'),  
     path('buscar/', views.buscar_pacientes, name='buscar'),
+    path('autocompletar/', views.autocompletar_pacientes, name='autocompletar'),
 ]
\ No newline at end of file
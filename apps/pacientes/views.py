@@ -2,8 +2,13 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db.models import Q
+from django.http import JsonResponse
 from .models import PacientesPaciente
-from .forms import PacienteForm
+from .forms import PacienteForm, ImportarPacientesForm
+from .importacion import (
+    ImportadorPacientes, COLUMNAS_OBLIGATORIAS, COLUMNAS_OPCIONALES, normalizar_rut, rut_con_puntos,
+)
+from .linea_tiempo import LineaTiempoPaciente
 
 @login_required
 def lista_pacientes(request):
@@ -26,6 +31,40 @@ def crear_paciente(request):
         form = PacienteForm()
     return render(request, 'pacientes/crear_paciente.html', {'form': form})
 
+@login_required
+def importar_pacientes(request):
+    resultado = None
+    if request.method == 'POST':
+        form = ImportarPacientesForm(request.POST, request.FILES)
+        if form.is_valid():
+            simular = form.cleaned_data['simular']
+            importador = ImportadorPacientes(request.user, simular=simular)
+            try:
+                conteos = importador.importar(form.cleaned_data['archivo'])
+            except (UnicodeDecodeError, ValueError) as e:
+                messages.error(request, f'No se pudo leer el archivo: {e}')
+            else:
+                resultado = {
+                    'conteos': conteos,
+                    'errores': importador.errores,
+                    'total_errores': importador.total_errores,
+                    'simular': simular,
+                }
+                if simular:
+                    messages.info(request, f"Validación terminada: {conteos['creadas']} pacientes se pueden importar.")
+                else:
+                    messages.success(request, f"Se importaron {conteos['creadas']} pacientes.")
+        else:
+            messages.error(request, 'Por favor corrige los errores del formulario.')
+    else:
+        form = ImportarPacientesForm()
+    return render(request, 'pacientes/importar_pacientes.html', {
+        'form': form,
+        'resultado': resultado,
+        'columnas_obligatorias': COLUMNAS_OBLIGATORIAS,
+        'columnas_opcionales': COLUMNAS_OPCIONALES,
+    })
+
 @login_required
 def editar_paciente(request, pk):
     paciente = get_object_or_404(PacientesPaciente, pk=pk)
@@ -46,6 +85,18 @@ def detalle_paciente(request, pk):
     paciente = get_object_or_404(PacientesPaciente, pk=pk)
     return render(request, 'pacientes/detalle_paciente.html', {'paciente': paciente})
 
+@login_required
+def linea_tiempo_paciente(request, pk):
+    """Eventos clínicos del paciente en JSON, paginados (?pagina=, ?por_pagina=, ?tipo=)"""
+    get_object_or_404(PacientesPaciente.objects.only('pk'), pk=pk)
+    try:
+        numero = int(request.GET.get('pagina', 1))
+        por_pagina = int(request.GET.get('por_pagina', LineaTiempoPaciente.POR_PAGINA))
+    except ValueError:
+        return JsonResponse({'error': 'pagina y por_pagina deben ser números'}, status=400)
+    tipos = set(request.GET.getlist('tipo'))
+    return JsonResponse(LineaTiempoPaciente.pagina(pk, numero, por_pagina, tipos))
+
 @login_required
 def eliminar_paciente(request, pk):
     paciente = get_object_or_404(PacientesPaciente, pk=pk)
@@ -87,4 +138,29 @@ def buscar_pacientes(request):
         'query': query,
         'estado_filtro': estado_filtro,
         'comuna_filtro': comuna_filtro
-    })
\ No newline at end of file
+    })
+
+MAX_RESULTADOS_AUTOCOMPLETAR = 10
+
+
+@login_required
+async def autocompletar_pacientes(request):
+    """Sugerencias JSON de pacientes por nombre o RUT (mínimo 2 caracteres)"""
+    query = request.GET.get('q', '').strip()
+    if len(query) < 2:
+        return JsonResponse({'resultados': []})
+
+    # Los RUT se guardan con o sin puntos, pero siempre con guion
+    filtro = Q(nombre__icontains=query) | Q(rut__icontains=query) | Q(rut__icontains=query.replace('.', ''))
+    try:
+        rut = normalizar_rut(query)
+    except ValueError:
+        pass
+    else:
+        filtro |= Q(rut__in=[rut, rut_con_puntos(rut)])
+    pacientes = PacientesPaciente.objects.filter(filtro).values(
+        'id', 'nombre', 'rut', 'establecimiento_salud', 'estado'
+    ).order_by('nombre')
+
+    resultados = [p async for p in pacientes[:MAX_RESULTADOS_AUTOCOMPLETAR]]
+    return JsonResponse({'resultados': resultados})
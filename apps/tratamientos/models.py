@@ -1,4 +1,8 @@
+from datetime import date
+
 from django.db import models
+from django.db.models import Case, Count, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Round
 from django.contrib.auth.models import User
 from apps.pacientes.models import PacientesPaciente as Paciente
 
@@ -104,6 +108,45 @@ class Tratamiento(models.Model):
         """Determina si el tratamiento está activo"""
         return self.resultado_final is None or self.resultado_final == 'En Tratamiento'
 
+class EsquemaMedicamentoQuerySet(models.QuerySet):
+    """QuerySet de esquemas con el avance de sus dosis calculado en SQL"""
+
+    def con_resumen_dosis(self, hoy=None):
+        """
+        Anota en cada esquema, con una sola consulta agrupada:
+        dosis_dadas (administradas), dosis_omitidas (no administradas con
+        fecha pasada), dosis_pendientes (no administradas desde hoy),
+        dosis_esperadas (según frecuencia y duración) y progreso_dosis
+        (% de las esperadas que ya se administraron).
+        """
+        hoy = hoy or date.today()
+        esperadas = Case(
+            *[
+                When(frecuencia=frecuencia, then=F('duracion_semanas') * por_semana)
+                for frecuencia, por_semana in EsquemaMedicamento.DOSIS_POR_SEMANA.items()
+            ],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        return self.annotate(
+            dosis_dadas=Count('dosis_administradas', filter=Q(dosis_administradas__administrada=True)),
+            dosis_omitidas=Count('dosis_administradas', filter=Q(
+                dosis_administradas__administrada=False, dosis_administradas__fecha_dosis__lt=hoy
+            )),
+            dosis_pendientes=Count('dosis_administradas', filter=Q(
+                dosis_administradas__administrada=False, dosis_administradas__fecha_dosis__gte=hoy
+            )),
+            dosis_esperadas=esperadas,
+        ).annotate(
+            progreso_dosis=Case(
+                When(dosis_esperadas__gt=0,
+                     then=Round(Cast('dosis_dadas', FloatField()) * 100 / F('dosis_esperadas'), 1)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+        )
+
+
 class EsquemaMedicamento(models.Model):
     """
     Modelo para gestionar los medicamentos dentro de un esquema de tratamiento
@@ -138,6 +181,14 @@ class EsquemaMedicamento(models.Model):
         ('Fase Completa', 'Fase Completa'),
     ]
 
+    # Dosis por semana de cada frecuencia, para estimar las dosis esperadas
+    DOSIS_POR_SEMANA = {
+        'Diaria': 7,
+        '3 veces por semana': 3,
+        '2 veces por semana': 2,
+        'Semanal': 1,
+    }
+
     # Relación con el tratamiento
     tratamiento = models.ForeignKey(
         Tratamiento,
@@ -154,6 +205,8 @@ class EsquemaMedicamento(models.Model):
     fecha_inicio = models.DateField()
     fecha_termino = models.DateField()
 
+    objects = EsquemaMedicamentoQuerySet.as_manager()
+
     class Meta:
         """Configuración del modelo"""
         db_table = 'tratamientos_esquemamedicamento'
@@ -2,7 +2,7 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from django.http import JsonResponse
 from datetime import date, timedelta
 from .models import Tratamiento, EsquemaMedicamento, DosisAdministrada
@@ -74,21 +74,49 @@ def detalle_tratamiento(request, pk):
     """
     Vista detallada de un tratamiento específico
     """
-    # Obtener el tratamiento con relaciones optimizadas
+    hoy = date.today()
+    # Tratamiento y esquemas con sus conteos de dosis: dos consultas sin importar
+    # cuántos esquemas o dosis tenga el tratamiento
+    esquemas = EsquemaMedicamento.objects.con_resumen_dosis(hoy).order_by('fecha_inicio', 'medicamento')
     tratamiento = get_object_or_404(
-        Tratamiento.objects.select_related('paciente', 'usuario_registro'),
+        Tratamiento.objects.select_related('paciente', 'usuario_registro').prefetch_related(
+            Prefetch('esquemas_medicamento', queryset=esquemas, to_attr='esquemas_resumen')
+        ),
         pk=pk
     )
-    
-    # Obtener los esquemas de medicamento relacionados
-    esquemas_medicamento = tratamiento.esquemas_medicamento.all()
+    esquemas_medicamento = tratamiento.esquemas_resumen
 
     context = {
         'tratamiento': tratamiento,
         'esquemas_medicamento': esquemas_medicamento,
+        'fases': _resumen_fases(esquemas_medicamento, hoy),
     }
     return render(request, 'tratamientos/detalle_tratamiento.html', context)
 
+def _resumen_fases(esquemas, hoy):
+    """Suma por fase los conteos ya anotados de cada esquema (sin consultas adicionales)"""
+    fases = {}
+    for esquema in esquemas:
+        fase = fases.setdefault(esquema.fase, {
+            'fase': esquema.fase, 'inicio': esquema.fecha_inicio, 'termino': esquema.fecha_termino,
+            'dosis_esperadas': 0, 'dosis_dadas': 0, 'dosis_omitidas': 0, 'dosis_pendientes': 0,
+        })
+        fase['inicio'] = min(fase['inicio'], esquema.fecha_inicio)
+        fase['termino'] = max(fase['termino'], esquema.fecha_termino)
+        for campo in ('dosis_esperadas', 'dosis_dadas', 'dosis_omitidas', 'dosis_pendientes'):
+            fase[campo] += getattr(esquema, campo)
+
+    orden = [codigo for codigo, _ in EsquemaMedicamento.FASES_OPCIONES]
+    resumen = sorted(fases.values(), key=lambda f: orden.index(f['fase']) if f['fase'] in orden else len(orden))
+    for fase in resumen:
+        fase['progreso_dosis'] = (
+            round(fase['dosis_dadas'] * 100 / fase['dosis_esperadas'], 1) if fase['dosis_esperadas'] else 0
+        )
+        duracion = (fase['termino'] - fase['inicio']).days
+        transcurrido = min(max((hoy - fase['inicio']).days, 0), duracion)
+        fase['progreso_tiempo'] = round(transcurrido * 100 / duracion, 1) if duracion > 0 else 100
+    return resumen
+
 @login_required
 def crear_tratamiento(request):
     """
@@ -287,10 +315,12 @@ def calendario_dosis(request):
     context = {}
     return render(request, 'tratamientos/calendario_dosis.html', context)
 
-# VISTA AJAX PARA BÚSQUEDA DE PACIENTES POR RUT
+# VISTAS AJAX (ASÍNCRONAS)
+# Son endpoints de solo lectura muy consultados; bajo ASGI no ocupan un hilo
+# del pool mientras esperan a la base de datos.
 
 @login_required
-def buscar_paciente_por_rut(request):
+async def buscar_paciente_por_rut(request):
     """
     Vista AJAX para buscar pacientes por RUT
     """
@@ -305,13 +335,13 @@ def buscar_paciente_por_rut(request):
             rut_limpio = rut.replace('.', '').replace('-', '').upper()
             
             # Buscar paciente por RUT (búsqueda parcial)
-            paciente = Paciente.objects.get(rut__icontains=rut_limpio)
+            paciente = await Paciente.objects.aget(rut__icontains=rut_limpio)
             
             # Verificar si el paciente ya tiene tratamiento activo
-            tratamiento_activo = Tratamiento.objects.filter(
-                paciente=paciente,
-                resultado_final__in=[None, 'En Tratamiento']
-            ).exists()
+            tratamiento_activo = await Tratamiento.objects.filter(
+                Q(resultado_final__isnull=True) | Q(resultado_final='En Tratamiento'),
+                paciente=paciente
+            ).aexists()
             
             # Preparar respuesta
             respuesta = {
@@ -322,7 +352,7 @@ def buscar_paciente_por_rut(request):
                     'rut': paciente.rut,
                     'establecimiento_salud': paciente.establecimiento_salud,
                     'fecha_nacimiento': paciente.fecha_nacimiento.strftime('%d/%m/%Y') if paciente.fecha_nacimiento else 'No registrada',
-                    'edad': paciente.get_edad() if hasattr(paciente, 'get_edad') else 'N/A',
+                    'edad': paciente.get_edad() if paciente.fecha_nacimiento else 'N/A',
                 },
                 'tratamiento_activo': tratamiento_activo
             }
@@ -347,4 +377,56 @@ def buscar_paciente_por_rut(request):
                 'error': f'Error en la búsqueda: {str(e)}'
             }, status=500)
     
-    return JsonResponse({'error': 'Método no permitido'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+
+MAX_DIAS_CALENDARIO = 62
+
+
+@login_required
+async def eventos_calendario_dosis(request):
+    """
+    Feed JSON de dosis para el calendario, entre las fechas inicio y fin (AAAA-MM-DD).
+    Por defecto devuelve el mes en curso.
+    """
+    hoy = date.today()
+    try:
+        inicio = date.fromisoformat(request.GET['inicio']) if request.GET.get('inicio') else hoy.replace(day=1)
+        fin = date.fromisoformat(request.GET['fin']) if request.GET.get('fin') else inicio + timedelta(days=31)
+    except ValueError:
+        return JsonResponse({'error': 'Formato de fecha inválido, use AAAA-MM-DD'}, status=400)
+
+    if fin < inicio or (fin - inicio).days > MAX_DIAS_CALENDARIO:
+        return JsonResponse({'error': f'El rango debe ser de 0 a {MAX_DIAS_CALENDARIO} días'}, status=400)
+
+    dosis = DosisAdministrada.objects.filter(fecha_dosis__range=(inicio, fin))
+    tratamiento_id = request.GET.get('tratamiento')
+    if tratamiento_id and tratamiento_id.isdigit():
+        dosis = dosis.filter(esquema_medicamento__tratamiento_id=tratamiento_id)
+
+    filas = dosis.values(
+        'id', 'fecha_dosis', 'administrada', 'hora_administracion',
+        'esquema_medicamento__medicamento', 'esquema_medicamento__dosis_mg',
+        'esquema_medicamento__tratamiento_id',
+        'esquema_medicamento__tratamiento__paciente__nombre',
+    ).order_by('fecha_dosis', 'esquema_medicamento__tratamiento_id')
+
+    eventos = []
+    async for fila in filas:
+        eventos.append({
+            'id': fila['id'],
+            'fecha': fila['fecha_dosis'].isoformat(),
+            'hora': fila['hora_administracion'].strftime('%H:%M') if fila['hora_administracion'] else None,
+            'administrada': fila['administrada'],
+            'medicamento': fila['esquema_medicamento__medicamento'],
+            'dosis_mg': fila['esquema_medicamento__dosis_mg'],
+            'tratamiento_id': fila['esquema_medicamento__tratamiento_id'],
+            'paciente': fila['esquema_medicamento__tratamiento__paciente__nombre'],
+        })
+
+    return JsonResponse({
+        'inicio': inicio.isoformat(),
+        'fin': fin.isoformat(),
+        'total': len(eventos),
+        'eventos': eventos,
+    })
\ No newline at end of file
@@ -0,0 +1 @@
+# Scripts de medición de rendimiento del sistema (no se cargan desde Django)
@@ -0,0 +1,270 @@
+"""
+Prueba de carga que reproduce sesiones de trabajo de cada rol clínico.
+
+Cada usuario virtual inicia sesión con un rol de create_groups_users.py y
+recorre, con pausas de "tiempo de lectura", los escenarios ponderados de ese
+rol: rondas de dosis de enfermería, dashboard y cohortes del médico, ingreso
+de exámenes del tecnólogo y exportaciones del administrador. Funciona contra
+runserver o un servidor WSGI/ASGI:
+
+    python manage.py runserver 8000
+    python -m benchmarks.carga --url http://127.0.0.1:8000 --usuarios 20 --duracion 60
+
+    # Sobre datos de generar_datos_sinteticos, con sus usuarios sintetico.<rol>
+    python -m benchmarks.carga --credenciales sinteticas --usuarios 50 --rampa 10 --salida carga.json
+
+Al terminar reporta por URL (agrupada por nombre de paso, sin los ids)
+peticiones, errores, peticiones por segundo y latencias p50/p95/p99/máx.
+Los escenarios solo hacen GET: se pueden ejecutar sobre una copia de
+producción sin modificar datos.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from apps.indicadores.estadistica import percentil
+
+from .cliente_http import SesionHTTP
+
+# Usuarios de create_groups_users.py y de generar_datos_sinteticos
+CREDENCIALES = {
+    'demo': {
+        'admin': ('admin.sistema', 'Admin.1234'),
+        'medico': ('medico.principal', 'Medico.1234'),
+        'enfermera': ('enfermera.jefe', 'Enfermera.1234'),
+        'tecnologo': ('tecnologo.lab', 'Tecnologo.1234'),
+        'paramedico': ('tecnico.terreno', 'Tecnico.1234'),
+    },
+    'sinteticas': {
+        rol: (f'sintetico.{rol}', 'Sintetico.1234')
+        for rol in ['admin', 'medico', 'enfermera', 'tecnologo', 'paramedico']
+    },
+}
+
+
+class Paso:
+    """
+    Una petición GET de un escenario.
+
+    La ruta puede tener marcadores {clave} que se reemplazan por un id
+    capturado en un paso anterior del mismo usuario virtual; `captura` es
+    (clave, regex) y toma los ids del cuerpo de la respuesta. Si aún no hay
+    ids para un marcador, el paso se omite.
+    """
+
+    def __init__(self, nombre, ruta, captura=None, ajax=False):
+        self.nombre = nombre
+        self.ruta = ruta
+        self.captura = (captura[0], re.compile(captura[1].encode())) if captura else None
+        self.ajax = ajax
+
+    def resolver(self, ids, azar):
+        valores = {}
+        for clave in re.findall(r'{(\w+)}', self.ruta):
+            if not ids.get(clave):
+                return None
+            valores[clave] = azar.choice(ids[clave])
+        return self.ruta.format(**valores)
+
+    def capturar(self, cuerpo, ids):
+        if self.captura:
+            clave, patron = self.captura
+            encontrados = list(dict.fromkeys(patron.findall(cuerpo)))
+            if encontrados:
+                ids[clave] = [int(v) for v in encontrados[:50]]
+
+
+class Escenario:
+    def __init__(self, nombre, rol, peso, pasos):
+        self.nombre = nombre
+        self.rol = rol
+        self.peso = peso
+        self.pasos = pasos
+
+
+def _rango_calendario():
+    hoy = date.today()
+    return f'inicio={(hoy - timedelta(days=7)).isoformat()}&fin={(hoy + timedelta(days=7)).isoformat()}'
+
+
+ESCENARIOS = [
+    Escenario('ronda_dosis', 'enfermera', 4, [
+        Paso('tratamientos:dosis_pendientes', '/tratamientos/dosis/pendientes/'),
+        Paso('tratamientos:eventos_calendario', f'/tratamientos/calendario/eventos/?{_rango_calendario()}',
+             captura=('tratamiento', r'"tratamiento_id": (\d+)'), ajax=True),
+        Paso('tratamientos:detalle', '/tratamientos/{tratamiento}/'),
+        Paso('tratamientos:detalle', '/tratamientos/{tratamiento}/'),
+        Paso('tratamientos:lista', '/tratamientos/'),
+    ]),
+    Escenario('consulta_medica', 'medico', 3, [
+        Paso('indicadores:dashboard', '/indicadores/dashboard/'),
+        Paso('indicadores:indicadores_cohorte', '/indicadores/cohorte/'),
+        Paso('pacientes:lista', '/pacientes/', captura=('paciente', r'/pacientes/detalle/(\d+)/')),
+        Paso('pacientes:autocompletar', '/pacientes/autocompletar/?q=gon', ajax=True),
+        Paso('pacientes:detalle', '/pacientes/detalle/{paciente}/'),
+        Paso('examenes:examenes_por_paciente', '/examenes/paciente/{paciente}/'),
+    ]),
+    Escenario('ingreso_examenes', 'tecnologo', 2, [
+        Paso('examenes:lista_examenes', '/examenes/', captura=('examen', r'/examenes/(\d+)/')),
+        Paso('examenes:crear_examen', '/examenes/crear/'),
+        Paso('examenes:detalle_examen', '/examenes/{examen}/'),
+        Paso('laboratorio:tarjetero_lista', '/laboratorio/tarjetero/'),
+    ]),
+    Escenario('exportaciones', 'admin', 1, [
+        Paso('indicadores:reportes_gerenciales', '/indicadores/reportes/'),
+        Paso('indicadores:descargar_reporte_cohorte', '/indicadores/reportes/cohorte/descargar/'),
+        Paso('indicadores:descargar_reporte_operacional', '/indicadores/reportes/operacional/descargar/'),
+        Paso('indicadores:alertas_lista', '/indicadores/alertas/'),
+    ]),
+    Escenario('visita_terreno', 'paramedico', 1, [
+        Paso('contactos:lista', '/contactos/'),
+        Paso('prevencion:quimioprofilaxis_lista', '/prevencion/quimioprofilaxis/'),
+        Paso('pacientes:buscar', '/pacientes/buscar/?q=san'),
+    ]),
+]
+
+
+class Estadisticas:
+    """Latencias y errores por nombre de paso, compartidas entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.status_error = defaultdict(lambda: defaultdict(int))
+
+    def registrar(self, nombre, status, segundos):
+        with self._lock:
+            # 3xx también es error: una redirección al login significa que la sesión se perdió
+            if status == 0 or status >= 300:
+                self.errores[nombre] += 1
+                self.status_error[nombre][status] += 1
+            else:
+                self.latencias[nombre].append(segundos)
+
+    def resumen(self, duracion):
+        filas = []
+        for nombre in sorted(set(self.latencias) | set(self.errores)):
+            valores = sorted(self.latencias[nombre])
+            filas.append({
+                'url': nombre,
+                'peticiones': len(valores) + self.errores[nombre],
+                'errores': self.errores[nombre],
+                'status_error': dict(self.status_error[nombre]),
+                'rps': len(valores) / duracion if duracion else 0.0,
+                'p50_ms': percentil(valores, 50) * 1000,
+                'p95_ms': percentil(valores, 95) * 1000,
+                'p99_ms': percentil(valores, 99) * 1000,
+                'max_ms': (valores[-1] if valores else 0.0) * 1000,
+            })
+        return filas
+
+
+def usuario_virtual(numero, sesion, escenarios, estadisticas, fin, pausa, semilla):
+    """Recorre escenarios del rol al azar (ponderados) hasta `fin`"""
+    azar = random.Random(semilla + numero)
+    pesos = [e.peso for e in escenarios]
+    ids = {}
+    while time.monotonic() < fin:
+        escenario = azar.choices(escenarios, weights=pesos)[0]
+        for paso in escenario.pasos:
+            if time.monotonic() >= fin:
+                break
+            ruta = paso.resolver(ids, azar)
+            if ruta is None:
+                continue
+            try:
+                status, cuerpo, segundos = sesion.solicitar('GET', ruta, ajax=paso.ajax)
+            except OSError:
+                status, cuerpo, segundos = 0, b'', None
+            estadisticas.registrar(paso.nombre, status, segundos)
+            if status == 200:
+                paso.capturar(cuerpo, ids)
+            if pausa:
+                # Tiempo de lectura exponencial: la mayoría breve, algunos largos
+                time.sleep(min(azar.expovariate(1 / pausa), pausa * 5))
+    sesion.cerrar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--usuarios', type=int, default=10, help='Usuarios virtuales simultáneos')
+    parser.add_argument('--duracion', type=float, default=60, help='Segundos de carga')
+    parser.add_argument('--rampa', type=float, default=5, help='Segundos para iniciar a todos los usuarios')
+    parser.add_argument('--pausa', type=float, default=1.0, help='Tiempo de lectura medio entre pasos (0 = sin pausa)')
+    parser.add_argument('--escenario', action='append', choices=[e.nombre for e in ESCENARIOS])
+    parser.add_argument('--credenciales', choices=sorted(CREDENCIALES), default='demo')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar el resumen')
+    args = parser.parse_args(argv)
+
+    escenarios = [e for e in ESCENARIOS if not args.escenario or e.nombre in args.escenario]
+    por_rol = defaultdict(list)
+    for escenario in escenarios:
+        por_rol[escenario.rol].append(escenario)
+
+    # Una sesión por rol; cada usuario virtual usa una copia con su propia conexión
+    sesiones = {}
+    for rol in por_rol:
+        usuario, password = CREDENCIALES[args.credenciales][rol]
+        sesiones[rol] = SesionHTTP.iniciar_sesion(args.url, usuario, password)
+        sesiones[rol].cerrar()
+
+    # Los usuarios virtuales se reparten entre roles según el peso de sus escenarios
+    azar = random.Random(args.semilla)
+    roles = list(por_rol)
+    pesos_rol = [sum(e.peso for e in por_rol[rol]) for rol in roles]
+    asignados = azar.choices(roles, weights=pesos_rol, k=args.usuarios)
+
+    estadisticas = Estadisticas()
+    inicio = time.monotonic()
+    fin = inicio + args.rampa + args.duracion
+    hilos = []
+    for numero, rol in enumerate(asignados):
+        hilo = threading.Thread(
+            target=usuario_virtual,
+            args=(numero, sesiones[rol].clonar(), por_rol[rol], estadisticas, fin, args.pausa, args.semilla),
+            daemon=True,
+        )
+        hilos.append(hilo)
+        hilo.start()
+        if args.usuarios > 1:
+            time.sleep(args.rampa / (args.usuarios - 1))
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.monotonic() - inicio
+
+    filas = estadisticas.resumen(duracion)
+    total = sum(f['peticiones'] for f in filas)
+    errores = sum(f['errores'] for f in filas)
+    print(f"\n{args.usuarios} usuarios ({', '.join(f'{r}={asignados.count(r)}' for r in roles)}) "
+          f"durante {duracion:.1f} s: {total} peticiones, {total / duracion:.1f} req/s, {errores} errores")
+    print(f"{'URL':44} {'pet':>6} {'err':>5} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8}")
+    for f in filas:
+        print(f"{f['url'][:44]:44} {f['peticiones']:>6} {f['errores']:>5} {f['rps']:>7.2f} "
+              f"{f['p50_ms']:>8.1f} {f['p95_ms']:>8.1f} {f['p99_ms']:>8.1f} {f['max_ms']:>8.1f}")
+        if f['status_error']:
+            print(f"{'':44} status con error: {f['status_error']}")
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'url': args.url,
+                'fecha': date.today().isoformat(),
+                'usuarios': args.usuarios,
+                'duracion_s': round(duracion, 1),
+                'pausa_s': args.pausa,
+                'escenarios': [e.nombre for e in escenarios],
+                'urls': filas,
+            }, archivo, indent=2, ensure_ascii=False)
+        print(f'\nResumen guardado en {args.salida}')
+
+
+if __name__ == '__main__':
+    main()
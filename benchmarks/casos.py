@@ -0,0 +1,120 @@
+# casos.py - Casos medidos por benchmarks.suite
+from django.urls import reverse
+
+CASOS = []
+
+
+def caso(nombre, repeticiones=None):
+    """Registra una función como caso del benchmark; recibe el contexto de la corrida"""
+    def registrar(funcion):
+        CASOS.append({'nombre': nombre, 'funcion': funcion, 'repeticiones': repeticiones})
+        return funcion
+    return registrar
+
+
+def _get(ctx, nombre_url, **params):
+    respuesta = ctx.cliente.get(reverse(nombre_url), params)
+    if respuesta.status_code != 200:
+        raise RuntimeError(f'{nombre_url} respondió {respuesta.status_code}')
+    # Consumir respuestas en streaming (CSV) para medir la generación completa
+    if getattr(respuesta, 'streaming', False):
+        b''.join(respuesta.streaming_content)
+    return respuesta
+
+
+# Servicios de indicadores
+
+@caso('calculador.cohorte', repeticiones=3)
+def calculador_cohorte(ctx):
+    from apps.indicadores.services import CalculadorIndicadores
+    trimestre = f'Q{(ctx.hoy.month - 1) // 3 + 1}'
+    CalculadorIndicadores.calcular_indicadores_cohorte(ctx.hoy.year, trimestre, ctx.establecimiento)
+
+
+@caso('calculador.operacionales')
+def calculador_operacionales(ctx):
+    from apps.indicadores.services import CalculadorIndicadores
+    CalculadorIndicadores.calcular_indicadores_operacionales(ctx.hoy.month, ctx.hoy.year, ctx.establecimiento)
+
+
+@caso('calculador.prevencion')
+def calculador_prevencion(ctx):
+    from apps.indicadores.services import CalculadorIndicadores
+    CalculadorIndicadores.calcular_indicadores_prevencion(ctx.hoy.month, ctx.hoy.year, ctx.establecimiento)
+
+
+@caso('alertas.evaluar_reglas', repeticiones=3)
+def alertas_evaluar_reglas(ctx):
+    from apps.indicadores.services import GeneradorAlertas
+    GeneradorAlertas.evaluar_reglas()
+
+
+@caso('alertas.sla')
+def alertas_sla(ctx):
+    from apps.indicadores.services import AnaliticaAlertas
+    AnaliticaAlertas.calcular(dias=30)
+
+
+# Listas y búsquedas
+
+@caso('vista.pacientes_lista', repeticiones=3)
+def pacientes_lista(ctx):
+    _get(ctx, 'pacientes:lista')
+
+
+@caso('vista.pacientes_buscar')
+def pacientes_buscar(ctx):
+    _get(ctx, 'pacientes:buscar', q='González')
+
+
+@caso('vista.contactos_lista', repeticiones=3)
+def contactos_lista(ctx):
+    _get(ctx, 'contactos:lista')
+
+
+@caso('vista.tratamientos_lista', repeticiones=3)
+def tratamientos_lista(ctx):
+    _get(ctx, 'tratamientos:lista')
+
+
+@caso('vista.examenes_lista')
+def examenes_lista(ctx):
+    _get(ctx, 'examenes:lista_examenes', q='González')
+
+
+@caso('vista.tarjetero_lista')
+def tarjetero_lista(ctx):
+    _get(ctx, 'laboratorio:tarjetero_lista')
+
+
+# Dashboards y exportaciones
+
+@caso('vista.dashboard_indicadores')
+def dashboard_indicadores(ctx):
+    _get(ctx, 'indicadores:dashboard')
+
+
+@caso('vista.series_indicadores')
+def series_indicadores(ctx):
+    _get(ctx, 'indicadores:series_indicadores', familia='operacionales', granularidad='mes',
+         desde=ctx.hoy.replace(year=ctx.hoy.year - 4).isoformat())
+
+
+@caso('vista.indicadores_cohorte')
+def indicadores_cohorte(ctx):
+    _get(ctx, 'indicadores:indicadores_cohorte')
+
+
+@caso('vista.alertas_lista')
+def alertas_lista(ctx):
+    _get(ctx, 'indicadores:alertas_lista')
+
+
+@caso('csv.reporte_cohorte')
+def csv_reporte_cohorte(ctx):
+    _get(ctx, 'indicadores:descargar_reporte_cohorte')
+
+
+@caso('csv.reporte_operacional')
+def csv_reporte_operacional(ctx):
+    _get(ctx, 'indicadores:descargar_reporte_operacional')
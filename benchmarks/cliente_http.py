@@ -0,0 +1,97 @@
+# cliente_http.py - Cliente HTTP mínimo con sesión de Django para los benchmarks
+import http.client
+import re
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+COOKIE_SESION = 'sistematbc_sessionid'
+
+
+class SesionHTTP:
+    """
+    Conexión keep-alive con las cookies de una sesión iniciada en el sistema.
+
+    No es seguro compartir una instancia entre hilos: cada hilo del benchmark
+    crea la suya a partir de las cookies de login (ver clonar()).
+    """
+
+    def __init__(self, base_url, cookies=None, timeout=30):
+        partes = urlsplit(base_url)
+        self.host = partes.hostname
+        self.puerto = partes.port or 80
+        self.timeout = timeout
+        self.cookies = dict(cookies or {})
+        self._conexion = None
+
+    def clonar(self):
+        copia = SesionHTTP.__new__(SesionHTTP)
+        copia.host, copia.puerto, copia.timeout = self.host, self.puerto, self.timeout
+        copia.cookies = dict(self.cookies)
+        copia._conexion = None
+        return copia
+
+    def _conectar(self):
+        if self._conexion is None:
+            self._conexion = http.client.HTTPConnection(self.host, self.puerto, timeout=self.timeout)
+        return self._conexion
+
+    def cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+    def solicitar(self, metodo, ruta, datos=None, ajax=True):
+        """Envía una petición y retorna (status, cuerpo, segundos)"""
+        cabeceras = {'Host': f'{self.host}:{self.puerto}'}
+        if self.cookies:
+            cabeceras['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        if ajax:
+            cabeceras['X-Requested-With'] = 'XMLHttpRequest'
+        cuerpo = None
+        if metodo == 'POST':
+            datos = dict(datos or {})
+            if 'csrftoken' in self.cookies:
+                cabeceras['X-CSRFToken'] = self.cookies['csrftoken']
+                cabeceras['Referer'] = f'http://{self.host}:{self.puerto}/'
+            cuerpo = urlencode(datos)
+            cabeceras['Content-Type'] = 'application/x-www-form-urlencoded'
+
+        inicio = time.perf_counter()
+        for intento in range(2):
+            conexion = self._conectar()
+            try:
+                conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                contenido = respuesta.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # El servidor cerró la conexión keep-alive: se reintenta una vez
+                self.cerrar()
+                if intento:
+                    raise
+        segundos = time.perf_counter() - inicio
+
+        for valor in respuesta.headers.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie()
+            cookie.load(valor)
+            for nombre, morsel in cookie.items():
+                self.cookies[nombre] = morsel.value
+        return respuesta.status, contenido, segundos
+
+    @classmethod
+    def iniciar_sesion(cls, base_url, usuario, password):
+        """Inicia sesión con el formulario de login (ruta '/') y retorna la sesión"""
+        sesion = cls(base_url)
+        status, contenido, _ = sesion.solicitar('GET', '/', ajax=False)
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', contenido)
+        if status != 200 or not token:
+            raise RuntimeError(f'No se pudo obtener el formulario de login ({status})')
+        sesion.solicitar('POST', '/', {
+            'csrfmiddlewaretoken': token.group(1).decode(),
+            'username': usuario,
+            'password': password,
+        }, ajax=False)
+        if COOKIE_SESION not in sesion.cookies:
+            raise RuntimeError(f'Credenciales rechazadas para {usuario}')
+        return sesion
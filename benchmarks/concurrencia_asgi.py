@@ -0,0 +1,93 @@
+"""
+Mide el rendimiento de los endpoints JSON de solo lectura bajo concurrencia.
+
+Sirve para comparar el mismo proyecto servido por WSGI y por ASGI. Con la
+base local SQLite (DB_ENGINE=django.db.backends.sqlite3 en .env):
+
+    uvicorn sistemaTBC_demo.asgi:application --port 8001 --workers 1
+    gunicorn sistemaTBC_demo.wsgi:application --bind :8002 --threads 8
+
+    python -m benchmarks.concurrencia_asgi --url http://127.0.0.1:8001 \\
+        --usuario admin.sistema --password Admin.1234 --niveles 1,10,50
+
+Por cada nivel de concurrencia se reporta peticiones por segundo, p50 y p95
+de latencia y la cantidad de errores por endpoint.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from apps.indicadores.estadistica import percentil
+
+from .cliente_http import SesionHTTP
+
+ENDPOINTS = [
+    '/tratamientos/buscar-paciente/?rut=1',
+    '/pacientes/autocompletar/?q=a',
+    '/tratamientos/calendario/eventos/',
+    '/indicadores/alertas/novedades/',
+]
+
+
+def medir(sesion_base, ruta, concurrencia, peticiones):
+    """Lanza `peticiones` GET repartidas en `concurrencia` hilos"""
+    latencias = []
+    errores = 0
+    lock = threading.Lock()
+    locales = threading.local()
+
+    def una_peticion(_):
+        nonlocal errores
+        if not hasattr(locales, 'sesion'):
+            locales.sesion = sesion_base.clonar()
+        try:
+            status, _, segundos = locales.sesion.solicitar('GET', ruta)
+        except OSError:
+            status, segundos = 0, None
+        with lock:
+            # 404/400 son respuestas válidas de búsqueda, no errores de servidor
+            if status == 0 or status >= 500:
+                errores += 1
+            else:
+                latencias.append(segundos)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(una_peticion, range(peticiones)))
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'ruta': ruta,
+        'concurrencia': concurrencia,
+        'rps': len(latencias) / total if total else 0.0,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'errores': errores,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--usuario', default='admin.sistema')
+    parser.add_argument('--password', default='Admin.1234')
+    parser.add_argument('--niveles', default='1,10,50', help='Niveles de concurrencia separados por coma')
+    parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por endpoint y nivel')
+    parser.add_argument('--ruta', action='append', help='Endpoint a medir (repetible)')
+    args = parser.parse_args(argv)
+
+    sesion = SesionHTTP.iniciar_sesion(args.url, args.usuario, args.password)
+    niveles = [int(n) for n in args.niveles.split(',') if n.strip()]
+
+    print(f"{'Endpoint':45} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'err':>5}")
+    for ruta in args.ruta or ENDPOINTS:
+        for nivel in niveles:
+            r = medir(sesion, ruta, nivel, args.peticiones)
+            print(f"{r['ruta'][:45]:45} {r['concurrencia']:>5} {r['rps']:>9.1f} "
+                  f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['errores']:>5}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark de servicios de indicadores, listas, dashboards y exportaciones CSV.
+
+Crea una base de pruebas, la llena con GeneradorDatosSinteticos hasta cada
+tamaño pedido (se reutiliza al crecer: 1k, luego +9k, luego +90k) y mide cada
+caso de benchmarks/casos.py: p50/p95 de latencia, consultas SQL y pico de
+memoria. Ejemplos:
+
+    python -m benchmarks.suite --tamanos 1000,10000 --salida benchmarks/resultados/actual.json
+    python -m benchmarks.suite --tamanos 1000 --base benchmarks/base.json
+    python -m benchmarks.suite --tamanos 1000,10000,100000 --actualizar-base benchmarks/base.json
+
+Con --base termina con código 1 si algún caso empeora más que --umbral en
+p50 o ejecuta más consultas que la línea base. Las líneas base solo son
+comparables en la misma máquina y motor de base de datos.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+import django
+
+from apps.indicadores.estadistica import percentil
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistemaTBC_demo.settings')
+
+
+class Contexto:
+    """Objetos compartidos por los casos de una corrida"""
+
+    def __init__(self, cliente, establecimiento):
+        self.cliente = cliente
+        self.establecimiento = establecimiento
+        self.hoy = date.today()
+
+
+def medir_caso(definicion, ctx, repeticiones):
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    funcion = definicion['funcion']
+    repeticiones = definicion['repeticiones'] or repeticiones
+    tiempos, consultas = [], 0
+    try:
+        cache.clear()
+        funcion(ctx)  # calentamiento: plantillas compiladas, conexiones abiertas
+        for _ in range(repeticiones):
+            cache.clear()
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as contexto:
+                inicio = time.perf_counter()
+                funcion(ctx)
+                tiempos.append(time.perf_counter() - inicio)
+            consultas = len(contexto.captured_queries)
+
+        # Memoria en una ejecución aparte: tracemalloc distorsiona los tiempos
+        cache.clear()
+        tracemalloc.start()
+        funcion(ctx)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    except Exception as error:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {'error': str(error)}
+
+    return {
+        'p50_ms': round(percentil(tiempos, 50) * 1000, 2),
+        'p95_ms': round(percentil(tiempos, 95) * 1000, 2),
+        'consultas': consultas,
+        'memoria_pico_kb': round(pico / 1024, 1),
+        'repeticiones': repeticiones,
+    }
+
+
+def comparar(resultados, base, umbral):
+    """Retorna las regresiones respecto de la línea base"""
+    regresiones = []
+    for tamano, casos in resultados['tamanos'].items():
+        for nombre, actual in casos.items():
+            anterior = base.get('tamanos', {}).get(tamano, {}).get(nombre)
+            if not anterior or 'error' in anterior:
+                continue
+            if 'error' in actual:
+                regresiones.append(f'{nombre} [{tamano}]: error {actual["error"]}')
+                continue
+            if actual['p50_ms'] > anterior['p50_ms'] * (1 + umbral):
+                regresiones.append(f'{nombre} [{tamano}]: p50 {anterior["p50_ms"]} -> {actual["p50_ms"]} ms')
+            if actual['consultas'] > anterior['consultas']:
+                regresiones.append(f'{nombre} [{tamano}]: consultas {anterior["consultas"]} -> {actual["consultas"]}')
+    return regresiones
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tamanos', default='1000,10000', help='Pacientes por corrida, separados por coma')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--caso', action='append', help='Ejecutar solo los casos que comiencen así')
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados')
+    parser.add_argument('--base', help='Línea base JSON con la que comparar')
+    parser.add_argument('--actualizar-base', help='Guardar los resultados como nueva línea base')
+    parser.add_argument('--umbral', type=float, default=0.25, help='Empeoramiento tolerado en p50 (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from apps.indicadores.sinteticos import GeneradorDatosSinteticos
+    from .casos import CASOS
+
+    casos = [c for c in CASOS if not args.caso or any(c['nombre'].startswith(f) for f in args.caso)]
+    tamanos = sorted(int(t) for t in args.tamanos.split(',') if t.strip())
+    resultados = {
+        'commit': _commit_actual(),
+        'fecha': date.today().isoformat(),
+        'motor': connection.vendor,
+        'python': platform.python_version(),
+        'tamanos': {},
+    }
+
+    setup_test_environment()
+    nombre_original = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        generados = 0
+        for tamano in tamanos:
+            inicio = time.perf_counter()
+            GeneradorDatosSinteticos(
+                pacientes=tamano - generados,
+                establecimientos=max(3, tamano // 5000),
+                semilla=args.semilla + generados,
+            ).generar()
+            generados = tamano
+            print(f'\n== {tamano} pacientes (datos generados en {time.perf_counter() - inicio:.1f} s)')
+
+            usuarios = GeneradorDatosSinteticos().usuarios_por_rol()
+            from apps.indicadores.models import Establecimiento
+            cliente = Client()
+            cliente.force_login(usuarios['admin'])
+            ctx = Contexto(cliente, Establecimiento.objects.order_by('pk').first())
+
+            print(f"{'Caso':32} {'p50 ms':>10} {'p95 ms':>10} {'consultas':>10} {'mem KB':>10}")
+            por_caso = {}
+            for definicion in casos:
+                r = medir_caso(definicion, ctx, args.repeticiones)
+                por_caso[definicion['nombre']] = r
+                if 'error' in r:
+                    print(f"{definicion['nombre']:32} ERROR {r['error'][:80]}")
+                else:
+                    print(f"{definicion['nombre']:32} {r['p50_ms']:>10.1f} {r['p95_ms']:>10.1f} "
+                          f"{r['consultas']:>10} {r['memoria_pico_kb']:>10.0f}")
+            resultados['tamanos'][str(tamano)] = por_caso
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0)
+        teardown_test_environment()
+
+    for ruta in filter(None, [args.salida, args.actualizar_base]):
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+        print(f'\nResultados guardados en {ruta}')
+
+    if args.base:
+        with open(args.base, encoding='utf-8') as archivo:
+            regresiones = comparar(resultados, json.load(archivo), args.umbral)
+        if regresiones:
+            print('\nRegresiones respecto de la línea base:')
+            for regresion in regresiones:
+                print(f'  {regresion}')
+            sys.exit(1)
+        print('\nSin regresiones respecto de la línea base')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,14 @@ ASGI config for sistemaTBC_demo project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The alert stream (indicadores:stream_alertas) keeps one connection open per
+browser and needs an ASGI server, for example:
+
+    uvicorn sistemaTBC_demo.asgi:application
+
+Its pub/sub lives in the server process, so run a single worker process or
+accept that each worker only pushes the alerts saved through it.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -0,0 +1,199 @@
+# middleware.py - Perfilador de consultas y tiempos por petición
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger('sistemaTBC.perfilador')
+
+# Perfil de la petición en curso; lo usa el parche de render de plantillas
+_perfil_actual = contextvars.ContextVar('perfil_actual', default=None)
+
+_RE_LISTA_IN = re.compile(r'IN \((?:%s, )*%s\)')
+_RE_ESPACIOS = re.compile(r'\s+')
+
+
+def normalizar_sql(sql):
+    """Plantilla de una consulta: mismas consultas con distintos parámetros o largos de IN coinciden"""
+    return _RE_ESPACIOS.sub(' ', _RE_LISTA_IN.sub('IN (...)', sql)).strip()
+
+
+class PerfilPeticion:
+    """Acumula las métricas de una petición muestreada"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.sql_segundos = 0.0
+        self.plantillas_segundos = 0.0
+        self.plantillas_sql = Counter()
+        self.exactas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper de django.db: se invoca por cada consulta ejecutada
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.sql_segundos += time.perf_counter() - inicio
+            self.plantillas_sql[normalizar_sql(sql)] += 1
+            try:
+                self.exactas[(sql, repr(params))] += 1
+            except Exception:
+                pass
+
+    def repetidas(self, limite=5):
+        """Consultas con la misma plantilla ejecutadas varias veces (patrón N+1)"""
+        return [
+            {'sql': sql[:300], 'veces': veces}
+            for sql, veces in self.plantillas_sql.most_common(limite)
+            if veces > 1
+        ]
+
+    @property
+    def duplicadas(self):
+        """Ejecuciones sobrantes de consultas idénticas (mismo SQL y parámetros)"""
+        return sum(veces - 1 for veces in self.exactas.values() if veces > 1)
+
+
+class MedidorMemoria:
+    """
+    tracemalloc es global al proceso: solo la primera petición muestreada que
+    lo activa mide el pico; las concurrentes informan memoria nula.
+    """
+    _lock = threading.Lock()
+    _propietario = None
+
+    def iniciar(self):
+        with self._lock:
+            if MedidorMemoria._propietario is not None or tracemalloc.is_tracing():
+                return False
+            MedidorMemoria._propietario = self
+            tracemalloc.start()
+            return True
+
+    def detener(self):
+        with self._lock:
+            if MedidorMemoria._propietario is not self:
+                return None
+            _, pico = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            MedidorMemoria._propietario = None
+            return round(pico / 1024, 1)
+
+
+def _instrumentar_plantillas():
+    """Mide el render de plantillas Django de la petición perfilada (se aplica una vez)"""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, '_perfilado', False):
+        return
+    render_original = Template.render
+
+    def render(self, context=None, request=None):
+        perfil = _perfil_actual.get()
+        if perfil is None:
+            return render_original(self, context, request)
+        inicio = time.perf_counter()
+        try:
+            return render_original(self, context, request)
+        finally:
+            perfil.plantillas_segundos += time.perf_counter() - inicio
+
+    render._perfilado = True
+    Template.render = render
+
+
+def _configurar_log(ruta, max_bytes, respaldos):
+    if any(isinstance(h, RotatingFileHandler) for h in logger.handlers):
+        return
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    handler = RotatingFileHandler(ruta, maxBytes=max_bytes, backupCount=respaldos, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class PerfiladorConsultasMiddleware:
+    """
+    Registra por petición muestreada: cantidad y tiempo de consultas SQL,
+    consultas repetidas, tiempo de render de plantillas y pico de memoria.
+
+    Se activa con PERFILADOR_ACTIVO y escribe una línea JSON por petición en
+    PERFILADOR_LOG (archivo rotativo). El resumen se obtiene con
+    `python manage.py reporte_rendimiento`.
+
+    Es un middleware síncrono: mientras está activo las vistas async (incluido
+    el stream SSE de alertas) se ejecutan adaptadas a un hilo, para que sus
+    consultas caigan en la conexión instrumentada. Pensado para diagnóstico.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFILADOR_ACTIVO', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.muestreo = float(getattr(settings, 'PERFILADOR_MUESTREO', 0.1))
+        self.medir_memoria = getattr(settings, 'PERFILADOR_MEMORIA', True)
+        _configurar_log(
+            str(settings.PERFILADOR_LOG),
+            getattr(settings, 'PERFILADOR_MAX_BYTES', 5 * 1024 * 1024),
+            getattr(settings, 'PERFILADOR_RESPALDOS', 5),
+        )
+        _instrumentar_plantillas()
+
+    def __call__(self, request):
+        if random.random() >= self.muestreo:
+            return self.get_response(request)
+
+        perfil = PerfilPeticion()
+        medidor = MedidorMemoria() if self.medir_memoria else None
+        midiendo_memoria = medidor.iniciar() if medidor else False
+        token = _perfil_actual.set(perfil)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(perfil))
+                response = self.get_response(request)
+        finally:
+            duracion = time.perf_counter() - inicio
+            _perfil_actual.reset(token)
+            memoria_kb = medidor.detener() if midiendo_memoria else None
+
+        self._registrar(request, response, perfil, duracion, memoria_kb)
+        return response
+
+    def _registrar(self, request, response, perfil, duracion, memoria_kb):
+        match = getattr(request, 'resolver_match', None)
+        try:
+            logger.info(json.dumps({
+                'fecha': timezone.now().isoformat(),
+                'metodo': request.method,
+                'ruta': request.path,
+                'vista': (match.view_name or match._func_path) if match else None,
+                'status': response.status_code,
+                'duracion_ms': round(duracion * 1000, 2),
+                'consultas': perfil.consultas,
+                'sql_ms': round(perfil.sql_segundos * 1000, 2),
+                'duplicadas': perfil.duplicadas,
+                'repetidas': perfil.repetidas(),
+                'plantillas_ms': round(perfil.plantillas_segundos * 1000, 2),
+                'memoria_pico_kb': memoria_kb,
+            }, ensure_ascii=False))
+        except Exception:
+            # El perfilador nunca debe romper una respuesta
+            logging.getLogger(__name__).exception("No se pudo registrar el perfil de %s", request.path)
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',# Headers de seguridad
+    'sistemaTBC_demo.middleware.PerfiladorConsultasMiddleware',# Perfilador (solo si PERFILADOR_ACTIVO)
     'django.contrib.sessions.middleware.SessionMiddleware',# Manejo de sesiones
     'django.middleware.common.CommonMiddleware',# Normalizacion de URLs
     'django.middleware.csrf.CsrfViewMiddleware',# Proteccion CSRF
@@ -75,20 +76,31 @@ TEMPLATES = [
 WSGI_APPLICATION = 'sistemaTBC_demo.wsgi.application'
 
 # Configuración de base de datos con variables de entorno
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST'),
-        'PORT': config('DB_PORT'),
-        'OPTIONS': {
-            'charset': 'utf8mb4',
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+# DB_ENGINE permite usar SQLite como reemplazo local (pruebas de carga, CI)
+DB_ENGINE = config('DB_ENGINE', default='django.db.backends.mysql')
+
+if 'sqlite' in DB_ENGINE:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': DB_ENGINE,
+            'NAME': config('DB_NAME'),
+            'USER': config('DB_USER'),
+            'PASSWORD': config('DB_PASSWORD'),
+            'HOST': config('DB_HOST'),
+            'PORT': config('DB_PORT'),
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            }
         }
     }
-}
 
 # CONFIGURACION DE AUTENTICACION Y SEGURIDAD
 # Backend de autenticacion por defecto de Django
@@ -205,6 +217,25 @@ MESSAGE_TAGS = {
     messages.ERROR: 'danger',
 }
 
+# CONFIGURACION DEL PERFILADOR DE RENDIMIENTO
+
+# Registrar consultas SQL, plantillas y memoria por petición
+PERFILADOR_ACTIVO = config('PERFILADOR_ACTIVO', default=False, cast=bool)
+# Fracción de peticiones perfiladas (0.0 a 1.0)
+PERFILADOR_MUESTREO = config('PERFILADOR_MUESTREO', default=0.1, cast=float)
+# Medir pico de memoria con tracemalloc (agrega sobrecarga)
+PERFILADOR_MEMORIA = config('PERFILADOR_MEMORIA', default=True, cast=bool)
+# Archivo rotativo con una línea JSON por petición
+PERFILADOR_LOG = config('PERFILADOR_LOG', default=os.path.join(BASE_DIR, 'logs', 'perfilador.jsonl'))
+PERFILADOR_MAX_BYTES = 5 * 1024 * 1024
+PERFILADOR_RESPALDOS = 5
+
+# CONFIGURACION DE ALERTAS
+
+# Código del establecimiento que recibe las alertas cuyo origen no coincide con
+# ningún establecimiento registrado. Vacío: esas alertas se omiten y se informan en el log
+ALERTAS_ESTABLECIMIENTO_POR_DEFECTO = config('ALERTAS_ESTABLECIMIENTO_POR_DEFECTO', default='')
+
 # URLS DE AUTENTICACION
 
 # URL para redireccionar cuando se requiere login